@@ -0,0 +1,231 @@
+"""Cache of the resolved cabinet principal.
+
+An authenticated cabinet page fires a burst of XHRs with the same access token
+and ``X-Telegram-Init-Data`` header. Without a cache every one of them
+re-verifies the initData HMAC and, for admin routes, reloads roles, role
+assignments and ABAC policies for every required permission.
+
+An entry is keyed by ``(sha256(token), sha256(initData))`` and holds the user id,
+the outcome of initData verification and, once the first permission check
+needs it, an ``RbacSnapshot`` (permissions, compiled matcher, applicable
+policies). The user row itself is still loaded per request — routes need an
+instance bound to their session — so status/blacklist checks keep running on
+fresh data.
+
+Entries live for CABINET_PRINCIPAL_CACHE_TTL_SECONDS, never past the token
+expiry or the first role assignment expiry. Committed changes to roles, role
+assignments, policies or a user's status drop affected entries (ORM session
+hooks below); with the cluster event bus the invalidation reaches other
+replicas too. Without a running bus another replica can't be told, so the
+RBAC snapshot is reused for at most CABINET_PRINCIPAL_RBAC_LOCAL_TTL_SECONDS.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+import structlog
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.cluster_event_bus import cluster_event_bus
+from app.services.permission_service import PermissionService, RbacSnapshot
+
+
+logger = structlog.get_logger(__name__)
+
+_SESSION_INFO_KEY = 'cabinet_principal_invalidation'
+
+
+@dataclass(slots=True)
+class CabinetPrincipal:
+    user_id: int
+    # Telegram ID из проверенного initData; None — заголовка нет или подпись не сошлась
+    init_data_telegram_id: int | None
+    init_data_invalid: bool
+    expires_at: float
+    rbac: RbacSnapshot | None = None
+    rbac_loaded_at: float = 0.0
+
+
+class CabinetPrincipalCache:
+    def __init__(self) -> None:
+        self._entries: OrderedDict[tuple[str, str], CabinetPrincipal] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.CABINET_PRINCIPAL_CACHE_TTL_SECONDS > 0
+
+    @staticmethod
+    def _key(token: str, init_data: str | None) -> tuple[str, str]:
+        return (
+            hashlib.sha256(token.encode()).hexdigest(),
+            hashlib.sha256(init_data.encode()).hexdigest() if init_data else '',
+        )
+
+    def get(self, token: str, init_data: str | None) -> CabinetPrincipal | None:
+        if not self.is_enabled():
+            return None
+        key = self._key(token, init_data)
+        principal = self._entries.get(key)
+        if principal is not None and principal.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return principal
+        if principal is not None:
+            self._entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        token: str,
+        init_data: str | None,
+        *,
+        user_id: int,
+        init_data_telegram_id: int | None,
+        init_data_invalid: bool,
+        token_expires_at: Any = None,
+    ) -> CabinetPrincipal:
+        ttl = float(settings.CABINET_PRINCIPAL_CACHE_TTL_SECONDS)
+        if isinstance(token_expires_at, int | float):
+            ttl = min(ttl, token_expires_at - time.time())
+        principal = CabinetPrincipal(
+            user_id=user_id,
+            init_data_telegram_id=init_data_telegram_id,
+            init_data_invalid=init_data_invalid,
+            expires_at=time.monotonic() + ttl,
+        )
+        if not self.is_enabled() or ttl <= 0:
+            return principal
+
+        key = self._key(token, init_data)
+        self._entries[key] = principal
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.CABINET_PRINCIPAL_CACHE_MAX_SIZE:
+            self._entries.popitem(last=False)
+        return principal
+
+    def invalidate_users(self, user_ids: set[int]) -> None:
+        stale = [key for key, principal in self._entries.items() if principal.user_id in user_ids]
+        for key in stale:
+            self._entries.pop(key, None)
+        self.invalidations += 1
+
+    def invalidate_all(self) -> None:
+        self._entries.clear()
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+cabinet_principal_cache = CabinetPrincipalCache()
+
+
+async def get_principal_rbac(db: AsyncSession, principal: CabinetPrincipal | None, user_id: int) -> RbacSnapshot:
+    """RBAC/ABAC snapshot of the principal, loaded on first use and reused by later requests."""
+    if principal is None:
+        return await PermissionService.load_rbac_snapshot(db, user_id)
+    snapshot = principal.rbac
+    if snapshot is None or snapshot.is_expired(datetime.now(UTC)) or _rbac_unsynced_stale(principal):
+        snapshot = await PermissionService.load_rbac_snapshot(db, user_id)
+        principal.rbac = snapshot
+        principal.rbac_loaded_at = time.monotonic()
+    return snapshot
+
+
+def _rbac_unsynced_stale(principal: CabinetPrincipal) -> bool:
+    # Без кластерной шины отзыв роли на другой реплике сюда не дойдёт — ограничиваем возраст снимка
+    if cluster_event_bus.is_running():
+        return False
+    return time.monotonic() - principal.rbac_loaded_at >= settings.CABINET_PRINCIPAL_RBAC_LOCAL_TTL_SECONDS
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+
+
+def _apply_invalidation(scope: dict[str, Any]) -> None:
+    if scope.get('all'):
+        cabinet_principal_cache.invalidate_all()
+    elif scope.get('user_ids'):
+        cabinet_principal_cache.invalidate_users({int(user_id) for user_id in scope['user_ids']})
+
+
+def _collect_changes(session: Session, flush_context: Any) -> None:
+    from app.database.models import AccessPolicy, AdminRole, User, UserRole
+
+    invalidate_all = False
+    user_ids: set[int] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, (AdminRole, AccessPolicy)):
+            invalidate_all = True
+        elif isinstance(instance, UserRole):
+            user_id = instance.__dict__.get('user_id')
+            if user_id is None:
+                invalidate_all = True
+            else:
+                user_ids.add(user_id)
+        elif isinstance(instance, User) and instance.__dict__.get('id') is not None:
+            try:
+                status_changed = sa_inspect(instance).attrs.status.history.has_changes()
+            except Exception:
+                status_changed = False
+            if status_changed:
+                user_ids.add(instance.__dict__['id'])
+
+    if invalidate_all or user_ids:
+        scope = session.info.setdefault(_SESSION_INFO_KEY, {'all': False, 'user_ids': set()})
+        scope['all'] = scope['all'] or invalidate_all
+        scope['user_ids'] |= user_ids
+
+
+def _invalidate_after_commit(session: Session) -> None:
+    scope = session.info.pop(_SESSION_INFO_KEY, None)
+    if not scope:
+        return
+    _apply_invalidation(scope)
+    cluster_event_bus.publish('principal', {'all': scope['all'], 'user_ids': sorted(scope['user_ids'])})
+
+
+def _discard_after_rollback(session: Session, previous_transaction: Any) -> None:
+    if not getattr(previous_transaction, 'nested', False):
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+_registered = False
+
+
+def register_principal_invalidation() -> None:
+    """Подписывается на события ORM-сессии: коммит изменений ролей/политик/статуса сбрасывает кэш."""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_flush', _collect_changes)
+    event.listen(Session, 'after_commit', _invalidate_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    cluster_event_bus.subscribe('principal', _apply_invalidation)
+    _registered = True
+
+
+register_principal_invalidation()
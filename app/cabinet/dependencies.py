@@ -17,6 +17,7 @@ from app.services.user_action_log_service import schedule_cabinet_action_log
 from app.services.user_revival_service import NotDeletedError, revive_deleted_user
 
 from .auth.jwt_handler import get_token_payload
+from .auth.principal_cache import CabinetPrincipal, cabinet_principal_cache, get_principal_rbac
 from .auth.telegram_auth import validate_telegram_init_data
 from .ip_utils import get_client_ip
 
@@ -26,6 +27,12 @@ logger = structlog.get_logger(__name__)
 security = HTTPBearer(auto_error=False)
 
 
+def _request_principal(request: Request) -> CabinetPrincipal | None:
+    """Principal, resolved for this request by ``get_current_cabinet_user``."""
+    principal = getattr(request.state, 'cabinet_principal', None)
+    return principal if isinstance(principal, CabinetPrincipal) else None
+
+
 async def get_cabinet_db() -> AsyncSession:
     """Get database session for cabinet operations."""
     async with AsyncSessionLocal() as session:
@@ -67,23 +74,31 @@ async def get_current_cabinet_user(
         )
 
     token = credentials.credentials
-    payload = get_token_payload(token, expected_type='access')
+    init_data_raw = request.headers.get('X-Telegram-Init-Data')
 
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Invalid or expired token',
-            headers={'WWW-Authenticate': 'Bearer'},
-        )
+    # Повторные запросы страницы с тем же токеном и initData берут уже проверенный
+    # principal: без повторной проверки подписи initData и загрузки ролей/политик.
+    principal = cabinet_principal_cache.get(token, init_data_raw)
+    if principal is not None:
+        user_id = principal.user_id
+    else:
+        payload = get_token_payload(token, expected_type='access')
 
-    try:
-        user_id = int(payload.get('sub'))
-    except (TypeError, ValueError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Invalid token payload',
-            headers={'WWW-Authenticate': 'Bearer'},
-        )
+        if not payload:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Invalid or expired token',
+                headers={'WWW-Authenticate': 'Bearer'},
+            )
+
+        try:
+            user_id = int(payload.get('sub'))
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Invalid token payload',
+                headers={'WWW-Authenticate': 'Bearer'},
+            )
 
     user = await get_user_by_id(db, user_id)
 
@@ -97,20 +112,35 @@ async def get_current_cabinet_user(
     # cross-account guard (existing) and for the DELETED auto-revival
     # (new). Reading the header always; verification only when it's
     # present.
-    init_data_raw = request.headers.get('X-Telegram-Init-Data')
-    init_data_telegram_id: int | None = None
+    if principal is None:
+        init_data_telegram_id: int | None = None
+        init_data_invalid = False
+        if init_data_raw:
+            # Use generous max_age: Telegram Desktop caches initData
+            # (https://github.com/telegramdesktop/tdesktop/issues/28303).
+            tg_user = validate_telegram_init_data(init_data_raw, max_age_seconds=86400 * 30)
+            if tg_user is None:
+                init_data_invalid = True
+            else:
+                init_data_telegram_id = tg_user.get('id')
+        principal = cabinet_principal_cache.put(
+            token,
+            init_data_raw,
+            user_id=user_id,
+            init_data_telegram_id=init_data_telegram_id,
+            init_data_invalid=init_data_invalid,
+            token_expires_at=payload.get('exp'),
+        )
+
     init_data_matches_user = False
     if init_data_raw and user.telegram_id is not None:
-        # Use generous max_age: Telegram Desktop caches initData
-        # (https://github.com/telegramdesktop/tdesktop/issues/28303).
-        tg_user = validate_telegram_init_data(init_data_raw, max_age_seconds=86400 * 30)
-        if tg_user is None:
+        if principal.init_data_invalid:
             logger.warning(
                 'Telegram initData validation failed but header was present',
                 jwt_user_id=user.id,
             )
-        else:
-            init_data_telegram_id = tg_user.get('id')
+        elif principal.init_data_telegram_id is not None:
+            init_data_telegram_id = principal.init_data_telegram_id
             init_data_matches_user = init_data_telegram_id == user.telegram_id
             if not init_data_matches_user:
                 # Defense in depth: cross-validate Telegram identity.
@@ -130,6 +160,8 @@ async def get_current_cabinet_user(
                     headers={'WWW-Authenticate': 'Bearer'},
                 )
 
+    request.state.cabinet_principal = principal
+
     # Blacklist check happens BEFORE the status branching: a blacklisted
     # account must show as blacklisted regardless of whether it's also
     # DELETED. This prevents (1) auto-revival of banned users and (2)
@@ -328,10 +360,8 @@ async def get_current_admin_user(
         return user
 
     # RBAC check: user has any active role with level > 0
-    from app.database.crud.rbac import UserRoleCRUD
-
-    _permissions, _role_names, max_level = await UserRoleCRUD.get_user_permissions(db, user.id)
-    if max_level > 0:
+    rbac = await get_principal_rbac(db, _request_principal(request), user.id)
+    if rbac.role_level > 0:
         return user
 
     raise HTTPException(
@@ -377,10 +407,17 @@ def require_permission(*permissions: str):
             if ':' in first_perm:
                 resource_type = first_perm.split(':', maxsplit=1)[0]
 
+        # Роли и ABAC-политики загружаются один раз на principal, а не на каждое право;
+        # legacy-админам (ADMIN_IDS / ADMIN_EMAILS) они не нужны вовсе
+        from app.services.rbac_bootstrap_service import is_user_admin_by_env
+
+        rbac = None
+        if not is_user_admin_by_env(user).is_admin:
+            rbac = await get_principal_rbac(db, _request_principal(request), user.id)
         for perm in permissions:
-            allowed, reason = await PermissionService.check_permission(
-                db,
+            allowed, reason = PermissionService.evaluate_snapshot(
                 user,
+                rbac,
                 perm,
                 ip_address=client_ip,
             )
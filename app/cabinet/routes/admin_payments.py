@@ -13,6 +13,7 @@ from app.database.models import PaymentMethod, User
 from app.services.payment_search_service import (
     MAX_ALL_TIME_DAYS,
     PeriodPreset,
+    SearchCursor,
     SearchParams,
     StatusFilter,
     search_payments,
@@ -27,6 +28,7 @@ from app.services.payment_verification_service import (
     method_display_name,
     run_manual_check,
 )
+from app.services.payment_webhook_inbox import list_inbox_items, payment_webhook_inbox
 
 from ..dependencies import get_cabinet_db, require_permission
 
@@ -74,6 +76,7 @@ class PendingPaymentListResponse(BaseModel):
     page: int
     per_page: int
     pages: int
+    next_cursor: str | None = None
 
 
 class ManualCheckResponse(BaseModel):
@@ -104,6 +107,40 @@ class SearchStatsResponse(BaseModel):
     by_method: dict
 
 
+class WebhookInboxItemResponse(BaseModel):
+    """Payment provider callback stored in the webhook inbox."""
+
+    id: int
+    provider: str
+    handler: str
+    status: str
+    attempts: int
+    last_error: str | None = None
+    received_at: datetime
+    processed_at: datetime | None = None
+    next_attempt_at: datetime
+    payload: dict | list | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class WebhookInboxListResponse(BaseModel):
+    """Recent webhook inbox entries."""
+
+    items: list[WebhookInboxItemResponse]
+
+
+class WebhookInboxMetricsResponse(BaseModel):
+    """Webhook inbox depth and lag per provider."""
+
+    providers: dict
+    in_flight: int
+    succeeded: int
+    failed: int
+    exhausted: int
+
+
 # ============ Helper functions ============
 
 
@@ -395,10 +432,20 @@ async def search_payments_endpoint(
     date_to: datetime | None = Query(None, description='Custom range end (ISO 8601)'),
     page: int = Query(1, ge=1, description='Page number'),
     per_page: int = Query(20, ge=1, le=100, description='Items per page'),
+    cursor: str | None = Query(
+        None, max_length=512, description='next_cursor from the previous page (keyset pagination, page is ignored)'
+    ),
     admin: User = Depends(require_permission('payments:read')),
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Search payments across all providers with filters."""
+    page_cursor = None
+    if cursor:
+        try:
+            page_cursor = SearchCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+
     try:
         parsed_status = StatusFilter(status_filter)
     except ValueError:
@@ -438,9 +485,10 @@ async def search_payments_endpoint(
         date_to=date_to,
         page=page,
         per_page=per_page,
+        cursor=page_cursor,
     )
 
-    page_items, total = await search_payments(db, params)
+    page_items, total, next_cursor = await search_payments(db, params)
     pages = math.ceil(total / per_page) if total > 0 else 1
     items = [_record_to_response(p) for p in page_items]
 
@@ -450,6 +498,7 @@ async def search_payments_endpoint(
         page=page,
         per_page=per_page,
         pages=pages,
+        next_cursor=next_cursor.encode() if next_cursor else None,
     )
 
 
@@ -517,6 +566,45 @@ async def search_payments_stats_endpoint(
     )
 
 
+@router.get('/webhook-inbox', response_model=WebhookInboxListResponse)
+async def get_webhook_inbox(
+    status_filter: str | None = Query(None, description='Status filter: pending, done, failed'),
+    provider: str | None = Query(None, max_length=32, description='Filter by provider'),
+    limit: int = Query(50, ge=1, le=200),
+    admin: User = Depends(require_permission('payments:read')),
+    db: AsyncSession = Depends(get_cabinet_db),
+):
+    """List recent payment callbacks from the webhook inbox."""
+    items = await list_inbox_items(db, status=status_filter, provider=provider, limit=limit)
+    return WebhookInboxListResponse(items=[WebhookInboxItemResponse.model_validate(item) for item in items])
+
+
+@router.get('/webhook-inbox/metrics', response_model=WebhookInboxMetricsResponse)
+async def get_webhook_inbox_metrics(
+    admin: User = Depends(require_permission('payments:read')),
+):
+    """Get webhook inbox queue depth and lag per provider."""
+    return WebhookInboxMetricsResponse(**await payment_webhook_inbox.get_metrics())
+
+
+@router.post('/webhook-inbox/{item_id}/replay', response_model=WebhookInboxItemResponse)
+async def replay_webhook_inbox_item(
+    item_id: int,
+    admin: User = Depends(require_permission('payments:edit')),
+    db: AsyncSession = Depends(get_cabinet_db),
+):
+    """Queue a stored payment callback for processing again."""
+    if not await payment_webhook_inbox.replay(item_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Webhook is already queued or does not exist',
+        )
+
+    logger.info('Admin replayed payment webhook', admin_id=admin.id, item_id=item_id)
+    items = await list_inbox_items(db, limit=1, item_id=item_id)
+    return WebhookInboxItemResponse.model_validate(items[0])
+
+
 @router.get('/{method}/{payment_id}', response_model=PendingPaymentResponse)
 async def get_pending_payment_details(
     method: str,
@@ -7,10 +7,11 @@ from datetime import UTC, datetime
 import structlog
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
-from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy import func, or_, select, union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.database.crud.referral_closure import get_ancestor_ids, get_descendant_ids
 from app.database.models import (
     AdvertisingCampaign,
     AdvertisingCampaignRegistration,
@@ -19,11 +20,10 @@ from app.database.models import (
     Subscription,
     SubscriptionStatus,
     Tariff,
-    Transaction,
-    TransactionType,
     User,
 )
 from app.utils.cache import RateLimitCache
+from app.utils.text_search import search_text_clause
 
 from ..dependencies import get_cabinet_db, require_permission
 
@@ -34,8 +34,6 @@ router = APIRouter(prefix='/admin/referral-network', tags=['Cabinet Admin Referr
 
 # ============ Constants ============
 
-SPENT_TRANSACTION_TYPES: tuple[str, ...] = (TransactionType.SUBSCRIPTION_PAYMENT.value,)
-
 EDGE_TYPE_REFERRAL = 'referral'
 EDGE_TYPE_CAMPAIGN = 'campaign'
 EDGE_TYPE_PARTNER_CAMPAIGN = 'partner_campaign'
@@ -254,25 +252,13 @@ async def _fetch_network_user_ids(db: AsyncSession) -> set[int]:
     - have at least one referral (someone's referred_by_id points to them)
     - have at least one campaign registration
     """
-    # Users with referrer
-    referred_q = select(User.id).where(User.referred_by_id.isnot(None))
-
-    # Users who are referrers
-    referrer_q = select(User.referred_by_id).where(User.referred_by_id.isnot(None)).distinct()
-
-    # Users with campaign registration
-    campaign_user_q = select(AdvertisingCampaignRegistration.user_id).distinct()
-
-    result_referred = await db.execute(referred_q)
-    result_referrers = await db.execute(referrer_q)
-    result_campaign = await db.execute(campaign_user_q)
-
-    user_ids: set[int] = set()
-    user_ids.update(row[0] for row in result_referred)
-    user_ids.update(row[0] for row in result_referrers if row[0] is not None)
-    user_ids.update(row[0] for row in result_campaign)
-
-    return user_ids
+    network_q = union(
+        select(User.id).where(User.referred_by_id.isnot(None)),
+        select(User.referred_by_id).where(User.referred_by_id.isnot(None)),
+        select(AdvertisingCampaignRegistration.user_id),
+    )
+    result = await db.execute(network_q)
+    return {row[0] for row in result}
 
 
 async def _fetch_direct_referral_counts(db: AsyncSession, user_ids: set[int] | None = None) -> dict[int, int]:
@@ -305,30 +291,16 @@ async def _fetch_personal_revenue(db: AsyncSession, user_ids: set[int]) -> dict[
 async def _fetch_branch_revenue(db: AsyncSession, user_ids: set[int]) -> dict[int, int]:
     """Return {referrer_id: total_spent_by_direct_referrals}.
 
-    This sums subscription payments by each user's direct referrals (one level deep).
+    This sums subscription payments by each user's direct referrals (one level deep),
+    read from the per-user running totals instead of the transactions table.
     """
     if not user_ids:
         return {}
 
-    referred_user = (
-        select(User.id, User.referred_by_id)
-        .where(and_(User.referred_by_id.isnot(None), User.referred_by_id.in_(user_ids)))
-        .subquery()
-    )
-
     stmt = (
-        select(
-            referred_user.c.referred_by_id,
-            func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0),
-        )
-        .join(referred_user, Transaction.user_id == referred_user.c.id)
-        .where(
-            and_(
-                Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-                Transaction.is_completed.is_(True),
-            )
-        )
-        .group_by(referred_user.c.referred_by_id)
+        select(User.referred_by_id, func.coalesce(func.sum(User.total_spent_kopeks), 0))
+        .where(User.referred_by_id.in_(user_ids))
+        .group_by(User.referred_by_id)
     )
     result = await db.execute(stmt)
     return {row[0]: row[1] for row in result}
@@ -339,17 +311,7 @@ async def _fetch_personal_spent(db: AsyncSession, user_ids: set[int]) -> dict[in
     if not user_ids:
         return {}
 
-    stmt = (
-        select(Transaction.user_id, func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0))
-        .where(
-            and_(
-                Transaction.user_id.in_(user_ids),
-                Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-                Transaction.is_completed.is_(True),
-            )
-        )
-        .group_by(Transaction.user_id)
-    )
+    stmt = select(User.id, User.total_spent_kopeks).where(User.id.in_(user_ids), User.total_spent_kopeks != 0)
     result = await db.execute(stmt)
     return {row[0]: row[1] for row in result}
 
@@ -495,21 +457,7 @@ async def _fetch_campaign_stats(
     for uids in campaign_user_ids.values():
         all_campaign_users.update(uids)
 
-    user_spent: dict[int, int] = {}
-    if all_campaign_users:
-        spent_stmt = (
-            select(Transaction.user_id, func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0))
-            .where(
-                and_(
-                    Transaction.user_id.in_(all_campaign_users),
-                    Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-                    Transaction.is_completed.is_(True),
-                )
-            )
-            .group_by(Transaction.user_id)
-        )
-        spent_result = await db.execute(spent_stmt)
-        user_spent = {row[0]: row[1] for row in spent_result}
+    user_spent = await _fetch_personal_spent(db, all_campaign_users)
 
     # Top referrers: users from campaign who have the most referrals
     # Also need usernames for those users
@@ -803,41 +751,12 @@ async def get_scope_options(
 
 async def _get_descendant_user_ids(db: AsyncSession, root_ids: set[int]) -> set[int]:
     """Get all user IDs in the referral trees rooted at root_ids (inclusive)."""
-    if not root_ids:
-        return set()
-
-    anchor = (
-        select(User.id, literal(0).label('depth')).where(User.id.in_(root_ids)).cte(name='descendants', recursive=True)
-    )
-    rpart = (
-        select(User.id, (anchor.c.depth + 1).label('depth'))
-        .join(anchor, User.referred_by_id == anchor.c.id)
-        .where(anchor.c.depth < MAX_REFERRAL_DEPTH)
-    )
-    descendants_cte = anchor.union_all(rpart)
-
-    result = await db.execute(select(func.distinct(descendants_cte.c.id)))
-    return {row[0] for row in result}
+    return await get_descendant_ids(db, root_ids, max_depth=MAX_REFERRAL_DEPTH)
 
 
 async def _get_ancestor_user_ids(db: AsyncSession, start_user_ids: set[int]) -> set[int]:
     """Walk up the referral chain from start_user_ids to root (inclusive)."""
-    if not start_user_ids:
-        return set()
-    anchor = (
-        select(User.id, User.referred_by_id, literal(0).label('depth'))
-        .where(User.id.in_(start_user_ids))
-        .cte(name='ancestors', recursive=True)
-    )
-    rpart = (
-        select(User.id, User.referred_by_id, (anchor.c.depth + 1).label('depth'))
-        .join(anchor, User.id == anchor.c.referred_by_id)
-        .where(anchor.c.depth < MAX_REFERRAL_DEPTH)
-    )
-    ancestors_cte = anchor.union_all(rpart)
-
-    result = await db.execute(select(func.distinct(ancestors_cte.c.id)))
-    return {row[0] for row in result}
+    return await get_ancestor_ids(db, start_user_ids, max_depth=MAX_REFERRAL_DEPTH)
 
 
 async def _build_scoped_graph(
@@ -1132,19 +1051,10 @@ async def get_network_user_detail(
     personal_rev_result = await db.execute(personal_rev_stmt)
     personal_revenue = personal_rev_result.scalar() or 0
 
-    # Branch revenue: computed after branch CTE (see below)
-    branch_revenue = 0
-
-    # Personal spent
-    spent_stmt = select(func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0)).where(
-        and_(
-            Transaction.user_id == user_id,
-            Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-            Transaction.is_completed.is_(True),
-        )
-    )
-    spent_result = await db.execute(spent_stmt)
-    personal_spent = spent_result.scalar() or 0
+    # Personal spent and the whole branch come from running totals (see ReferralClosure)
+    personal_spent = user.total_spent_kopeks or 0
+    total_branch_users = user.referral_branch_size or 0
+    branch_revenue = user.referral_branch_spent_kopeks or 0
 
     # Campaign registration
     campaign_reg_stmt = (
@@ -1163,34 +1073,6 @@ async def get_network_user_detail(
         camp_result = await db.execute(camp_stmt)
         campaign_name = camp_result.scalar_one_or_none()
 
-    # Total branch users via recursive CTE (with depth limit to prevent cycles)
-    base = (
-        select(User.id, literal(1).label('depth'))
-        .where(User.referred_by_id == user_id)
-        .cte(name='branch', recursive=True)
-    )
-    recursive_part = (
-        select(User.id, (base.c.depth + 1).label('depth'))
-        .join(base, User.referred_by_id == base.c.id)
-        .where(base.c.depth < MAX_REFERRAL_DEPTH)
-    )
-    branch_cte = base.union_all(recursive_part)  # UNION ALL + count(distinct) is faster than UNION
-    total_branch_stmt = select(func.count(func.distinct(branch_cte.c.id))).select_from(branch_cte)
-    total_branch_result = await db.execute(total_branch_stmt)
-    total_branch_users = total_branch_result.scalar() or 0
-
-    # Branch revenue: total spent by all users in the branch
-    branch_user_ids_stmt = select(branch_cte.c.id)
-    branch_rev_stmt = select(func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0)).where(
-        and_(
-            Transaction.user_id.in_(branch_user_ids_stmt),
-            Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-            Transaction.is_completed.is_(True),
-        )
-    )
-    branch_rev_result = await db.execute(branch_rev_stmt)
-    branch_revenue = branch_rev_result.scalar() or 0
-
     # Referrer info
     referrer_display_name: str | None = None
     if user.referred_by_id is not None:
@@ -1302,23 +1184,10 @@ async def get_network_campaign_detail(
     # Spending by campaign users (for conversion, avg check, and total revenue)
     paying_users = 0
     total_spent = 0
-    if campaign_user_ids:
-        spent_stmt = (
-            select(Transaction.user_id, func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0))
-            .where(
-                and_(
-                    Transaction.user_id.in_(campaign_user_ids),
-                    Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-                    Transaction.is_completed.is_(True),
-                )
-            )
-            .group_by(Transaction.user_id)
-        )
-        spent_result = await db.execute(spent_stmt)
-        for row in spent_result:
-            if row[1] > 0:
-                paying_users += 1
-                total_spent += row[1]
+    for spent in (await _fetch_personal_spent(db, set(campaign_user_ids))).values():
+        if spent > 0:
+            paying_users += 1
+            total_spent += spent
 
     conversion_rate = (paying_users / direct_users * 100) if direct_users > 0 else 0.0
     avg_check = (total_spent // paying_users) if paying_users > 0 else 0
@@ -1382,11 +1251,8 @@ async def search_referral_network(
     query_stripped = q.strip()
     escaped_query = _escape_like(query_stripped)
 
-    # Build user search conditions (with escaped LIKE wildcards)
-    user_conditions = [
-        User.username.ilike(f'%{escaped_query}%', escape='\\'),
-        User.email.ilike(f'%{escaped_query}%', escape='\\'),
-    ]
+    # Username/email ищутся по нормализованной колонке users.search_text (индексируемый LIKE)
+    user_conditions = [search_text_clause(User.search_text, query_stripped)]
 
     # If query is numeric, also search by telegram_id and user id
     if query_stripped.isdigit():
@@ -1484,21 +1350,7 @@ async def search_referral_network(
             all_campaign_user_ids.update(uids)
 
         # Batch: spending per user (for campaign revenue)
-        campaign_user_spent: dict[int, int] = {}
-        if all_campaign_user_ids:
-            spent_stmt = (
-                select(Transaction.user_id, func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0))
-                .where(
-                    and_(
-                        Transaction.user_id.in_(all_campaign_user_ids),
-                        Transaction.type.in_(SPENT_TRANSACTION_TYPES),
-                        Transaction.is_completed.is_(True),
-                    )
-                )
-                .group_by(Transaction.user_id)
-            )
-            spent_res = await db.execute(spent_stmt)
-            campaign_user_spent = {row[0]: row[1] for row in spent_res}
+        campaign_user_spent = await _fetch_personal_spent(db, all_campaign_user_ids)
         campaign_referral_counts = (
             await _fetch_direct_referral_counts(db, all_campaign_user_ids) if all_campaign_user_ids else {}
         )
@@ -1,6 +1,6 @@
 """Admin routes for sales statistics in cabinet."""
 
-from datetime import UTC, datetime, timedelta
+from datetime import UTC, date, datetime, time, timedelta
 
 import structlog
 from fastapi import APIRouter, Depends, HTTPException, Query, status
@@ -9,6 +9,7 @@ from sqlalchemy import Integer as SAInteger, and_, case, cast, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.crud.payment_gateway_stats import get_gateway_success_rates
+from app.database.crud.stats_rollup import get_subscription_rollups, get_transaction_rollups
 from app.database.crud.transaction import (
     REAL_PAYMENT_METHODS,
     addon_description_clause,
@@ -27,6 +28,7 @@ from app.database.models import (
     TransactionType,
     User,
 )
+from app.services.stats_rollup_service import stats_rollup_service
 
 from ..dependencies import get_cabinet_db, require_permission
 
@@ -88,6 +90,20 @@ def _parse_period(
     return datetime(2020, 1, 1, tzinfo=UTC), now
 
 
+def _rollup_days(period_start: datetime, period_end: datetime) -> tuple[date, date] | None:
+    """Day range for the daily rollups, or None when they cannot answer the period.
+
+    Rollups are per UTC day, so the period has to start at midnight; its end is
+    either "now" or the end of a day, both of which cover the whole last day.
+    """
+    if not stats_rollup_service.is_ready():
+        return None
+    start_utc = period_start.astimezone(UTC)
+    if start_utc.time() != time.min:
+        return None
+    return start_utc.date(), period_end.astimezone(UTC).date()
+
+
 # ============ Summary Schemas ============
 
 
@@ -383,27 +399,35 @@ async def get_trials_stats(
     try:
         period_start, period_end = _parse_period(days, start_date, end_date)
 
-        total_result = await db.execute(
-            select(func.count(Subscription.id)).where(
-                and_(
-                    Subscription.is_trial == True,
-                    Subscription.created_at >= period_start,
-                    Subscription.created_at <= period_end,
+        rollup_days = _rollup_days(period_start, period_end)
+        rollup_rows = await get_subscription_rollups(db, *rollup_days) if rollup_days else None
+
+        if rollup_rows is not None:
+            total_trials = sum(row.trials_started for row in rollup_rows)
+            conversion_records = sum(row.trial_conversions for row in rollup_rows)
+        else:
+            total_result = await db.execute(
+                select(func.count(Subscription.id)).where(
+                    and_(
+                        Subscription.is_trial == True,
+                        Subscription.created_at >= period_start,
+                        Subscription.created_at <= period_end,
+                    )
                 )
             )
-        )
-        total_trials = total_result.scalar() or 0
+            total_trials = total_result.scalar() or 0
 
-        # Conversion: SubscriptionConversion records + fallback to has_had_paid_subscription
-        conversions_result = await db.execute(
-            select(func.count(SubscriptionConversion.id)).where(
-                and_(
-                    SubscriptionConversion.converted_at >= period_start,
-                    SubscriptionConversion.converted_at <= period_end,
+            conversions_result = await db.execute(
+                select(func.count(SubscriptionConversion.id)).where(
+                    and_(
+                        SubscriptionConversion.converted_at >= period_start,
+                        SubscriptionConversion.converted_at <= period_end,
+                    )
                 )
             )
-        )
-        conversion_records = conversions_result.scalar() or 0
+            conversion_records = conversions_result.scalar() or 0
+
+        # Conversion: SubscriptionConversion records + fallback to has_had_paid_subscription
 
         converted_users_result = await db.execute(
             select(func.count(User.id)).where(
@@ -459,57 +483,62 @@ async def get_trials_stats(
         )
         by_provider = [ProviderBreakdownItem(provider=row.provider, count=row.count) for row in provider_query]
 
-        # Total registrations (all user signups in period)
-        reg_total_result = await db.execute(
-            select(func.count(User.id)).where(
-                and_(
-                    User.created_at >= period_start,
-                    User.created_at <= period_end,
+        if rollup_rows is not None:
+            total_registrations = sum(row.registrations for row in rollup_rows)
+            reg_by_date = {row.day.isoformat(): row.registrations for row in rollup_rows if row.registrations}
+            trial_by_date = {row.day.isoformat(): row.trials_started for row in rollup_rows if row.trials_started}
+        else:
+            # Total registrations (all user signups in period)
+            reg_total_result = await db.execute(
+                select(func.count(User.id)).where(
+                    and_(
+                        User.created_at >= period_start,
+                        User.created_at <= period_end,
+                    )
                 )
             )
-        )
-        total_registrations = reg_total_result.scalar() or 0
+            total_registrations = reg_total_result.scalar() or 0
 
-        # Daily registrations (user signups per day)
-        daily_reg_query = await db.execute(
-            select(
-                func.date(User.created_at).label('date'),
-                func.count(User.id).label('count'),
-            )
-            .where(
-                and_(
-                    User.created_at >= period_start,
-                    User.created_at <= period_end,
+            # Daily registrations (user signups per day)
+            daily_reg_query = await db.execute(
+                select(
+                    func.date(User.created_at).label('date'),
+                    func.count(User.id).label('count'),
                 )
+                .where(
+                    and_(
+                        User.created_at >= period_start,
+                        User.created_at <= period_end,
+                    )
+                )
+                .group_by(func.date(User.created_at))
+                .order_by(func.date(User.created_at))
             )
-            .group_by(func.date(User.created_at))
-            .order_by(func.date(User.created_at))
-        )
-        reg_by_date: dict[str, int] = {}
-        for row in daily_reg_query:
-            date_str = row.date.isoformat() if hasattr(row.date, 'isoformat') else str(row.date)
-            reg_by_date[date_str] = row.count
+            reg_by_date: dict[str, int] = {}
+            for row in daily_reg_query:
+                date_str = row.date.isoformat() if hasattr(row.date, 'isoformat') else str(row.date)
+                reg_by_date[date_str] = row.count
 
-        # Daily trials (trial subscriptions per day)
-        daily_trial_query = await db.execute(
-            select(
-                func.date(Subscription.created_at).label('date'),
-                func.count(Subscription.id).label('count'),
-            )
-            .where(
-                and_(
-                    Subscription.is_trial == True,
-                    Subscription.created_at >= period_start,
-                    Subscription.created_at <= period_end,
+            # Daily trials (trial subscriptions per day)
+            daily_trial_query = await db.execute(
+                select(
+                    func.date(Subscription.created_at).label('date'),
+                    func.count(Subscription.id).label('count'),
+                )
+                .where(
+                    and_(
+                        Subscription.is_trial == True,
+                        Subscription.created_at >= period_start,
+                        Subscription.created_at <= period_end,
+                    )
                 )
+                .group_by(func.date(Subscription.created_at))
+                .order_by(func.date(Subscription.created_at))
             )
-            .group_by(func.date(Subscription.created_at))
-            .order_by(func.date(Subscription.created_at))
-        )
-        trial_by_date: dict[str, int] = {}
-        for row in daily_trial_query:
-            date_str = row.date.isoformat() if hasattr(row.date, 'isoformat') else str(row.date)
-            trial_by_date[date_str] = row.count
+            trial_by_date: dict[str, int] = {}
+            for row in daily_trial_query:
+                date_str = row.date.isoformat() if hasattr(row.date, 'isoformat') else str(row.date)
+                trial_by_date[date_str] = row.count
 
         # Merge both series by date union
         all_dates = sorted(set(reg_by_date.keys()) | set(trial_by_date.keys()))
@@ -1151,6 +1180,52 @@ class DepositsStatsResponse(BaseModel):
 # ============ Deposits Endpoint ============
 
 
+async def _deposits_stats_from_rollups(
+    db: AsyncSession, start_day: date, end_day: date, methods: list[str]
+) -> DepositsStatsResponse:
+    rows = await get_transaction_rollups(
+        db,
+        start_day,
+        end_day,
+        types=[TransactionType.DEPOSIT.value, TransactionType.SUBSCRIPTION_PAYMENT.value],
+        payment_methods=methods,
+    )
+
+    by_method_totals: dict[str, list[int]] = {}
+    daily_totals: dict[date, list[int]] = {}
+    daily_method_amounts: dict[tuple[date, str], int] = {}
+    for row in rows:
+        method_totals = by_method_totals.setdefault(row.payment_method, [0, 0])
+        method_totals[0] += row.transactions_count
+        method_totals[1] += row.amount_kopeks
+        day_totals = daily_totals.setdefault(row.day, [0, 0])
+        day_totals[0] += row.transactions_count
+        day_totals[1] += row.amount_kopeks
+        key = (row.day, row.payment_method)
+        daily_method_amounts[key] = daily_method_amounts.get(key, 0) + row.amount_kopeks
+
+    total_deposits = sum(count for count, _ in by_method_totals.values())
+    total_amount = sum(amount for _, amount in by_method_totals.values())
+
+    return DepositsStatsResponse(
+        total_deposits=total_deposits,
+        total_amount_kopeks=total_amount,
+        avg_deposit_kopeks=total_amount // total_deposits if total_deposits > 0 else 0,
+        by_method=[
+            DepositByMethodItem(method=method or 'unknown', count=count, amount_kopeks=amount)
+            for method, (count, amount) in sorted(by_method_totals.items(), key=lambda item: item[1][1], reverse=True)
+        ],
+        daily=[
+            DailyDepositItem(date=day.isoformat(), count=count, amount_kopeks=amount)
+            for day, (count, amount) in sorted(daily_totals.items())
+        ],
+        daily_by_method=[
+            DailyDepositByMethodItem(date=day.isoformat(), method=method or 'unknown', amount_kopeks=amount)
+            for (day, method), amount in sorted(daily_method_amounts.items())
+        ],
+    )
+
+
 @router.get('/deposits', response_model=DepositsStatsResponse)
 async def get_deposits_stats(
     days: int | None = Query(default=30),
@@ -1164,6 +1239,10 @@ async def get_deposits_stats(
         period_start, period_end = _parse_period(days, start_date, end_date)
 
         methods_with_manual = [*REAL_PAYMENT_METHODS, PaymentMethod.MANUAL.value]
+        rollup_days = _rollup_days(period_start, period_end)
+        if rollup_days:
+            return await _deposits_stats_from_rollups(db, *rollup_days, methods_with_manual)
+
         base_filter = and_(
             Transaction.type.in_([TransactionType.DEPOSIT.value, TransactionType.SUBSCRIPTION_PAYMENT.value]),
             Transaction.is_completed == True,
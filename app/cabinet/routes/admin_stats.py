@@ -13,6 +13,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.crud.campaign import get_campaign_statistics, get_campaigns_count, get_campaigns_list
 from app.database.crud.server_squad import get_server_statistics
+from app.database.crud.stats_rollup import get_daily_transaction_totals, sum_transaction_rollups
 from app.database.crud.subscription import get_subscriptions_statistics
 from app.database.crud.transaction import REAL_PAYMENT_METHODS, get_revenue_by_period, get_transactions_statistics
 from app.database.models import (
@@ -25,6 +26,7 @@ from app.database.models import (
     User,
 )
 from app.services.remnawave_service import RemnaWaveService
+from app.services.stats_rollup_service import stats_rollup_service
 from app.services.version_service import version_service
 
 from ..dependencies import get_cabinet_db, require_permission
@@ -251,20 +253,23 @@ async def get_dashboard_stats(
         # Get nodes status from RemnaWave
         nodes_data = await _get_nodes_overview()
 
+        use_rollups = stats_rollup_service.is_ready()
+
         # Get subscription statistics
-        sub_stats = await get_subscriptions_statistics(db)
+        sub_stats = await get_subscriptions_statistics(db, include_purchases=not use_rollups)
 
         # Get financial statistics
         now = datetime.now(UTC)
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        trans_stats = await get_transactions_statistics(db, month_start, now)
-        all_time_stats = await get_transactions_statistics(
-            db, start_date=datetime(2020, 1, 1, tzinfo=UTC), end_date=now
-        )
-
-        # Get revenue chart data (last 30 days)
-        revenue_data = await get_revenue_by_period(db, days=30)
+        if use_rollups:
+            financials = await _get_financials_from_rollups(db, now)
+            sub_stats.update(financials['purchases'])
+        else:
+            financials = await _get_financials_live(db, now)
+        revenue_data = financials['revenue_chart']
+        income_today_kopeks = financials['income_today_kopeks']
+        income_month_kopeks = financials['income_month_kopeks']
+        income_total_kopeks = financials['income_total_kopeks']
+        subscription_income_kopeks = abs(financials['subscription_income_kopeks'])
 
         # Get server statistics
         server_stats = await get_server_statistics(db)
@@ -272,14 +277,6 @@ async def get_dashboard_stats(
         # Get tariff statistics
         tariff_stats = await _get_tariff_stats(db)
 
-        # Derive income_today from revenue_chart to ensure consistency with chart
-        today_str = now.date().isoformat()
-        income_today_from_chart = sum(
-            item.get('amount_kopeks', 0) for item in revenue_data if str(item.get('date', '')) == today_str
-        )
-        # Use chart-derived value if available, otherwise fall back to trans_stats
-        income_today_kopeks = income_today_from_chart or trans_stats.get('today', {}).get('income_kopeks', 0)
-
         # Build response
         return DashboardStats(
             nodes=nodes_data,
@@ -297,13 +294,12 @@ async def get_dashboard_stats(
             financial=FinancialStats(
                 income_today_kopeks=income_today_kopeks,
                 income_today_rubles=income_today_kopeks / 100,
-                income_month_kopeks=trans_stats.get('totals', {}).get('income_kopeks', 0),
-                income_month_rubles=trans_stats.get('totals', {}).get('income_kopeks', 0) / 100,
-                income_total_kopeks=all_time_stats.get('totals', {}).get('income_kopeks', 0),
-                income_total_rubles=all_time_stats.get('totals', {}).get('income_kopeks', 0) / 100,
-                subscription_income_kopeks=abs(all_time_stats.get('totals', {}).get('subscription_income_kopeks', 0)),
-                subscription_income_rubles=abs(all_time_stats.get('totals', {}).get('subscription_income_kopeks', 0))
-                / 100,
+                income_month_kopeks=income_month_kopeks,
+                income_month_rubles=income_month_kopeks / 100,
+                income_total_kopeks=income_total_kopeks,
+                income_total_rubles=income_total_kopeks / 100,
+                subscription_income_kopeks=subscription_income_kopeks,
+                subscription_income_rubles=subscription_income_kopeks / 100,
             ),
             servers=ServerStats(
                 total_servers=server_stats.get('total_servers', 0),
@@ -445,6 +441,77 @@ async def toggle_node(
         )
 
 
+async def _get_financials_live(db: AsyncSession, now: datetime) -> dict[str, Any]:
+    """Financial dashboard figures computed from the transactions table."""
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    trans_stats = await get_transactions_statistics(db, month_start, now)
+    all_time_stats = await get_transactions_statistics(db, start_date=datetime(2020, 1, 1, tzinfo=UTC), end_date=now)
+
+    # Get revenue chart data (last 30 days)
+    revenue_data = await get_revenue_by_period(db, days=30)
+
+    # Derive income_today from revenue_chart to ensure consistency with chart
+    today_str = now.date().isoformat()
+    income_today_from_chart = sum(
+        item.get('amount_kopeks', 0) for item in revenue_data if str(item.get('date', '')) == today_str
+    )
+    # Use chart-derived value if available, otherwise fall back to trans_stats
+    income_today_kopeks = income_today_from_chart or trans_stats.get('today', {}).get('income_kopeks', 0)
+
+    return {
+        'revenue_chart': revenue_data,
+        'income_today_kopeks': income_today_kopeks,
+        'income_month_kopeks': trans_stats.get('totals', {}).get('income_kopeks', 0),
+        'income_total_kopeks': all_time_stats.get('totals', {}).get('income_kopeks', 0),
+        'subscription_income_kopeks': all_time_stats.get('totals', {}).get('subscription_income_kopeks', 0),
+    }
+
+
+async def _get_financials_from_rollups(db: AsyncSession, now: datetime) -> dict[str, Any]:
+    """Financial dashboard figures read from the daily rollups.
+
+    Periods are whole UTC days: the chart covers the last 30 days plus today,
+    "week"/"month" purchases count from the start of the day 7/30 days ago.
+    """
+    today = now.date()
+    income_types = [TransactionType.DEPOSIT.value, TransactionType.SUBSCRIPTION_PAYMENT.value]
+    subscription_types = [TransactionType.SUBSCRIPTION_PAYMENT.value]
+
+    revenue_data = await get_daily_transaction_totals(
+        db, today - timedelta(days=30), today, types=income_types, payment_methods=REAL_PAYMENT_METHODS
+    )
+    income_today_kopeks = sum(item['amount_kopeks'] for item in revenue_data if item['date'] == today)
+    _, income_month_kopeks = await sum_transaction_rollups(
+        db, start_day=today.replace(day=1), end_day=today, types=income_types, payment_methods=REAL_PAYMENT_METHODS
+    )
+    _, income_total_kopeks = await sum_transaction_rollups(
+        db, end_day=today, types=income_types, payment_methods=REAL_PAYMENT_METHODS
+    )
+    _, subscription_income_kopeks = await sum_transaction_rollups(db, end_day=today, types=subscription_types)
+
+    purchases_by_day = {
+        item['date']: item['count']
+        for item in await get_daily_transaction_totals(db, today - timedelta(days=30), today, types=subscription_types)
+    }
+
+    def _purchased_since(start_day) -> int:
+        return sum(count for day, count in purchases_by_day.items() if day >= start_day)
+
+    return {
+        'revenue_chart': revenue_data,
+        'income_today_kopeks': income_today_kopeks,
+        'income_month_kopeks': income_month_kopeks,
+        'income_total_kopeks': income_total_kopeks,
+        'subscription_income_kopeks': subscription_income_kopeks,
+        'purchases': {
+            'purchased_today': _purchased_since(today),
+            'purchased_week': _purchased_since(today - timedelta(days=7)),
+            'purchased_month': _purchased_since(today - timedelta(days=30)),
+        },
+    }
+
+
 async def _get_nodes_overview() -> NodesOverview:
     """Get overview of all nodes."""
     try:
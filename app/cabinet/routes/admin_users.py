@@ -17,13 +17,14 @@ from app.database.crud.subscription import (
 )
 from app.database.crud.tariff import get_tariff_by_id
 from app.database.crud.user import (
+    UsersListCursor,
     add_user_balance,
     delete_user as soft_delete_user,
     get_referrals,
     get_user_by_id,
     get_user_by_telegram_id,
-    get_users_count,
-    get_users_list,
+    get_users_count_cached,
+    get_users_page,
     get_users_spending_stats,
     get_users_statistics,
     subtract_user_balance,
@@ -158,9 +159,14 @@ async def _get_owned_subscription_or_404(db: AsyncSession, subscription_id: int,
 
 
 def _build_user_list_item(user: User, spending_stats: dict = None) -> UserListItem:
-    """Build UserListItem from User model."""
-    stats = spending_stats or {}
-    user_stats = stats.get(user.id, {'total_spent': 0, 'purchase_count': 0})
+    """Build UserListItem from User model.
+
+    Без ``spending_stats`` траты берутся из нарастающих итогов в users.
+    """
+    if spending_stats is None:
+        user_stats = {'total_spent': user.total_spent_kopeks or 0, 'purchase_count': user.purchase_count or 0}
+    else:
+        user_stats = spending_stats.get(user.id, {'total_spent': 0, 'purchase_count': 0})
 
     subscription_status = None
     subscription_is_trial = False
@@ -585,6 +591,7 @@ async def _sync_subscription_to_panel(
 async def list_users(
     offset: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, max_length=512),
     search: str | None = Query(None, max_length=255),
     email: str | None = Query(None, max_length=255),
     status: UserStatusEnum | None = Query(None),
@@ -600,8 +607,9 @@ async def list_users(
     """
     Get paginated list of users with filtering and sorting.
 
-    - **offset**: Pagination offset
+    - **offset**: Pagination offset (ignored when cursor is set)
     - **limit**: Number of users per page (max 200)
+    - **cursor**: `next_cursor` from the previous page — keyset pagination, constant cost at any depth
     - **search**: Search by telegram_id, username, first_name, last_name
     - **email**: Search by email
     - **status**: Filter by user status (active, blocked, deleted)
@@ -612,14 +620,6 @@ async def list_users(
     if status:
         user_status = UserStatus(status.value)
 
-    # Map sort options
-    order_by_balance = sort_by == SortByEnum.BALANCE
-    order_by_traffic = sort_by == SortByEnum.TRAFFIC
-    order_by_last_activity = sort_by == SortByEnum.LAST_ACTIVITY
-    order_by_total_spent = sort_by == SortByEnum.TOTAL_SPENT
-    order_by_purchase_count = sort_by == SortByEnum.PURCHASE_COUNT
-    order_by_subscription_end = sort_by == SortByEnum.SUBSCRIPTION_END_DATE
-
     # Parse comma-separated tariff_ids
     tariff_ids: list[int] | None = None
     if tariff_id:
@@ -628,49 +628,45 @@ async def list_users(
         except ValueError:
             tariff_ids = None
 
-    users = await get_users_list(
-        db=db,
-        offset=offset,
+    page_cursor = None
+    if cursor:
+        try:
+            page_cursor = UsersListCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+        if page_cursor.sort_by != sort_by.value:
+            raise HTTPException(status_code=400, detail='Cursor does not match sort_by')
+
+    filters = {
+        'search': search,
+        'email': email,
+        'status': user_status,
+        'subscription_status': subscription_status,
+        'tariff_ids': tariff_ids,
+        'promo_group_id': promo_group_id,
+        'campaign_id': campaign_id,
+        'partner_id': partner_id,
+    }
+    users, next_cursor = await get_users_page(
+        db,
         limit=limit,
-        search=search,
-        email=email,
-        status=user_status,
-        subscription_status=subscription_status,
-        tariff_ids=tariff_ids,
-        promo_group_id=promo_group_id,
-        campaign_id=campaign_id,
-        partner_id=partner_id,
-        order_by_balance=order_by_balance,
-        order_by_traffic=order_by_traffic,
-        order_by_last_activity=order_by_last_activity,
-        order_by_total_spent=order_by_total_spent,
-        order_by_purchase_count=order_by_purchase_count,
-        order_by_subscription_end=order_by_subscription_end,
-    )
-
-    total = await get_users_count(
-        db=db,
-        status=user_status,
-        search=search,
-        email=email,
-        subscription_status=subscription_status,
-        tariff_ids=tariff_ids,
-        promo_group_id=promo_group_id,
-        campaign_id=campaign_id,
-        partner_id=partner_id,
+        offset=offset,
+        cursor=page_cursor,
+        sort_by=sort_by.value,
+        **filters,
     )
+    total, total_is_estimate = await get_users_count_cached(db, **filters)
 
-    # Get spending stats for all users
-    user_ids = [u.id for u in users]
-    spending_stats = await get_users_spending_stats(db, user_ids) if user_ids else {}
-
-    items = [_build_user_list_item(u, spending_stats) for u in users]
+    # Траты берутся из нарастающих итогов в users — без агрегата по транзакциям страницы
+    items = [_build_user_list_item(u) for u in users]
 
     return UsersListResponse(
         users=items,
         total=total,
-        offset=offset,
+        offset=0 if page_cursor else offset,
         limit=limit,
+        next_cursor=next_cursor.encode() if next_cursor else None,
+        total_is_estimate=total_is_estimate,
     )
 
 
@@ -3326,11 +3322,7 @@ async def get_user_referrals(
     total = len(referrals)
     referrals = referrals[offset : offset + limit]
 
-    # Get spending stats
-    user_ids = [r.id for r in referrals]
-    spending_stats = await get_users_spending_stats(db, user_ids) if user_ids else {}
-
-    items = [_build_user_list_item(r, spending_stats) for r in referrals]
+    items = [_build_user_list_item(r) for r in referrals]
 
     return UsersListResponse(
         users=items,
@@ -41,6 +41,7 @@ from app.database.crud.user import get_user_by_id
 from app.database.database import AsyncSessionLocal
 from app.database.models import Ticket, TicketMessage, User, UserStatus
 from app.services.blacklist_service import blacklist_service
+from app.services.cluster_event_bus import cluster_event_bus
 from app.services.maintenance_service import maintenance_service
 from app.services.permission_service import PermissionService
 from app.services.rbac_bootstrap_service import is_user_admin_by_env
@@ -343,6 +344,25 @@ class SupportWsManager:
             self._sessions.discard(session)
 
     async def broadcast_ticket_event(self, db: AsyncSession, ticket: Ticket, event: dict[str, Any]) -> None:
+        await self._deliver_local(db, ticket, event)
+        # Sessions on other replicas get the event via the cluster bus (no-op outside cluster mode)
+        cluster_event_bus.publish('support', {'ticket_id': ticket.id, 'ticket_user_id': ticket.user_id, 'event': event})
+
+    async def deliver_remote(self, data: dict[str, Any]) -> None:
+        """Deliver an event broadcast by another replica to sessions of this one."""
+        async with self._lock:
+            if not self._sessions:
+                return
+        ticket_id = _coerce_int(data.get('ticket_id'))
+        event = data.get('event')
+        if ticket_id is None or not isinstance(event, dict):
+            return
+        # Visibility only depends on the ticket owner, so a transient ticket is enough
+        ticket = Ticket(id=ticket_id, user_id=_coerce_int(data.get('ticket_user_id')))
+        async with AsyncSessionLocal() as db:
+            await self._deliver_local(db, ticket, event)
+
+    async def _deliver_local(self, db: AsyncSession, ticket: Ticket, event: dict[str, Any]) -> None:
         async with self._lock:
             sessions = list(self._sessions)
 
@@ -355,6 +375,7 @@ class SupportWsManager:
 
 
 support_ws_manager = SupportWsManager()
+cluster_event_bus.subscribe('support', support_ws_manager.deliver_remote)
 
 
 async def _role_context(db: AsyncSession, user: User, payload: dict[str, Any]) -> WsUserContext:
@@ -12,6 +12,8 @@ from app.cabinet.auth.jwt_handler import get_token_payload
 from app.config import settings
 from app.database.crud.user import get_user_by_id
 from app.database.database import AsyncSessionLocal
+from app.services.cluster_event_bus import cluster_event_bus
+from app.services.websocket_fanout import WebSocketFanout
 
 
 logger = structlog.get_logger(__name__)
@@ -27,7 +29,11 @@ class CabinetConnectionManager:
         self._user_connections: dict[int, set[WebSocket]] = {}
         # admin user_ids -> set of websocket connections
         self._admin_connections: dict[int, set[WebSocket]] = {}
+        # websocket -> user_id: хаб сообщает об отключении только сокет
+        self._connection_users: dict[WebSocket, int] = {}
         self._lock = asyncio.Lock()
+        # Отправка идёт через очереди хаба: send_to_* не ждут медленных клиентов
+        self._hub = WebSocketFanout('cabinet', on_drop=self._forget)
 
     async def connect(self, websocket: WebSocket, user_id: int, is_admin: bool) -> None:
         """Зарегистрировать подключение."""
@@ -41,6 +47,9 @@ class CabinetConnectionManager:
                     self._admin_connections[user_id] = set()
                 self._admin_connections[user_id].add(websocket)
 
+            self._connection_users[websocket] = user_id
+            self._hub.register(websocket)
+
         logger.debug(
             'Cabinet WS connected: user_id is_admin total_users',
             user_id=user_id,
@@ -51,75 +60,75 @@ class CabinetConnectionManager:
     async def disconnect(self, websocket: WebSocket, user_id: int) -> None:
         """Отменить регистрацию подключения."""
         async with self._lock:
-            if user_id in self._user_connections:
-                self._user_connections[user_id].discard(websocket)
-                if not self._user_connections[user_id]:
-                    del self._user_connections[user_id]
-
-            if user_id in self._admin_connections:
-                self._admin_connections[user_id].discard(websocket)
-                if not self._admin_connections[user_id]:
-                    del self._admin_connections[user_id]
+            self._discard(websocket, user_id)
+            self._hub.unregister(websocket)
 
         logger.debug('Cabinet WS disconnected: user_id', user_id=user_id)
 
+    def _discard(self, websocket: WebSocket, user_id: int) -> None:
+        self._connection_users.pop(websocket, None)
+        for connections_by_user in (self._user_connections, self._admin_connections):
+            connections = connections_by_user.get(user_id)
+            if connections is None:
+                continue
+            connections.discard(websocket)
+            if not connections:
+                del connections_by_user[user_id]
+
+    def _forget(self, websocket: WebSocket) -> None:
+        """Хаб сам отключил сокет (медленный клиент или ошибка отправки).
+
+        Вызывается синхронно из хаба, поэтому без self._lock: между await'ами
+        словари никто не меняет.
+        """
+        user_id = self._connection_users.get(websocket)
+        if user_id is not None:
+            self._discard(websocket, user_id)
+
     async def send_to_user(self, user_id: int, message: dict) -> None:
-        """Отправить сообщение конкретному пользователю."""
-        # Snapshot connections under the lock to avoid mutation during iteration
-        async with self._lock:
-            connections = list(self._user_connections.get(user_id, set()))
+        """Отправить сообщение конкретному пользователю (на всех экземплярах в кластерном режиме)."""
+        await self._deliver_to_user(user_id, message)
+        cluster_event_bus.publish('cabinet', {'user_id': user_id, 'message': message})
 
-        if not connections:
+    async def send_to_admins(self, message: dict) -> None:
+        """Отправить сообщение всем админам (на всех экземплярах в кластерном режиме)."""
+        await self._deliver_to_admins(message)
+        cluster_event_bus.publish('cabinet', {'admins': True, 'message': message})
+
+    async def deliver_remote(self, data: dict) -> None:
+        """Доставить локальным подключениям сообщение, отправленное другим экземпляром."""
+        message = data.get('message')
+        if not isinstance(message, dict):
             return
+        if data.get('admins'):
+            await self._deliver_to_admins(message)
+        elif data.get('user_id') is not None:
+            await self._deliver_to_user(int(data['user_id']), message)
 
-        disconnected = set()
-        data = json.dumps(message, default=str, ensure_ascii=False)
-
-        for ws in connections:
-            try:
-                await ws.send_text(data)
-            except Exception as e:
-                logger.warning('Failed to send to user', user_id=user_id, e=e)
-                disconnected.add(ws)
+    async def _deliver_to_user(self, user_id: int, message: dict) -> None:
+        # Snapshot connections under the lock to avoid mutation during iteration
+        async with self._lock:
+            connections = list(self._user_connections.get(user_id, set()))
 
-        # Cleanup disconnected
-        if disconnected:
-            async with self._lock:
-                for ws in disconnected:
-                    self._user_connections.get(user_id, set()).discard(ws)
+        if connections:
+            self._hub.publish(message, targets=connections)
 
-    async def send_to_admins(self, message: dict) -> None:
-        """Отправить сообщение всем админам."""
+    async def _deliver_to_admins(self, message: dict) -> None:
         # Snapshot connections under the lock to avoid mutation during iteration
         async with self._lock:
-            if not self._admin_connections:
-                return
-            # Create a snapshot: list of (user_id, list of websockets)
-            admin_snapshot = [(user_id, list(connections)) for user_id, connections in self._admin_connections.items()]
-
-        data = json.dumps(message, default=str, ensure_ascii=False)
-        disconnected_by_user: dict[int, set[WebSocket]] = {}
-
-        for user_id, connections in admin_snapshot:
-            for ws in connections:
-                try:
-                    await ws.send_text(data)
-                except Exception as e:
-                    logger.warning('Failed to send to admin', user_id=user_id, e=e)
-                    if user_id not in disconnected_by_user:
-                        disconnected_by_user[user_id] = set()
-                    disconnected_by_user[user_id].add(ws)
-
-        # Cleanup disconnected
-        if disconnected_by_user:
-            async with self._lock:
-                for user_id, ws_set in disconnected_by_user.items():
-                    for ws in ws_set:
-                        self._admin_connections.get(user_id, set()).discard(ws)
+            connections = [ws for user_connections in self._admin_connections.values() for ws in user_connections]
+
+        if connections:
+            self._hub.publish(message, targets=connections)
+
+    def get_stats(self) -> dict[str, int]:
+        """Счётчики хаба: подписчики, отстающие и отключённые медленные клиенты."""
+        return self._hub.get_stats()
 
 
 # Глобальный менеджер подключений
 cabinet_ws_manager = CabinetConnectionManager()
+cluster_event_bus.subscribe('cabinet', cabinet_ws_manager.deliver_remote)
 
 
 async def verify_cabinet_ws_token(token: str) -> tuple[int | None, bool]:
@@ -154,6 +154,10 @@ class UsersListResponse(BaseModel):
     total: int
     offset: int = 0
     limit: int = 50
+    # Курсор следующей страницы (keyset-пагинация); None — страниц больше нет
+    next_cursor: str | None = None
+    # total — оценка планировщика PostgreSQL, а не точный COUNT(*)
+    total_is_estimate: bool = False
 
 
 class UserByRemnawaveResponse(BaseModel):
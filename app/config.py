@@ -155,6 +155,13 @@ class Settings(BaseSettings):
     ADMIN_REPORTS_TOPIC_ID: int | None = None
     ADMIN_REPORTS_SEND_TIME: str | None = None
 
+    STATS_ROLLUPS_ENABLED: bool = True
+    STATS_ROLLUP_FLUSH_INTERVAL_SECONDS: int = 30
+    STATS_ROLLUP_RECONCILE_HOUR: int = 4
+    STATS_ROLLUP_RECONCILE_DAYS: int = 7
+
+    REFERRAL_BRANCH_FLUSH_INTERVAL_SECONDS: int = 10
+
     CHANNEL_IS_REQUIRED_SUB: bool = False
     CHANNEL_DISABLE_TRIAL_ON_UNSUBSCRIBE: bool = True
     CHANNEL_REQUIRED_FOR_ALL: bool = False
@@ -202,6 +209,32 @@ class Settings(BaseSettings):
     # пополнение ради подарка / просто денег не должно молча тратиться на подписку.
     CART_AUTOPURCHASE_INTENT_TTL_SECONDS: int = 1800  # 30 минут (хватает на оплату, но не на «забытую» корзину)
 
+    # Снимки пользователей для AuthMiddleware (app/utils/user_snapshot_cache.py):
+    # хендлеры без параметра db_user обслуживаются без тяжёлой загрузки User.
+    # L1 — память процесса (короткий TTL ограничивает рассинхрон между процессами),
+    # L2 — Redis.
+    USER_SNAPSHOT_CACHE_ENABLED: bool = True
+    USER_SNAPSHOT_TTL_SECONDS: int = 30
+    USER_SNAPSHOT_L1_TTL_SECONDS: float = 5.0
+    USER_SNAPSHOT_L1_MAX_SIZE: int = 50000
+    # Каталог (тарифы, сквады, промогруппы) в памяти процесса (app/utils/catalog_cache.py).
+    # Правки через ORM поднимают версию в Redis; остальные процессы сверяют её
+    # не чаще раза в интервал. MAX_AGE — страховка на случай недоступного Redis.
+    CATALOG_CACHE_ENABLED: bool = True
+    CATALOG_CACHE_VERSION_CHECK_SECONDS: float = 5.0
+    CATALOG_CACHE_MAX_AGE_SECONDS: int = 600
+    # last_activity пишется пакетами раз в интервал, а не UPDATE на каждый апдейт.
+    USER_ACTIVITY_COALESCING_ENABLED: bool = True
+    USER_ACTIVITY_FLUSH_INTERVAL_SECONDS: float = 30.0
+    USER_ACTIVITY_FLUSH_BATCH_SIZE: int = 500
+    # Клики по кнопкам/команды (button_click_logs) копятся в ограниченном буфере
+    # и пишутся одним INSERT раз в интервал или по набору пачки; при
+    # переполнении буфера клики отбрасываются со счётчиком.
+    BUTTON_CLICK_LOG_BATCH_ENABLED: bool = True
+    BUTTON_CLICK_LOG_FLUSH_INTERVAL_MS: int = 1000
+    BUTTON_CLICK_LOG_BATCH_SIZE: int = 500
+    BUTTON_CLICK_LOG_BUFFER_SIZE: int = 20000
+
     REMNAWAVE_API_URL: str | None = None
     REMNAWAVE_API_KEY: str | None = None
     REMNAWAVE_SECRET_KEY: str | None = None
@@ -213,6 +246,30 @@ class Settings(BaseSettings):
     REMNAWAVE_API_CONNECT_TIMEOUT: int = 30
     REMNAWAVE_API_TOTAL_TIMEOUT: int = 60
 
+    # Общий keep-alive пул соединений к панели (app/external/remnawave_session_pool.py).
+    # Вместо TCP+TLS handshake на каждый вызов панели клиенты арендуют
+    # долгоживущую сессию. POOL_ENABLED=false возвращает старое поведение
+    # (своя сессия на каждый `async with RemnaWaveAPI`).
+    REMNAWAVE_API_POOL_ENABLED: bool = True
+    REMNAWAVE_API_POOL_LIMIT: int = 100
+    REMNAWAVE_API_POOL_LIMIT_PER_HOST: int = 50
+    REMNAWAVE_API_KEEPALIVE_TIMEOUT: float = 30.0
+    REMNAWAVE_API_DNS_CACHE_TTL: int = 300
+
+    # Общий исходящий HTTP-транспорт платёжных шлюзов (app/external/http_transport.py):
+    # keep-alive пулы по хостам, единые таймауты и повторы, circuit breaker на провайдера.
+    HTTP_TRANSPORT_POOL_LIMIT: int = 100
+    HTTP_TRANSPORT_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_TRANSPORT_KEEPALIVE_TIMEOUT: float = 30.0
+    HTTP_TRANSPORT_DNS_CACHE_TTL: int = 300
+    HTTP_TRANSPORT_CONNECT_TIMEOUT: float = 10.0
+    HTTP_TRANSPORT_READ_TIMEOUT: float = 25.0
+    HTTP_TRANSPORT_TOTAL_TIMEOUT: float = 30.0
+    HTTP_TRANSPORT_MAX_RETRIES: int = 2
+    HTTP_TRANSPORT_RETRY_BASE_DELAY: float = 0.5
+    HTTP_TRANSPORT_BREAKER_FAILURES: int = 5
+    HTTP_TRANSPORT_BREAKER_COOLDOWN_SECONDS: float = 30.0
+
     REMNAWAVE_USERNAME: str | None = None
     REMNAWAVE_PASSWORD: str | None = None
     REMNAWAVE_CADDY_TOKEN: str | None = None
@@ -222,6 +279,15 @@ class Settings(BaseSettings):
     REMNAWAVE_USER_DELETE_MODE: str = 'delete'  # "delete" или "disable"
     REMNAWAVE_AUTO_SYNC_ENABLED: bool = False
     REMNAWAVE_AUTO_SYNC_TIMES: str = '03:00'
+    REMNAWAVE_SYNC_PAGE_SIZE: int = 500  # Размер страницы /api/users/stream при синхронизации панель→бот
+    REMNAWAVE_SYNC_SKIP_UNCHANGED: bool = True  # Пропускать пользователей, не изменившихся с прошлого прохода
+    REMNAWAVE_SYNC_FINGERPRINT_TTL_SECONDS: int = 86400
+    REMNAWAVE_RETRY_MAX_ATTEMPTS: int = 12
+    REMNAWAVE_RETRY_BASE_DELAY_SECONDS: int = 30  # Задержка первой попытки, дальше растёт вдвое
+    REMNAWAVE_RETRY_MAX_DELAY_SECONDS: int = 3600
+    REMNAWAVE_RETRY_CONCURRENCY: int = 4
+    REMNAWAVE_RETRY_POLL_SECONDS: int = 5
+    REMNAWAVE_RETRY_BATCH_SIZE: int = 100
     CABINET_REMNA_SUB_CONFIG: str | None = None  # UUID конфига страницы подписки из RemnaWave
 
     # RemnaWave incoming webhooks (real-time event delivery from backend)
@@ -418,6 +484,7 @@ class Settings(BaseSettings):
     BLACKLIST_GITHUB_URL: str | None = None
     BLACKLIST_UPDATE_INTERVAL_HOURS: int = 24
     BLACKLIST_IGNORE_ADMINS: bool = True
+    BLACKLIST_CACHE_PATH: str = './data/blacklist_cache.txt'
 
     DISPOSABLE_EMAIL_CHECK_ENABLED: bool = True
 
@@ -498,6 +565,15 @@ class Settings(BaseSettings):
     # per-send логов). Этот таймаут даёт быстрый предсказуемый предел: на TimeoutError
     # получатель пропускается, цикл продолжается.
     MONITORING_NOTIFICATION_SEND_TIMEOUT: float = 20.0
+    # Этапы мониторинга выполняются каждый в своей транзакции, независимые группы —
+    # параллельно. Таймаут (сек) одного этапа: истёкший этап откатывается, остальные
+    # продолжают работу.
+    MONITORING_STAGE_TIMEOUT_SECONDS: int = 600
+    # Переопределения для отдельных этапов, «имя:значение» через запятую:
+    # интервалы в минутах (по умолчанию MONITORING_INTERVAL) и таймауты в секундах.
+    # Например: MONITORING_STAGE_INTERVALS=traffic_warnings:180,panel_sync:15
+    MONITORING_STAGE_INTERVALS: str = ''
+    MONITORING_STAGE_TIMEOUTS: str = ''
     LOW_BALANCE_ALERT_EXPIRY_DAYS: int = 3  # Only alert when subscription expires within N days
     # Months of inactivity before a user row is soft-deleted (status=DELETED).
     # 12 months is conservative — VPN users are highly seasonal (vacations,
@@ -595,6 +671,15 @@ class Settings(BaseSettings):
     SUPPORT_TOPUP_ENABLED: bool = True
     PAYMENT_VERIFICATION_AUTO_CHECK_ENABLED: bool = False
     PAYMENT_VERIFICATION_AUTO_CHECK_INTERVAL_MINUTES: int = 10
+    PAYMENT_VERIFICATION_MIN_RECHECK_SECONDS: int = 30
+    PAYMENT_VERIFICATION_PROVIDER_CONCURRENCY: int = 4
+    PAYMENT_VERIFICATION_PROVIDER_RATE_LIMIT: float = 5.0
+    PAYMENT_WEBHOOK_INBOX_WORKERS: int = 16
+    PAYMENT_WEBHOOK_INBOX_MAX_ATTEMPTS: int = 8
+    PAYMENT_WEBHOOK_INBOX_BASE_DELAY_SECONDS: int = 15  # Задержка первого повтора, дальше растёт вдвое
+    PAYMENT_WEBHOOK_INBOX_MAX_DELAY_SECONDS: int = 1800
+    PAYMENT_WEBHOOK_INBOX_POLL_SECONDS: int = 5
+    PAYMENT_WEBHOOK_INBOX_RETENTION_DAYS: int = 14
 
     NALOGO_ENABLED: bool = False
     NALOGO_INN: str | None = None
@@ -1098,6 +1183,9 @@ class Settings(BaseSettings):
     MINIAPP_SERVICE_NAME_RU: str = 'Bedolaga VPN'
     MINIAPP_SERVICE_DESCRIPTION_EN: str = 'Secure & Fast Connection'
     MINIAPP_SERVICE_DESCRIPTION_RU: str = 'Безопасное и быстрое подключение'
+    MINIAPP_SUBSCRIPTION_CACHE_TTL_SECONDS: int = 10  # 0 — не кешировать ответ /subscription
+    MINIAPP_SUBSCRIPTION_CACHE_MAX_SIZE: int = 10000
+    MINIAPP_PANEL_LOOKUP_TIMEOUT_SECONDS: float = 5.0
     CONNECT_BUTTON_HAPP_DOWNLOAD_ENABLED: bool = False
     HAPP_CRYPTOLINK_REDIRECT_TEMPLATE: str | None = None
     # Remnawave 2.8.0 удалил /api/system/tools/happ/encrypt — недостающие crypt-ссылки
@@ -1303,6 +1391,13 @@ class Settings(BaseSettings):
     WEBHOOK_WORKERS: int = 4
     WEBHOOK_ENQUEUE_TIMEOUT: float = 0.1
     WEBHOOK_WORKER_SHUTDOWN_TIMEOUT: float = 30.0
+    # Шардированная очередь: апдейты одного пользователя обрабатываются строго
+    # по порядку (один воркер на шард), разные пользователи — параллельно.
+    # 0 — общая очередь на WEBHOOK_WORKERS воркеров (прежний режим).
+    WEBHOOK_SHARD_COUNT: int = 0
+    # Лимит необработанных апдейтов одного пользователя в шардированном режиме;
+    # сверх него апдейты этого пользователя отбрасываются. 0 — без лимита.
+    WEBHOOK_PER_USER_MAX_PENDING: int = 0
     BOT_RUN_MODE: str = 'polling'
 
     WEB_API_ENABLED: bool = False
@@ -1323,6 +1418,22 @@ class Settings(BaseSettings):
     # предохранитель: агент, ошибшийся на два нуля, упрётся в лимит, а не подарит
     # человеку годовую подписку. 0 — без ограничения.
     WEB_API_MANUAL_DEPOSIT_MAX_KOPEKS: int = 1_000_000
+    # Хаб событий: очередь на каждое WebSocket-подключение (web API и кабинет).
+    # Клиент, у которого очередь переполнилась или отправка не уложилась в таймаут,
+    # отключается с кодом 1013 вместо того, чтобы тормозить код, отправивший событие.
+    EVENT_HUB_SEND_QUEUE_SIZE: int = 256
+    EVENT_HUB_SEND_TIMEOUT_SECONDS: float = 10.0
+    # Кластерный режим: доставка WebSocket-событий сокетам других экземпляров через Redis pub/sub.
+    # Нужен, если за балансировщиком работает больше одной реплики кабинета/web API.
+    EVENT_BUS_CLUSTER_ENABLED: bool = False
+    EVENT_BUS_REDIS_URL: str | None = None  # По умолчанию REDIS_URL
+    EVENT_BUS_CHANNEL_PREFIX: str = 'bedolaga:events'
+    EVENT_BUS_DEDUP_TTL_SECONDS: int = 120
+    EVENT_BUS_PUBLISH_QUEUE_SIZE: int = 10000
+    # Фоновая доставка webhooks из EventEmitter
+    WEBHOOK_DELIVERY_QUEUE_SIZE: int = 5000
+    WEBHOOK_DELIVERY_WORKERS: int = 4
+    WEBHOOK_DELIVERY_DRAIN_TIMEOUT_SECONDS: float = 10.0
 
     ENABLE_DEEP_LINKS: bool = True
     APP_CONFIG_CACHE_TTL: int = 3600
@@ -1337,6 +1448,8 @@ class Settings(BaseSettings):
     BACKUP_MAX_KEEP: int = 7
     BACKUP_COMPRESSION: bool = True
     BACKUP_INCLUDE_LOGS: bool = False
+    BACKUP_EXPORT_CHUNK_SIZE: int = 5000  # Строк за один запрос при NDJSON-дампе (без pg_dump)
+    BACKUP_RESTORE_CHUNK_SIZE: int = 1000  # Строк в одном INSERT ... ON CONFLICT при восстановлении из JSON
     BACKUP_LOCATION: str = '/app/data/backups'
     BACKUP_SEND_ENABLED: bool = False
     BACKUP_SEND_CHAT_ID: str | None = None
@@ -1348,6 +1461,17 @@ class Settings(BaseSettings):
     CABINET_JWT_SECRET: str | None = None
     CABINET_ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     CABINET_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Кэш проверенного principal (initData, роли, ABAC-политики) между запросами с тем же токеном.
+    # Сбрасывается при изменении ролей/политик/статуса пользователя; 0 — выключен.
+    CABINET_PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    CABINET_PRINCIPAL_CACHE_MAX_SIZE: int = 20000
+    # Сброс доходит до других реплик только через кластерную шину (EVENT_BUS_CLUSTER_ENABLED).
+    # Без неё роли и политики из кэша переиспользуются не дольше N секунд; 0 — перечитывать на каждый запрос.
+    CABINET_PRINCIPAL_RBAC_LOCAL_TTL_SECONDS: int = 5
+    # Общее число пользователей в админском списке кэшируется на N секунд для каждого набора фильтров.
+    # Без фильтров на PostgreSQL от ADMIN_USERS_COUNT_ESTIMATE_THRESHOLD строк берётся оценка планировщика.
+    ADMIN_USERS_COUNT_CACHE_SECONDS: int = 30
+    ADMIN_USERS_COUNT_ESTIMATE_THRESHOLD: int = 100000
     CABINET_ALLOWED_ORIGINS: str = ''
     CABINET_EMAIL_VERIFICATION_ENABLED: bool = True
     CABINET_EMAIL_VERIFICATION_EXPIRE_HOURS: int = 24
@@ -3235,6 +3359,16 @@ class Settings(BaseSettings):
 
         return minutes
 
+    def get_payment_verification_min_recheck_seconds(self) -> int:
+        return max(5, int(self.PAYMENT_VERIFICATION_MIN_RECHECK_SECONDS or 30))
+
+    def get_payment_verification_provider_concurrency(self) -> int:
+        return max(1, int(self.PAYMENT_VERIFICATION_PROVIDER_CONCURRENCY or 1))
+
+    def get_payment_verification_provider_rate_limit(self) -> float:
+        """Запросов в секунду к API одного провайдера; 0 — без ограничения."""
+        return max(0.0, float(self.PAYMENT_VERIFICATION_PROVIDER_RATE_LIMIT or 0))
+
     def get_cryptobot_base_url(self) -> str:
         if self.CRYPTOBOT_TESTNET:
             return 'https://testnet-pay.crypt.bot'
@@ -3375,6 +3509,30 @@ class Settings(BaseSettings):
     def is_maintenance_monitoring_enabled(self) -> bool:
         return self.MAINTENANCE_MONITORING_ENABLED
 
+    @staticmethod
+    def _parse_monitoring_stage_map(config_str: str | None) -> dict[str, int]:
+        values: dict[str, int] = {}
+        for part in (config_str or '').split(','):
+            name, _, raw_value = part.partition(':')
+            name = name.strip()
+            if not name:
+                continue
+            try:
+                value = int(raw_value.strip())
+            except ValueError:
+                continue
+            if value > 0:
+                values[name] = value
+        return values
+
+    def get_monitoring_stage_intervals(self) -> dict[str, int]:
+        """Интервалы этапов мониторинга в минутах из MONITORING_STAGE_INTERVALS."""
+        return self._parse_monitoring_stage_map(self.MONITORING_STAGE_INTERVALS)
+
+    def get_monitoring_stage_timeouts(self) -> dict[str, int]:
+        """Таймауты этапов мониторинга в секундах из MONITORING_STAGE_TIMEOUTS."""
+        return self._parse_monitoring_stage_map(self.MONITORING_STAGE_TIMEOUTS)
+
     def get_available_subscription_periods(self) -> list[int]:
         """
         Возвращает доступные периоды подписки.
@@ -3868,6 +4026,34 @@ class Settings(BaseSettings):
             raw_path = '/' + raw_path
         return raw_path
 
+    def get_remnawave_api_pool_limit(self) -> int:
+        try:
+            limit = int(self.REMNAWAVE_API_POOL_LIMIT)
+        except (TypeError, ValueError):
+            limit = 100
+        return max(1, limit)
+
+    def get_remnawave_api_pool_limit_per_host(self) -> int:
+        try:
+            limit = int(self.REMNAWAVE_API_POOL_LIMIT_PER_HOST)
+        except (TypeError, ValueError):
+            limit = 50
+        return max(1, min(limit, self.get_remnawave_api_pool_limit()))
+
+    def get_remnawave_api_keepalive_timeout(self) -> float:
+        try:
+            timeout = float(self.REMNAWAVE_API_KEEPALIVE_TIMEOUT)
+        except (TypeError, ValueError):
+            timeout = 30.0
+        return max(1.0, timeout)
+
+    def get_remnawave_api_dns_cache_ttl(self) -> int:
+        try:
+            ttl = int(self.REMNAWAVE_API_DNS_CACHE_TTL)
+        except (TypeError, ValueError):
+            ttl = 300
+        return max(0, ttl)
+
     def get_webhook_queue_maxsize(self) -> int:
         try:
             size = int(self.WEBHOOK_MAX_QUEUE_SIZE)
@@ -3882,6 +4068,20 @@ class Settings(BaseSettings):
             workers = 1
         return max(1, workers)
 
+    def get_webhook_shard_count(self) -> int:
+        try:
+            shards = int(self.WEBHOOK_SHARD_COUNT)
+        except (TypeError, ValueError):
+            shards = 0
+        return max(0, shards)
+
+    def get_webhook_per_user_max_pending(self) -> int:
+        try:
+            limit = int(self.WEBHOOK_PER_USER_MAX_PENDING)
+        except (TypeError, ValueError):
+            limit = 0
+        return max(0, limit)
+
     def get_webhook_enqueue_timeout(self) -> float:
         try:
             timeout = float(self.WEBHOOK_ENQUEUE_TIMEOUT)
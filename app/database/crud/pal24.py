@@ -9,6 +9,7 @@ import structlog
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.crud.payment_index import index_payments
 from app.database.models import Pal24Payment
 
 
@@ -133,9 +134,10 @@ async def update_pal24_payment_status(
     update_values['last_status'] = status
 
     await db.execute(update(Pal24Payment).where(Pal24Payment.id == payment.id).values(**update_values))
-
-    await db.commit()
     await db.refresh(payment)
+    # Массовый UPDATE обходит хуки индекса платежей
+    await index_payments(db, [payment])
+    await db.commit()
 
     logger.info(
         'Обновлен Pal24 платеж',
@@ -0,0 +1,353 @@
+"""Сводный индекс платежей (``payment_index``) для поиска в админке.
+
+Обычные изменения счетов ведут ORM-хуки моделей провайдеров
+(``register_payment_index_hooks``, вызывается при импорте); здесь же —
+досинхронизация после массовых UPDATE/DELETE, которые хуки не видят, и
+досборка индекса по уже существующим платежам.
+"""
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from operator import attrgetter
+from typing import Any
+
+import structlog
+from sqlalchemy import and_, delete, event, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import get_history
+
+from app.database.models import (
+    AntilopayPayment,
+    AuraPayPayment,
+    CisPayPayment,
+    CloudPaymentsPayment,
+    CryptoBotPayment,
+    DonutPayment,
+    EtoplatezhiPayment,
+    FreekassaPayment,
+    HeleketPayment,
+    JupiterPayment,
+    KassaAiPayment,
+    LavaPayment,
+    MulenPayPayment,
+    OverpayPayment,
+    Pal24Payment,
+    PaymentIndex,
+    PaymentMethod,
+    PayPearPayment,
+    PlategaPayment,
+    RioPayPayment,
+    RollyPayPayment,
+    SeverPayPayment,
+    Transaction,
+    TransactionType,
+    WataPayment,
+    YooKassaPayment,
+)
+from app.utils.text_search import normalize_search_text
+
+
+logger = structlog.get_logger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+# Сужение выборки досборки в SQL: из transactions в индекс идут только пополнения Stars
+_BACKFILL_FILTERS: dict[type, tuple[Any, ...]] = {
+    Transaction: (
+        Transaction.type == TransactionType.DEPOSIT.value,
+        Transaction.payment_method == PaymentMethod.TELEGRAM_STARS.value,
+    ),
+}
+
+
+# Сводный статус платежа любого провайдера — по нему фильтруют поиск и считают статистику
+PAID_PAYMENT_STATUSES: frozenset[str] = frozenset(
+    {'completed', 'confirmed', 'paid', 'paid_over', 'succeeded', 'success'}
+)
+CANCELLED_PAYMENT_STATUSES: frozenset[str] = frozenset(
+    {'cancel', 'canceled', 'cancelled', 'declined', 'error', 'expired', 'fail', 'failed', 'amount_mismatch'}
+)
+
+
+def classify_payment_status(status: str | None, is_paid: bool) -> str:
+    """Статус провайдера → 'paid', 'cancelled' или 'pending'."""
+    status_lower = (status or '').lower()
+    if is_paid or status_lower in PAID_PAYMENT_STATUSES:
+        return 'paid'
+    if status_lower in CANCELLED_PAYMENT_STATUSES:
+        return 'cancelled'
+    return 'pending'
+
+
+def _provider_status(payment: Any) -> str:
+    return payment.status or ''
+
+
+def _provider_is_paid(payment: Any) -> bool:
+    return bool(payment.is_paid)
+
+
+def _order_identifier(payment: Any) -> str:
+    return payment.order_id
+
+
+@dataclass(frozen=True, slots=True)
+class PaymentIndexSource:
+    """Как строка таблицы провайдера превращается в строку ``payment_index``."""
+
+    method: PaymentMethod
+    identifier: Callable[[Any], str]
+    # Внешние номера, по которым админ ищет счёт
+    search_fields: tuple[str, ...]
+    amount: Callable[[Any], int] = attrgetter('amount_kopeks')
+    status: Callable[[Any], str] = _provider_status
+    is_paid: Callable[[Any], bool] = _provider_is_paid
+    # Не все строки таблицы — платежи для поиска (например, только пополнения YooKassa)
+    include: Callable[[Any], bool] | None = None
+    include_fields: tuple[str, ...] = ()
+
+    def values(self, payment: Any) -> dict[str, Any] | None:
+        """Колонки строки индекса без created_at; None — платёж в индекс не попадает."""
+        if self.include is not None and not self.include(payment):
+            return None
+        provider_status = self.status(payment)
+        is_paid = bool(self.is_paid(payment))
+        external_ids = (getattr(payment, field, None) for field in self.search_fields)
+        return {
+            'method': self.method.value,
+            'local_id': payment.id,
+            'user_id': payment.user_id,
+            'amount_kopeks': int(self.amount(payment) or 0),
+            'status': classify_payment_status(provider_status, is_paid),
+            'provider_status': provider_status[:64] or None,
+            'is_paid': is_paid,
+            'identifier': self.identifier(payment),
+            'external_ids': normalize_search_text(' '.join(str(value) for value in external_ids if value)) or None,
+        }
+
+
+def _order_source(method: PaymentMethod, provider_field: str) -> PaymentIndexSource:
+    return PaymentIndexSource(method, _order_identifier, ('order_id', provider_field))
+
+
+PAYMENT_INDEX_SOURCES: dict[type, PaymentIndexSource] = {
+    YooKassaPayment: PaymentIndexSource(
+        PaymentMethod.YOOKASSA,
+        attrgetter('yookassa_payment_id'),
+        ('yookassa_payment_id',),
+        include=attrgetter('is_balance_topup'),
+        include_fields=('metadata_json',),
+    ),
+    CryptoBotPayment: PaymentIndexSource(
+        PaymentMethod.CRYPTOBOT,
+        attrgetter('invoice_id'),
+        ('invoice_id',),
+        amount=attrgetter('payload_amount_kopeks'),
+    ),
+    HeleketPayment: PaymentIndexSource(PaymentMethod.HELEKET, attrgetter('uuid'), ('uuid', 'order_id')),
+    MulenPayPayment: PaymentIndexSource(PaymentMethod.MULENPAY, attrgetter('uuid'), ('uuid', 'mulen_payment_id')),
+    Pal24Payment: PaymentIndexSource(PaymentMethod.PAL24, attrgetter('bill_id'), ('bill_id', 'order_id')),
+    WataPayment: PaymentIndexSource(PaymentMethod.WATA, attrgetter('payment_link_id'), ('payment_link_id', 'order_id')),
+    PlategaPayment: PaymentIndexSource(
+        PaymentMethod.PLATEGA,
+        lambda payment: payment.platega_transaction_id or payment.correlation_id or str(payment.id),
+        ('correlation_id', 'platega_transaction_id'),
+    ),
+    CloudPaymentsPayment: PaymentIndexSource(
+        PaymentMethod.CLOUDPAYMENTS, attrgetter('invoice_id'), ('invoice_id', 'transaction_id_cp')
+    ),
+    FreekassaPayment: _order_source(PaymentMethod.FREEKASSA, 'freekassa_order_id'),
+    KassaAiPayment: _order_source(PaymentMethod.KASSA_AI, 'kassa_ai_order_id'),
+    RioPayPayment: _order_source(PaymentMethod.RIOPAY, 'riopay_order_id'),
+    SeverPayPayment: PaymentIndexSource(
+        PaymentMethod.SEVERPAY, _order_identifier, ('order_id', 'severpay_id', 'severpay_uid')
+    ),
+    OverpayPayment: _order_source(PaymentMethod.OVERPAY, 'overpay_payment_id'),
+    PayPearPayment: _order_source(PaymentMethod.PAYPEAR, 'paypear_id'),
+    RollyPayPayment: _order_source(PaymentMethod.ROLLYPAY, 'rollypay_payment_id'),
+    AuraPayPayment: _order_source(PaymentMethod.AURAPAY, 'aurapay_invoice_id'),
+    EtoplatezhiPayment: _order_source(PaymentMethod.ETOPLATEZHI, 'etoplatezhi_payment_id'),
+    AntilopayPayment: _order_source(PaymentMethod.ANTILOPAY, 'antilopay_payment_id'),
+    JupiterPayment: _order_source(PaymentMethod.JUPITER, 'jupiter_transaction_id'),
+    DonutPayment: _order_source(PaymentMethod.DONUT, 'donut_transaction_id'),
+    LavaPayment: _order_source(PaymentMethod.LAVA, 'lava_invoice_id'),
+    CisPayPayment: _order_source(PaymentMethod.CISPAY, 'cispay_payment_id'),
+    # Stars зачисляются сразу транзакцией пополнения, отдельной таблицы счетов у них нет
+    Transaction: PaymentIndexSource(
+        PaymentMethod.TELEGRAM_STARS,
+        lambda transaction: transaction.external_id or str(transaction.id),
+        ('external_id',),
+        status=lambda transaction: 'paid' if transaction.is_completed else 'pending',
+        is_paid=attrgetter('is_completed'),
+        include=lambda transaction: (
+            transaction.type == TransactionType.DEPOSIT.value
+            and transaction.payment_method == PaymentMethod.TELEGRAM_STARS.value
+        ),
+        include_fields=('type', 'payment_method'),
+    ),
+}
+
+
+def payment_index_upsert(dialect_name: str):
+    """INSERT ... ON CONFLICT (method, local_id) DO UPDATE в ``payment_index``."""
+    insert_factory = pg_insert if dialect_name == 'postgresql' else sqlite_insert
+    stmt = insert_factory(PaymentIndex.__table__)
+    updated = {
+        column.name: stmt.excluded[column.name]
+        for column in PaymentIndex.__table__.columns
+        if column.name not in {'id', 'method', 'local_id', 'updated_at'}
+    }
+    updated['updated_at'] = func.now()
+    return stmt.on_conflict_do_update(index_elements=['method', 'local_id'], set_=updated)
+
+
+def _payment_index_key(source: PaymentIndexSource, local_id: int):
+    table = PaymentIndex.__table__
+    return and_(table.c.method == source.method.value, table.c.local_id == local_id)
+
+
+def _write_payment_index_row(mapper, connection, target, values: dict[str, Any]) -> None:
+    # created_at провайдера заполняется func.now() в самом INSERT — берём его из строки
+    source_table = mapper.local_table
+    created_at = select(source_table.c.created_at).where(source_table.c.id == target.id).scalar_subquery()
+    connection.execute(
+        payment_index_upsert(connection.dialect.name).values(**values, created_at=func.coalesce(created_at, func.now()))
+    )
+
+
+def _index_inserted_payment(mapper, connection, target) -> None:
+    values = PAYMENT_INDEX_SOURCES[mapper.class_].values(target)
+    if values is not None:
+        _write_payment_index_row(mapper, connection, target, values)
+
+
+def _reindex_updated_payment(mapper, connection, target) -> None:
+    source = PAYMENT_INDEX_SOURCES[mapper.class_]
+    values = source.values(target)
+    if values is not None:
+        _write_payment_index_row(mapper, connection, target, values)
+    elif any(get_history(target, field).has_changes() for field in source.include_fields):
+        connection.execute(PaymentIndex.__table__.delete().where(_payment_index_key(source, target.id)))
+
+
+def _unindex_deleted_payment(mapper, connection, target) -> None:
+    source = PAYMENT_INDEX_SOURCES[mapper.class_]
+    if source.include is not None and not source.include(target):
+        return
+    connection.execute(PaymentIndex.__table__.delete().where(_payment_index_key(source, target.id)))
+
+
+_hooks_registered = False
+
+
+def register_payment_index_hooks() -> None:
+    """Подписывает хуки моделей провайдеров и пополнений Stars, которые ведут ``payment_index``."""
+    global _hooks_registered
+    if _hooks_registered:
+        return
+    for model in PAYMENT_INDEX_SOURCES:
+        event.listen(model, 'after_insert', _index_inserted_payment)
+        event.listen(model, 'after_update', _reindex_updated_payment)
+        event.listen(model, 'after_delete', _unindex_deleted_payment)
+    _hooks_registered = True
+
+
+register_payment_index_hooks()
+
+
+def _index_row(payment: Any) -> dict[str, Any] | None:
+    values = PAYMENT_INDEX_SOURCES[type(payment)].values(payment)
+    if values is not None:
+        values['created_at'] = payment.created_at or datetime.now(UTC)
+    return values
+
+
+async def index_payments(db: AsyncSession, payments: Iterable[Any]) -> int:
+    """Переносит в индекс текущее состояние загруженных платежей после массового UPDATE."""
+    rows = []
+    for payment in payments:
+        values = _index_row(payment)
+        if values is not None:
+            rows.append(values)
+            continue
+        source = PAYMENT_INDEX_SOURCES[type(payment)]
+        await db.execute(
+            delete(PaymentIndex).where(PaymentIndex.method == source.method.value, PaymentIndex.local_id == payment.id)
+        )
+    if rows:
+        await db.execute(payment_index_upsert(db.get_bind().dialect.name), rows)
+    return len(rows)
+
+
+async def reassign_payment_index(db: AsyncSession, from_user_id: int, to_user_id: int) -> None:
+    """Переносит строки индекса на другого пользователя вслед за массовым UPDATE user_id."""
+    await db.execute(update(PaymentIndex).where(PaymentIndex.user_id == from_user_id).values(user_id=to_user_id))
+
+
+async def delete_payment_index_entries(db: AsyncSession, user_id: int, method: PaymentMethod) -> None:
+    """Убирает из индекса платежи пользователя, удалённые массовым DELETE."""
+    await db.execute(delete(PaymentIndex).where(PaymentIndex.user_id == user_id, PaymentIndex.method == method.value))
+
+
+async def backfill_payment_index_batch(
+    db: AsyncSession, model: type, after_id: int = 0, batch_size: int = BACKFILL_BATCH_SIZE
+) -> tuple[int, int | None]:
+    """Индексирует следующую пачку платежей ``model`` с id > ``after_id``, которых нет в индексе.
+
+    Возвращает число проиндексированных строк и id, с которого продолжать;
+    ``None`` — таблица пройдена до конца.
+    """
+    source = PAYMENT_INDEX_SOURCES[model]
+    already_indexed = exists().where(PaymentIndex.method == source.method.value, PaymentIndex.local_id == model.id)
+    result = await db.execute(
+        select(model)
+        .where(model.id > after_id, ~already_indexed, *_BACKFILL_FILTERS.get(model, ()))
+        .order_by(model.id)
+        .limit(batch_size)
+    )
+    payments = result.scalars().all()
+    if not payments:
+        return 0, None
+    indexed = await index_payments(db, payments)
+    return indexed, payments[-1].id if len(payments) == batch_size else None
+
+
+class PaymentIndexBackfill:
+    """Досборка индекса пачками с запоминанием позиции по каждой таблице провайдера.
+
+    Нужна один раз после миграции 0113 (и на случай строк, записанных в обход
+    хуков); пройдя все таблицы, дальше ничего не делает.
+    """
+
+    def __init__(self, batch_size: int = BACKFILL_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._positions: dict[type, int | None] = dict.fromkeys(PAYMENT_INDEX_SOURCES, 0)
+
+    @property
+    def done(self) -> bool:
+        return all(position is None for position in self._positions.values())
+
+    async def run(self, db: AsyncSession, max_batches: int | None = None) -> int:
+        """Проходит до ``max_batches`` пачек (``None`` — до конца); возвращает число новых строк индекса."""
+        indexed = 0
+        batches = 0
+        for model, position in self._positions.items():
+            while position is not None:
+                if max_batches is not None and batches >= max_batches:
+                    return indexed
+                count, position = await backfill_payment_index_batch(db, model, position, self.batch_size)
+                self._positions[model] = position
+                indexed += count
+                batches += 1
+        return indexed
+
+
+async def rebuild_payment_index(db: AsyncSession, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Пересобирает индекс целиком — после восстановления бекапа массовыми INSERT."""
+    await db.execute(delete(PaymentIndex))
+    indexed = await PaymentIndexBackfill(batch_size).run(db)
+    logger.info('Индекс платежей пересобран', rows=indexed)
+    return indexed
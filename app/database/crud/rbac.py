@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from datetime import UTC, datetime
 
 import structlog
@@ -171,7 +172,6 @@ class UserRoleCRUD:
         Returns:
             (sorted_permissions, role_names, max_level)
         """
-        now = datetime.now(UTC)
         result = await db.execute(
             select(UserRole)
             .options(selectinload(UserRole.role))
@@ -180,8 +180,18 @@ class UserRoleCRUD:
                 UserRole.is_active.is_(True),
             )
         )
-        user_roles = result.scalars().all()
+        return UserRoleCRUD.aggregate_permissions(result.scalars().all())
 
+    @staticmethod
+    def aggregate_permissions(
+        user_roles: Sequence[UserRole],
+        now: datetime | None = None,
+    ) -> tuple[list[str], list[str], int]:
+        """Aggregate permissions of already loaded active role assignments.
+
+        Expired assignments and inactive roles are skipped.
+        """
+        now = now or datetime.now(UTC)
         permissions: set[str] = set()
         role_names: list[str] = []
         max_level: int = 0
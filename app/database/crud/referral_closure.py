@@ -0,0 +1,320 @@
+"""Замыкание реферального дерева (``referral_closure``) и итоги веток в ``users``.
+
+Обычные изменения ведут хуки модели ``User`` (``register_referral_closure_hooks``,
+вызывается при импорте); здесь же выборки по замыканию и досинхронизация после
+массовых UPDATE/DELETE, которые хуки не видят.
+
+Траты веток в транзакции платежа не пересчитываются: хуки откладывают id
+пользователей в ``session.info`` (``defer_branch_refresh``), а после коммита их
+пачками пересчитывает ``referral_branch_service``.
+"""
+
+from collections.abc import Iterable
+
+import structlog
+from sqlalchemy import event, func, literal as sa_literal, or_, select, text, true, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, object_session
+from sqlalchemy.orm.attributes import get_history
+
+from app.database.models import ReferralClosure, User
+
+
+logger = structlog.get_logger(__name__)
+
+# Глубина обхода при полной пересборке: ограничивает и циклы в referred_by_id
+REBUILD_MAX_DEPTH = 50
+# Ключ session.info: пользователи, у которых после коммита пересчитать итоги веток
+BRANCH_REFRESH_INFO_KEY = 'referral_branch_refresh_ids'
+
+
+def defer_branch_refresh(session, user_ids: Iterable[int]) -> None:
+    """Откладывает пересчёт итогов веток у ``user_ids`` и их предков до коммита сессии."""
+    ids = {user_id for user_id in user_ids if user_id is not None}
+    if session is None or not ids:
+        return
+    session.info.setdefault(BRANCH_REFRESH_INFO_KEY, set()).update(ids)
+
+
+def _lock_users_in_order(connection, user_ids) -> None:
+    """Блокирует строки users по возрастанию id: встречные пересчёты веток не дедлочат."""
+    users = User.__table__
+    connection.execute(select(users.c.id).where(users.c.id.in_(user_ids)).order_by(users.c.id).with_for_update())
+
+
+def _shift_branch_totals(connection, ancestor_ids, size: int, spent_kopeks: int) -> None:
+    """Сдвигает итоги ветки у предков (``ancestor_ids`` — список или подзапрос)."""
+    if not size and not spent_kopeks:
+        return
+    users = User.__table__
+    _lock_users_in_order(connection, ancestor_ids)
+    connection.execute(
+        users.update()
+        .where(users.c.id.in_(ancestor_ids))
+        .values(
+            referral_branch_size=users.c.referral_branch_size + size,
+            referral_branch_spent_kopeks=users.c.referral_branch_spent_kopeks + spent_kopeks,
+        )
+    )
+
+
+def _subtree_totals(connection, user_id: int) -> tuple[int, int]:
+    """Размер и траты поддерева пользователя вместе с ним самим."""
+    users = User.__table__
+    row = connection.execute(
+        select(
+            users.c.referral_branch_size,
+            users.c.referral_branch_spent_kopeks,
+            users.c.total_spent_kopeks,
+        ).where(users.c.id == user_id)
+    ).first()
+    if row is None:
+        return 1, 0
+    return 1 + row.referral_branch_size, row.total_spent_kopeks + row.referral_branch_spent_kopeks
+
+
+def link_referral_subtree(connection, user_id: int, referrer_id: int) -> None:
+    """Подвешивает поддерево ``user_id`` под ``referrer_id`` в замыкании и итогах веток."""
+    closure = ReferralClosure.__table__
+    if referrer_id == user_id:
+        return
+    creates_cycle = connection.execute(
+        select(closure.c.depth).where(closure.c.ancestor_id == user_id, closure.c.descendant_id == referrer_id)
+    ).first()
+    if creates_cycle is not None:
+        # Реферер сам находится в ветке пользователя — цикл в замыкание не пишем
+        return
+
+    ancestors = union_all(
+        select(sa_literal(referrer_id).label('ancestor_id'), sa_literal(0).label('depth')),
+        select(closure.c.ancestor_id, closure.c.depth).where(closure.c.descendant_id == referrer_id),
+    ).subquery()
+    descendants = union_all(
+        select(sa_literal(user_id).label('descendant_id'), sa_literal(0).label('depth')),
+        select(closure.c.descendant_id, closure.c.depth).where(closure.c.ancestor_id == user_id),
+    ).subquery()
+    connection.execute(
+        closure.insert().from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(
+                ancestors.c.ancestor_id,
+                descendants.c.descendant_id,
+                ancestors.c.depth + descendants.c.depth + 1,
+            ).select_from(ancestors.join(descendants, true())),
+        )
+    )
+
+    size, spent_kopeks = _subtree_totals(connection, user_id)
+    _shift_branch_totals(
+        connection,
+        select(closure.c.ancestor_id).where(closure.c.descendant_id == user_id),
+        size,
+        spent_kopeks,
+    )
+
+
+def unlink_referral_subtree(connection, user_id: int) -> list[int]:
+    """Отвязывает поддерево ``user_id`` от всех его предков; возвращает бывших предков."""
+    closure = ReferralClosure.__table__
+    ancestor_ids = (
+        connection.execute(select(closure.c.ancestor_id).where(closure.c.descendant_id == user_id)).scalars().all()
+    )
+    if not ancestor_ids:
+        return []
+
+    size, spent_kopeks = _subtree_totals(connection, user_id)
+    _shift_branch_totals(connection, ancestor_ids, -size, -spent_kopeks)
+    connection.execute(
+        closure.delete().where(
+            closure.c.ancestor_id.in_(ancestor_ids),
+            or_(
+                closure.c.descendant_id == user_id,
+                closure.c.descendant_id.in_(select(closure.c.descendant_id).where(closure.c.ancestor_id == user_id)),
+            ),
+        )
+    )
+    return list(ancestor_ids)
+
+
+def _link_registered_referral(mapper, connection, target: User) -> None:
+    if target.referred_by_id is not None:
+        link_referral_subtree(connection, target.id, target.referred_by_id)
+
+
+def _relink_reassigned_referral(mapper, connection, target: User) -> None:
+    if not get_history(target, 'referred_by_id').has_changes():
+        return
+    # Старые предки берутся из самого замыкания, а не из истории атрибута.
+    # Их итоги сдвинуты по ещё не пересчитанным тратам ветки — сверяем после коммита.
+    defer_branch_refresh(object_session(target), unlink_referral_subtree(connection, target.id))
+    if target.referred_by_id is not None:
+        link_referral_subtree(connection, target.id, target.referred_by_id)
+
+
+def _detach_deleted_referrer(mapper, connection, target: User) -> None:
+    # Рефералы удаляемого становятся корнями (referred_by_id → NULL по FK)
+    defer_branch_refresh(object_session(target), unlink_referral_subtree(connection, target.id))
+    closure = ReferralClosure.__table__
+    connection.execute(closure.delete().where(closure.c.ancestor_id == target.id))
+
+
+_hooks_registered = False
+
+
+def register_referral_closure_hooks() -> None:
+    """Подписывает хуки User, которые ведут замыкание и итоги веток."""
+    global _hooks_registered
+    if _hooks_registered:
+        return
+    event.listen(User, 'after_insert', _link_registered_referral)
+    event.listen(User, 'after_update', _relink_reassigned_referral)
+    event.listen(User, 'before_delete', _detach_deleted_referrer)
+    _hooks_registered = True
+
+
+register_referral_closure_hooks()
+
+
+async def get_descendant_ids(db: AsyncSession, root_ids: Iterable[int], max_depth: int | None = None) -> set[int]:
+    """Пользователи веток с корнями ``root_ids`` (корни включены)."""
+    roots = set(root_ids)
+    if not roots:
+        return set()
+    query = select(ReferralClosure.descendant_id).where(ReferralClosure.ancestor_id.in_(roots))
+    if max_depth is not None:
+        query = query.where(ReferralClosure.depth <= max_depth)
+    result = await db.execute(query)
+    return roots | set(result.scalars().all())
+
+
+async def get_ancestor_ids(db: AsyncSession, user_ids: Iterable[int], max_depth: int | None = None) -> set[int]:
+    """Цепочки рефереров над ``user_ids`` до корня (сами пользователи включены)."""
+    starts = set(user_ids)
+    if not starts:
+        return set()
+    query = select(ReferralClosure.ancestor_id).where(ReferralClosure.descendant_id.in_(starts))
+    if max_depth is not None:
+        query = query.where(ReferralClosure.depth <= max_depth)
+    result = await db.execute(query)
+    return starts | set(result.scalars().all())
+
+
+def _relink(session, links) -> None:
+    connection = session.connection()
+    for user_id, referrer_id in links:
+        defer_branch_refresh(session, unlink_referral_subtree(connection, user_id))
+        if referrer_id is not None:
+            link_referral_subtree(connection, user_id, referrer_id)
+
+
+async def relink_referrals(db: AsyncSession, user_ids: Iterable[int]) -> None:
+    """Переносит в замыкание текущий ``referred_by_id`` пользователей после массового UPDATE."""
+    ids = sorted(set(user_ids))
+    if not ids:
+        return
+
+    def _run(session) -> None:
+        connection = session.connection()
+        links = connection.execute(select(User.id, User.referred_by_id).where(User.id.in_(ids))).all()
+        _relink(session, links)
+
+    await db.run_sync(_run)
+
+
+async def relink_referrals_of(db: AsyncSession, referrer_ids: Iterable[int]) -> None:
+    """Досинхронизирует прямых рефералов ``referrer_ids``, которых массовый UPDATE переназначил на них."""
+    ids = sorted(set(referrer_ids))
+    if not ids:
+        return
+
+    def _run(session) -> None:
+        connection = session.connection()
+        stale = connection.execute(
+            select(User.id, User.referred_by_id).where(
+                User.referred_by_id.in_(ids),
+                ~select(ReferralClosure.depth)
+                .where(
+                    ReferralClosure.ancestor_id == User.referred_by_id,
+                    ReferralClosure.descendant_id == User.id,
+                    ReferralClosure.depth == 1,
+                )
+                .exists(),
+            )
+        ).all()
+        _relink(session, stale)
+
+    await db.run_sync(_run)
+
+
+def _branch_totals_values() -> dict:
+    """Значения итогов ветки для UPDATE users, посчитанные по замыканию."""
+    descendant = aliased(User)
+    return {
+        'referral_branch_size': select(func.count()).where(ReferralClosure.ancestor_id == User.id).scalar_subquery(),
+        'referral_branch_spent_kopeks': select(func.coalesce(func.sum(descendant.total_spent_kopeks), 0))
+        .select_from(ReferralClosure)
+        .join(descendant, descendant.id == ReferralClosure.descendant_id)
+        .where(ReferralClosure.ancestor_id == User.id)
+        .scalar_subquery(),
+    }
+
+
+async def refresh_referral_branch_totals(
+    db: AsyncSession, user_ids: Iterable[int], *, include_self: bool = False
+) -> None:
+    """Пересчитывает итоги веток у всех предков ``user_ids`` (после правки их трат в обход хуков).
+
+    ``include_self`` — пересчитать и самих ``user_ids``.
+    """
+    ids = set(user_ids)
+    if not ids:
+        return
+    targets = User.id.in_(select(ReferralClosure.ancestor_id).where(ReferralClosure.descendant_id.in_(ids)))
+    if include_self:
+        targets = or_(User.id.in_(ids), targets)
+    await db.execute(select(User.id).where(targets).order_by(User.id).with_for_update())
+    await db.execute(
+        update(User).where(targets).values(**_branch_totals_values()).execution_options(synchronize_session=False)
+    )
+
+
+async def rebuild_referral_closure(db: AsyncSession) -> int:
+    """Полностью пересобирает замыкание и итоги веток по ``users.referred_by_id``.
+
+    Нужна после восстановления из бекапа; возвращает число строк замыкания.
+    """
+    await db.execute(ReferralClosure.__table__.delete())
+    await db.execute(
+        text(
+            """
+            WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+                SELECT referred_by_id, id, 1 FROM users WHERE referred_by_id IS NOT NULL
+                UNION ALL
+                SELECT u.referred_by_id, walk.descendant_id, walk.depth + 1
+                FROM walk JOIN users u ON u.id = walk.ancestor_id
+                WHERE u.referred_by_id IS NOT NULL AND walk.depth < :max_depth
+            )
+            INSERT INTO referral_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM walk
+            WHERE ancestor_id <> descendant_id
+            GROUP BY ancestor_id, descendant_id
+            """
+        ),
+        {'max_depth': REBUILD_MAX_DEPTH},
+    )
+    await db.execute(
+        update(User)
+        .where(
+            or_(
+                User.referral_branch_size != 0,
+                User.referral_branch_spent_kopeks != 0,
+                User.id.in_(select(ReferralClosure.ancestor_id)),
+            )
+        )
+        .values(**_branch_totals_values())
+        .execution_options(synchronize_session=False)
+    )
+
+    rows = (await db.execute(select(func.count()).select_from(ReferralClosure))).scalar_one()
+    logger.info('Замыкание реферального дерева пересобрано', rows=rows)
+    return rows
@@ -0,0 +1,232 @@
+"""Daily statistics rollups: recompute from source tables and read for admin stats.
+
+``daily_transaction_rollups`` keeps, per UTC day, the count and sum of
+``abs(amount_kopeks)`` of completed transactions grouped by type and payment
+method; ``daily_subscription_rollups`` keeps registrations, trial starts and
+trial→paid conversions per day. A day is always recomputed as a whole from the
+source tables (delete + insert), so a recompute is idempotent and the nightly
+reconciler can simply re-run it for recent days.
+"""
+
+from collections.abc import Iterable
+from datetime import UTC, date, datetime, time, timedelta
+
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import (
+    DailySubscriptionRollup,
+    DailyTransactionRollup,
+    Subscription,
+    SubscriptionConversion,
+    Transaction,
+    User,
+)
+
+
+def _as_date(value) -> date:
+    # func.date() отдаёт date в PostgreSQL и строку в SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _day_bounds(start_day: date, end_day: date) -> tuple[datetime, datetime]:
+    return (
+        datetime.combine(start_day, time.min, tzinfo=UTC),
+        datetime.combine(end_day + timedelta(days=1), time.min, tzinfo=UTC),
+    )
+
+
+async def recompute_rollups(db: AsyncSession, start_day: date, end_day: date) -> int:
+    """Recompute rollup rows for ``[start_day, end_day]`` and return the number of rows written.
+
+    Does not commit.
+    """
+    start_dt, end_dt = _day_bounds(start_day, end_day)
+
+    tx_day = func.date(Transaction.created_at)
+    tx_method = func.coalesce(Transaction.payment_method, '')
+    tx_result = await db.execute(
+        select(
+            tx_day.label('day'),
+            Transaction.type,
+            tx_method.label('payment_method'),
+            func.count(Transaction.id).label('count'),
+            func.coalesce(func.sum(func.abs(Transaction.amount_kopeks)), 0).label('amount'),
+        )
+        .where(
+            and_(
+                Transaction.is_completed == True,
+                Transaction.created_at >= start_dt,
+                Transaction.created_at < end_dt,
+            )
+        )
+        .group_by(tx_day, Transaction.type, tx_method)
+    )
+    transaction_rows = [
+        {
+            'day': _as_date(row.day),
+            'type': row.type,
+            'payment_method': row.payment_method,
+            'transactions_count': row.count,
+            'amount_kopeks': int(row.amount),
+        }
+        for row in tx_result
+    ]
+
+    per_day: dict[date, dict[str, int]] = {}
+
+    async def _count_by_day(day_column, *conditions) -> dict[date, int]:
+        day_expr = func.date(day_column)
+        result = await db.execute(
+            select(day_expr.label('day'), func.count().label('count'))
+            .where(and_(day_column >= start_dt, day_column < end_dt, *conditions))
+            .group_by(day_expr)
+        )
+        return {_as_date(row.day): row.count for row in result}
+
+    for field, counts in (
+        ('registrations', await _count_by_day(User.created_at)),
+        ('trials_started', await _count_by_day(Subscription.created_at, Subscription.is_trial == True)),
+        ('trial_conversions', await _count_by_day(SubscriptionConversion.converted_at)),
+    ):
+        for day, count in counts.items():
+            per_day.setdefault(day, {})[field] = count
+
+    subscription_rows = [
+        {
+            'day': day,
+            'registrations': counts.get('registrations', 0),
+            'trials_started': counts.get('trials_started', 0),
+            'trial_conversions': counts.get('trial_conversions', 0),
+        }
+        for day, counts in per_day.items()
+    ]
+
+    await db.execute(
+        delete(DailyTransactionRollup).where(
+            DailyTransactionRollup.day >= start_day, DailyTransactionRollup.day <= end_day
+        )
+    )
+    await db.execute(
+        delete(DailySubscriptionRollup).where(
+            DailySubscriptionRollup.day >= start_day, DailySubscriptionRollup.day <= end_day
+        )
+    )
+    if transaction_rows:
+        await db.execute(insert(DailyTransactionRollup), transaction_rows)
+    if subscription_rows:
+        await db.execute(insert(DailySubscriptionRollup), subscription_rows)
+
+    return len(transaction_rows) + len(subscription_rows)
+
+
+async def get_first_activity_day(db: AsyncSession) -> date | None:
+    """Earliest day that has source data for the rollups."""
+    days = []
+    for column in (Transaction.created_at, User.created_at):
+        value = (await db.execute(select(func.min(column)))).scalar()
+        if value is not None:
+            days.append(value.astimezone(UTC).date() if value.tzinfo else value.date())
+    return min(days) if days else None
+
+
+async def has_rollups(db: AsyncSession) -> bool:
+    result = await db.execute(select(DailyTransactionRollup.day).limit(1))
+    if result.first() is not None:
+        return True
+    result = await db.execute(select(DailySubscriptionRollup.day).limit(1))
+    return result.first() is not None
+
+
+async def get_transaction_rollups(
+    db: AsyncSession,
+    start_day: date,
+    end_day: date,
+    *,
+    types: Iterable[str] | None = None,
+    payment_methods: Iterable[str] | None = None,
+) -> list[DailyTransactionRollup]:
+    query = _filtered_rollup_query(select(DailyTransactionRollup), start_day, end_day, types, payment_methods)
+    result = await db.execute(query.order_by(DailyTransactionRollup.day))
+    return list(result.scalars().all())
+
+
+async def get_subscription_rollups(db: AsyncSession, start_day: date, end_day: date) -> list[DailySubscriptionRollup]:
+    result = await db.execute(
+        select(DailySubscriptionRollup)
+        .where(DailySubscriptionRollup.day >= start_day, DailySubscriptionRollup.day <= end_day)
+        .order_by(DailySubscriptionRollup.day)
+    )
+    return list(result.scalars().all())
+
+
+def _filtered_rollup_query(
+    query,
+    start_day: date | None,
+    end_day: date | None,
+    types: Iterable[str] | None,
+    payment_methods: Iterable[str] | None,
+):
+    if start_day is not None:
+        query = query.where(DailyTransactionRollup.day >= start_day)
+    if end_day is not None:
+        query = query.where(DailyTransactionRollup.day <= end_day)
+    if types is not None:
+        query = query.where(DailyTransactionRollup.type.in_(list(types)))
+    if payment_methods is not None:
+        query = query.where(DailyTransactionRollup.payment_method.in_(list(payment_methods)))
+    return query
+
+
+async def sum_transaction_rollups(
+    db: AsyncSession,
+    *,
+    start_day: date | None = None,
+    end_day: date | None = None,
+    types: Iterable[str] | None = None,
+    payment_methods: Iterable[str] | None = None,
+) -> tuple[int, int]:
+    """Total ``(transactions_count, amount_kopeks)`` over the matching rollup rows."""
+    query = _filtered_rollup_query(
+        select(
+            func.coalesce(func.sum(DailyTransactionRollup.transactions_count), 0),
+            func.coalesce(func.sum(DailyTransactionRollup.amount_kopeks), 0),
+        ),
+        start_day,
+        end_day,
+        types,
+        payment_methods,
+    )
+    count, amount = (await db.execute(query)).one()
+    return int(count), int(amount)
+
+
+async def get_daily_transaction_totals(
+    db: AsyncSession,
+    start_day: date,
+    end_day: date,
+    *,
+    types: Iterable[str] | None = None,
+    payment_methods: Iterable[str] | None = None,
+) -> list[dict]:
+    """Per-day ``count``/``amount_kopeks`` over the matching rollup rows, ordered by day."""
+    query = _filtered_rollup_query(
+        select(
+            DailyTransactionRollup.day,
+            func.sum(DailyTransactionRollup.transactions_count).label('count'),
+            func.sum(DailyTransactionRollup.amount_kopeks).label('amount'),
+        ),
+        start_day,
+        end_day,
+        types,
+        payment_methods,
+    )
+    result = await db.execute(query.group_by(DailyTransactionRollup.day).order_by(DailyTransactionRollup.day))
+    return [
+        {'date': _as_date(row.day), 'count': int(row.count or 0), 'amount_kopeks': int(row.amount or 0)}
+        for row in result
+    ]
@@ -1817,7 +1817,7 @@ async def get_subscriptions_for_autopay(db: AsyncSession) -> list[Subscription]:
     return ready_for_autopay
 
 
-async def get_subscriptions_statistics(db: AsyncSession) -> dict:
+async def get_subscriptions_statistics(db: AsyncSession, *, include_purchases: bool = True) -> dict:
     total_result = await db.execute(select(func.count(Subscription.id)))
     total_subscriptions = total_result.scalar()
 
@@ -1840,38 +1840,41 @@ async def get_subscriptions_statistics(db: AsyncSession) -> dict:
     week_ago = today_start - timedelta(days=7)
     month_ago = today_start - timedelta(days=30)
 
-    today_result = await db.execute(
-        select(func.count(Transaction.id)).where(
-            and_(
-                Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
-                Transaction.is_completed.is_(True),
-                Transaction.created_at >= today_start,
+    purchased_today = purchased_week = purchased_month = 0
+    # Дашборд с готовыми дневными агрегатами считает покупки по ним
+    if include_purchases:
+        today_result = await db.execute(
+            select(func.count(Transaction.id)).where(
+                and_(
+                    Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
+                    Transaction.is_completed.is_(True),
+                    Transaction.created_at >= today_start,
+                )
             )
         )
-    )
-    purchased_today = today_result.scalar() or 0
+        purchased_today = today_result.scalar() or 0
 
-    week_result = await db.execute(
-        select(func.count(Transaction.id)).where(
-            and_(
-                Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
-                Transaction.is_completed.is_(True),
-                Transaction.created_at >= week_ago,
+        week_result = await db.execute(
+            select(func.count(Transaction.id)).where(
+                and_(
+                    Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
+                    Transaction.is_completed.is_(True),
+                    Transaction.created_at >= week_ago,
+                )
             )
         )
-    )
-    purchased_week = week_result.scalar() or 0
+        purchased_week = week_result.scalar() or 0
 
-    month_result = await db.execute(
-        select(func.count(Transaction.id)).where(
-            and_(
-                Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
-                Transaction.is_completed.is_(True),
-                Transaction.created_at >= month_ago,
+        month_result = await db.execute(
+            select(func.count(Transaction.id)).where(
+                and_(
+                    Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
+                    Transaction.is_completed.is_(True),
+                    Transaction.created_at >= month_ago,
+                )
             )
         )
-    )
-    purchased_month = month_result.scalar() or 0
+        purchased_month = month_result.scalar() or 0
 
     try:
         from app.database.crud.subscription_conversion import get_conversion_statistics
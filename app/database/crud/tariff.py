@@ -4,10 +4,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database.models import PromoGroup, Subscription, SubscriptionStatus, Tariff
+from app.utils.catalog_cache import register_catalog_invalidation
 
 
 logger = structlog.get_logger(__name__)
 
+# Закоммиченные правки тарифов, серверов и промогрупп поднимают версию каталога
+# в памяти процессов (app/utils/catalog_cache.py).
+register_catalog_invalidation()
+
 
 def _normalize_period_prices(period_prices: dict[int, int] | None) -> dict[str, int]:
     """Нормализует цены периодов в формат {str: int}."""
@@ -1,22 +1,44 @@
+import base64
+import binascii
 import hmac
+import json
 import secrets
 import string
+import time
+from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
+from typing import Any
 
 import structlog
-from sqlalchemy import and_, case, exists, func, nullslast, or_, select, text
+from sqlalchemy import (
+    and_,
+    bindparam,
+    case,
+    event,
+    exists,
+    func,
+    literal as sa_literal,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+)
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import object_session, selectinload
+from sqlalchemy.orm.attributes import get_history
 
 from app.config import settings
 from app.database.constants import POSTGRES_INT4_MAX, POSTGRES_INT4_MIN
 from app.database.crud.discount_offer import get_latest_claimed_offer_for_user
 from app.database.crud.promo_group import get_default_promo_group
 from app.database.crud.promo_offer_log import log_promo_offer_action
+from app.database.crud.referral_closure import defer_branch_refresh, refresh_referral_branch_totals
 from app.database.models import (
     AdvertisingCampaign,
     AdvertisingCampaignRegistration,
+    AwareDateTime,
     PaymentMethod,
     PromoGroup,
     Subscription,
@@ -28,12 +50,17 @@ from app.database.models import (
     UserPromoGroup,
     UserStatus,
 )
-from app.utils.text_search import contains_conditions
+from app.utils.text_search import build_user_search_text, search_text_clause
+from app.utils.user_snapshot_cache import register_snapshot_invalidation
 from app.utils.validators import sanitize_telegram_name
 
 
 logger = structlog.get_logger(__name__)
 
+# Любой закоммиченный INSERT/UPDATE/DELETE User/Subscription сбрасывает снимки
+# пользователей, которыми AuthMiddleware обслуживает лёгкие хендлеры.
+register_snapshot_invalidation()
+
 # PostgreSQL BIGINT upper bound. A numeric search term larger than this fits a
 # Python int but overflows the telegram_id BigInteger column, so comparing against
 # it raises a DB error instead of returning no rows.
@@ -43,19 +70,17 @@ _BIGINT_MAX = 9223372036854775807
 def _user_search_conditions(search: str) -> list:
     """Build the OR-conditions for the admin user search box (id/name/username).
 
-    Always matches the text columns; matches telegram_id only when the term is an
+    Always matches the normalized search text; matches telegram_id only when the term is an
     in-range BIGINT number. A digit string that overflows BIGINT (or a non-ASCII
     "digit" that int() rejects) would otherwise crash the query, so it falls back
     to text-only matching instead.
 
-    Регистр сворачивается через contains_conditions, а не голым ILIKE: под локалью
-    базы `C` (наш docker-compose) ILIKE не трогает кириллицу, и «поз» не находил
-    «Позитив». Подробности — в app/utils/text_search.py.
+    Текст ищется по нормализованной колонке users.search_text, а не ILIKE по
+    сырым полям: под локалью базы `C` (наш docker-compose) ILIKE не трогает
+    кириллицу, а варианты регистра через OR не могут использовать индекс.
+    Подробности — в app/utils/text_search.py.
     """
-    conditions = contains_conditions(
-        (User.first_name, User.last_name, User.username),
-        search,
-    )
+    conditions = [search_text_clause(User.search_text, search)]
     if search.isdigit():
         try:
             search_int = int(search)
@@ -78,7 +103,6 @@ def _build_spending_stats_select():
     Возвращает базовый SELECT для статистики трат пользователей.
 
     Используется в:
-    - get_users_list() для сортировки по тратам/покупкам
     - get_users_spending_stats() для получения статистики
 
     Returns:
@@ -941,31 +965,19 @@ async def cleanup_expired_promo_offer_discounts(db: AsyncSession) -> int:
     return len(users)
 
 
-async def get_users_list(
-    db: AsyncSession,
-    offset: int = 0,
-    limit: int = 50,
+def _apply_users_list_filters(
+    query,
+    *,
+    status: UserStatus | None = None,
     search: str | None = None,
     email: str | None = None,
-    status: UserStatus | None = None,
     subscription_status: str | None = None,
     tariff_ids: list[int] | None = None,
     promo_group_id: int | None = None,
     campaign_id: int | None = None,
     partner_id: int | None = None,
-    order_by_balance: bool = False,
-    order_by_traffic: bool = False,
-    order_by_last_activity: bool = False,
-    order_by_total_spent: bool = False,
-    order_by_purchase_count: bool = False,
-    order_by_subscription_end: bool = False,
-) -> list[User]:
-    query = select(User).options(
-        selectinload(User.subscriptions).selectinload(Subscription.tariff),
-        selectinload(User.promo_group),
-        selectinload(User.referrer),
-    )
-
+):
+    """Фильтры админского списка пользователей — общие для выборки и подсчёта."""
     if status:
         query = query.where(User.status == status.value)
 
@@ -1018,6 +1030,67 @@ async def get_users_list(
     if email:
         query = query.where(User.email.ilike(f'%{email}%'))
 
+    return query
+
+
+USERS_LIST_SORT_KEYS = (
+    'created_at',
+    'balance',
+    'traffic',
+    'last_activity',
+    'total_spent',
+    'purchase_count',
+    'subscription_end_date',
+)
+_DATETIME_SORT_KEYS = frozenset({'created_at', 'last_activity', 'subscription_end_date'})
+# NULL в ключе сортировки заменяется граничным значением: порядок тот же, что у
+# nullslast, но ключ всегда сравним и годится для keyset-условия
+_SORT_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_SORT_FAR_FUTURE = datetime(9999, 12, 31, tzinfo=UTC)
+
+
+@dataclass(frozen=True, slots=True)
+class UsersListCursor:
+    """Позиция в админском списке: ключ сортировки и (created_at, id) последней строки страницы."""
+
+    sort_by: str
+    value: Any
+    created_at: datetime
+    user_id: int
+
+    def encode(self) -> str:
+        value = self.value.isoformat() if isinstance(self.value, datetime) else self.value
+        payload = json.dumps([self.sort_by, value, self.created_at.isoformat(), self.user_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, token: str) -> 'UsersListCursor':
+        """Разбирает курсор из ответа API; ValueError — курсор повреждён."""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            sort_by, value, created_at, user_id = json.loads(raw)
+            if sort_by not in USERS_LIST_SORT_KEYS:
+                raise ValueError(sort_by)
+            if sort_by in _DATETIME_SORT_KEYS:
+                value = datetime.fromisoformat(value)
+            elif sort_by == 'traffic':
+                value = float(value)
+            else:
+                value = int(value)
+            return cls(sort_by, value, datetime.fromisoformat(created_at), int(user_id))
+        except (TypeError, ValueError, binascii.Error) as error:
+            raise ValueError('Некорректный курсор списка пользователей') from error
+
+
+def _users_list_sort_key(
+    *,
+    order_by_balance: bool = False,
+    order_by_traffic: bool = False,
+    order_by_last_activity: bool = False,
+    order_by_total_spent: bool = False,
+    order_by_purchase_count: bool = False,
+    order_by_subscription_end: bool = False,
+) -> str:
     sort_flags = [
         order_by_balance,
         order_by_traffic,
@@ -1031,33 +1104,39 @@ async def get_users_list(
             'Выбрано несколько сортировок пользователей — применяется приоритет: трафик > траты > покупки > баланс > активность > окончание подписки'
         )
 
-    transactions_stats = None
-    if order_by_total_spent or order_by_purchase_count:
-        from app.database.models import Transaction
-
-        transactions_stats = (
-            select(*_build_spending_stats_select())
-            .where(Transaction.is_completed.is_(True))
-            .group_by(Transaction.user_id)
-            .subquery()
-        )
-        query = query.outerjoin(transactions_stats, transactions_stats.c.user_id == User.id)
-
     if order_by_traffic:
-        traffic_sort = func.coalesce(Subscription.traffic_used_gb, 0.0)
-        query = query.outerjoin(Subscription, Subscription.user_id == User.id)
-        query = query.order_by(traffic_sort.desc(), User.created_at.desc())
-    elif order_by_total_spent:
-        order_column = func.coalesce(transactions_stats.c.total_spent, 0)
-        query = query.order_by(order_column.desc(), User.created_at.desc())
-    elif order_by_purchase_count:
-        order_column = func.coalesce(transactions_stats.c.purchase_count, 0)
-        query = query.order_by(order_column.desc(), User.created_at.desc())
-    elif order_by_balance:
-        query = query.order_by(User.balance_kopeks.desc(), User.created_at.desc())
-    elif order_by_last_activity:
-        query = query.order_by(nullslast(User.last_activity.desc()), User.created_at.desc())
-    elif order_by_subscription_end:
+        return 'traffic'
+    if order_by_total_spent:
+        return 'total_spent'
+    if order_by_purchase_count:
+        return 'purchase_count'
+    if order_by_balance:
+        return 'balance'
+    if order_by_last_activity:
+        return 'last_activity'
+    if order_by_subscription_end:
+        return 'subscription_end_date'
+    return 'created_at'
+
+
+def _users_list_sort_expression(sort_by: str, subscription_status: str | None) -> tuple[Any, bool]:
+    """Выражение ключа сортировки и направление (True — по возрастанию)."""
+    if sort_by == 'traffic':
+        # Подзапрос, а не outerjoin: при нескольких подписках join дублировал строки
+        max_traffic = (
+            select(func.max(Subscription.traffic_used_gb)).where(Subscription.user_id == User.id).scalar_subquery()
+        )
+        return func.coalesce(max_traffic, 0.0), False
+    if sort_by == 'total_spent':
+        # Нарастающий итог в users вместо агрегата по всем транзакциям
+        return User.total_spent_kopeks, False
+    if sort_by == 'purchase_count':
+        return User.purchase_count, False
+    if sort_by == 'balance':
+        return User.balance_kopeks, False
+    if sort_by == 'last_activity':
+        return func.coalesce(User.last_activity, sa_literal(_SORT_EPOCH, User.last_activity.type)), False
+    if sort_by == 'subscription_end_date':
         # MIN(end_date) среди подписок пользователя; без outerjoin — иначе дубли
         # строк при нескольких подписках (мультитариф).
         #
@@ -1087,14 +1166,81 @@ async def get_users_list(
             .where(*soonest_end_conditions)
             .scalar_subquery()
         )
-        query = query.order_by(nullslast(soonest_end.asc()), User.created_at.desc())
-    else:
-        query = query.order_by(User.created_at.desc())
+        return func.coalesce(soonest_end, sa_literal(_SORT_FAR_FUTURE, Subscription.end_date.type)), True
+    return User.created_at, False
 
-    query = query.offset(offset).limit(limit)
 
-    result = await db.execute(query)
-    users = result.scalars().unique().all()
+def _keyset_after(keys: list[tuple[Any, bool, Any]]) -> Any:
+    """Условие «строка идёт после курсора» для составного ключа.
+
+    При одном направлении у всех колонок — сравнение кортежей: его и PostgreSQL,
+    и SQLite обслуживают индексом (ключ, created_at, id). Разные направления
+    раскладываются в OR по префиксам.
+    """
+    directions = {ascending for _, ascending, _ in keys}
+    if len(directions) == 1:
+        left = tuple_(*(expression for expression, _, _ in keys))
+        right = tuple_(*(value for _, _, value in keys))
+        return left > right if directions.pop() else left < right
+
+    clauses = []
+    equal: list[Any] = []
+    for expression, ascending, value in keys:
+        clauses.append(and_(*equal, expression > value if ascending else expression < value))
+        equal.append(expression == value)
+    return or_(*clauses)
+
+
+async def get_users_page(
+    db: AsyncSession,
+    *,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: UsersListCursor | None = None,
+    sort_by: str = 'created_at',
+    **filters: Any,
+) -> tuple[list[User], UsersListCursor | None]:
+    """Страница админского списка пользователей.
+
+    С ``cursor`` страница продолжается после последней строки предыдущей
+    (keyset по ключу сортировки и (created_at, id)) — стоимость не растёт с
+    глубиной, в отличие от OFFSET. Второе значение — курсор следующей страницы
+    или None, если страница неполная.
+    """
+    if cursor is not None and cursor.sort_by != sort_by:
+        raise ValueError('Курсор получен для другой сортировки')
+
+    sort_expression, ascending = _users_list_sort_expression(sort_by, filters.get('subscription_status'))
+    query = select(User, sort_expression.label('sort_value')).options(
+        selectinload(User.subscriptions).selectinload(Subscription.tariff),
+        selectinload(User.promo_group),
+        selectinload(User.referrer),
+    )
+    query = _apply_users_list_filters(query, **filters)
+
+    order_keys: list[tuple[Any, bool]] = [(User.created_at, False), (User.id, False)]
+    if sort_by != 'created_at':
+        order_keys.insert(0, (sort_expression, ascending))
+    query = query.order_by(*(key.asc() if key_ascending else key.desc() for key, key_ascending in order_keys))
+
+    if cursor is not None:
+        cursor_values = [cursor.created_at, cursor.user_id]
+        if sort_by != 'created_at':
+            cursor_values.insert(0, cursor.value)
+        query = query.where(
+            _keyset_after(
+                [
+                    (key, key_ascending, value)
+                    for (key, key_ascending), value in zip(order_keys, cursor_values, strict=True)
+                ]
+            )
+        )
+    elif offset:
+        query = query.offset(offset)
+
+    result = await db.execute(query.limit(limit))
+    rows = result.all()
+    users = [row[0] for row in rows]
 
     # Загружаем дополнительные зависимости для всех пользователей
     for user in users:
@@ -1102,6 +1248,55 @@ async def get_users_list(
             # Загружаем дополнительные зависимости для subscription
             _ = user.subscription.is_active
 
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last_user, last_value = rows[-1]
+        if last_user.created_at is not None:
+            next_cursor = UsersListCursor(sort_by, last_value, last_user.created_at, last_user.id)
+    return users, next_cursor
+
+
+async def get_users_list(
+    db: AsyncSession,
+    offset: int = 0,
+    limit: int = 50,
+    search: str | None = None,
+    email: str | None = None,
+    status: UserStatus | None = None,
+    subscription_status: str | None = None,
+    tariff_ids: list[int] | None = None,
+    promo_group_id: int | None = None,
+    campaign_id: int | None = None,
+    partner_id: int | None = None,
+    order_by_balance: bool = False,
+    order_by_traffic: bool = False,
+    order_by_last_activity: bool = False,
+    order_by_total_spent: bool = False,
+    order_by_purchase_count: bool = False,
+    order_by_subscription_end: bool = False,
+) -> list[User]:
+    sort_by = _users_list_sort_key(
+        order_by_balance=order_by_balance,
+        order_by_traffic=order_by_traffic,
+        order_by_last_activity=order_by_last_activity,
+        order_by_total_spent=order_by_total_spent,
+        order_by_purchase_count=order_by_purchase_count,
+        order_by_subscription_end=order_by_subscription_end,
+    )
+    users, _ = await get_users_page(
+        db,
+        limit=limit,
+        offset=offset,
+        sort_by=sort_by,
+        search=search,
+        email=email,
+        status=status,
+        subscription_status=subscription_status,
+        tariff_ids=tariff_ids,
+        promo_group_id=promo_group_id,
+        campaign_id=campaign_id,
+        partner_id=partner_id,
+    )
     return users
 
 
@@ -1116,61 +1311,61 @@ async def get_users_count(
     campaign_id: int | None = None,
     partner_id: int | None = None,
 ) -> int:
-    query = select(func.count(User.id))
+    query = _apply_users_list_filters(
+        select(func.count(User.id)),
+        status=status,
+        search=search,
+        email=email,
+        subscription_status=subscription_status,
+        tariff_ids=tariff_ids,
+        promo_group_id=promo_group_id,
+        campaign_id=campaign_id,
+        partner_id=partner_id,
+    )
+    result = await db.execute(query)
+    return result.scalar()
 
-    if status:
-        query = query.where(User.status == status.value)
 
-    if subscription_status or tariff_ids:
-        sub_conditions = []
-        if subscription_status:
-            sub_conditions.append(Subscription.status == subscription_status)
-        if tariff_ids:
-            sub_conditions.append(Subscription.tariff_id.in_(tariff_ids))
-        sub_query = select(Subscription.user_id).where(and_(*sub_conditions)).distinct().scalar_subquery()
-        query = query.where(User.id.in_(sub_query))
+_users_count_cache: dict[tuple, tuple[float, int, bool]] = {}
+_USERS_COUNT_CACHE_MAX_ENTRIES = 512
 
-    if promo_group_id:
-        # Юзер считается членом группы если она в legacy `user.promo_group_id` ИЛИ
-        # в M2M `user_promo_groups`. Без OR-условия админский фильтр пропускал юзеров
-        # с группой только в M2M (см. analogue issue #422 для payment methods).
-        query = query.where(
-            or_(
-                User.promo_group_id == promo_group_id,
-                User.id.in_(select(UserPromoGroup.user_id).where(UserPromoGroup.promo_group_id == promo_group_id)),
-            )
-        )
 
-    if campaign_id:
-        query = query.where(
-            exists(
-                select(AdvertisingCampaignRegistration.id).where(
-                    AdvertisingCampaignRegistration.user_id == User.id,
-                    AdvertisingCampaignRegistration.campaign_id == campaign_id,
-                )
-            )
-        )
+async def get_users_count_cached(db: AsyncSession, **filters: Any) -> tuple[int, bool]:
+    """Общее число пользователей для админского списка: (число, это оценка).
 
-    if partner_id:
-        query = query.where(
-            exists(
-                select(AdvertisingCampaignRegistration.id)
-                .join(AdvertisingCampaign, AdvertisingCampaign.id == AdvertisingCampaignRegistration.campaign_id)
-                .where(
-                    AdvertisingCampaignRegistration.user_id == User.id,
-                    AdvertisingCampaign.partner_user_id == partner_id,
-                )
-            )
+    Результат кэшируется на ADMIN_USERS_COUNT_CACHE_SECONDS для каждого набора
+    фильтров, поэтому листание страниц не пересчитывает COUNT(*). Без фильтров
+    на PostgreSQL большая таблица оценивается по статистике планировщика.
+    """
+    active_filters = {key: value for key, value in filters.items() if value}
+    key = tuple(
+        sorted(
+            (name, tuple(value) if isinstance(value, list) else getattr(value, 'value', value))
+            for name, value in active_filters.items()
         )
-
-    if search:
-        query = query.where(or_(*_user_search_conditions(search)))
-
-    if email:
-        query = query.where(User.email.ilike(f'%{email}%'))
-
-    result = await db.execute(query)
-    return result.scalar()
+    )
+    ttl = settings.ADMIN_USERS_COUNT_CACHE_SECONDS
+    now = time.monotonic()
+    cached = _users_count_cache.get(key)
+    if ttl > 0 and cached is not None and now - cached[0] < ttl:
+        return cached[1], cached[2]
+
+    total: int | None = None
+    is_estimate = False
+    if not active_filters and db.bind.dialect.name == 'postgresql':
+        estimate = (
+            await db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"))
+        ).scalar()
+        if estimate is not None and estimate >= settings.ADMIN_USERS_COUNT_ESTIMATE_THRESHOLD:
+            total, is_estimate = int(estimate), True
+    if total is None:
+        total = await get_users_count(db, **active_filters)
+
+    if ttl > 0:
+        if len(_users_count_cache) >= _USERS_COUNT_CACHE_MAX_ENTRIES:
+            _users_count_cache.clear()
+        _users_count_cache[key] = (now, total, is_estimate)
+    return total, is_estimate
 
 
 async def get_users_spending_stats(db: AsyncSession, user_ids: list[int]) -> dict[int, dict[str, int]]:
@@ -1208,6 +1403,215 @@ async def get_users_spending_stats(db: AsyncSession, user_ids: list[int]) -> dic
     }
 
 
+def _spending_totals_values() -> dict:
+    """Итоги трат для UPDATE users, посчитанные по транзакциям (правила get_users_spending_stats)."""
+    purchases = and_(
+        Transaction.user_id == User.id,
+        Transaction.type == TransactionType.SUBSCRIPTION_PAYMENT.value,
+        Transaction.is_completed.is_(True),
+    )
+    return {
+        'total_spent_kopeks': func.coalesce(
+            select(func.sum(func.abs(Transaction.amount_kopeks))).where(purchases).scalar_subquery(), 0
+        ),
+        'purchase_count': select(func.count(Transaction.id)).where(purchases).scalar_subquery(),
+        'last_purchase_at': select(func.max(func.coalesce(Transaction.completed_at, Transaction.created_at)))
+        .where(purchases)
+        .scalar_subquery(),
+    }
+
+
+async def refresh_user_spending(db: AsyncSession, user_ids: list[int]) -> None:
+    """Пересчитывает users.total_spent_kopeks/purchase_count/last_purchase_at по транзакциям.
+
+    Нужен после массовых UPDATE/DELETE по transactions — их не видят ORM-хуки,
+    которые ведут эти итоги при обычных изменениях. Итоги веток у рефереров
+    пересчитываются вслед за ними.
+    """
+    if not user_ids:
+        return
+
+    await db.execute(
+        update(User)
+        .where(User.id.in_(set(user_ids)))
+        .values(**_spending_totals_values())
+        .execution_options(synchronize_session=False)
+    )
+    await refresh_referral_branch_totals(db, user_ids)
+
+
+async def rebuild_user_spending(db: AsyncSession) -> None:
+    """Пересчитывает итоги трат у всех пользователей одним UPDATE — после восстановления бекапа.
+
+    Транзакции загружаются массовыми INSERT в обход хуков, которые ведут итоги.
+    Итоги веток здесь не трогаются: их следом пересобирает ``rebuild_referral_closure``.
+    """
+    await db.execute(update(User).values(**_spending_totals_values()).execution_options(synchronize_session=False))
+    logger.info('Итоги трат пользователей пересчитаны')
+
+
+# Нарастающие итоги трат в users (total_spent_kopeks, purchase_count, last_purchase_at)
+# считаются по тем же правилам, что и get_users_spending_stats: завершённые оплаты подписок.
+# Хуки срабатывают в той же транзакции, что и изменение Transaction, и трогают только
+# строку самого плательщика; итоги веток его рефереров пересчитываются после коммита
+# (defer_branch_refresh). Массовые UPDATE/DELETE по transactions хуки обходят — после
+# них вызывается refresh_user_spending.
+_SPENDING_SOURCE_FIELDS = ('user_id', 'type', 'amount_kopeks', 'is_completed')
+
+
+def _spending_contribution(tx_type: str | None, amount_kopeks: int | None, is_completed: bool | None) -> int | None:
+    if is_completed is not True or tx_type != TransactionType.SUBSCRIPTION_PAYMENT.value or amount_kopeks is None:
+        return None
+    return abs(amount_kopeks)
+
+
+def _apply_spending_delta(
+    connection, target: Transaction, user_id: int | None, kopeks: int, count: int, purchased_at=None
+) -> None:
+    if user_id is None:
+        return
+    users = User.__table__
+    values = {
+        'total_spent_kopeks': users.c.total_spent_kopeks + kopeks,
+        'purchase_count': users.c.purchase_count + count,
+    }
+    if purchased_at is not None:
+        purchased_at_param = sa_literal(purchased_at, AwareDateTime())
+        values['last_purchase_at'] = case(
+            (
+                or_(users.c.last_purchase_at.is_(None), users.c.last_purchase_at < purchased_at_param),
+                purchased_at_param,
+            ),
+            else_=users.c.last_purchase_at,
+        )
+    connection.execute(users.update().where(users.c.id == user_id).values(**values))
+    if kopeks:
+        defer_branch_refresh(object_session(target), [user_id])
+
+
+def _count_inserted_transaction(mapper, connection, target: Transaction) -> None:
+    kopeks = _spending_contribution(target.type, target.amount_kopeks, target.is_completed)
+    if kopeks is not None:
+        purchased_at = target.completed_at or datetime.now(UTC)
+        _apply_spending_delta(connection, target, target.user_id, kopeks, 1, purchased_at)
+
+
+def _recount_updated_transaction(mapper, connection, target: Transaction) -> None:
+    histories = {field: get_history(target, field) for field in _SPENDING_SOURCE_FIELDS}
+    if not any(history.has_changes() for history in histories.values()):
+        return
+
+    def _previous(field: str):
+        history = histories[field]
+        return history.deleted[0] if history.deleted else getattr(target, field)
+
+    old_kopeks = _spending_contribution(_previous('type'), _previous('amount_kopeks'), _previous('is_completed'))
+    new_kopeks = _spending_contribution(target.type, target.amount_kopeks, target.is_completed)
+    if old_kopeks is not None:
+        _apply_spending_delta(connection, target, _previous('user_id'), -old_kopeks, -1)
+    if new_kopeks is not None:
+        purchased_at = target.completed_at or datetime.now(UTC)
+        _apply_spending_delta(connection, target, target.user_id, new_kopeks, 1, purchased_at)
+
+
+def _uncount_deleted_transaction(mapper, connection, target: Transaction) -> None:
+    kopeks = _spending_contribution(target.type, target.amount_kopeks, target.is_completed)
+    if kopeks is not None:
+        _apply_spending_delta(connection, target, target.user_id, -kopeks, -1)
+
+
+_spending_hooks_registered = False
+
+
+def register_spending_hooks() -> None:
+    """Подписывает хуки Transaction, которые ведут итоги трат в users."""
+    global _spending_hooks_registered
+    if _spending_hooks_registered:
+        return
+    event.listen(Transaction, 'after_insert', _count_inserted_transaction)
+    event.listen(Transaction, 'after_update', _recount_updated_transaction)
+    event.listen(Transaction, 'after_delete', _uncount_deleted_transaction)
+    _spending_hooks_registered = True
+
+
+register_spending_hooks()
+
+
+# users.search_text — нормализованные имя, username, email и реферальный код для
+# админ-поиска (см. app/utils/text_search.py). Ведут хуки User при вставке и правке
+# этих полей; после массовых INSERT в обход ORM — rebuild_user_search_text.
+_USER_SEARCH_SOURCE_FIELDS = ('first_name', 'last_name', 'username', 'email', 'referral_code')
+
+
+def _fill_user_search_text(mapper, connection, target: User) -> None:
+    target.search_text = build_user_search_text(target)
+
+
+def _refresh_user_search_text(mapper, connection, target: User) -> None:
+    if any(get_history(target, field).has_changes() for field in _USER_SEARCH_SOURCE_FIELDS):
+        target.search_text = build_user_search_text(target)
+
+
+_search_text_hooks_registered = False
+
+
+def register_search_text_hooks() -> None:
+    """Подписывает хуки User, которые ведут users.search_text."""
+    global _search_text_hooks_registered
+    if _search_text_hooks_registered:
+        return
+    event.listen(User, 'before_insert', _fill_user_search_text)
+    event.listen(User, 'before_update', _refresh_user_search_text)
+    _search_text_hooks_registered = True
+
+
+register_search_text_hooks()
+
+
+_SEARCH_TEXT_REBUILD_BATCH = 5000
+
+
+async def rebuild_user_search_text(db: AsyncSession, batch_size: int = _SEARCH_TEXT_REBUILD_BATCH) -> int:
+    """Пересчитывает users.search_text у всех пользователей — после восстановления бекапа.
+
+    Пользователи загружаются массовыми INSERT/UPSERT в обход ORM-хуков, которые
+    ведут колонку, и без пересчёта пропадают из админ-поиска. Значение строится в
+    приложении, поэтому колонка обновляется пачками по первичному ключу.
+    """
+    users = User.__table__
+    update_stmt = users.update().where(users.c.id == bindparam('user_id')).values(search_text=bindparam('search_value'))
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            await db.execute(
+                select(
+                    users.c.id,
+                    users.c.first_name,
+                    users.c.last_name,
+                    users.c.username,
+                    users.c.email,
+                    users.c.referral_code,
+                )
+                .where(users.c.id > last_id)
+                .order_by(users.c.id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        await db.execute(
+            update_stmt,
+            [{'user_id': row.id, 'search_value': build_user_search_text(row)} for row in rows],
+        )
+        updated += len(rows)
+
+    logger.info('Поисковый текст пользователей пересчитан', users=updated)
+    return updated
+
+
 async def get_referrals(db: AsyncSession, user_id: int) -> list[User]:
     result = await db.execute(
         select(User)
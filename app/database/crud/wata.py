@@ -7,6 +7,7 @@ import structlog
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.crud.payment_index import index_payments
 from app.database.models import WataPayment
 
 
@@ -133,9 +134,10 @@ async def update_wata_payment_status(
         return payment
 
     await db.execute(update(WataPayment).where(WataPayment.id == payment.id).values(**update_values))
-
-    await db.commit()
     await db.refresh(payment)
+    # Массовый UPDATE обходит хуки индекса платежей
+    await index_payments(db, [payment])
+    await db.commit()
 
     logger.info(
         'Обновлен Wata платеж',
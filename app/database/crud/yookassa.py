@@ -6,6 +6,7 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.database.crud.payment_index import index_payments
 from app.database.models import YooKassaPayment
 
 
@@ -115,14 +116,18 @@ async def update_yookassa_payment_status(
     await db.execute(
         update(YooKassaPayment).where(YooKassaPayment.yookassa_payment_id == yookassa_payment_id).values(**update_data)
     )
-    await db.commit()
 
     result = await db.execute(
         select(YooKassaPayment)
         .options(selectinload(YooKassaPayment.user))
         .where(YooKassaPayment.yookassa_payment_id == yookassa_payment_id)
+        .execution_options(populate_existing=True)
     )
     payment = result.scalar_one_or_none()
+    if payment:
+        # Массовый UPDATE обходит хуки индекса платежей
+        await index_payments(db, [payment])
+    await db.commit()
 
     if payment:
         logger.info(
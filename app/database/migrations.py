@@ -41,6 +41,7 @@ async def _detect_db_state() -> str:
 
 
 _INITIAL_REVISION = '0001'
+_USER_SEARCH_INDEX = 'ix_users_search_text_trgm'
 
 
 async def _bootstrap_fresh_db() -> None:
@@ -115,6 +116,7 @@ async def _ensure_runtime_schema_guards() -> None:
                         """
                     )
                 )
+            await _ensure_user_search_index(conn)
         elif dialect == 'sqlite':
             await conn.execute(
                 text(
@@ -135,6 +137,27 @@ async def _ensure_runtime_schema_guards() -> None:
             )
 
 
+async def _ensure_user_search_index(conn) -> None:
+    """Триграммный индекс users.search_text (миграция 0110) для баз, созданных через create_all."""
+    index_exists = (
+        await conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE tablename = 'users' AND indexname = :name"),
+            {'name': _USER_SEARCH_INDEX},
+        )
+    ).scalar() is not None
+    if index_exists:
+        return
+
+    try:
+        async with conn.begin_nested():
+            await conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            await conn.execute(
+                text(f'CREATE INDEX IF NOT EXISTS {_USER_SEARCH_INDEX} ON users USING gin (search_text gin_trgm_ops)')
+            )
+    except Exception as error:
+        logger.warning('Не удалось создать триграммный индекс поиска пользователей', error=error)
+
+
 async def run_alembic_upgrade() -> None:
     """Run ``alembic upgrade head``, handling fresh and legacy databases."""
     import asyncio
@@ -8,6 +8,7 @@ def _aware(dt: datetime | None) -> datetime | None:
     return dt
 
 
+import re
 from enum import Enum, StrEnum
 
 from sqlalchemy import (
@@ -239,6 +240,12 @@ class YooKassaPayment(Base):
     def is_pending(self) -> bool:
         return self.status == 'pending'
 
+    @property
+    def is_balance_topup(self) -> bool:
+        metadata = self.metadata_json or {}
+        payment_type = str(metadata.get('type') or metadata.get('payment_type') or '').lower()
+        return payment_type.startswith('balance_topup')
+
     @property
     def is_succeeded(self) -> bool:
         return self.status == 'succeeded' and self.is_paid
@@ -329,6 +336,12 @@ class CryptoBotPayment(Base):
     def is_pending(self) -> bool:
         return self.status == 'active'
 
+    @property
+    def payload_amount_kopeks(self) -> int:
+        """Сумма пополнения в копейках из хвоста payload (``..._<kopeks>``); 0, если не разобрать."""
+        match = re.search(r'_(\d+)$', self.payload or '')
+        return int(match.group(1)) if match else 0
+
     @property
     def is_expired(self) -> bool:
         return self.status == 'expired'
@@ -2067,6 +2080,13 @@ class PartnerStatus(Enum):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset-пагинация админского списка: ключ сортировки + (created_at, id) как тай-брейкер
+        Index('ix_users_created_id', 'created_at', 'id'),
+        Index('ix_users_balance_created_id', 'balance_kopeks', 'created_at', 'id'),
+        Index('ix_users_total_spent_created_id', 'total_spent_kopeks', 'created_at', 'id'),
+        Index('ix_users_purchase_count_created_id', 'purchase_count', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(BigInteger, unique=True, index=True, nullable=True)  # Nullable для email-only пользователей
@@ -2074,9 +2094,19 @@ class User(Base):
     username = Column(String(255), nullable=True)
     first_name = Column(String(255), nullable=True)
     last_name = Column(String(255), nullable=True)
+    # Нормализованные имя/username/email/реф. код для админ-поиска (см. app/utils/text_search.py);
+    # ведут хуки из app.database.crud.user
+    search_text = Column(Text, nullable=True)
     status = Column(String(20), default=UserStatus.ACTIVE.value)
     language = Column(String(5), default='ru')
     balance_kopeks = Column(Integer, default=0)
+    # Нарастающие итоги по завершённым оплатам подписок; ведут хуки Transaction из app.database.crud.user
+    total_spent_kopeks = Column(BigInteger, default=0, server_default='0', nullable=False)
+    purchase_count = Column(Integer, default=0, server_default='0', nullable=False)
+    last_purchase_at = Column(AwareDateTime(), nullable=True)
+    # Размер и траты всей реферальной ветки (все уровни); ведутся хуками по ReferralClosure
+    referral_branch_size = Column(Integer, default=0, server_default='0', nullable=False)
+    referral_branch_spent_kopeks = Column(BigInteger, default=0, server_default='0', nullable=False)
     used_promocodes = Column(Integer, default=0)
     has_had_paid_subscription = Column(Boolean, default=False, nullable=False)
     referred_by_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True)
@@ -2701,6 +2731,39 @@ class Transaction(Base):
         return self.amount_kopeks / 100
 
 
+class PaymentIndex(Base):
+    """Денормализованная строка платежа любого провайдера для поиска в админке.
+
+    Источник правды — таблицы провайдеров; строку ведут ORM-хуки моделей
+    провайдеров из ``app.database.crud.payment_index``, там же досинхронизация
+    массовых UPDATE/DELETE в обход ORM.
+    """
+
+    __tablename__ = 'payment_index'
+    __table_args__ = (
+        UniqueConstraint('method', 'local_id', name='uq_payment_index_method_local_id'),
+        Index('ix_payment_index_created_id', 'created_at', 'id'),
+        Index('ix_payment_index_status_created_id', 'status', 'created_at', 'id'),
+        Index('ix_payment_index_method_created_id', 'method', 'created_at', 'id'),
+        Index('ix_payment_index_user_created', 'user_id', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    method = Column(String(32), nullable=False)
+    local_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    amount_kopeks = Column(BigInteger, nullable=False, default=0)
+    # pending / paid / cancelled — см. crud.payment_index.classify_payment_status
+    status = Column(String(16), nullable=False)
+    provider_status = Column(String(64), nullable=True)
+    is_paid = Column(Boolean, nullable=False, default=False)
+    identifier = Column(String(255), nullable=True)
+    # Нормализованные (normalize_search_text) внешние номера через пробел — для поиска по счёту
+    external_ids = Column(Text, nullable=True)
+    created_at = Column(AwareDateTime(), nullable=False)
+    updated_at = Column(AwareDateTime(), default=func.now(), onupdate=func.now())
+
+
 class SubscriptionConversion(Base):
     __tablename__ = 'subscription_conversions'
     __table_args__ = (
@@ -2891,6 +2954,24 @@ class ReferralEarning(Base):
         return self.amount_kopeks / 100
 
 
+class ReferralClosure(Base):
+    """Транзитивное замыкание реферального дерева: строка на каждую пару «предок — потомок».
+
+    ``depth`` = 1 — прямой реферал, 2 — реферал реферала и т.д.; строк «сам себе»
+    нет. Таблицу и нарастающие итоги ``User.referral_branch_*`` ведут хуки
+    ``User`` из ``app.database.crud.referral_closure`` при регистрации, смене
+    реферера и удалении пользователя; там же досинхронизация массовых изменений
+    ``referred_by_id`` в обход ORM.
+    """
+
+    __tablename__ = 'referral_closure'
+    __table_args__ = (Index('ix_referral_closure_descendant_depth', 'descendant_id', 'depth'),)
+
+    ancestor_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+
 class WithdrawalRequestStatus(Enum):
     """Статусы заявки на вывод реферального баланса."""
 
@@ -3416,6 +3497,12 @@ class BroadcastHistory(Base):
     email_subject = Column(String(255), nullable=True)
     email_html_content = Column(Text, nullable=True)
 
+    # Продолжение Telegram-рассылки после рестарта: курсор — ключ последнего
+    # получателя, до которого включительно всё обработано (User.id для
+    # рассылок по сегменту), resume_state — кнопки, не хранящиеся в колонках.
+    resume_cursor = Column(BigInteger, nullable=True)
+    resume_state = Column(JSON, nullable=True)
+
     admin = relationship('User', back_populates='broadcasts')
 
 
@@ -4687,3 +4774,87 @@ class UserDeviceAlias(Base):
     alias = Column(String(64), nullable=False)
     created_at = Column(AwareDateTime(), server_default=func.now(), nullable=False)
     updated_at = Column(AwareDateTime(), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class DailyTransactionRollup(Base):
+    """Дневной агрегат завершённых транзакций по типу и способу оплаты.
+
+    Поддерживается ``stats_rollup_service``: дни, затронутые записью транзакций,
+    пересчитываются в фоне, ночной сверщик перепроверяет последние дни. Админ-
+    дашборд и статистика продаж читают эти строки вместо сканирования
+    ``transactions``. ``payment_method`` хранится как '' для NULL, потому что
+    входит в первичный ключ.
+    """
+
+    __tablename__ = 'daily_transaction_rollups'
+
+    day = Column(Date, primary_key=True)
+    type = Column(String(50), primary_key=True)
+    payment_method = Column(String(50), primary_key=True, default='')
+    transactions_count = Column(Integer, nullable=False, default=0)
+    amount_kopeks = Column(BigInteger, nullable=False, default=0)  # сумма модулей amount_kopeks
+    updated_at = Column(AwareDateTime(), server_default=func.now(), onupdate=func.now())
+
+
+class DailySubscriptionRollup(Base):
+    """Дневной агрегат регистраций, триалов и конверсий триал → платная."""
+
+    __tablename__ = 'daily_subscription_rollups'
+
+    day = Column(Date, primary_key=True)
+    registrations = Column(Integer, nullable=False, default=0)
+    trials_started = Column(Integer, nullable=False, default=0)  # подписки с is_trial, созданные в этот день
+    trial_conversions = Column(Integer, nullable=False, default=0)
+    updated_at = Column(AwareDateTime(), server_default=func.now(), onupdate=func.now())
+
+
+class RemnaWaveRetryItem(Base):
+    """Отложенная синхронизация подписки с панелью RemnaWave.
+
+    Очередь ``remnawave_retry_queue`` хранится здесь, чтобы переживать
+    рестарт процесса. Одна строка на подписку: повторные постановки в очередь
+    сливаются в неё, ``version`` растёт при каждой постановке, и воркер удаляет
+    строку после успеха, только если за время попытки её не поставили заново.
+    """
+
+    __tablename__ = 'remnawave_retry_items'
+    __table_args__ = (Index('ix_remnawave_retry_items_next_attempt', 'next_attempt_at'),)
+
+    subscription_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    action = Column(String(16), nullable=False, default='create')  # create | update
+    attempts = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=1)
+    next_attempt_at = Column(AwareDateTime(), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(AwareDateTime(), nullable=False, default=func.now())
+    updated_at = Column(AwareDateTime(), nullable=False, default=func.now(), onupdate=func.now())
+
+
+class PaymentWebhookInboxItem(Base):
+    """Принятый коллбек платёжного провайдера, ожидающий или прошедший обработку.
+
+    Вебхук сохраняет сюда проверенный payload до ответа 200, обрабатывают его
+    воркеры ``webhook_inbox_service``. Повторная доставка того же тела
+    отбрасывается по ``(provider, idempotency_key)``; после исчерпания попыток
+    строка остаётся в статусе ``failed`` до ручного повтора из админки.
+    """
+
+    __tablename__ = 'payment_webhook_inbox'
+    __table_args__ = (
+        UniqueConstraint('provider', 'idempotency_key', name='uq_payment_webhook_inbox_provider_key'),
+        Index('ix_payment_webhook_inbox_status_next_attempt', 'status', 'next_attempt_at'),
+        Index('ix_payment_webhook_inbox_provider_status', 'provider', 'status'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String(32), nullable=False)
+    handler = Column(String(64), nullable=False)  # метод PaymentService, обрабатывающий payload
+    idempotency_key = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(16), nullable=False, default='pending')  # pending | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(AwareDateTime(), nullable=False)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(AwareDateTime(), nullable=False, default=func.now())
+    processed_at = Column(AwareDateTime(), nullable=True)
@@ -3,10 +3,10 @@ import hmac
 import json
 from typing import Any
 
-import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -31,26 +31,25 @@ class CryptoBotService:
         headers = {'Crypto-Pay-API-Token': self.api_token, 'Content-Type': 'application/json'}
 
         try:
-            async with aiohttp.ClientSession() as session:
-                request_kwargs: dict[str, Any] = {'headers': headers}
-
-                if method.upper() == 'GET':
-                    if data:
-                        request_kwargs['params'] = data
-                elif data:
-                    request_kwargs['json'] = data
-
-                async with session.request(
-                    method,
-                    url,
-                    **request_kwargs,
-                ) as response:
-                    response_data = await response.json()
-
-                    if response.status == 200 and response_data.get('ok'):
-                        return response_data.get('result')
-                    logger.error('CryptoBot API ошибка', response_data=response_data)
-                    return None
+            request_kwargs: dict[str, Any] = {'headers': headers}
+
+            if method.upper() == 'GET':
+                if data:
+                    request_kwargs['params'] = data
+            elif data:
+                request_kwargs['json'] = data
+
+            async with http_transport.session('cryptobot').request(
+                method,
+                url,
+                **request_kwargs,
+            ) as response:
+                response_data = await response.json()
+
+                if response.status == 200 and response_data.get('ok'):
+                    return response_data.get('result')
+                logger.error('CryptoBot API ошибка', response_data=response_data)
+                return None
 
         except Exception as e:
             logger.error('Ошибка запроса к CryptoBot API', error=e)
@@ -102,7 +101,8 @@ class CryptoBotService:
             data['status'] = status
 
         if invoice_ids:
-            data['invoice_ids'] = invoice_ids
+            # API принимает список id одной строкой через запятую
+            data['invoice_ids'] = ','.join(str(invoice_id) for invoice_id in invoice_ids)
 
         result = await self._make_request('GET', 'getInvoices', data)
 
@@ -8,10 +8,10 @@ import hmac
 import json
 from typing import Any
 
-import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -81,16 +81,12 @@ class HeleketService:
         }
 
         try:
-            timeout = aiohttp.ClientTimeout(total=30)
-            async with (
-                aiohttp.ClientSession(timeout=timeout) as session,
-                session.post(
-                    url,
-                    data=body.encode('utf-8'),
-                    headers=headers,
-                    params=params,
-                ) as response,
-            ):
+            async with http_transport.session('heleket').post(
+                url,
+                data=body.encode('utf-8'),
+                headers=headers,
+                params=params,
+            ) as response:
                 text = await response.text()
                 if response.content_type != 'application/json':
                     logger.error('Ответ Heleket не JSON', content_type=response.content_type, text=text)
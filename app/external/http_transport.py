@@ -0,0 +1,320 @@
+"""Общий исходящий HTTP-транспорт платёжных шлюзов и внешних API.
+
+Раньше каждый клиент провайдера создавал свой `aiohttp.ClientSession` — чаще
+всего на каждый запрос, — со своими таймаутами и без общих соединений: каждый
+вызов шлюза платил TCP+TLS handshake, а лежащий провайдер отвечал таймаутом на
+каждую проверку платежа.
+
+Транспорт держит один `TCPConnector` (keep-alive пулы по хостам, DNS-кэш) и по
+долгоживущей сессии на провайдера поверх него. Клиенты берут сессию через
+`http_transport.session('<provider>')` и работают с ней как с обычной сессией
+aiohttp, но не закрывают её. Клиентский middleware сессии добавляет:
+
+* единые таймауты HTTP_TRANSPORT_* (запрос может переопределить свои);
+* повтор запроса, который не дошёл до провайдера (ошибка соединения), а для
+  идемпотентных методов — ещё и обрыва/таймаута чтения и ответов 502/503/504;
+  неидемпотентный POST после отправки не повторяется, чтобы не создать счёт
+  дважды;
+* circuit breaker на провайдера: после HTTP_TRANSPORT_BREAKER_FAILURES
+  ошибок подряд запросы сразу получают `CircuitOpenError` (наследник
+  `aiohttp.ClientConnectionError`, так что существующие `except
+  aiohttp.ClientError` его ловят), через HTTP_TRANSPORT_BREAKER_COOLDOWN_SECONDS
+  пропускается пробный запрос;
+* гистограммы задержки до заголовков ответа и счётчики ошибок по
+  провайдеру и эндпоинту — `get_stats()`, отдаётся в /health.
+
+Как и пул RemnaWave, транспорт привязан к event loop'у: при смене loop'а
+старые сессии забываются. На shutdown `main.py` вызывает `close()`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import aiohttp
+import structlog
+
+from app.config import settings
+
+
+logger = structlog.get_logger(__name__)
+
+# Верхние границы корзин гистограммы задержки, мс; последняя корзина — всё, что дольше.
+LATENCY_BUCKETS_MS: tuple[int, ...] = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+_RETRYABLE_STATUSES = frozenset({502, 503, 504})
+# Сегменты пути, похожие на идентификатор счёта, схлопываются, чтобы эндпоинтов было конечное число
+_ID_SEGMENT_RE = re.compile(r'^(?=.*\d)[\w-]{6,}$|^[0-9a-fA-F-]{16,}$')
+
+
+class CircuitOpenError(aiohttp.ClientConnectionError):
+    """Провайдер временно отключён circuit breaker'ом — запрос не отправлялся."""
+
+    def __init__(self, provider: str, retry_in: float) -> None:
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(f'Circuit for {provider} is open, retry in {retry_in:.0f}s')
+
+
+def endpoint_label(method: str, path: str) -> str:
+    segments = ['{id}' if _ID_SEGMENT_RE.match(segment) else segment for segment in path.split('/')]
+    return f'{method.upper()} {"/".join(segments) or "/"}'
+
+
+@dataclass
+class _EndpointStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_ms: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    def observe(self, elapsed_ms: float, *, failed: bool) -> None:
+        self.requests += 1
+        self.total_ms += elapsed_ms
+        if failed:
+            self.errors += 1
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile_ms(self, quantile: float) -> int | None:
+        """Оценка квантиля сверху — граница корзины, в которую он попал."""
+        if not self.requests:
+            return None
+        rank = quantile * self.requests
+        seen = 0
+        for index, count in enumerate(self.buckets[:-1]):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[index]
+        return None  # дольше последней границы
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': round(self.total_ms / self.requests, 1) if self.requests else None,
+            'p50_ms': self.quantile_ms(0.5),
+            'p95_ms': self.quantile_ms(0.95),
+            'buckets_ms': dict(zip([*map(str, LATENCY_BUCKETS_MS), 'inf'], self.buckets, strict=True)),
+        }
+
+
+class _CircuitBreaker:
+    """closed → (N ошибок подряд) → open → (cooldown) → half-open: один пробный запрос."""
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.opened_total = 0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self._cooldown_left() <= 0 else 'open'
+
+    def _cooldown_left(self) -> float:
+        return self.opened_at + settings.HTTP_TRANSPORT_BREAKER_COOLDOWN_SECONDS - time.monotonic()
+
+    def before_request(self, provider: str) -> None:
+        if self.opened_at is None:
+            return
+        cooldown_left = self._cooldown_left()
+        if cooldown_left > 0 or self._probe_in_flight:
+            raise CircuitOpenError(provider, max(0.0, cooldown_left))
+        self._probe_in_flight = True
+
+    def release_probe(self) -> None:
+        self._probe_in_flight = False
+
+    def record(self, provider: str, *, failed: bool) -> None:
+        self.release_probe()
+        if not failed:
+            if self.opened_at is not None:
+                logger.info('Провайдер снова отвечает, circuit breaker закрыт', provider=provider)
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        threshold = max(1, settings.HTTP_TRANSPORT_BREAKER_FAILURES)
+        if self.opened_at is not None or self.failures >= threshold:
+            if self.opened_at is None:
+                self.opened_total += 1
+                logger.warning(
+                    'Провайдер не отвечает, запросы к нему приостановлены',
+                    provider=provider,
+                    failures=self.failures,
+                    cooldown_seconds=settings.HTTP_TRANSPORT_BREAKER_COOLDOWN_SECONDS,
+                )
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class _ProviderState:
+    breaker: _CircuitBreaker = field(default_factory=_CircuitBreaker)
+    endpoints: dict[str, _EndpointStats] = field(default_factory=dict)
+
+    def endpoint(self, label: str) -> _EndpointStats:
+        stats = self.endpoints.get(label)
+        if stats is None:
+            stats = self.endpoints[label] = _EndpointStats()
+        return stats
+
+
+@dataclass
+class _LoopPool:
+    loop: asyncio.AbstractEventLoop
+    connector: aiohttp.TCPConnector
+    sessions: dict[str, aiohttp.ClientSession] = field(default_factory=dict)
+
+
+def retry_delay_seconds(attempt: int) -> float:
+    base = max(0.0, settings.HTTP_TRANSPORT_RETRY_BASE_DELAY)
+    return base * 2 ** (attempt - 1) + random.uniform(0, base)
+
+
+class HttpTransport:
+    """Реестр долгоживущих сессий aiohttp по провайдерам поверх общего коннектора."""
+
+    def __init__(self) -> None:
+        self._pool: _LoopPool | None = None
+        self._providers: dict[str, _ProviderState] = {}
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            state = self._providers[provider] = _ProviderState()
+        return state
+
+    @staticmethod
+    def _create_connector() -> aiohttp.TCPConnector:
+        limit = max(1, settings.HTTP_TRANSPORT_POOL_LIMIT)
+        return aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=max(1, min(settings.HTTP_TRANSPORT_POOL_LIMIT_PER_HOST, limit)),
+            ttl_dns_cache=settings.HTTP_TRANSPORT_DNS_CACHE_TTL,
+            keepalive_timeout=settings.HTTP_TRANSPORT_KEEPALIVE_TIMEOUT,
+        )
+
+    @staticmethod
+    def default_timeout() -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=settings.HTTP_TRANSPORT_TOTAL_TIMEOUT,
+            connect=settings.HTTP_TRANSPORT_CONNECT_TIMEOUT,
+            sock_read=settings.HTTP_TRANSPORT_READ_TIMEOUT,
+        )
+
+    def session(self, provider: str, *, max_retries: int | None = None) -> aiohttp.ClientSession:
+        """Общая сессия провайдера; вызывающий её не закрывает.
+
+        ``max_retries`` задаёт свою политику повторов для клиентов, которые уже
+        повторяют запросы сами (``0`` — без повторов транспорта); учитывается при
+        создании сессии провайдера.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        if pool is None or pool.loop is not loop or pool.connector.closed:
+            # Сессии чужого loop'а закрыть корректно уже нельзя — просто забываем.
+            pool = self._pool = _LoopPool(loop=loop, connector=self._create_connector())
+
+        session = pool.sessions.get(provider)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=pool.connector,
+                connector_owner=False,
+                timeout=self.default_timeout(),
+                middlewares=(self._build_middleware(provider, max_retries),),
+            )
+            pool.sessions[provider] = session
+        return session
+
+    def _build_middleware(self, provider: str, max_retries: int | None) -> aiohttp.ClientMiddlewareType:
+        state = self._state(provider)
+
+        async def middleware(request: aiohttp.ClientRequest, handler: aiohttp.ClientHandlerType):
+            retries = settings.HTTP_TRANSPORT_MAX_RETRIES if max_retries is None else max_retries
+            idempotent = request.method.upper() in _IDEMPOTENT_METHODS
+            stats = state.endpoint(endpoint_label(request.method, request.url.path))
+            attempt = 0
+            while True:
+                attempt += 1
+                state.breaker.before_request(provider)
+                started = time.perf_counter()
+                try:
+                    response = await handler(request)
+                except aiohttp.ClientConnectionError as error:
+                    stats.observe((time.perf_counter() - started) * 1000, failed=True)
+                    state.breaker.record(provider, failed=True)
+                    # Ошибка соединения — запрос до провайдера не дошёл, повторить можно любой
+                    not_sent = isinstance(error, aiohttp.ClientConnectorError | aiohttp.ConnectionTimeoutError)
+                    if attempt > retries or not (not_sent or idempotent):
+                        raise
+                    logger.debug('Повтор запроса к провайдеру', provider=provider, attempt=attempt, error=error)
+                except BaseException:
+                    # Отмена или общий таймаут запроса — ответа не было, но и провайдер не виноват
+                    state.breaker.release_probe()
+                    raise
+                else:
+                    failed = response.status >= 500
+                    stats.observe((time.perf_counter() - started) * 1000, failed=failed)
+                    state.breaker.record(provider, failed=failed)
+                    if not (idempotent and response.status in _RETRYABLE_STATUSES and attempt <= retries):
+                        return response
+                    response.release()
+                    logger.debug(
+                        'Повтор запроса к провайдеру', provider=provider, attempt=attempt, status=response.status
+                    )
+                stats.retries += 1
+                await asyncio.sleep(retry_delay_seconds(attempt))
+
+        return middleware
+
+    async def close(self) -> None:
+        """Закрывает все сессии и коннектор (вызывается на shutdown)."""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if pool.loop is not loop:
+            return
+        for provider, session in pool.sessions.items():
+            try:
+                await session.close()
+            except Exception as error:
+                logger.warning('Ошибка закрытия HTTP-сессии провайдера', provider=provider, error=error)
+        await pool.connector.close()
+
+    def get_stats(self) -> dict[str, Any]:
+        pool = self._pool
+        return {
+            'sessions': len(pool.sessions) if pool else 0,
+            'limit': settings.HTTP_TRANSPORT_POOL_LIMIT,
+            'limit_per_host': settings.HTTP_TRANSPORT_POOL_LIMIT_PER_HOST,
+            'providers': {
+                provider: {
+                    'circuit': state.breaker.state,
+                    'consecutive_failures': state.breaker.failures,
+                    'circuit_opened_total': state.breaker.opened_total,
+                    'endpoints': {label: stats.as_dict() for label, stats in state.endpoints.items()},
+                }
+                for provider, state in self._providers.items()
+            },
+        }
+
+
+http_transport = HttpTransport()
@@ -12,6 +12,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -79,19 +80,15 @@ class Pal24Client:
             'Accept': 'application/json',
         }
 
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
-
         try:
-            async with (
-                aiohttp.ClientSession(timeout=timeout) as session,
-                session.request(
-                    method,
-                    url,
-                    headers=headers,
-                    json=json_payload,
-                    params=params,
-                ) as response,
-            ):
+            async with http_transport.session('pal24').request(
+                method,
+                url,
+                headers=headers,
+                json=json_payload,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as response:
                 status = response.status
                 try:
                     payload = await response.json(content_type=None)
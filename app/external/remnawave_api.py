@@ -15,6 +15,7 @@ from Crypto.Cipher import PKCS1_v1_5
 from Crypto.PublicKey import RSA
 
 from app.config import settings
+from app.external.remnawave_session_pool import remnawave_session_pool
 
 
 logger = structlog.get_logger(__name__)
@@ -339,8 +340,8 @@ HAPP_CRYPTO_API_CACHE_MAX = 512
 
 class RemnaWaveAPI:
     # Remnawave 2.8.0 удалил POST /api/system/tools/happ/encrypt (панель теперь
-    # генерирует crypt-ссылки на клиенте своего subpage). Клиент создаётся на каждый
-    # запрос, поэтому состояние happ-шифрования держим на классе (сбрасывается рестартом):
+    # генерирует crypt-ссылки на клиенте своего subpage). Экземпляр клиента создаётся на
+    # каждый запрос (HTTP-сессия при этом общая — см. remnawave_session_pool), поэтому состояние happ-шифрования держим на классе (сбрасывается рестартом):
     #  - _happ_encrypt_unavailable: после первого 404 не дёргаем удалённый эндпоинт
     #    (иначе 404 + warning на каждый вызов get_subscription_info/enrich_user_with_happ_link);
     #  - _happ_api_disabled_until: monotonic-метка охлаждения официального Happ API после
@@ -378,6 +379,8 @@ class RemnaWaveAPI:
         self.caddy_token = caddy_token
         self.auth_type = auth_type.lower() if auth_type else 'api_key'
         self.session: aiohttp.ClientSession | None = None
+        self._pool_key: tuple | None = None
+        self._pool_leases = 0
         self.authenticated = False
 
     def _detect_connection_type(self) -> str:
@@ -446,22 +449,35 @@ class RemnaWaveAPI:
                 cookies = {self.secret_key: self.secret_key}
                 logger.debug('Используем куки: =***', secret_key=self.secret_key)
 
-        connector_kwargs = {}
+        verify_ssl = True
 
         if conn_type == 'local':
             logger.debug('Используют локальные заголовки proxy')
             headers.update({'X-Forwarded-Host': 'localhost', 'Host': 'localhost'})
 
             if self.base_url.startswith('https://'):
-                ssl_context = ssl.create_default_context()
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
-                connector_kwargs['ssl'] = ssl_context
+                verify_ssl = False
                 logger.debug('SSL проверка отключена для локального HTTPS')
 
         elif conn_type == 'external':
             logger.debug('Используют внешнее подключение с полной SSL проверкой')
 
+        if remnawave_session_pool.is_enabled():
+            # Общая keep-alive сессия пула: «аренда» без TCP+TLS handshake.
+            self._pool_key, self.session = await remnawave_session_pool.acquire(
+                self.base_url, headers, cookies, verify_ssl
+            )
+            self._pool_leases += 1
+            self.authenticated = True
+            return self
+
+        connector_kwargs = {}
+        if not verify_ssl:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            connector_kwargs['ssl'] = ssl_context
+
         connector = aiohttp.TCPConnector(**connector_kwargs)
 
         session_kwargs = {
@@ -482,6 +498,12 @@ class RemnaWaveAPI:
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._pool_leases > 0:
+            # Пуловую сессию не закрываем — только возвращаем аренду. Счётчик на
+            # экземпляре: один клиент бывает общим для параллельных `async with`.
+            self._pool_leases -= 1
+            await remnawave_session_pool.release(self._pool_key)
+            return
         if self.session:
             await self.session.close()
 
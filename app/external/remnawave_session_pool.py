@@ -0,0 +1,248 @@
+"""Общий пул HTTP-соединений к панели RemnaWave.
+
+Раньше каждый `async with RemnaWaveAPI(...)` создавал свой `TCPConnector` +
+`ClientSession` и закрывал их на выходе — каждый вызов панели платил полный
+TCP+TLS handshake. Пул держит одну долгоживущую keep-alive сессию на
+конфигурацию подключения (URL + заголовки авторизации + куки + режим SSL),
+а `RemnaWaveAPI.__aenter__` лишь берёт её в «аренду» (счётчик, без I/O).
+
+Сессия привязана к event loop'у: если loop сменился (тесты, пересоздание
+приложения), старая запись выбрасывается и создаётся новая. Смена настроек
+панели в админке даёт новый ключ — сессии старого ключа закрываются, как
+только их никто не арендует. На shutdown `main.py` вызывает `close()`.
+
+HTTP/1.1 pipelining aiohttp не поддерживает, поэтому выигрыш достигается
+переиспользованием keep-alive соединений и DNS-кэшем коннектора.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ssl
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+import aiohttp
+import structlog
+
+from app.config import settings
+
+
+logger = structlog.get_logger(__name__)
+
+# Окно, по которому считается handshakes/sec в метриках.
+_HANDSHAKE_RATE_WINDOW_SECONDS = 60.0
+
+
+@dataclass
+class _PoolEntry:
+    session: aiohttp.ClientSession
+    connector: aiohttp.TCPConnector
+    loop: asyncio.AbstractEventLoop
+    in_use: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class RemnaWaveSessionPool:
+    """Процессный пул keep-alive сессий aiohttp к панели RemnaWave."""
+
+    def __init__(self) -> None:
+        self._entries: dict[tuple, _PoolEntry] = {}
+        self._current_key: tuple | None = None
+        self._handshakes: deque[float] = deque()
+        self._handshakes_total = 0
+        self._reused_total = 0
+        self._leases_total = 0
+        self._closed_stale = 0
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.REMNAWAVE_API_POOL_ENABLED)
+
+    @staticmethod
+    def _build_key(
+        base_url: str,
+        headers: dict[str, str],
+        cookies: dict[str, str] | None,
+        verify_ssl: bool,
+    ) -> tuple:
+        return (
+            base_url,
+            tuple(sorted(headers.items())),
+            tuple(sorted((cookies or {}).items())),
+            verify_ssl,
+        )
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params) -> None:
+            now = time.monotonic()
+            self._handshakes.append(now)
+            self._handshakes_total += 1
+            self._trim_handshakes(now)
+
+        async def on_connection_reuseconn(session, context, params) -> None:
+            self._reused_total += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _trim_handshakes(self, now: float) -> None:
+        border = now - _HANDSHAKE_RATE_WINDOW_SECONDS
+        while self._handshakes and self._handshakes[0] < border:
+            self._handshakes.popleft()
+
+    def _create_entry(
+        self,
+        headers: dict[str, str],
+        cookies: dict[str, str] | None,
+        verify_ssl: bool,
+        loop: asyncio.AbstractEventLoop,
+    ) -> _PoolEntry:
+        connector_kwargs: dict[str, Any] = {
+            'limit': settings.get_remnawave_api_pool_limit(),
+            'limit_per_host': settings.get_remnawave_api_pool_limit_per_host(),
+            'ttl_dns_cache': settings.get_remnawave_api_dns_cache_ttl(),
+            'keepalive_timeout': settings.get_remnawave_api_keepalive_timeout(),
+        }
+        if not verify_ssl:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            connector_kwargs['ssl'] = ssl_context
+
+        connector = aiohttp.TCPConnector(**connector_kwargs)
+        session_kwargs: dict[str, Any] = {
+            'timeout': aiohttp.ClientTimeout(
+                total=settings.REMNAWAVE_API_TOTAL_TIMEOUT,
+                connect=settings.REMNAWAVE_API_CONNECT_TIMEOUT,
+            ),
+            'headers': headers,
+            'connector': connector,
+            'trace_configs': [self._build_trace_config()],
+        }
+        if cookies:
+            session_kwargs['cookies'] = cookies
+
+        session = aiohttp.ClientSession(**session_kwargs)
+        logger.debug(
+            'Создана пуловая сессия RemnaWave',
+            limit=connector_kwargs['limit'],
+            limit_per_host=connector_kwargs['limit_per_host'],
+        )
+        return _PoolEntry(session=session, connector=connector, loop=loop)
+
+    async def acquire(
+        self,
+        base_url: str,
+        headers: dict[str, str],
+        cookies: dict[str, str] | None,
+        verify_ssl: bool,
+    ) -> tuple[tuple, aiohttp.ClientSession]:
+        """Выдаёт общую сессию для конфигурации и увеличивает счётчик аренды."""
+        loop = asyncio.get_running_loop()
+        key = self._build_key(base_url, headers, cookies, verify_ssl)
+
+        entry = self._entries.get(key)
+        if entry is not None and (entry.session.closed or entry.loop is not loop):
+            # Сессию чужого loop'а закрыть корректно уже нельзя — просто забываем.
+            if entry.loop is loop:
+                await entry.session.close()
+            self._entries.pop(key, None)
+            entry = None
+
+        if entry is None:
+            await self._close_stale_entries(keep_key=key, loop=loop)
+            entry = self._create_entry(headers, cookies, verify_ssl, loop)
+            self._entries[key] = entry
+        self._current_key = key
+
+        entry.in_use += 1
+        self._leases_total += 1
+        return key, entry.session
+
+    async def release(self, key: tuple) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.in_use = max(0, entry.in_use - 1)
+        if entry.in_use == 0 and key != self._current_key:
+            # Последний арендатор устаревшей конфигурации — закрываем её сессию.
+            self._entries.pop(key, None)
+            self._closed_stale += 1
+            if not entry.session.closed and entry.loop is asyncio.get_running_loop():
+                await entry.session.close()
+
+    async def _close_stale_entries(self, keep_key: tuple, loop: asyncio.AbstractEventLoop) -> None:
+        """Закрывает сессии прежних конфигураций, которые сейчас никто не арендует."""
+        for key, entry in list(self._entries.items()):
+            if key == keep_key or entry.in_use > 0:
+                continue
+            self._entries.pop(key, None)
+            self._closed_stale += 1
+            if entry.loop is loop and not entry.session.closed:
+                try:
+                    await entry.session.close()
+                except Exception as error:
+                    logger.warning('Не удалось закрыть устаревшую сессию RemnaWave', error=error)
+
+    async def close(self) -> None:
+        """Закрывает все сессии пула (вызывается на shutdown)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        entries = list(self._entries.values())
+        self._entries.clear()
+        self._current_key = None
+        for entry in entries:
+            if entry.session.closed or entry.loop is not loop:
+                continue
+            try:
+                await entry.session.close()
+            except Exception as error:
+                logger.warning('Ошибка закрытия пуловой сессии RemnaWave', error=error)
+
+    @staticmethod
+    def _count_idle_connections(connector: aiohttp.TCPConnector) -> int:
+        # Публичного API для числа простаивающих соединений у aiohttp нет.
+        conns = getattr(connector, '_conns', None) or {}
+        try:
+            return sum(len(items) for items in conns.values())
+        except Exception:
+            return 0
+
+    def get_stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        self._trim_handshakes(now)
+        in_use = 0
+        idle = 0
+        sessions = 0
+        for entry in self._entries.values():
+            if entry.session.closed:
+                continue
+            sessions += 1
+            in_use += entry.in_use
+            idle += self._count_idle_connections(entry.connector)
+
+        return {
+            'enabled': self.is_enabled(),
+            'sessions': sessions,
+            'leases_in_use': in_use,
+            'idle_connections': idle,
+            'limit': settings.get_remnawave_api_pool_limit(),
+            'limit_per_host': settings.get_remnawave_api_pool_limit_per_host(),
+            'handshakes_total': self._handshakes_total,
+            'handshakes_per_sec': round(len(self._handshakes) / _HANDSHAKE_RATE_WINDOW_SECONDS, 3),
+            'reused_connections_total': self._reused_total,
+            'leases_total': self._leases_total,
+            'stale_sessions_closed': self._closed_stale,
+        }
+
+
+remnawave_session_pool = RemnaWaveSessionPool()
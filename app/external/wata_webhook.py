@@ -15,6 +15,7 @@ from cryptography.hazmat.primitives.asymmetric import padding
 
 from app.config import settings
 from app.database.database import AsyncSessionLocal
+from app.external.http_transport import http_transport
 from app.services.payment_service import PaymentService
 
 
@@ -64,7 +65,7 @@ class WataPublicKeyProvider:
         timeout = aiohttp.ClientTimeout(total=settings.WATA_REQUEST_TIMEOUT)
 
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session, session.get(url) as response:
+            async with http_transport.session('wata').get(url, timeout=timeout) as response:
                 text = await response.text()
                 if response.status >= 400:
                     logger.error('Ошибка получения публичного ключа WATA', response_status=response.status, text=text)
@@ -1,5 +1,6 @@
 import asyncio
 import html
+from collections.abc import Callable
 from datetime import UTC, datetime, timedelta
 
 import structlog
@@ -9,6 +10,7 @@ from aiogram.fsm.context import FSMContext
 from sqlalchemy import and_, func, or_, select
 from sqlalchemy.exc import InterfaceError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.config import settings
 from app.database.crud.subscription import get_expiring_subscriptions
@@ -1803,148 +1805,72 @@ async def get_target_users_count(db: AsyncSession, target: str) -> int:
     return 0
 
 
-async def get_target_users(db: AsyncSession, target: str) -> list:
-    # Загружаем всех активных пользователей батчами, чтобы не ограничиваться 10к
-    users: list[User] = []
-    offset = 0
-    batch_size = 5000
+_EXPIRING_TARGET_DAYS = {'expiring': 3, 'expiring_subscribers': 7}
 
-    while True:
-        batch = await get_users_list(
-            db,
-            offset=offset,
-            limit=batch_size,
-            status=UserStatus.ACTIVE,
-        )
 
-        if not batch:
-            break
+def _subs(user: User) -> list[Subscription]:
+    return getattr(user, 'subscriptions', None) or []
 
-        users.extend(batch)
-        offset += batch_size
+
+def _is_expired_subscriber(user: User, now: datetime) -> bool:
+    expired_statuses = {
+        SubscriptionStatus.EXPIRED.value,
+        SubscriptionStatus.DISABLED.value,
+    }
+    subs = _subs(user)
+    if subs:
+        if any(s.is_active for s in subs):
+            return False  # Skip users who have at least one active subscription
+        return any(s.status in expired_statuses or (s.end_date <= now and not s.is_active) for s in subs)
+    return bool(user.has_had_paid_subscription)
+
+
+async def _build_target_user_filter(db: AsyncSession, target: str) -> Callable[[User], bool] | None:
+    """Предикат отбора активного пользователя (с загруженными подписками) под target.
+
+    None — target не фильтрует по пользователям (неизвестный или expiring-сегмент,
+    который строится от подписок).
+    """
+    now = datetime.now(UTC)
 
     if target == 'all':
-        return users
+        return lambda user: True
 
     if target == 'active':
-        return [
-            user
-            for user in users
-            if any(s.is_active and not s.is_trial for s in (getattr(user, 'subscriptions', None) or []))
-        ]
+        return lambda user: any(s.is_active and not s.is_trial for s in _subs(user))
 
     if target == 'trial':
-        return [user for user in users if any(s.is_trial for s in (getattr(user, 'subscriptions', None) or []))]
+        return lambda user: any(s.is_trial for s in _subs(user))
 
     if target == 'no':
-        return [user for user in users if not any(s.is_active for s in (getattr(user, 'subscriptions', None) or []))]
-
-    if target == 'expiring':
-        expiring_subs = await get_expiring_subscriptions(db, 3)
-        return [sub.user for sub in expiring_subs if sub.user]
+        return lambda user: not any(s.is_active for s in _subs(user))
 
-    if target == 'expired':
-        now = datetime.now(UTC)
-        expired_statuses = {
-            SubscriptionStatus.EXPIRED.value,
-            SubscriptionStatus.DISABLED.value,
-        }
-        expired_users = []
-        for user in users:
-            subs = getattr(user, 'subscriptions', None) or []
-            if subs:
-                has_active = any(s.is_active for s in subs)
-                if has_active:
-                    continue  # Skip users who have at least one active subscription
-                has_expired = any(s.status in expired_statuses or (s.end_date <= now and not s.is_active) for s in subs)
-                if has_expired:
-                    expired_users.append(user)
-            elif user.has_had_paid_subscription:
-                expired_users.append(user)
-        return expired_users
+    if target in ('expired', 'expired_subscribers'):
+        return lambda user: _is_expired_subscriber(user, now)
 
     if target == 'active_zero':
-        return [
-            user
-            for user in users
-            if any(
-                not s.is_trial and s.is_active and (s.traffic_used_gb or 0) <= 0
-                for s in (getattr(user, 'subscriptions', None) or [])
-            )
-        ]
+        return lambda user: any(not s.is_trial and s.is_active and (s.traffic_used_gb or 0) <= 0 for s in _subs(user))
 
     if target == 'trial_zero':
-        return [
-            user
-            for user in users
-            if any(
-                s.is_trial and s.is_active and (s.traffic_used_gb or 0) <= 0
-                for s in (getattr(user, 'subscriptions', None) or [])
-            )
-        ]
+        return lambda user: any(s.is_trial and s.is_active and (s.traffic_used_gb or 0) <= 0 for s in _subs(user))
 
     if target == 'zero':
-        return [
-            user
-            for user in users
-            if any(s.is_active and (s.traffic_used_gb or 0) <= 0 for s in (getattr(user, 'subscriptions', None) or []))
-        ]
-
-    if target == 'expiring_subscribers':
-        expiring_subs = await get_expiring_subscriptions(db, 7)
-        return [sub.user for sub in expiring_subs if sub.user]
-
-    if target == 'expired_subscribers':
-        now = datetime.now(UTC)
-        expired_statuses = {
-            SubscriptionStatus.EXPIRED.value,
-            SubscriptionStatus.DISABLED.value,
-        }
-        expired_users = []
-        for user in users:
-            subs = getattr(user, 'subscriptions', None) or []
-            if subs:
-                has_active = any(s.is_active for s in subs)
-                if has_active:
-                    continue  # Skip users who have at least one active subscription
-                has_expired = any(s.status in expired_statuses or (s.end_date <= now and not s.is_active) for s in subs)
-                if has_expired:
-                    expired_users.append(user)
-            elif user.has_had_paid_subscription:
-                expired_users.append(user)
-        return expired_users
+        return lambda user: any(s.is_active and (s.traffic_used_gb or 0) <= 0 for s in _subs(user))
 
     if target == 'canceled_subscribers':
-        return [
-            user
-            for user in users
-            if any(s.status == SubscriptionStatus.DISABLED.value for s in (getattr(user, 'subscriptions', None) or []))
-        ]
+        return lambda user: any(s.status == SubscriptionStatus.DISABLED.value for s in _subs(user))
 
     if target == 'trial_ending':
-        now = datetime.now(UTC)
         in_3_days = now + timedelta(days=TRIAL_ENDING_DAYS)
-        return [
-            user
-            for user in users
-            if any(
-                s.is_trial and s.is_active and s.end_date <= in_3_days
-                for s in (getattr(user, 'subscriptions', None) or [])
-            )
-        ]
+        return lambda user: any(s.is_trial and s.is_active and s.end_date <= in_3_days for s in _subs(user))
 
     if target == 'trial_expired':
-        now = datetime.now(UTC)
-        return [
-            user
-            for user in users
-            if any(s.is_trial and s.end_date <= now for s in (getattr(user, 'subscriptions', None) or []))
-        ]
+        return lambda user: any(s.is_trial and s.end_date <= now for s in _subs(user))
 
     if target == 'autopay_failed':
         from app.database.models import SubscriptionEvent
 
-        week_ago = datetime.now(UTC) - timedelta(days=AUTOPAY_FAILED_WINDOW_DAYS)
+        week_ago = now - timedelta(days=AUTOPAY_FAILED_WINDOW_DAYS)
         stmt = (
             select(SubscriptionEvent.user_id)
             .where(
@@ -1957,61 +1883,139 @@ async def get_target_users(db: AsyncSession, target: str) -> list:
         )
         result = await db.execute(stmt)
         failed_user_ids = set(result.scalars().all())
-        return [user for user in users if user.id in failed_user_ids]
+        return lambda user: user.id in failed_user_ids
 
     if target == 'low_balance':
         threshold_kopeks = LOW_BALANCE_THRESHOLD_KOPEKS
-        return [
-            user for user in users if (user.balance_kopeks or 0) < threshold_kopeks and (user.balance_kopeks or 0) > 0
-        ]
+        return lambda user: 0 < (user.balance_kopeks or 0) < threshold_kopeks
 
     if target in INACTIVE_TARGET_DAYS:
-        threshold = datetime.now(UTC) - timedelta(days=INACTIVE_TARGET_DAYS[target])
-        return [user for user in users if user.last_activity and user.last_activity < threshold]
+        threshold = now - timedelta(days=INACTIVE_TARGET_DAYS[target])
+        return lambda user: bool(user.last_activity and user.last_activity < threshold)
 
     # Фильтр по тарифу
     if target.startswith('tariff_'):
         tariff_id = int(target.split('_')[1])
-        return [
-            user
-            for user in users
-            if any(s.is_active and s.tariff_id == tariff_id for s in (getattr(user, 'subscriptions', None) or []))
-        ]
+        return lambda user: any(s.is_active and s.tariff_id == tariff_id for s in _subs(user))
 
-    return []
+    return None
 
 
-async def get_custom_users_count(db: AsyncSession, criteria: str) -> int:
-    users = await get_custom_users(db, criteria)
-    return len(users)
+async def get_target_users(db: AsyncSession, target: str) -> list:
+    if target in _EXPIRING_TARGET_DAYS:
+        expiring_subs = await get_expiring_subscriptions(db, _EXPIRING_TARGET_DAYS[target])
+        return [sub.user for sub in expiring_subs if sub.user]
+
+    user_filter = await _build_target_user_filter(db, target)
+    if user_filter is None:
+        return []
 
+    # Загружаем всех активных пользователей батчами, чтобы не ограничиваться 10к
+    users: list[User] = []
+    offset = 0
+    batch_size = 5000
 
-async def get_custom_users(db: AsyncSession, criteria: str) -> list:
+    while True:
+        batch = await get_users_list(
+            db,
+            offset=offset,
+            limit=batch_size,
+            status=UserStatus.ACTIVE,
+        )
+
+        if not batch:
+            break
+
+        users.extend(batch)
+        offset += batch_size
+
+    return [user for user in users if user_filter(user)]
+
+
+async def fetch_broadcast_recipients_page(
+    db: AsyncSession,
+    target: str,
+    *,
+    after_user_id: int = 0,
+    limit: int = 1000,
+) -> tuple[list[User], int | None]:
+    """Одна страница получателей рассылки по keyset (User.id > after_user_id).
+
+    Возвращает отобранных пользователей страницы (по возрастанию id) и курсор
+    следующей страницы — id последнего просмотренного пользователя, либо None,
+    если выборка исчерпана. Курсор двигается и по отсеянным фильтром
+    пользователям, так что рассылку можно продолжить с него после рестарта.
+    """
+    if target in _EXPIRING_TARGET_DAYS:
+        # Сегмент строится от подписок и невелик — режем его по id в памяти.
+        expiring_subs = await get_expiring_subscriptions(db, _EXPIRING_TARGET_DAYS[target])
+        by_id = {sub.user.id: sub.user for sub in expiring_subs if sub.user and sub.user.id > after_user_id}
+        page = [by_id[user_id] for user_id in sorted(by_id)[:limit]]
+        next_cursor = page[-1].id if len(by_id) > limit else None
+        return page, next_cursor
+
+    if target.startswith('custom_'):
+        condition = _custom_users_condition(target[len('custom_') :])
+        user_filter = None
+        options = ()
+    else:
+        condition = User.status == UserStatus.ACTIVE.value
+        user_filter = await _build_target_user_filter(db, target)
+        options = (selectinload(User.subscriptions).selectinload(Subscription.tariff),)
+        if user_filter is None:
+            return [], None
+    if condition is None:
+        return [], None
+
+    stmt = select(User).options(*options).where(condition, User.id > after_user_id).order_by(User.id).limit(limit)
+    scanned = list((await db.execute(stmt)).scalars().all())
+    if not scanned:
+        return [], None
+
+    page = [user for user in scanned if user_filter(user)] if user_filter else scanned
+    next_cursor = scanned[-1].id if len(scanned) == limit else None
+    return page, next_cursor
+
+
+def _custom_users_condition(criteria: str):
     now = datetime.now(UTC)
     today = now.replace(hour=0, minute=0, second=0, microsecond=0)
     week_ago = now - timedelta(days=7)
     month_ago = now - timedelta(days=30)
 
     if criteria == 'today':
-        stmt = select(User).where(and_(User.status == 'active', User.created_at >= today))
-    elif criteria == 'week':
-        stmt = select(User).where(and_(User.status == 'active', User.created_at >= week_ago))
-    elif criteria == 'month':
-        stmt = select(User).where(and_(User.status == 'active', User.created_at >= month_ago))
-    elif criteria == 'active_today':
-        stmt = select(User).where(and_(User.status == 'active', User.last_activity >= today))
-    elif criteria == 'inactive_week':
-        stmt = select(User).where(and_(User.status == 'active', User.last_activity < week_ago))
-    elif criteria == 'inactive_month':
-        stmt = select(User).where(and_(User.status == 'active', User.last_activity < month_ago))
-    elif criteria == 'referrals':
-        stmt = select(User).where(and_(User.status == 'active', User.referred_by_id.isnot(None)))
-    elif criteria == 'direct':
-        stmt = select(User).where(and_(User.status == 'active', User.referred_by_id.is_(None)))
-    else:
+        return and_(User.status == 'active', User.created_at >= today)
+    if criteria == 'week':
+        return and_(User.status == 'active', User.created_at >= week_ago)
+    if criteria == 'month':
+        return and_(User.status == 'active', User.created_at >= month_ago)
+    if criteria == 'active_today':
+        return and_(User.status == 'active', User.last_activity >= today)
+    if criteria == 'inactive_week':
+        return and_(User.status == 'active', User.last_activity < week_ago)
+    if criteria == 'inactive_month':
+        return and_(User.status == 'active', User.last_activity < month_ago)
+    if criteria == 'referrals':
+        return and_(User.status == 'active', User.referred_by_id.isnot(None))
+    if criteria == 'direct':
+        return and_(User.status == 'active', User.referred_by_id.is_(None))
+    return None
+
+
+async def get_custom_users_count(db: AsyncSession, criteria: str) -> int:
+    condition = _custom_users_condition(criteria)
+    if condition is None:
+        return 0
+    result = await db.execute(select(func.count(User.id)).where(condition))
+    return result.scalar() or 0
+
+
+async def get_custom_users(db: AsyncSession, criteria: str) -> list:
+    condition = _custom_users_condition(criteria)
+    if condition is None:
         return []
 
-    result = await db.execute(stmt)
+    result = await db.execute(select(User).where(condition))
     return result.scalars().all()
 
 
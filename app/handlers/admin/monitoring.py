@@ -22,6 +22,7 @@ from app.services.traffic_monitoring_service import (
 from app.states import AdminStates
 from app.utils.decorators import admin_required
 from app.utils.pagination import paginate_list
+from app.utils.timezone import format_local_datetime
 
 
 logger = structlog.get_logger(__name__)
@@ -32,6 +33,37 @@ def _format_toggle(enabled: bool) -> str:
     return '🟢 Вкл' if enabled else '🔴 Выкл'
 
 
+def _is_stage_failing(stage: dict) -> bool:
+    last_error_at = stage['last_error_at']
+    return last_error_at is not None and (stage['last_success_at'] is None or last_error_at >= stage['last_success_at'])
+
+
+def _format_stage_line(stage: dict) -> str:
+    failing = _is_stage_failing(stage)
+    if stage['running']:
+        icon = '⏳'
+    elif stage['last_started_at'] is None:
+        icon = '⚪'
+    elif failing:
+        icon = '🔴'
+    else:
+        icon = '🟢'
+
+    details = []
+    if stage['last_duration'] is not None:
+        details.append(f'{stage["last_duration"]:.1f} с')
+    if stage['last_rows'] is not None:
+        details.append(f'строк: {stage["last_rows"]}')
+    details.append(f'успех: {format_local_datetime(stage["last_success_at"], "%d.%m %H:%M", "—")}')
+    if stage['failures']:
+        details.append(f'ошибок: {stage["failures"]}')
+
+    line = f'{icon} <b>{html.escape(stage["title"])}</b> <code>{stage["name"]}</code>\n   ' + ' · '.join(details)
+    if failing and stage['last_error']:
+        line += f'\n   ⚠️ {html.escape(stage["last_error"][:120])}'
+    return line
+
+
 def _build_notification_settings_view(language: str):
     get_texts(language)
     config = NotificationSettingsService.get_config()
@@ -362,6 +394,7 @@ async def admin_monitoring_menu(callback: CallbackQuery):
 
             running_status = '🟢 Работает' if status['is_running'] else '🔴 Остановлен'
             last_update = status['last_update'].strftime('%H:%M:%S') if status['last_update'] else 'Никогда'
+            failing_stages = sum(1 for stage in status['stages'] if _is_stage_failing(stage))
 
             text = f"""
 🔍 <b>Система мониторинга</b>
@@ -376,6 +409,8 @@ async def admin_monitoring_menu(callback: CallbackQuery):
 • Ошибок: {status['stats_24h']['failed']}
 • Успешность: {status['stats_24h']['success_rate']}%
 
+⏱️ <b>Этапы:</b> {failing_stages} с ошибкой из {len(status['stages'])}
+
 🔧 Выберите действие:
 """
 
@@ -388,6 +423,40 @@ async def admin_monitoring_menu(callback: CallbackQuery):
         await callback.answer('❌ Ошибка получения данных', show_alert=True)
 
 
+@router.callback_query(F.data == 'admin_mon_stages')
+@admin_required
+async def admin_monitoring_stages(callback: CallbackQuery):
+    try:
+        stages = monitoring_service.get_stage_stats()
+        groups: dict[str, list[dict]] = {}
+        for stage in stages:
+            groups.setdefault(stage['group'], []).append(stage)
+
+        lines = ['⏱️ <b>Этапы мониторинга</b>', '']
+        for group, group_stages in groups.items():
+            lines.append(f'📂 <b>{group}</b>')
+            lines.extend(_format_stage_line(stage) for stage in group_stages)
+            lines.append('')
+        lines.append('Группы работают параллельно, этапы внутри группы — по порядку.')
+
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text='🔄 Обновить', callback_data='admin_mon_stages')],
+                [InlineKeyboardButton(text='⬅️ Назад', callback_data='admin_monitoring')],
+            ]
+        )
+        try:
+            await callback.message.edit_text('\n'.join(lines)[:4000], parse_mode='HTML', reply_markup=keyboard)
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in str(e):
+                raise
+        await callback.answer()
+
+    except Exception as e:
+        logger.error('Ошибка отображения этапов мониторинга', error=e)
+        await callback.answer('❌ Ошибка получения данных', show_alert=True)
+
+
 @router.callback_query(F.data == 'admin_mon_settings')
 @admin_required
 async def admin_monitoring_settings(callback: CallbackQuery):
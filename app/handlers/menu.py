@@ -1449,9 +1449,9 @@ async def get_main_menu_text(user, texts, db: AsyncSession):
         subscription = getattr(user, 'subscription', None)
         if settings.is_tariffs_mode() and subscription and subscription.tariff_id:
             try:
-                from app.database.crud.tariff import get_tariff_by_id
+                from app.utils.catalog_cache import get_cached_tariff
 
-                tariff = await get_tariff_by_id(db, subscription.tariff_id)
+                tariff = await get_cached_tariff(db, subscription.tariff_id)
                 if tariff:
                     is_daily_tariff = getattr(tariff, 'is_daily', False)
                     tariff_info_block = f'\n📦 Тариф: {html.escape(tariff.name)}'
@@ -1520,13 +1520,13 @@ async def handle_activate_button(callback: types.CallbackQuery, db_user: User, d
     """
     texts = get_texts(db_user.language)
 
-    from app.database.crud.server_squad import get_available_server_squads
     from app.database.crud.subscription import create_paid_subscription, get_subscription_by_user_id
     from app.database.crud.transaction import create_transaction
     from app.database.crud.user import subtract_user_balance
     from app.database.models import PaymentMethod, TransactionType
     from app.services.subscription_renewal_service import SubscriptionRenewalService
     from app.services.subscription_service import SubscriptionService
+    from app.utils.catalog_cache import get_cached_available_server_squads
 
     if settings.is_multi_tariff_enabled():
         from app.database.crud.subscription import get_active_subscriptions_by_user_id
@@ -1561,7 +1561,7 @@ async def handle_activate_button(callback: types.CallbackQuery, db_user: User, d
 
     # Если серверы не выбраны — берём бесплатные по умолчанию
     if not connected_squads:
-        available_servers = await get_available_server_squads(db, promo_group_id=db_user.promo_group_id)
+        available_servers = await get_cached_available_server_squads(db, promo_group_id=db_user.promo_group_id)
         connected_squads = [s.squad_uuid for s in available_servers if s.is_available and s.price_kopeks == 0]
         # Если бесплатных нет — берём первый доступный
         if not connected_squads and available_servers:
@@ -23,6 +23,7 @@ from app.database.crud.user import (
     find_phantom_user_by_username,
     get_user_by_referral_code,
     get_user_by_telegram_id,
+    refresh_user_spending,
 )
 from app.database.crud.user_message import get_random_active_message
 from app.database.models import GuestPurchase, GuestPurchaseStatus, PinnedMessage, SubscriptionStatus, UserStatus
@@ -1446,6 +1447,7 @@ async def cmd_start(message: types.Message, state: FSMContext, db: AsyncSession,
         try:
             from sqlalchemy import delete, update as sa_update
 
+            from app.database.crud.payment_index import delete_payment_index_entries
             from app.database.models import (
                 CloudPaymentsPayment,
                 CryptoBotPayment,
@@ -1454,6 +1456,7 @@ async def cmd_start(message: types.Message, state: FSMContext, db: AsyncSession,
                 KassaAiPayment,
                 MulenPayPayment,
                 Pal24Payment,
+                PaymentMethod,
                 PlategaPayment,
                 PromoCodeUse,
                 ReferralEarning,
@@ -1507,6 +1510,8 @@ async def cmd_start(message: types.Message, state: FSMContext, db: AsyncSession,
                 )
 
             await db.execute(delete(Transaction).where(Transaction.user_id == user.id))
+            await refresh_user_spending(db, [user.id])
+            await delete_payment_index_entries(db, user.id, PaymentMethod.TELEGRAM_STARS)
 
             if user.balance_kopeks > 0:
                 logger.warning(
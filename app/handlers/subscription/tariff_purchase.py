@@ -27,6 +27,7 @@ from app.localization.texts import Texts, get_texts
 from app.services.admin_notification_service import AdminNotificationService
 from app.services.subscription_service import SubscriptionService
 from app.services.user_cart_service import user_cart_service
+from app.utils.catalog_cache import get_cached_tariffs_for_user
 from app.utils.decorators import error_handler
 from app.utils.formatting import format_period, format_price_kopeks, format_traffic
 from app.utils.promo_offer import get_user_active_promo_discount_percent
@@ -797,7 +798,7 @@ async def show_tariffs_list(
 
     # Получаем доступные тарифы
     promo_group_id = getattr(db_user, 'promo_group_id', None)
-    tariffs = await get_tariffs_for_user(db, promo_group_id)
+    tariffs = await get_cached_tariffs_for_user(db, promo_group_id)
 
     if not tariffs:
         await callback.message.edit_text(
@@ -2693,7 +2694,7 @@ async def show_tariff_extend(
     if not subscription.tariff_id:
         # Legacy user without tariff — show tariff selection for upgrade
         promo_group_id = getattr(db_user, 'promo_group_id', None)
-        tariffs = await get_tariffs_for_user(db, promo_group_id)
+        tariffs = await get_cached_tariffs_for_user(db, promo_group_id)
         if not tariffs:
             await callback.answer(texts.t('TARIFF_PURCHASE_NO_TARIFFS_ALERT', 'Нет доступных тарифов'), show_alert=True)
             return
@@ -2732,7 +2733,7 @@ async def show_tariff_extend(
     # показываем список доступных тарифов вместо продления скрытого
     if not tariff.is_active:
         promo_group_id = getattr(db_user, 'promo_group_id', None)
-        tariffs = await get_tariffs_for_user(db, promo_group_id)
+        tariffs = await get_cached_tariffs_for_user(db, promo_group_id)
         active_tariffs = [t for t in tariffs if not t.is_daily]
         if not active_tariffs:
             await callback.answer(
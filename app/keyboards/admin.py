@@ -1740,6 +1740,11 @@ def get_monitoring_keyboard(language: str = 'ru') -> InlineKeyboardMarkup:
                     text=_t(texts, 'ADMIN_MONITORING_STATISTICS', '📈 Статистика'), callback_data='admin_mon_statistics'
                 ),
             ],
+            [
+                InlineKeyboardButton(
+                    text=_t(texts, 'ADMIN_MONITORING_STAGES', '⏱️ Этапы мониторинга'), callback_data='admin_mon_stages'
+                ),
+            ],
             [
                 InlineKeyboardButton(
                     text=_t(texts, 'ADMIN_MONITORING_TEST_NOTIFICATIONS', '🧪 Тест уведомлений'),
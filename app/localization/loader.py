@@ -285,6 +285,11 @@ def _merge_dicts(base: dict[str, Any], overrides: dict[str, Any]) -> dict[str, A
     return result
 
 
+# Скомпилированные таблицы текстов (app/localization/texts.py) сверяют этот
+# счётчик, чтобы пересобраться после сброса кэша локалей.
+_locale_generation = 0
+
+
 @cache
 def load_locale(language: str) -> dict[str, Any]:
     language = language or DEFAULT_LANGUAGE
@@ -300,5 +305,12 @@ def load_locale(language: str) -> dict[str, Any]:
     return merged
 
 
+def get_locale_generation() -> int:
+    """Номер поколения кэша локалей: растёт при каждом clear_locale_cache()."""
+    return _locale_generation
+
+
 def clear_locale_cache() -> None:
+    global _locale_generation
     load_locale.cache_clear()
+    _locale_generation += 1
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import asyncio
+from collections.abc import Mapping
+from types import MappingProxyType
 from typing import Any
 
 import structlog
@@ -9,6 +11,7 @@ from app.config import settings
 from app.localization.loader import (
     DEFAULT_LANGUAGE,
     clear_locale_cache,
+    get_locale_generation,
     load_locale,
 )
 
@@ -17,6 +20,31 @@ _logger = structlog.get_logger(__name__)
 
 _cached_rules: dict[str, str] = {}
 
+_MISSING = object()
+
+# Скомпилированные таблицы текстов по коду языка (см. Texts / get_texts).
+_compiled_texts: dict[str | None, Texts] = {}
+_COMPILED_TEXTS_MAX = 64
+
+# Растёт при изменении настроек, от которых зависят динамические тексты
+# (цены пакетов трафика, SUPPORT_USERNAME, округление цен).
+_settings_generation = 0
+
+# Настройки, входящие в _build_dynamic_values (см. invalidate_texts_cache).
+TEXTS_DEPENDENT_SETTINGS = frozenset(
+    {
+        'PRICE_TRAFFIC_5GB',
+        'PRICE_TRAFFIC_10GB',
+        'PRICE_TRAFFIC_25GB',
+        'PRICE_TRAFFIC_50GB',
+        'PRICE_TRAFFIC_100GB',
+        'PRICE_TRAFFIC_250GB',
+        'PRICE_TRAFFIC_UNLIMITED',
+        'PRICE_ROUNDING_ENABLED',
+        'SUPPORT_USERNAME',
+    }
+)
+
 
 _LANGUAGE_ALIASES = {
     'uk': 'ua',
@@ -142,22 +170,35 @@ def _build_dynamic_values(language: str) -> dict[str, Any]:
 
 
 class Texts:
+    """Неизменяемая скомпилированная таблица текстов одного языка.
+
+    Таблица собирается один раз (fallback-локаль → локаль языка → динамические
+    цены трафика) и переиспользуется всеми вызовами get_texts() для этого языка,
+    поэтому поиск ключа — один dict lookup без копирования локали на вызов.
+    """
+
     def __init__(self, language: str = DEFAULT_LANGUAGE):
         self.language = language or DEFAULT_LANGUAGE
-        raw_data = load_locale(self.language)
-        self._values = {key: value for key, value in raw_data.items()}
+        self._locale_generation = get_locale_generation()
+        self._settings_generation = _settings_generation
 
+        raw_data = load_locale(self.language)
         if self.language != DEFAULT_LANGUAGE:
-            fallback_data = load_locale(DEFAULT_LANGUAGE)
+            table = dict(load_locale(DEFAULT_LANGUAGE))
+            table.update(raw_data)
         else:
-            fallback_data = self._values
+            table = dict(raw_data)
+        table.update(_build_dynamic_values(self.language))
 
-        self._fallback_values = {key: value for key, value in fallback_data.items() if key not in self._values}
+        self._table: Mapping[str, Any] = MappingProxyType(table)
 
-        self._values.update(_build_dynamic_values(self.language))
+    def is_current(self) -> bool:
+        return self._locale_generation == get_locale_generation() and self._settings_generation == _settings_generation
 
     def __getattr__(self, item: str) -> Any:
-        if item == 'language':
+        if item == 'language' or item.startswith('_'):
+            # Служебные атрибуты (_table до инициализации, __deepcopy__ и т.п.)
+            # не являются ключами локали.
             return super().__getattribute__(item)
         try:
             return self._get_value(item)
@@ -185,11 +226,9 @@ class Texts:
         if item == 'RULES_TEXT':
             return _get_cached_rules_value(self.language)
 
-        if item in self._values:
-            return self._values[item]
-
-        if item in self._fallback_values:
-            return self._fallback_values[item]
+        value = self._table.get(item, _MISSING)
+        if value is not _MISSING:
+            return value
 
         # Предупреждаем только когда у вызова НЕТ запасного текста. t(key, default) и
         # get(key, default) передают warn=False: для них отсутствие ключа штатно —
@@ -233,7 +272,22 @@ class Texts:
 
 
 def get_texts(language: str = DEFAULT_LANGUAGE) -> Texts:
-    return Texts(language)
+    texts = _compiled_texts.get(language)
+    if texts is not None and texts.is_current():
+        return texts
+
+    texts = Texts(language)
+    # Коды языков приходят из Telegram — не даём произвольным строкам раздувать кэш.
+    if language in _compiled_texts or len(_compiled_texts) < _COMPILED_TEXTS_MAX:
+        _compiled_texts[language] = texts
+    return texts
+
+
+def invalidate_texts_cache() -> None:
+    """Сбрасывает скомпилированные таблицы (смена цен трафика, поддержки и т.п.)."""
+    global _settings_generation
+    _settings_generation += 1
+    _compiled_texts.clear()
 
 
 async def get_rules_from_db(language: str = DEFAULT_LANGUAGE) -> str:
@@ -308,3 +362,4 @@ def clear_rules_cache() -> None:
 
 def reload_locales() -> None:
     clear_locale_cache()
+    _compiled_texts.clear()
@@ -1,4 +1,5 @@
 import asyncio
+import time
 from collections.abc import Awaitable, Callable
 from datetime import UTC, datetime
 from typing import Any
@@ -9,13 +10,18 @@ from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, TelegramObject, User as TgUser
 from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.config import settings
 from app.database.crud.user import get_user_by_telegram_id
 from app.database.database import AsyncSessionLocal
+from app.database.models import UserStatus
 from app.services.remnawave_service import RemnaWaveService
+from app.services.user_activity_service import user_activity_coalescer
 from app.states import RegistrationStates
 from app.utils.check_reg_process import is_registration_process
+from app.utils.user_snapshot_cache import UserSnapshot, user_snapshot_cache
 from app.utils.validators import sanitize_telegram_name
 
 
@@ -37,6 +43,59 @@ async def _refresh_remnawave_description(remnawave_id: int, description: str, te
 
 
 class AuthMiddleware(BaseMiddleware):
+    @staticmethod
+    def _can_serve_from_snapshot(snapshot: UserSnapshot, user: TgUser, data: dict[str, Any]) -> bool:
+        """Снимка достаточно, если хендлер не просит db_user, профиль не менялся
+        и ни одну подписку не пора деактивировать (это делает
+        SubscriptionStatusMiddleware по ORM-пользователю).
+
+        Для inner-middleware aiogram кладёт в data['handler'] уже выбранный
+        HandlerObject: его params — ровно те kwargs, что получит хендлер.
+        """
+        if snapshot.status != UserStatus.ACTIVE.value or not user_activity_coalescer.is_running():
+            return False
+        if snapshot.expiry_due(time.time()):
+            return False
+        handler_object = data.get('handler')
+        params = getattr(handler_object, 'params', None)
+        if params is None or getattr(handler_object, 'varkw', True) or 'db_user' in params:
+            return False
+        return snapshot.profile_matches(
+            user.username,
+            sanitize_telegram_name(user.first_name),
+            sanitize_telegram_name(user.last_name),
+        )
+
+    @staticmethod
+    async def _reject_blocked(event: TelegramObject, telegram_id: int) -> None:
+        if isinstance(event, Message):
+            await event.answer('🚫 Ваш аккаунт заблокирован администратором.')
+        elif isinstance(event, CallbackQuery):
+            await event.answer('🚫 Ваш аккаунт заблокирован администратором.', show_alert=True)
+        logger.info('🚫 Заблокированный пользователь попытался использовать бота', user_id=telegram_id)
+
+    @staticmethod
+    async def _run_handler(
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+        db: AsyncSession,
+    ) -> Any:
+        result = await handler(event, data)
+        try:
+            await db.commit()
+        except (InterfaceError, OperationalError) as conn_err:
+            # Соединение закрылось (таймаут после долгой операции) - просто логируем
+            logger.warning('⚠️ Соединение с БД закрыто после обработки, пропускаем commit', conn_err=conn_err)
+        except Exception as commit_err:
+            # Transaction aborted (e.g. handler swallowed a ProgrammingError) — rollback
+            logger.warning('⚠️ Не удалось commit после обработки, rollback', commit_err=commit_err)
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+        return result
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
@@ -58,8 +117,24 @@ class AuthMiddleware(BaseMiddleware):
         if user.is_bot:
             return await handler(event, data)
 
+        snapshot = await user_snapshot_cache.get(user.id)
+        if snapshot is not None and snapshot.status == UserStatus.BLOCKED.value:
+            await self._reject_blocked(event, user.id)
+            return None
+        use_snapshot = snapshot is not None and self._can_serve_from_snapshot(snapshot, user, data)
+
         async with AsyncSessionLocal() as db:
             try:
+                if use_snapshot:
+                    # Хендлеру не нужен ORM-пользователь: обходимся снимком, без
+                    # тяжёлой загрузки User с подписками/промогруппами.
+                    user_activity_coalescer.record(snapshot.id, datetime.now(UTC))
+                    data['db'] = db
+                    data['db_user'] = None
+                    data['user_snapshot'] = snapshot
+                    data['is_admin'] = settings.is_admin(user.id)
+                    return await self._run_handler(handler, event, data, db)
+
                 db_user = await get_user_by_telegram_id(db, user.id)
 
                 if not db_user:
@@ -96,14 +171,8 @@ class AuthMiddleware(BaseMiddleware):
                         await event.answer('▶️ Необходимо начать с команды /start', show_alert=True)
                     logger.info('🚫 Заблокирован незарегистрированный пользователь', user_id=user.id)
                     return None
-                from app.database.models import UserStatus
-
                 if db_user.status == UserStatus.BLOCKED.value:
-                    if isinstance(event, Message):
-                        await event.answer('🚫 Ваш аккаунт заблокирован администратором.')
-                    elif isinstance(event, CallbackQuery):
-                        await event.answer('🚫 Ваш аккаунт заблокирован администратором.', show_alert=True)
-                    logger.info('🚫 Заблокированный пользователь попытался использовать бота', user_id=user.id)
+                    await self._reject_blocked(event, user.id)
                     return None
 
                 if db_user.status == UserStatus.DELETED.value:
@@ -196,7 +265,13 @@ class AuthMiddleware(BaseMiddleware):
                     )
                     profile_updated = True
 
-                db_user.last_activity = datetime.now(UTC)
+                activity_at = datetime.now(UTC)
+                if user_activity_coalescer.record(db_user.id, activity_at):
+                    # Значение видно хендлерам, но строка не помечается грязной:
+                    # last_activity уйдёт в БД пакетным UPDATE коалесцера.
+                    set_committed_value(db_user, 'last_activity', activity_at)
+                else:
+                    db_user.last_activity = activity_at
 
                 if profile_updated:
                     db_user.updated_at = datetime.now(UTC)
@@ -231,24 +306,14 @@ class AuthMiddleware(BaseMiddleware):
                                     )
                                 )
 
+                if db_user.status == UserStatus.ACTIVE.value:
+                    await user_snapshot_cache.put(UserSnapshot.from_user(db_user))
+
                 data['db'] = db
                 data['db_user'] = db_user
                 data['is_admin'] = settings.is_admin(user.id)
 
-                result = await handler(event, data)
-                try:
-                    await db.commit()
-                except (InterfaceError, OperationalError) as conn_err:
-                    # Соединение закрылось (таймаут после долгой операции) - просто логируем
-                    logger.warning('⚠️ Соединение с БД закрыто после обработки, пропускаем commit', conn_err=conn_err)
-                except Exception as commit_err:
-                    # Transaction aborted (e.g. handler swallowed a ProgrammingError) — rollback
-                    logger.warning('⚠️ Не удалось commit после обработки, rollback', commit_err=commit_err)
-                    try:
-                        await db.rollback()
-                    except Exception:
-                        pass
-                return result
+                return await self._run_handler(handler, event, data, db)
 
             except (InterfaceError, OperationalError) as conn_err:
                 # Соединение с БД закрылось - не пытаемся rollback
@@ -10,6 +10,7 @@ from aiogram.types import CallbackQuery, Message, TelegramObject
 
 from app.config import settings
 from app.database.database import AsyncSessionLocal
+from app.services.button_click_log_service import button_click_log_writer
 
 
 logger = structlog.get_logger(__name__)
@@ -124,14 +125,12 @@ class ButtonStatsMiddleware(BaseMiddleware):
             if event.message and hasattr(event.message, 'reply_markup'):
                 button_text = self._extract_button_text(event.message.reply_markup, callback_data)
 
-            asyncio.create_task(
-                self._log_button_click_async(
-                    button_id=callback_data,
-                    user_id=user_id,
-                    callback_data=callback_data,
-                    button_type=button_type,
-                    button_text=button_text,
-                )
+            self._schedule_log(
+                button_id=callback_data,
+                user_id=user_id,
+                callback_data=callback_data,
+                button_type=button_type,
+                button_text=button_text,
             )
         except Exception as e:
             # Не прерываем обработку при ошибке логирования
@@ -158,18 +157,22 @@ class ButtonStatsMiddleware(BaseMiddleware):
 
             user_id = event.from_user.id if event.from_user else None
 
-            asyncio.create_task(
-                self._log_button_click_async(
-                    button_id=command,
-                    user_id=user_id,
-                    callback_data=None,
-                    button_type='command',
-                    button_text=f'{command} …' if has_payload else command,
-                )
+            self._schedule_log(
+                button_id=command,
+                user_id=user_id,
+                callback_data=None,
+                button_type='command',
+                button_text=f'{command} …' if has_payload else command,
             )
         except Exception as e:
             logger.error('Ошибка логирования команды бота', error=e, exc_info=True)
 
+    def _schedule_log(self, **click: Any) -> None:
+        """Отдаёт клик пакетному писателю; без него — пишет отдельной задачей."""
+        if button_click_log_writer.record(**click):
+            return
+        asyncio.create_task(self._log_button_click_async(**click))
+
     def _determine_button_type(self, callback_data: str) -> str:
         """Определяет тип кнопки по callback_data.
 
@@ -130,7 +130,7 @@ class DisplayNameRestrictionMiddleware(BaseMiddleware):
 
     @staticmethod
     def _resolve_language(user: TgUser, data: dict[str, Any]) -> str:
-        db_user = data.get('db_user')
+        db_user = data.get('db_user') or data.get('user_snapshot')
         if db_user and getattr(db_user, 'language', None):
             return db_user.language
         language_code = getattr(user, 'language_code', None)
@@ -19,7 +19,8 @@ class SubscriptionStatusMiddleware(BaseMiddleware):
     """
     Проверяет статус подписки пользователя.
     ВАЖНО: Использует db и db_user из data, которые уже загружены в AuthMiddleware.
-    Не создаёт дополнительных сессий БД.
+    Не создаёт дополнительных сессий БД. На пути по снимку (db_user=None)
+    AuthMiddleware пропускает только пользователей без просроченных подписок.
 
     Деактивирует подписку только если она истекла более чем на EXPIRATION_BUFFER_MINUTES минут.
     Это защищает от race conditions при продлении подписки.
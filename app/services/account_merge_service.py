@@ -8,7 +8,9 @@ from sqlalchemy import and_, delete, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
-from app.database.crud.user import OAUTH_PROVIDER_COLUMNS, get_user_by_id
+from app.database.crud.payment_index import reassign_payment_index
+from app.database.crud.referral_closure import relink_referrals_of
+from app.database.crud.user import OAUTH_PROVIDER_COLUMNS, get_user_by_id, refresh_user_spending
 from app.database.models import (
     AccessPolicy,
     AdminAuditLog,
@@ -701,10 +703,13 @@ async def execute_merge(
 
     # 6. Переназначение транзакций
     await db.execute(update(Transaction).where(Transaction.user_id == secondary.id).values(user_id=primary.id))
+    await refresh_user_spending(db, [primary.id, secondary.id])
 
     # 7. Переназначение всех платёжных таблиц
     for payment_model in _PAYMENT_MODELS:
         await db.execute(update(payment_model).where(payment_model.user_id == secondary.id).values(user_id=primary.id))
+    # Массовые UPDATE выше обходят хуки индекса платежей (включая пополнения Stars из шага 6)
+    await reassign_payment_index(db, secondary.id, primary.id)
 
     # 7b. Переназначение saved_payment_methods (FK без ondelete)
     await db.execute(
@@ -758,6 +763,7 @@ async def execute_merge(
     await db.execute(
         update(User).where(User.referred_by_id == secondary.id, User.id != primary.id).values(referred_by_id=primary.id)
     )
+    await relink_referrals_of(db, [primary.id])
     # Если primary был приглашён secondary — очищаем (нельзя ссылаться на самого себя)
     if primary.referred_by_id == secondary.id:
         primary.referred_by_id = None
@@ -11,6 +11,7 @@ from Crypto.PublicKey import RSA
 from Crypto.Signature import pkcs1_15
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -31,9 +32,6 @@ class AntilopayAPIError(Exception):
 class AntilopayService:
     """Сервис для работы с API Antilopay."""
 
-    def __init__(self) -> None:
-        self._session: aiohttp.ClientSession | None = None
-
     @property
     def secret_id(self) -> str:
         return settings.ANTILOPAY_SECRET_ID or ''
@@ -51,18 +49,8 @@ class AntilopayService:
         return settings.ANTILOPAY_PROJECT_ID or ''
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Возвращает переиспользуемую HTTP-сессию."""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-            )
-        return self._session
-
-    async def close(self) -> None:
-        """Закрывает HTTP-сессию."""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        """Возвращает общую HTTP-сессию провайдера из транспорта; закрывать её не нужно."""
+        return http_transport.session('antilopay')
 
     def _sign_request(self, json_body: str) -> str:
         """SHA256WithRSA подпись JSON body приватным ключом.
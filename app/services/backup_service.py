@@ -7,24 +7,30 @@ import os
 import shutil
 import tarfile
 import tempfile
+import time
+from collections.abc import AsyncIterator
 from dataclasses import asdict, dataclass
 from datetime import UTC, date as dt_date, datetime, time as dt_time, timedelta
 from decimal import Decimal
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 from zoneinfo import ZoneInfo
 
 import aiofiles
 import pyzipper
 import structlog
 from aiogram.types import FSInputFile
-from sqlalchemy import inspect, select, text
+from sqlalchemy import Integer, Row, Table, bindparam, column, inspect, select, text, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.pool import NullPool
 
 from app.config import settings
+from app.database.crud.payment_index import rebuild_payment_index
+from app.database.crud.referral_closure import rebuild_referral_closure
+from app.database.crud.user import rebuild_user_search_text, rebuild_user_spending
 from app.database.database import AsyncSessionLocal, engine, sync_postgres_sequences
 from app.database.models import (
     AccessPolicy,
@@ -128,6 +134,7 @@ from app.database.models import (
     server_squad_promo_groups,
     tariff_promo_groups,
 )
+from app.services.stats_rollup_service import stats_rollup_service
 
 
 logger = structlog.get_logger(__name__)
@@ -162,6 +169,163 @@ async def _terminate_competing_backends(conn) -> int:
         return 0
 
 
+NDJSON_DUMP_FORMAT_VERSION = 'ndjson-1'
+
+
+def _serialize_backup_value(value: Any) -> Any:
+    """Приводит значение колонки к JSON-совместимому виду (как в ORM-дампе orm-1.0)."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, dt_date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return 0.0
+    if isinstance(value, (list, dict)):
+        try:
+            return json_lib.dumps(value)
+        except TypeError:
+            return str(value)
+    if hasattr(value, '__dict__'):
+        return str(value)
+    return value
+
+
+async def _iter_table_chunks(conn: AsyncConnection, table: Table, chunk_size: int) -> AsyncIterator[list[Row]]:
+    """Отдаёт строки таблицы пачками по первичному ключу (keyset), не держа таблицу в памяти."""
+    columns = list(table.columns)
+    pk_columns = list(table.primary_key.columns)
+
+    if not pk_columns:
+        # Без первичного ключа keyset невозможен — страницы по OFFSET.
+        offset = 0
+        while True:
+            result = await conn.execute(select(*columns).order_by(*columns).offset(offset).limit(chunk_size))
+            rows = result.all()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            offset += len(rows)
+
+    pk_positions = [columns.index(column) for column in pk_columns]
+    key = pk_columns[0] if len(pk_columns) == 1 else tuple_(*pk_columns)
+    last_key: Any = None
+
+    while True:
+        query = select(*columns).order_by(*pk_columns).limit(chunk_size)
+        if last_key is not None:
+            query = query.where(key > (last_key if len(pk_columns) == 1 else tuple_(*last_key)))
+        rows = (await conn.execute(query)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_row = rows[-1]
+        last_key = last_row[pk_positions[0]] if len(pk_columns) == 1 else [last_row[i] for i in pk_positions]
+
+
+def _write_ndjson_chunk(dump_file: IO[str], rows: list[Row]) -> None:
+    dump_file.write(
+        ''.join(
+            json_lib.dumps([_serialize_backup_value(value) for value in row], ensure_ascii=False) + '\n' for row in rows
+        )
+    )
+
+
+def _append_spooled_table(spool: IO[str], dump_file: IO[str]) -> None:
+    spool.seek(0)
+    shutil.copyfileobj(spool, dump_file)
+
+
+async def export_tables_to_ndjson(
+    bind: AsyncEngine,
+    tables: list[tuple[str, Table]],
+    dump_path: Path,
+    *,
+    chunk_size: int,
+) -> dict[str, int]:
+    """Потоково выгружает таблицы в gzip-сжатый NDJSON.
+
+    Формат: перед строками каждой таблицы идёт заголовок
+    ``{"table": ..., "columns": [...]}``, затем по строке-массиву значений на
+    запись. Таблицы читаются пачками по первичному ключу через Core-select
+    сырых колонок, поэтому память ограничена одной пачкой независимо от
+    размера БД. На PostgreSQL всё читается в одной транзакции REPEATABLE READ,
+    чтобы дамп был согласованным снимком. Таблица, при выгрузке которой
+    произошла ошибка, в дамп не попадает совсем (ни заголовок, ни строки).
+
+    Возвращает количество выгруженных строк по таблицам.
+    """
+    exported: dict[str, int] = {}
+
+    async with bind.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            await conn.execution_options(isolation_level='REPEATABLE READ', postgresql_readonly=True)
+
+        dump_file = await asyncio.to_thread(gzip.open, dump_path, 'wt', encoding='utf-8')
+        try:
+            async with conn.begin():
+                for table_name, table in tables:
+                    logger.info('📊 Экспортируем таблицу', table_name=table_name)
+                    header = json_lib.dumps({'table': table_name, 'columns': [column.name for column in table.columns]})
+                    count = 0
+                    # Таблица сначала пишется во временный файл и попадает в дамп только
+                    # целиком: из gzip-потока недописанную таблицу уже не вырезать, а
+                    # восстановление приняло бы её за полную.
+                    spool = await asyncio.to_thread(
+                        tempfile.TemporaryFile, 'w+', encoding='utf-8', dir=dump_path.parent
+                    )
+                    try:
+                        try:
+                            async with conn.begin_nested():
+                                await asyncio.to_thread(spool.write, header + '\n')
+                                async for rows in _iter_table_chunks(conn, table, chunk_size):
+                                    await asyncio.to_thread(_write_ndjson_chunk, spool, rows)
+                                    count += len(rows)
+                        except Exception as table_exc:
+                            logger.warning(
+                                '⚠️ Ошибка экспорта таблицы, пропускаем',
+                                table_name=table_name,
+                                exported_rows=count,
+                                error=str(table_exc),
+                            )
+                            continue
+                        await asyncio.to_thread(_append_spooled_table, spool, dump_file)
+                    finally:
+                        await asyncio.to_thread(spool.close)
+
+                    exported[table_name] = count
+                    logger.info('✅ Экспортировано записей из таблицы', table_data_count=count, table_name=table_name)
+        finally:
+            await asyncio.to_thread(dump_file.close)
+
+    return exported
+
+
+def read_ndjson_dump(dump_path: Path) -> dict[str, list[dict[str, Any]]]:
+    """Читает NDJSON-дамп в словарь ``{table: [row_dict, ...]}``."""
+    tables: dict[str, list[dict[str, Any]]] = {}
+    records: list[dict[str, Any]] = []
+    columns: list[str] = []
+
+    with gzip.open(dump_path, 'rt', encoding='utf-8') as dump_file:
+        for line in dump_file:
+            if not line.strip():
+                continue
+            item = json_lib.loads(line)
+            if isinstance(item, dict):
+                columns = item['columns']
+                records = tables.setdefault(item['table'], [])
+            else:
+                records.append(dict(zip(columns, item, strict=True)))
+
+    return tables
+
+
 @dataclass
 class BackupMetadata:
     timestamp: str
@@ -594,6 +758,9 @@ class BackupService:
             else:
                 success, message = await self._restore_from_legacy(backup_path, clear_existing)
 
+            # Данные заменены в обход ORM-событий — дневные агрегаты строим заново
+            stats_rollup_service.request_rebuild()
+
             if success and self.bot:
                 await self._send_backup_notification('restore_success', message)
             elif not success and self.bot:
@@ -657,9 +824,8 @@ class BackupService:
                     'tool': pg_dump_path,
                 }
 
-            logger.info('pg_dump не найден в PATH. Используется ORM-дамп в формате JSON')
-            json_info = await self._dump_postgres_json(staging_dir, include_logs)
-            return json_info
+            logger.info('pg_dump не найден в PATH. Используется потоковый дамп в формате NDJSON')
+            return await self._dump_postgres_ndjson(staging_dir, include_logs)
 
         dump_path = staging_dir / 'database.sqlite'
         await self._dump_sqlite(dump_path)
@@ -708,42 +874,37 @@ class BackupService:
 
         logger.info('✅ PostgreSQL dump создан', dump_path=dump_path)
 
-    async def _dump_postgres_json(self, staging_dir: Path, include_logs: bool) -> dict[str, Any]:
+    async def _dump_postgres_ndjson(self, staging_dir: Path, include_logs: bool) -> dict[str, Any]:
         models_to_backup = self._get_models_for_backup(include_logs)
-        (
-            backup_data,
-            association_data,
-            total_records,
-            tables_count,
-        ) = await self._export_database_via_orm(models_to_backup)
-
-        dump_path = staging_dir / 'database.json'
-        dump_structure = {
-            'metadata': {
-                'timestamp': datetime.now(UTC).isoformat(),
-                'version': 'orm-1.0',
-                'database_type': 'postgresql',
-                'tables_count': tables_count,
-                'total_records': total_records,
-            },
-            'data': backup_data,
-            'associations': association_data,
-        }
-
-        async with aiofiles.open(dump_path, 'w', encoding='utf-8') as dump_file:
-            await dump_file.write(json_lib.dumps(dump_structure, ensure_ascii=False, indent=2))
+        tables = [(model.__tablename__, model.__table__) for model in models_to_backup]
+        tables.extend(self.association_tables.items())
+
+        dump_path = staging_dir / 'database.ndjson.gz'
+        exported = await export_tables_to_ndjson(
+            engine,
+            tables,
+            dump_path,
+            chunk_size=max(1, settings.BACKUP_EXPORT_CHUNK_SIZE),
+        )
+        tables_count = len(exported)
+        total_records = sum(exported.values())
 
         size = (await asyncio.to_thread(dump_path.stat)).st_size if await asyncio.to_thread(dump_path.exists) else 0
 
-        logger.info('✅ PostgreSQL экспортирован через ORM в JSON', dump_path=dump_path)
+        logger.info(
+            '✅ PostgreSQL экспортирован в NDJSON',
+            dump_path=dump_path,
+            tables_count=tables_count,
+            total_records=total_records,
+        )
 
         return {
             'type': 'postgresql',
             'path': dump_path.name,
             'size_bytes': size,
-            'format': 'json',
+            'format': 'ndjson',
             'tool': 'orm',
-            'format_version': 'orm-1.0',
+            'format_version': NDJSON_DUMP_FORMAT_VERSION,
             'tables_count': tables_count,
             'total_records': total_records,
         }
@@ -757,85 +918,6 @@ class BackupService:
         await asyncio.to_thread(shutil.copy2, sqlite_path, dump_path)
         logger.info('✅ SQLite база данных скопирована', dump_path=dump_path)
 
-    async def _export_database_via_orm(
-        self,
-        models_to_backup: list[Any],
-    ) -> tuple[dict[str, list[dict[str, Any]]], dict[str, list[dict[str, Any]]], int, int]:
-        backup_data: dict[str, list[dict[str, Any]]] = {}
-        total_records = 0
-
-        async with AsyncSessionLocal() as db:
-            try:
-                for model in models_to_backup:
-                    table_name = model.__tablename__
-                    logger.info('📊 Экспортируем таблицу', table_name=table_name)
-
-                    try:
-                        query = select(model)
-
-                        if model == User:
-                            query = query.options(selectinload(User.subscriptions).selectinload(Subscription.tariff))
-                        elif model == Subscription:
-                            query = query.options(selectinload(Subscription.user))
-                        elif model == Transaction:
-                            query = query.options(selectinload(Transaction.user))
-
-                        result = await db.execute(query)
-                        records = result.scalars().all()
-                    except Exception as table_exc:
-                        logger.warning(
-                            '⚠️ Ошибка экспорта таблицы, пропускаем',
-                            table_name=table_name,
-                            error=str(table_exc),
-                        )
-                        await db.rollback()
-                        backup_data[table_name] = []
-                        continue
-
-                    table_data: list[dict[str, Any]] = []
-                    for record in records:
-                        record_dict: dict[str, Any] = {}
-                        for column in model.__table__.columns:
-                            value = getattr(record, column.name)
-
-                            if value is None:
-                                record_dict[column.name] = None
-                            elif isinstance(value, (datetime, dt_date, dt_time)):
-                                record_dict[column.name] = value.isoformat()
-                            elif isinstance(value, Decimal):
-                                record_dict[column.name] = float(value)
-                            elif isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-                                record_dict[column.name] = 0.0
-                            elif isinstance(value, (list, dict)):
-                                try:
-                                    record_dict[column.name] = json_lib.dumps(value) if value is not None else None
-                                except TypeError:
-                                    record_dict[column.name] = str(value)
-                            elif hasattr(value, '__dict__'):
-                                record_dict[column.name] = str(value)
-                            else:
-                                record_dict[column.name] = value
-
-                        table_data.append(record_dict)
-
-                    backup_data[table_name] = table_data
-                    total_records += len(table_data)
-
-                    logger.info(
-                        '✅ Экспортировано записей из таблицы', table_data_count=len(table_data), table_name=table_name
-                    )
-
-                association_data = await self._export_association_tables(db)
-                for records in association_data.values():
-                    total_records += len(records)
-
-                tables_count = len(models_to_backup) + len(association_data)
-                return backup_data, association_data, total_records, tables_count
-
-            except Exception as exc:
-                logger.error('Ошибка при экспорте данных', exc=exc)
-                raise
-
     async def _collect_files(self, staging_dir: Path, include_logs: bool) -> list[dict[str, Any]]:
         files_info: list[dict[str, Any]] = []
         files_dir = staging_dir / 'files'
@@ -928,10 +1010,15 @@ class BackupService:
 
             if database_info.get('type') == 'postgresql':
                 db_format = database_info.get('format', 'sql')
-                default_name = 'database.json' if db_format == 'json' else 'database.sql'
+                default_name = {
+                    'json': 'database.json',
+                    'ndjson': 'database.ndjson.gz',
+                }.get(db_format, 'database.sql')
                 dump_file = temp_path / database_info.get('path', default_name)
 
-                if db_format == 'json':
+                if db_format == 'ndjson':
+                    await self._restore_postgres_ndjson(dump_file, clear_existing)
+                elif db_format == 'json':
                     await self._restore_postgres_json(dump_file, clear_existing)
                 else:
                     await self._restore_postgres(dump_file, clear_existing)
@@ -1034,6 +1121,27 @@ class BackupService:
 
         logger.info('✅ PostgreSQL восстановлен из ORM JSON', dump_path=dump_path)
 
+    async def _restore_postgres_ndjson(self, dump_path: Path, clear_existing: bool):
+        if not await asyncio.to_thread(dump_path.exists):
+            raise FileNotFoundError(f'NDJSON дамп PostgreSQL не найден: {dump_path}')
+
+        tables = await asyncio.to_thread(read_ndjson_dump, dump_path)
+        association_data = {name: tables.pop(name) for name in self.association_tables if name in tables}
+        metadata = {
+            'version': NDJSON_DUMP_FORMAT_VERSION,
+            'total_records': sum(len(records) for records in tables.values())
+            + sum(len(records) for records in association_data.values()),
+        }
+
+        await self._restore_database_payload(
+            tables,
+            association_data,
+            metadata,
+            clear_existing,
+        )
+
+        logger.info('✅ PostgreSQL восстановлен из NDJSON', dump_path=dump_path)
+
     async def _restore_sqlite(self, dump_path: Path, clear_existing: bool):
         if not await asyncio.to_thread(dump_path.exists):
             raise FileNotFoundError(f'SQLite файл не найден: {dump_path}')
@@ -1128,6 +1236,8 @@ class BackupService:
                     logger.warning('🗑️ Очищаем существующие данные...')
                     await self._clear_database_tables(db, backup_data)
 
+                await self._defer_foreign_key_checks(db)
+
                 models_for_restore = self._get_models_for_backup(True)
                 models_by_table = {model.__tablename__: model for model in models_for_restore}
 
@@ -1193,6 +1303,15 @@ class BackupService:
                 await db.flush()
 
                 await self._update_user_referrals(db, backup_data)
+                # Транзакции загружены массовыми INSERT — итоги трат считаем заново
+                # (до замыкания: итоги веток складываются из них)
+                await rebuild_user_spending(db)
+                # Связи проставлены массовым UPDATE в обход ORM-хуков — замыкание строим заново
+                await rebuild_referral_closure(db)
+                # Платежи загружены массовыми INSERT — индекс поиска платежей тоже
+                await rebuild_payment_index(db)
+                # Пользователи загружены массовыми UPSERT — хуки search_text не сработали
+                await rebuild_user_search_text(db)
 
                 assoc_tables, assoc_records = await self._restore_association_tables(
                     db,
@@ -1272,66 +1391,17 @@ class BackupService:
         logger.info('👥 Восстанавливаем пользователей без реферальных связей', users_data_count=len(users_data))
 
         User = models_by_table['users']
+        started = time.monotonic()
 
+        rows = []
         for user_data in users_data:
-            try:
-                processed_data = self._process_record_data(user_data, User, 'users')
-                processed_data['referred_by_id'] = None
-
-                if 'id' in processed_data:
-                    existing_user = await db.execute(select(User).where(User.id == processed_data['id']))
-                    existing = existing_user.scalar_one_or_none()
-
-                    if existing:
-                        try:
-                            async with db.begin_nested():
-                                for key, value in processed_data.items():
-                                    if key != 'id':
-                                        setattr(existing, key, value)
-                                await db.flush()
-                        except IntegrityError:
-                            db.expire(existing)
-                            logger.warning(
-                                'Конфликт уникального ключа при обновлении пользователя, пропускаем',
-                                user_id=processed_data.get('id'),
-                                telegram_id=processed_data.get('telegram_id'),
-                            )
-                            continue
-                    else:
-                        instance = User(**processed_data)
-                        try:
-                            async with db.begin_nested():
-                                db.add(instance)
-                                await db.flush()
-                        except IntegrityError:
-                            logger.warning(
-                                'Дубликат пользователя, пропускаем',
-                                processed_data=processed_data.get('id'),
-                                processed_data_2=processed_data.get('telegram_id'),
-                            )
-                            continue
-                else:
-                    instance = User(**processed_data)
-                    try:
-                        async with db.begin_nested():
-                            db.add(instance)
-                            await db.flush()
-                    except IntegrityError:
-                        logger.warning(
-                            'Дубликат пользователя, пропускаем',
-                            processed_data=processed_data.get('telegram_id'),
-                        )
-                        continue
-
-            except Exception as e:
-                logger.error('Ошибка при восстановлении пользователя', error=e)
-                raise
+            processed_data = self._process_record_data(user_data, User, 'users')
+            # Реферальные связи проставляются одним UPDATE после загрузки всех пользователей
+            processed_data['referred_by_id'] = None
+            rows.append(processed_data)
 
-        try:
-            async with db.begin_nested():
-                await db.flush()
-        except IntegrityError as e:
-            logger.warning('IntegrityError при flush пользователей, savepoint откачен', e=e)
+        restored = await self._bulk_upsert_rows(db, User.__table__, rows)
+        self._log_restore_rate('users', restored, started)
         logger.info('✅ Пользователи без реферальных связей восстановлены')
 
     async def _update_user_referrals(self, db: AsyncSession, backup_data: dict):
@@ -1341,34 +1411,53 @@ class BackupService:
 
         logger.info('🔗 Обновляем реферальные связи пользователей')
 
-        for user_data in users_data:
-            try:
-                referred_by_id = user_data.get('referred_by_id')
-                user_id = user_data.get('id')
-
-                if referred_by_id and user_id:
-                    referrer_result = await db.execute(select(User).where(User.id == referred_by_id))
-                    referrer = referrer_result.scalar_one_or_none()
-
-                    if referrer:
-                        user_result = await db.execute(select(User).where(User.id == user_id))
-                        user = user_result.scalar_one_or_none()
+        referrals = {
+            user_data['id']: user_data['referred_by_id']
+            for user_data in users_data
+            if user_data.get('id') and user_data.get('referred_by_id')
+        }
+        if not referrals:
+            return
 
-                        if user:
-                            user.referred_by_id = referred_by_id
-                        else:
-                            logger.warning('Пользователь не найден для обновления реферальной связи', user_id=user_id)
-                    else:
-                        logger.warning(
-                            'Реферер не найден для пользователя', referred_by_id=referred_by_id, user_id=user_id
-                        )
+        users_table = User.__table__
+        chunk_size = self._restore_chunk_size()
+        referrer_ids = list(set(referrals.values()))
+        existing_referrers: set[int] = set()
+        for start in range(0, len(referrer_ids), chunk_size):
+            result = await db.execute(
+                select(users_table.c.id).where(users_table.c.id.in_(referrer_ids[start : start + chunk_size]))
+            )
+            existing_referrers.update(result.scalars().all())
 
-            except Exception as e:
-                logger.error('Ошибка при обновлении реферальной связи', error=e)
-                continue
+        pairs = [
+            (user_id, referrer_id) for user_id, referrer_id in referrals.items() if referrer_id in existing_referrers
+        ]
+        missing = len(referrals) - len(pairs)
+        if missing:
+            logger.warning('Реферер не найден для части пользователей, связь не восстановлена', missing=missing)
+
+        for start in range(0, len(pairs), chunk_size):
+            chunk = pairs[start : start + chunk_size]
+            if db.get_bind().dialect.name == 'postgresql':
+                referral_values = values(
+                    column('user_id', Integer),
+                    column('referrer_id', Integer),
+                    name='restored_referrals',
+                ).data(chunk)
+                await db.execute(
+                    update(users_table)
+                    .where(users_table.c.id == referral_values.c.user_id)
+                    .values(referred_by_id=referral_values.c.referrer_id)
+                )
+            else:
+                await db.execute(
+                    update(users_table)
+                    .where(users_table.c.id == bindparam('target_user_id'))
+                    .values(referred_by_id=bindparam('target_referrer_id')),
+                    [{'target_user_id': user_id, 'target_referrer_id': referrer_id} for user_id, referrer_id in chunk],
+                )
 
-        await db.flush()
-        logger.info('✅ Реферальные связи обновлены')
+        logger.info('✅ Реферальные связи обновлены', restored=len(pairs))
 
     def _process_record_data(self, record_data: dict, model, table_name: str) -> dict:
         processed_data = {}
@@ -1440,21 +1529,6 @@ class BackupService:
     def _get_primary_key_columns(self, model) -> list[str]:
         return [col.name for col in model.__table__.columns if col.primary_key]
 
-    async def _export_association_tables(self, db: AsyncSession) -> dict[str, list[dict[str, Any]]]:
-        association_data: dict[str, list[dict[str, Any]]] = {}
-
-        for table_name, table_obj in self.association_tables.items():
-            try:
-                logger.info('📊 Экспортируем таблицу связей', table_name=table_name)
-                result = await db.execute(select(table_obj))
-                rows = result.mappings().all()
-                association_data[table_name] = [dict(row) for row in rows]
-                logger.info('✅ Экспортировано связей из таблицы', rows_count=len(rows), table_name=table_name)
-            except Exception as e:
-                logger.error('Ошибка экспорта таблицы связей', table_name=table_name, error=e)
-
-        return association_data
-
     async def _restore_association_tables(
         self, db: AsyncSession, association_data: dict[str, list[dict[str, Any]]], clear_existing: bool
     ) -> tuple[int, int]:
@@ -1491,45 +1565,126 @@ class BackupService:
         if clear_existing:
             await db.execute(table_obj.delete())
 
-        restored = 0
-
+        started = time.monotonic()
+        rows = []
         for record in records:
-            values = {col: record.get(col) for col in col_names}
-
-            if any(v is None for v in values.values()):
+            row = {col: record.get(col) for col in col_names}
+            if any(v is None for v in row.values()):
                 logger.warning('Пропущена некорректная запись', table_name=table_name, record=record)
                 continue
+            rows.append(row)
 
-            try:
-                first_col = col_names[0]
-                exists_stmt = (
-                    select(table_obj.c[first_col])
-                    .where(*[table_obj.c[col] == values[col] for col in col_names])
-                    .limit(1)
-                )
-                existing = await db.execute(exists_stmt)
+        restored = await self._bulk_upsert_rows(db, table_obj, rows, update_existing=False)
+        self._log_restore_rate(table_name, restored, started)
+        return restored
 
-                if existing.scalar_one_or_none() is not None:
-                    logger.debug('Запись уже существует', table_name=table_name, values=values)
-                    continue
+    @staticmethod
+    def _restore_chunk_size() -> int:
+        return max(1, settings.BACKUP_RESTORE_CHUNK_SIZE)
+
+    @staticmethod
+    def _log_restore_rate(table_name: str, rows: int, started: float) -> None:
+        elapsed = time.monotonic() - started
+        logger.info(
+            '⏱️ Скорость восстановления таблицы',
+            table_name=table_name,
+            rows=rows,
+            seconds=round(elapsed, 3),
+            rows_per_sec=round(rows / elapsed) if elapsed > 0 else None,
+        )
+
+    async def _defer_foreign_key_checks(self, db: AsyncSession) -> None:
+        """Откладывает проверку FK до коммита, где это поддерживает СУБД.
+
+        SQLite проверяет отложенные FK на COMMIT. В PostgreSQL SET CONSTRAINTS
+        действует только на DEFERRABLE-ограничения, для остальных порядок
+        восстановления таблиц по-прежнему учитывает зависимости.
+        """
+        statement = 'SET CONSTRAINTS ALL DEFERRED'
+        if db.get_bind().dialect.name == 'sqlite':
+            statement = 'PRAGMA defer_foreign_keys = ON'
+        try:
+            await db.execute(text(statement))
+        except Exception as e:
+            logger.warning('Не удалось отложить проверку внешних ключей', error=e)
+
+    async def _bulk_upsert_rows(
+        self,
+        db: AsyncSession,
+        table: Table,
+        rows: list[dict[str, Any]],
+        *,
+        update_existing: bool = True,
+    ) -> int:
+        """Загружает строки пачками через INSERT ... ON CONFLICT по первичному ключу.
+
+        Пачка, упавшая на другом уникальном ключе или FK, повторяется построчно,
+        и только конфликтующие строки пропускаются — как при прежнем
+        восстановлении по одной записи.
+        """
+        if not rows:
+            return 0
+
+        insert_factory = pg_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+        pk_cols = [col.name for col in table.primary_key.columns]
+        chunk_size = self._restore_chunk_size()
 
+        # executemany требует одинаковый набор колонок, а старые бекапы могут его не иметь
+        rows_by_columns: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+        for row in rows:
+            rows_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+
+        restored = 0
+        for columns, group in rows_by_columns.items():
+            stmt = insert_factory(table)
+            if pk_cols and all(col in columns for col in pk_cols):
+                update_cols = [col for col in columns if col not in pk_cols]
+                if update_existing and update_cols:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=pk_cols,
+                        set_={col: stmt.excluded[col] for col in update_cols},
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=pk_cols)
+
+            for start in range(0, len(group), chunk_size):
+                chunk = group[start : start + chunk_size]
                 try:
                     async with db.begin_nested():
-                        await db.execute(table_obj.insert().values(**values))
-                    restored += 1
+                        await db.execute(stmt, chunk)
+                    restored += len(chunk)
                 except IntegrityError:
-                    logger.warning('Пропускаем связь (FK или дубликат)', table_name=table_name, values=values)
-                    continue
-            except Exception as e:
-                logger.error('Ошибка при восстановлении связи', table_name=table_name, values=values, e=e)
-                raise
+                    restored += await self._upsert_rows_one_by_one(db, stmt, chunk, table.name, pk_cols)
+
+        return restored
 
+    async def _upsert_rows_one_by_one(
+        self,
+        db: AsyncSession,
+        stmt,
+        rows: list[dict[str, Any]],
+        table_name: str,
+        pk_cols: list[str],
+    ) -> int:
+        restored = 0
+        for row in rows:
+            try:
+                async with db.begin_nested():
+                    await db.execute(stmt, [row])
+                restored += 1
+            except IntegrityError as e:
+                logger.warning(
+                    'Конфликт уникального ключа или FK при восстановлении записи, пропускаем',
+                    table_name=table_name,
+                    pk={col: row.get(col) for col in pk_cols},
+                    error=str(e.orig),
+                )
         return restored
 
     async def _restore_table_records(
         self, db: AsyncSession, model, table_name: str, records: list[dict[str, Any]], clear_existing: bool
     ) -> int:
-        restored_count = 0
+        started = time.monotonic()
 
         # Кешируем существующие tariff_id для проверки FK
         existing_tariff_ids = set()
@@ -1544,66 +1699,33 @@ class BackupService:
             except Exception as e:
                 logger.warning('⚠️ Не удалось получить список тарифов', error=e)
 
+        rows = []
+        missing_tariff_ids: set[int] = set()
         for record_data in records:
             try:
                 processed_data = self._process_record_data(record_data, model, table_name)
-
-                # Валидация FK для subscriptions.tariff_id
-                if table_name == 'subscriptions' and 'tariff_id' in processed_data:
-                    tariff_id = processed_data.get('tariff_id')
-                    if tariff_id is not None and tariff_id not in existing_tariff_ids:
-                        logger.warning(
-                            '⚠️ Тариф не найден, устанавливаем tariff_id=NULL для подписки', tariff_id=tariff_id
-                        )
-                        processed_data['tariff_id'] = None
-
-                pk_cols = self._get_primary_key_columns(model)
-
-                if pk_cols and all(col in processed_data for col in pk_cols):
-                    where_clause = [getattr(model, col) == processed_data[col] for col in pk_cols]
-                    existing_record = await db.execute(select(model).where(*where_clause))
-                    existing = existing_record.scalar_one_or_none()
-
-                    if existing:
-                        try:
-                            async with db.begin_nested():
-                                for key, value in processed_data.items():
-                                    if key not in pk_cols:
-                                        setattr(existing, key, value)
-                                await db.flush()
-                        except IntegrityError:
-                            db.expire(existing)
-                            logger.warning(
-                                'Конфликт уникального ключа при обновлении записи, пропускаем',
-                                table_name=table_name,
-                                pk={col: processed_data.get(col) for col in pk_cols},
-                            )
-                            continue
-                    else:
-                        instance = model(**processed_data)
-                        try:
-                            async with db.begin_nested():
-                                db.add(instance)
-                                await db.flush()
-                        except IntegrityError:
-                            # Unique constraint conflict — record exists with different PK
-                            logger.warning(
-                                'Дубликат по уникальному ключу в %s (PK=%s), пропускаем',
-                                table_name,
-                                {col: processed_data.get(col) for col in pk_cols},
-                            )
-                            continue
-                else:
-                    instance = model(**processed_data)
-                    db.add(instance)
-
-                restored_count += 1
-
             except Exception as e:
                 logger.error('Ошибка восстановления записи в таблицу', table_name=table_name, error=e)
                 logger.error('Проблемные данные', record_data=record_data)
                 raise
 
+            # Валидация FK для subscriptions.tariff_id
+            if table_name == 'subscriptions' and 'tariff_id' in processed_data:
+                tariff_id = processed_data.get('tariff_id')
+                if tariff_id is not None and tariff_id not in existing_tariff_ids:
+                    missing_tariff_ids.add(tariff_id)
+                    processed_data['tariff_id'] = None
+
+            rows.append(processed_data)
+
+        if missing_tariff_ids:
+            logger.warning(
+                '⚠️ Тарифы не найдены, устанавливаем tariff_id=NULL для подписок',
+                tariff_ids=sorted(missing_tariff_ids),
+            )
+
+        restored_count = await self._bulk_upsert_rows(db, model.__table__, rows)
+        self._log_restore_rate(table_name, restored_count, started)
         return restored_count
 
     async def _clear_database_tables(self, db: AsyncSession, backup_data: dict[str, Any] | None = None):
@@ -1,11 +1,19 @@
 """
 Сервис для работы с черным списком пользователей
 Проверяет пользователей по списку из GitHub репозитория
+
+При обновлении список компилируется в хэш-индексы (ID → запись, username → запись),
+поэтому проверка не зависит от размера списка. Последний загруженный файл сохраняется
+на диск (BLACKLIST_CACHE_PATH): после перезапуска проверки работают сразу, не дожидаясь GitHub.
 """
 
+from __future__ import annotations
+
 import asyncio
 import time
+from dataclasses import dataclass, field
 from datetime import UTC, datetime, timedelta
+from pathlib import Path
 
 import aiohttp
 import structlog
@@ -15,6 +23,91 @@ from app.config import settings
 
 logger = structlog.get_logger(__name__)
 
+# Пауза перед повторной загрузкой после неудачи, чтобы не ходить в GitHub на каждой проверке
+_UPDATE_RETRY_SECONDS = 300
+
+
+def parse_blacklist(raw: str) -> list[tuple[int, str, str]]:
+    """Разбирает файл черного списка в записи ``(telegram_id, username, reason)``."""
+    blacklist_data = []
+    lines = raw.splitlines()
+
+    for line_num, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue  # Пропускаем пустые строки и комментарии
+
+        # В формате '7021477105 # @MAMYT_PAXAL2016, перепродажа подписок'
+        # только первая часть до пробела - это Telegram ID, всё остальное комментарий
+        try:
+            # 1. Разделяем строку на ID и всё остальное по символу '#'
+            if '#' in line:
+                id_part, content_part = line.split('#', 1)
+                telegram_id = int(id_part.strip())
+                content = content_part.strip()
+            else:
+                # Если решётки нет, пробуем просто взять первое число
+                parts = line.split(maxsplit=1)
+                telegram_id = int(parts[0])
+                content = parts[1].strip() if len(parts) > 1 else ''
+
+            # 2. Обрабатываем контент: вычленяем username, если он есть в начале
+            username = ''
+            reason = 'Занесен в черный список'
+
+            if content:
+                if content.startswith('@'):
+                    # Разбиваем контент только по первому пробелу
+                    # content_parts[0] будет юзернеймом, content_parts[1] — причиной
+                    content_parts = content.split(maxsplit=1)
+                    username = content_parts[0]
+                    if len(content_parts) > 1:
+                        reason = content_parts[1].strip()
+                else:
+                    # Если собачки нет, значит весь контент — это причина
+                    reason = content
+
+            blacklist_data.append((telegram_id, username, reason))
+
+        except ValueError:
+            # Если не удается преобразовать в число, это не ID
+            logger.warning(
+                'Неверный формат строки в черном списке первое значение не является числом',
+                line_num=line_num,
+                line=line,
+            )
+
+    return blacklist_data
+
+
+def normalize_username(username: str | None) -> str:
+    return (username or '').lstrip('@').lower()
+
+
+@dataclass(frozen=True, slots=True)
+class BlacklistIndex:
+    """Скомпилированный черный список: хэш-индексы по ID и нормализованному username.
+
+    Строится один раз при обновлении и подменяется целиком одним присваиванием,
+    поэтому проверки никогда не видят наполовину собранный индекс.
+    """
+
+    entries: tuple[tuple[int, str, str], ...] = ()
+    by_id: dict[int, tuple[int, str, str]] = field(default_factory=dict)
+    by_username: dict[str, tuple[int, str, str]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, entries: list[tuple[int, str, str]]) -> BlacklistIndex:
+        by_id: dict[int, tuple[int, str, str]] = {}
+        by_username: dict[str, tuple[int, str, str]] = {}
+        for entry in entries:
+            # Как и при линейном поиске, выигрывает первая запись
+            by_id.setdefault(entry[0], entry)
+            username = normalize_username(entry[1])
+            if username:
+                by_username.setdefault(username, entry)
+        return cls(entries=tuple(entries), by_id=by_id, by_username=by_username)
+
 
 class BlacklistService:
     """
@@ -22,7 +115,7 @@ class BlacklistService:
     """
 
     def __init__(self):
-        self.blacklist_data = []  # Список в формате [(telegram_id, username, reason), ...]
+        self._index = BlacklistIndex()
         self.last_update = None
         # Используем интервал из настроек, по умолчанию 24 часа
         interval_hours = self.get_blacklist_update_interval_hours()
@@ -31,6 +124,18 @@ class BlacklistService:
         # Кэш результатов проверки: {telegram_id: (is_blacklisted, reason, timestamp)}
         self._check_cache: dict[int, tuple[bool, str | None, float]] = {}
         self._cache_ttl = 300  # 5 минут
+        self._persisted_checked = False
+        self._last_failure: float | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    @property
+    def blacklist_data(self) -> list[tuple[int, str, str]]:
+        """Список в формате [(telegram_id, username, reason), ...]"""
+        return list(self._index.entries)
+
+    @blacklist_data.setter
+    def blacklist_data(self, entries: list[tuple[int, str, str]]) -> None:
+        self._index = BlacklistIndex.build(list(entries))
 
     def is_blacklist_check_enabled(self) -> bool:
         """Проверяет, включена ли проверка черного списка"""
@@ -44,6 +149,11 @@ class BlacklistService:
         """Получает интервал обновления черного списка в часах"""
         return getattr(settings, 'BLACKLIST_UPDATE_INTERVAL_HOURS', 24)
 
+    def get_blacklist_cache_path(self) -> Path | None:
+        """Путь к сохраненной копии черного списка (None — не сохранять)"""
+        path = getattr(settings, 'BLACKLIST_CACHE_PATH', '')
+        return Path(path) if path else None
+
     def should_ignore_admins(self) -> bool:
         """Проверяет, нужно ли игнорировать администраторов при проверке черного списка"""
         return getattr(settings, 'BLACKLIST_IGNORE_ADMINS', True)
@@ -52,6 +162,12 @@ class BlacklistService:
         """Проверяет, является ли пользователь администратором"""
         return settings.is_admin(telegram_id)
 
+    def _apply(self, entries: list[tuple[int, str, str]], updated_at: datetime) -> None:
+        # Индекс собирается целиком и подменяется одним присваиванием
+        self._index = BlacklistIndex.build(entries)
+        self.last_update = updated_at
+        self._check_cache.clear()
+
     async def update_blacklist(self) -> bool:
         """
         Обновляет черный список из GitHub репозитория
@@ -73,72 +189,91 @@ class BlacklistService:
                 async with aiohttp.ClientSession() as session, session.get(raw_url) as response:
                     if response.status != 200:
                         logger.error('Ошибка при получении черного списка', status=response.status)
+                        self._last_failure = time.monotonic()
                         return False
 
                     content = await response.text()
 
-                # Разбираем содержимое файла
-                blacklist_data = []
-                lines = content.splitlines()
-
-                for line_num, line in enumerate(lines, 1):
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue  # Пропускаем пустые строки и комментарии
-
-                    # В формате '7021477105 # @MAMYT_PAXAL2016, перепродажа подписок'
-                    # только первая часть до пробела - это Telegram ID, всё остальное комментарий
-                    try:
-                        # 1. Разделяем строку на ID и всё остальное по символу '#'
-                        if '#' in line:
-                            id_part, content_part = line.split('#', 1)
-                            telegram_id = int(id_part.strip())
-                            content = content_part.strip()
-                        else:
-                            # Если решётки нет, пробуем просто взять первое число
-                            parts = line.split(maxsplit=1)
-                            telegram_id = int(parts[0])
-                            content = parts[1].strip() if len(parts) > 1 else ''
-
-                        # 2. Обрабатываем контент: вычленяем username, если он есть в начале
-                        username = ''
-                        reason = 'Занесен в черный список'
-
-                        if content:
-                            if content.startswith('@'):
-                                # Разбиваем контент только по первому пробелу
-                                # content_parts[0] будет юзернеймом, content_parts[1] — причиной
-                                content_parts = content.split(maxsplit=1)
-                                username = content_parts[0]
-                                if len(content_parts) > 1:
-                                    reason = content_parts[1].strip()
-                            else:
-                                # Если собачки нет, значит весь контент — это причина
-                                reason = content
-
-                        blacklist_data.append((telegram_id, username, reason))
-
-                    except ValueError:
-                        # Если не удается преобразовать в число, это не ID
-                        logger.warning(
-                            'Неверный формат строки в черном списке первое значение не является числом',
-                            line_num=line_num,
-                            line=line,
-                        )
-
-                self.blacklist_data = blacklist_data
-                self.last_update = datetime.now(UTC)
-                self._check_cache.clear()
+                blacklist_data = parse_blacklist(content)
+                self._apply(blacklist_data, datetime.now(UTC))
+                self._last_failure = None
                 logger.info('Черный список успешно обновлен. Найдено записей', blacklist_data_count=len(blacklist_data))
-                return True
-
-            except ValueError as e:
-                logger.error('Ошибка при парсинге ID из черного списка', error=e)
-                return False
             except Exception as e:
+                self._last_failure = time.monotonic()
                 logger.error('Ошибка при обновлении черного списка', error=e)
                 return False
 
+        await self._save_persisted(content)
+        return True
+
+    async def _save_persisted(self, content: str) -> None:
+        path = self.get_blacklist_cache_path()
+        if path is None:
+            return
+
+        def _write() -> None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.tmp')
+            tmp_path.write_text(content, encoding='utf-8')
+            tmp_path.replace(path)
+
+        try:
+            await asyncio.to_thread(_write)
+        except OSError as e:
+            logger.warning('Не удалось сохранить копию черного списка', path=str(path), error=e)
+
+    async def _load_persisted(self) -> bool:
+        """Загружает сохраненную копию черного списка, если индекс еще пуст."""
+        self._persisted_checked = True
+        path = self.get_blacklist_cache_path()
+        if path is None:
+            return False
+
+        def _read() -> tuple[str, float] | None:
+            if not path.is_file():
+                return None
+            return path.read_text(encoding='utf-8'), path.stat().st_mtime
+
+        try:
+            loaded = await asyncio.to_thread(_read)
+        except OSError as e:
+            logger.warning('Не удалось прочитать копию черного списка', path=str(path), error=e)
+            return False
+        if loaded is None:
+            return False
+
+        content, mtime = loaded
+        blacklist_data = parse_blacklist(content)
+        if not blacklist_data or self._index.entries:
+            return False
+        self._apply(blacklist_data, datetime.fromtimestamp(mtime, UTC))
+        logger.info('Черный список загружен из сохраненной копии', blacklist_data_count=len(blacklist_data))
+        return True
+
+    def _is_stale(self) -> bool:
+        required_interval = timedelta(hours=self.get_blacklist_update_interval_hours())
+        return self.last_update is None or datetime.now(UTC) - self.last_update > required_interval
+
+    def _can_retry(self) -> bool:
+        return self._last_failure is None or time.monotonic() - self._last_failure >= _UPDATE_RETRY_SECONDS
+
+    async def _ensure_fresh(self) -> None:
+        """Готовит индекс к проверке: копия с диска, затем загрузка или фоновое обновление."""
+        if not self._index.entries and not self._persisted_checked:
+            await self._load_persisted()
+
+        if not self._is_stale() or not self._can_retry():
+            return
+
+        if not self._index.entries:
+            # Проверять не по чему — ждем загрузку
+            await self.update_blacklist()
+            return
+
+        # Устаревший список продолжает работать, пока новый загружается в фоне
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.update_blacklist(), name='blacklist-refresh')
+
     async def is_user_blacklisted(self, telegram_id: int, username: str | None = None) -> tuple[bool, str | None]:
         """
         Проверяет, находится ли пользователь в черном списке
@@ -166,32 +301,26 @@ class BlacklistService:
             self._check_cache[telegram_id] = (False, None, now)
             return False, None
 
-        # Если черный список пуст или устарел, обновляем его
-        interval_hours = self.get_blacklist_update_interval_hours()
-        required_interval = timedelta(hours=interval_hours)
-        if not self.blacklist_data or (self.last_update and datetime.now(UTC) - self.last_update > required_interval):
-            await self.update_blacklist()
+        await self._ensure_fresh()
 
-        # Проверяем по Telegram ID
-        for bl_id, bl_username, bl_reason in self.blacklist_data:
-            if bl_id == telegram_id:
-                logger.info('Пользователь найден в черном списке по ID', telegram_id=telegram_id, bl_reason=bl_reason)
-                self._check_cache[telegram_id] = (True, bl_reason, now)
-                return True, bl_reason
+        index = self._index
+        entry = index.by_id.get(telegram_id)
+        if entry is not None:
+            logger.info('Пользователь найден в черном списке по ID', telegram_id=telegram_id, bl_reason=entry[2])
+            self._check_cache[telegram_id] = (True, entry[2], now)
+            return True, entry[2]
 
         # Проверяем по username, если он передан
-        if username:
-            username_lower = username.lower().lstrip('@')
-            for bl_id, bl_username, bl_reason in self.blacklist_data:
-                if bl_username and bl_username.lower().lstrip('@') == username_lower:
-                    logger.info(
-                        'Пользователь найден в черном списке по username',
-                        username=username,
-                        telegram_id=telegram_id,
-                        bl_reason=bl_reason,
-                    )
-                    self._check_cache[telegram_id] = (True, bl_reason, now)
-                    return True, bl_reason
+        entry = index.by_username.get(normalize_username(username)) if username else None
+        if entry is not None:
+            logger.info(
+                'Пользователь найден в черном списке по username',
+                username=username,
+                telegram_id=telegram_id,
+                bl_reason=entry[2],
+            )
+            self._check_cache[telegram_id] = (True, entry[2], now)
+            return True, entry[2]
 
         self._check_cache[telegram_id] = (False, None, now)
         return False, None
@@ -200,12 +329,8 @@ class BlacklistService:
         """
         Возвращает весь черный список
         """
-        interval_hours = self.get_blacklist_update_interval_hours()
-        required_interval = timedelta(hours=interval_hours)
-        if not self.blacklist_data or (self.last_update and datetime.now(UTC) - self.last_update > required_interval):
-            await self.update_blacklist()
-
-        return self.blacklist_data.copy()
+        await self._ensure_fresh()
+        return self.blacklist_data
 
     async def get_user_by_telegram_id(self, telegram_id: int) -> tuple[int, str, str] | None:
         """
@@ -217,29 +342,19 @@ class BlacklistService:
         Returns:
             Кортеж (telegram_id, username, reason) или None, если не найден
         """
-        for bl_id, bl_username, bl_reason in self.blacklist_data:
-            if bl_id == telegram_id:
-                return (bl_id, bl_username, bl_reason)
-        return None
+        return self._index.by_id.get(telegram_id)
 
     async def get_user_by_username(self, username: str) -> tuple[int, str, str] | None:
         """
         Возвращает информацию о пользователе из черного списка по username
 
         Args:
-            username: Username пользователя
+            username: Username пользователя (с @ или без)
 
         Returns:
             Кортеж (telegram_id, username, reason) или None, если не найден
         """
-        # Проверяем как с @, так и без
-        username_with_at = f'@{username}' if not username.startswith('@') else username
-        username_without_at = username.lstrip('@')
-
-        for bl_id, bl_username, bl_reason in self.blacklist_data:
-            if bl_username == username_with_at or bl_username.lstrip('@') == username_without_at:
-                return (bl_id, bl_username, bl_reason)
-        return None
+        return self._index.by_username.get(normalize_username(username))
 
     async def force_update_blacklist(self) -> tuple[bool, str]:
         """
@@ -250,7 +365,7 @@ class BlacklistService:
         """
         success = await self.update_blacklist()
         if success:
-            return True, f'Черный список обновлен успешно. Записей: {len(self.blacklist_data)}'
+            return True, f'Черный список обновлен успешно. Записей: {len(self._index.entries)}'
         return False, 'Ошибка обновления черного списка'
 
 
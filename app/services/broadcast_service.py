@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import functools
-from collections.abc import Callable
+from collections.abc import AsyncIterator, Callable
 from dataclasses import dataclass
 from datetime import UTC, datetime
 from typing import TYPE_CHECKING
@@ -24,8 +25,9 @@ from app.database.database import AsyncSessionLocal
 from app.database.models import BroadcastHistory, Subscription, SubscriptionStatus, User, UserStatus
 from app.handlers.admin.messages import (
     create_broadcast_keyboard,
-    get_custom_users,
-    get_target_users,
+    fetch_broadcast_recipients_page,
+    get_custom_users_count,
+    get_target_users_count,
 )
 
 
@@ -40,13 +42,21 @@ VALID_MEDIA_TYPES = {'photo', 'video', 'document'}
 
 # =========================================================================
 # Telegram rate limits: ~30 msg/sec для бота.
-# batch_size=25 + 1 sec delay = ~25 msg/sec с запасом.
+# Отправка идёт через токен-бакет (_TG_RATE_PER_SEC с запасом) со скользящим
+# окном до _TG_MAX_IN_FLIGHT одновременных запросов: медленный получатель не
+# задерживает остальных. FloodWait от Telegram снижает скорость вдвое, серия
+# успешных отправок плавно возвращает её к номиналу.
 # =========================================================================
-_TG_BATCH_SIZE = 25
-_TG_BATCH_DELAY = 1.0  # секунда между батчами
+_TG_RATE_PER_SEC = 25.0
+_TG_MIN_RATE_PER_SEC = 1.0
+_TG_RATE_RECOVERY_STEP = 1.0  # +msg/sec после каждой секунды отправок без FloodWait
+_TG_MAX_IN_FLIGHT = 25
 _TG_MAX_RETRIES = 3  # retry при FloodWait / transient errors
 
-# Прогресс обновляется каждые ~500 сообщений ИЛИ раз в 5 секунд (что наступит раньше)
+# Получатели сегмента читаются страницами по User.id (keyset), а не списком целиком
+_RECIPIENT_PAGE_SIZE = 1000
+
+# Прогресс (и курсор продолжения) обновляется каждые ~500 сообщений ИЛИ раз в 5 секунд
 _PROGRESS_UPDATE_MESSAGES = 500
 _PROGRESS_MIN_INTERVAL_SEC = 5.0
 
@@ -105,6 +115,62 @@ class _BroadcastTask:
     cancel_event: asyncio.Event
 
 
+@dataclass(slots=True)
+class _ResumePoint:
+    """Сохранённый прогресс рассылки, с которого она продолжается после рестарта."""
+
+    cursor: int = 0
+    sent_count: int = 0
+    failed_count: int = 0
+    blocked_count: int = 0
+
+
+class _AdaptiveRateLimiter:
+    """Токен-бакет, подстраивающий скорость под FloodWait от Telegram."""
+
+    def __init__(self, rate: float, *, min_rate: float, recovery_step: float) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self._min_rate = min(min_rate, rate)
+        self._recovery_step = recovery_step
+        self._tokens = 1.0
+        self._updated_at = asyncio.get_running_loop().time()
+        self._paused_until = 0.0
+        self._clean_since = self._updated_at
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                # Бакет вмещает не больше секунды токенов — всплесков сверх лимита нет.
+                self._tokens = min(self.rate, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def on_flood_wait(self, retry_after: float) -> None:
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + retry_after)
+        self.rate = max(self._min_rate, self.rate / 2)
+        self._tokens = 0.0
+        self._clean_since = self._paused_until
+
+    def on_success(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        now = asyncio.get_running_loop().time()
+        if now - self._clean_since >= 1.0:
+            self.rate = min(self.max_rate, self.rate + self._recovery_step)
+            self._clean_since = now
+
+
 class BroadcastService:
     """Handles broadcast execution triggered from the admin web API."""
 
@@ -120,7 +186,13 @@ class BroadcastService:
         task_entry = self._tasks.get(broadcast_id)
         return bool(task_entry and not task_entry.task.done())
 
-    async def start_broadcast(self, broadcast_id: int, config: BroadcastConfig) -> None:
+    async def start_broadcast(
+        self,
+        broadcast_id: int,
+        config: BroadcastConfig,
+        *,
+        resume_from: _ResumePoint | None = None,
+    ) -> None:
         if self._bot is None:
             logger.error('Невозможно запустить рассылку : бот не инициализирован', broadcast_id=broadcast_id)
             await self._mark_failed(broadcast_id)
@@ -134,7 +206,7 @@ class BroadcastService:
                 return
 
             task = asyncio.create_task(
-                self._run_broadcast(broadcast_id, config, cancel_event),
+                self._run_broadcast(broadcast_id, config, cancel_event, resume_from=resume_from),
                 name=f'broadcast-{broadcast_id}',
             )
             self._tasks[broadcast_id] = _BroadcastTask(task=task, cancel_event=cancel_event)
@@ -149,21 +221,85 @@ class BroadcastService:
             task_entry.cancel_event.set()
             return True
 
+    async def resume_interrupted(self) -> int:
+        """Продолжает Telegram-рассылки, прерванные рестартом, с сохранённого курсора.
+
+        Продолжаются только рассылки по сегменту, сохранившие resume_state:
+        персональные (промопредложения с клавиатурой на получателя) и
+        email-рассылки заново не запускаются. Возвращает число продолженных.
+        """
+        if self._bot is None:
+            return 0
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(BroadcastHistory).where(
+                    BroadcastHistory.status == 'in_progress',
+                    BroadcastHistory.channel == 'telegram',
+                    BroadcastHistory.resume_state.isnot(None),
+                )
+            )
+            interrupted = result.scalars().all()
+
+        resumed = 0
+        for broadcast in interrupted:
+            if self.is_running(broadcast.id):
+                continue
+            state = broadcast.resume_state or {}
+            media = None
+            if broadcast.has_media and broadcast.media_type and broadcast.media_file_id:
+                media = BroadcastMediaConfig(
+                    type=broadcast.media_type,
+                    file_id=broadcast.media_file_id,
+                    caption=broadcast.media_caption,
+                )
+            config = BroadcastConfig(
+                target=broadcast.target_type,
+                message_text=broadcast.message_text or '',
+                selected_buttons=list(state.get('selected_buttons') or []),
+                media=media,
+                initiator_name=broadcast.admin_name,
+                custom_buttons=state.get('custom_buttons'),
+                category=broadcast.category or 'system',
+            )
+            resume_from = _ResumePoint(
+                cursor=broadcast.resume_cursor or 0,
+                sent_count=broadcast.sent_count or 0,
+                failed_count=broadcast.failed_count or 0,
+                blocked_count=broadcast.blocked_count or 0,
+            )
+            logger.info(
+                'Продолжаем прерванную рассылку',
+                broadcast_id=broadcast.id,
+                cursor=resume_from.cursor,
+                sent_count=resume_from.sent_count,
+            )
+            await self.start_broadcast(broadcast.id, config, resume_from=resume_from)
+            resumed += 1
+        return resumed
+
     async def _run_broadcast(
         self,
         broadcast_id: int,
         config: BroadcastConfig,
         cancel_event: asyncio.Event,
+        *,
+        resume_from: _ResumePoint | None = None,
     ) -> None:
-        sent_count = 0
-        failed_count = 0
-        blocked_count = 0
+        start = resume_from or _ResumePoint()
+        sent_count = start.sent_count
+        failed_count = start.failed_count
+        blocked_count = start.blocked_count
 
         try:
             if cancel_event.is_set():
                 await self._mark_cancelled(broadcast_id, sent_count, failed_count, blocked_count)
                 return
 
+            # Рассылку по сегменту можно продолжить после рестарта; персональную
+            # (готовый список + клавиатура на получателя) — нет.
+            resumable = config.recipient_ids is None and config.keyboard_factory is None
+
             async with AsyncSessionLocal() as session:
                 broadcast = await session.get(BroadcastHistory, broadcast_id)
                 if not broadcast:
@@ -171,35 +307,30 @@ class BroadcastService:
                     return
 
                 broadcast.status = 'in_progress'
-                broadcast.sent_count = 0
-                broadcast.failed_count = 0
-                broadcast.blocked_count = 0
-                await session.commit()
-
-            # _fetch_recipients теперь возвращает list[int] (telegram_id), а не ORM-объекты
-            if config.recipient_ids is not None:
-                recipient_ids: list[int] = list(config.recipient_ids)
-            else:
-                recipient_ids = await self._fetch_recipients(config.target, config.category)
-
-            async with AsyncSessionLocal() as session:
-                broadcast = await session.get(BroadcastHistory, broadcast_id)
-                if not broadcast:
-                    logger.error('Запись рассылки удалена до запуска', broadcast_id=broadcast_id)
-                    return
-
-                broadcast.total_count = len(recipient_ids)
+                if resume_from is None:
+                    broadcast.sent_count = 0
+                    broadcast.failed_count = 0
+                    broadcast.blocked_count = 0
+                    broadcast.resume_cursor = 0
+                    broadcast.resume_state = (
+                        {
+                            'selected_buttons': list(config.selected_buttons or []),
+                            'custom_buttons': config.custom_buttons,
+                        }
+                        if resumable
+                        else None
+                    )
+                    broadcast.total_count = (
+                        len(config.recipient_ids)
+                        if config.recipient_ids is not None
+                        else await self._estimate_recipients(session, config.target)
+                    )
                 await session.commit()
 
             if cancel_event.is_set():
                 await self._mark_cancelled(broadcast_id, sent_count, failed_count, blocked_count)
                 return
 
-            if not recipient_ids:
-                logger.info('Рассылка : получатели не найдены', broadcast_id=broadcast_id)
-                await self._mark_finished(broadcast_id, sent_count, failed_count, blocked_count, cancelled=False)
-                return
-
             keyboard = (
                 None
                 if config.keyboard_factory
@@ -209,17 +340,24 @@ class BroadcastService:
             logger.info(
                 'Рассылка: начинаем отправку получателям',
                 broadcast_id=broadcast_id,
-                recipient_ids_count=len(recipient_ids),
-                TG_BATCH_SIZE=_TG_BATCH_SIZE,
-                TG_BATCH_DELAY=_TG_BATCH_DELAY,
+                target=config.target,
+                resume_cursor=start.cursor,
+                TG_RATE_PER_SEC=_TG_RATE_PER_SEC,
+                TG_MAX_IN_FLIGHT=_TG_MAX_IN_FLIGHT,
             )
 
+            recipients = (
+                list(config.recipient_ids)
+                if config.recipient_ids is not None
+                else self._iter_recipients(config.target, config.category, after_cursor=start.cursor)
+            )
             sent_count, failed_count, blocked_count, cancelled_during_run = await self._send_batched(
                 broadcast_id,
-                recipient_ids,
+                recipients,
                 config,
                 keyboard,
                 cancel_event,
+                resume_from=start,
             )
 
             if cancelled_during_run:
@@ -235,12 +373,17 @@ class BroadcastService:
                     broadcast_id=broadcast_id,
                 )
 
+            if sent_count + failed_count + blocked_count == 0:
+                logger.info('Рассылка : получатели не найдены', broadcast_id=broadcast_id)
+
             await self._mark_finished(
                 broadcast_id,
                 sent_count,
                 failed_count,
                 blocked_count,
                 cancelled=False,
+                # Для сегмента total_count был оценкой — фиксируем фактическое число.
+                total_count=None if config.recipient_ids is not None else sent_count + failed_count + blocked_count,
             )
 
         except asyncio.CancelledError:
@@ -250,66 +393,103 @@ class BroadcastService:
             logger.exception('Критическая ошибка при выполнении рассылки', broadcast_id=broadcast_id, exc=exc)
             await self._mark_failed(broadcast_id, sent_count, failed_count, blocked_count)
 
-    async def _fetch_recipients(self, target: str, category: str = 'system') -> list[int]:
-        """Загружает получателей и возвращает список telegram_id (скаляры, не ORM-объекты).
+    @staticmethod
+    async def _estimate_recipients(session, target: str) -> int:
+        """Оценка total_count через SQL COUNT; точное число фиксируется по завершении."""
+        try:
+            if target.startswith('custom_'):
+                return await get_custom_users_count(session, target[len('custom_') :])
+            return await get_target_users_count(session, target)
+        except Exception as exc:
+            logger.warning('Не удалось оценить число получателей рассылки', target=target, exc=exc)
+            return 0
+
+    async def _iter_recipients(
+        self,
+        target: str,
+        category: str = 'system',
+        *,
+        after_cursor: int = 0,
+    ) -> AsyncIterator[tuple[int, int | None]]:
+        """Стримит получателей сегмента страницами по User.id.
+
+        Отдаёт пары (User.id, telegram_id); пара (cursor, None) отмечает конец
+        страницы — все пользователи с id <= cursor просмотрены (часть могла
+        отсеяться фильтром). Сессия открывается на страницу, а не на всю рассылку.
 
         Filters out users who disabled the given broadcast category in their
         notification preferences (news_enabled, promo_offers_enabled).
         Category 'system' is never filtered — system notifications reach everyone.
         """
-        async with AsyncSessionLocal() as session:
-            if target.startswith('custom_'):
-                criteria = target[len('custom_') :]
-                users_orm = await get_custom_users(session, criteria)
-            else:
-                users_orm = await get_target_users(session, target)
-
-            # Filter by user notification preferences based on broadcast category
-            from app.utils.notification_prefs import filter_users_by_broadcast_category
-
-            # category == 'system' → no filtering, sent to everyone
-            users_orm = filter_users_by_broadcast_category(users_orm, category)
+        from app.utils.notification_prefs import filter_users_by_broadcast_category
 
-            # Извлекаем telegram_id сразу, пока сессия жива.
-            # После выхода из блока ORM-объекты станут detached.
-            return [u.telegram_id for u in users_orm if u.telegram_id is not None]
+        cursor = after_cursor
+        while True:
+            async with AsyncSessionLocal() as session:
+                users, next_cursor = await fetch_broadcast_recipients_page(
+                    session,
+                    target,
+                    after_user_id=cursor,
+                    limit=_RECIPIENT_PAGE_SIZE,
+                )
+                # category == 'system' → no filtering, sent to everyone
+                users = filter_users_by_broadcast_category(users, category)
+                # Извлекаем скаляры, пока сессия жива.
+                page = [(u.id, u.telegram_id) for u in users if u.telegram_id is not None]
+                last_seen = users[-1].id if users else cursor
+
+            for item in page:
+                yield item
+
+            if next_cursor is None:
+                if last_seen > cursor:
+                    yield last_seen, None
+                return
+            cursor = next_cursor
+            yield cursor, None
 
     async def _send_batched(
         self,
         broadcast_id: int,
-        recipient_ids: list[int],
+        recipients: list[int] | AsyncIterator[tuple[int, int | None]],
         config: BroadcastConfig,
         keyboard: InlineKeyboardMarkup | None,
         cancel_event: asyncio.Event,
+        *,
+        resume_from: _ResumePoint | None = None,
     ) -> tuple[int, int, int, bool]:
         """
         Единый метод рассылки для любого количества получателей.
 
-        Батчинг по _TG_BATCH_SIZE сообщений с _TG_BATCH_DELAY задержкой.
-        Прогресс обновляется каждые _PROGRESS_UPDATE_MESSAGES сообщений.
-        Глобальная пауза при FloodWait.
+        Скорость задаёт _AdaptiveRateLimiter, одновременно в полёте не больше
+        _TG_MAX_IN_FLIGHT отправок (скользящее окно, без ожидания самого
+        медленного в пачке). Список telegram_id нумеруется по позиции, поток
+        сегмента приходит с User.id. Курсор — ключ, до которого включительно
+        всё обработано, — сохраняется вместе со счётчиками ровно по этот ключ.
 
         Returns (sent_count, failed_count, blocked_count, was_cancelled).
         """
-        sent_count = 0
-        failed_count = 0
-        blocked_count = 0
-        blocked_telegram_ids: list[int] = []
-
-        # Глобальная пауза при FloodWait — все корутины ждут
-        flood_wait_until: float = 0.0
-        last_progress_update: float = 0.0
+        start = resume_from or _ResumePoint()
+        sent_count = start.sent_count
+        failed_count = start.failed_count
+        blocked_count = start.blocked_count
+
+        limiter = _AdaptiveRateLimiter(
+            _TG_RATE_PER_SEC,
+            min_rate=_TG_MIN_RATE_PER_SEC,
+            recovery_step=_TG_RATE_RECOVERY_STEP,
+        )
+        window = asyncio.Semaphore(_TG_MAX_IN_FLIGHT)
+        in_flight: dict[int, asyncio.Task[str]] = {}
+        scanned_cursor = start.cursor
+        loop = asyncio.get_running_loop()
+        last_progress_update: float = loop.time()
         last_progress_count: int = 0
 
         async def send_single(telegram_id: int) -> str:
             """Returns 'sent', 'blocked', or 'failed'."""
-            nonlocal flood_wait_until
-
             for attempt in range(_TG_MAX_RETRIES):
-                # Глобальная пауза при FloodWait
-                now = asyncio.get_event_loop().time()
-                if flood_wait_until > now:
-                    await asyncio.sleep(flood_wait_until - now)
+                await limiter.acquire()
 
                 if cancel_event.is_set():
                     return 'failed'
@@ -320,11 +500,11 @@ class BroadcastService:
                         config,
                         config.keyboard_factory(telegram_id) if config.keyboard_factory else keyboard,
                     )
+                    limiter.on_success()
                     return 'sent'
 
                 except TelegramRetryAfter as e:
-                    wait_seconds = e.retry_after + 1
-                    flood_wait_until = asyncio.get_event_loop().time() + wait_seconds
+                    limiter.on_flood_wait(e.retry_after + 1)
                     logger.warning(
                         'FloodWait рассылки : Telegram просит сек (user попытка /)',
                         broadcast_id=broadcast_id,
@@ -332,8 +512,8 @@ class BroadcastService:
                         telegram_id=telegram_id,
                         attempt=attempt + 1,
                         TG_MAX_RETRIES=_TG_MAX_RETRIES,
+                        rate=limiter.rate,
                     )
-                    await asyncio.sleep(wait_seconds)
 
                 except TelegramForbiddenError:
                     return 'blocked'
@@ -373,43 +553,102 @@ class BroadcastService:
 
             return 'failed'
 
-        for i in range(0, len(recipient_ids), _TG_BATCH_SIZE):
-            if cancel_event.is_set():
-                await self._mark_cancelled(broadcast_id, sent_count, failed_count, blocked_count)
-                return sent_count, failed_count, blocked_count, True
+        # Сохраняемый прогресс должен совпадать с курсором: итоги получателей,
+        # завершившихся выше него, попадают в БД, только когда курсор до них
+        # дойдёт. Иначе после рестарта их отправят и посчитают повторно.
+        saved_counts = {'sent': start.sent_count, 'failed': start.failed_count, 'blocked': start.blocked_count}
+        finished_above_cursor: dict[int, str] = {}
+
+        def on_done(key: int, task: asyncio.Task[str]) -> None:
+            nonlocal sent_count, failed_count, blocked_count
+            in_flight.pop(key, None)
+            window.release()
+            if task.cancelled():
+                outcome = 'failed'
+            else:
+                result = task.exception() or task.result()
+                outcome = result if result in {'sent', 'blocked'} else 'failed'
+                if isinstance(result, BaseException):
+                    logger.error('Необработанное исключение в рассылке', broadcast_id=broadcast_id, result=result)
+            if outcome == 'sent':
+                sent_count += 1
+            elif outcome == 'blocked':
+                blocked_count += 1
+            else:
+                failed_count += 1
+            finished_above_cursor[key] = outcome
 
-            batch = recipient_ids[i : i + _TG_BATCH_SIZE]
-            results = await asyncio.gather(
-                *[send_single(tid) for tid in batch],
-                return_exceptions=True,
-            )
+        def resume_cursor() -> int:
+            # Ключи идут по возрастанию: всё, что меньше самого раннего
+            # незавершённого получателя, уже обработано.
+            return min(in_flight) - 1 if in_flight else scanned_cursor
 
-            for idx, result in enumerate(results):
-                if isinstance(result, str):
-                    if result == 'sent':
-                        sent_count += 1
-                    elif result == 'blocked':
-                        blocked_count += 1
-                        blocked_telegram_ids.append(batch[idx])
-                    else:
-                        failed_count += 1
-                elif isinstance(result, Exception):
-                    failed_count += 1
-                    logger.error('Необработанное исключение в рассылке', broadcast_id=broadcast_id, result=result)
+        def settle_up_to(cursor: int) -> None:
+            for key in [key for key in finished_above_cursor if key <= cursor]:
+                saved_counts[finished_above_cursor.pop(key)] += 1
 
-            # Обновляем прогресс в БД периодически
+        async def maybe_update_progress(force: bool = False) -> None:
+            nonlocal last_progress_update, last_progress_count
             processed = sent_count + failed_count + blocked_count
-            now = asyncio.get_event_loop().time()
+            now = loop.time()
             if (
-                processed - last_progress_count >= _PROGRESS_UPDATE_MESSAGES
+                force
+                or processed - last_progress_count >= _PROGRESS_UPDATE_MESSAGES
                 or now - last_progress_update >= _PROGRESS_MIN_INTERVAL_SEC
             ):
-                await self._update_progress(broadcast_id, sent_count, failed_count, blocked_count)
+                cursor = resume_cursor()
+                settle_up_to(cursor)
+                await self._update_progress(
+                    broadcast_id,
+                    saved_counts['sent'],
+                    saved_counts['failed'],
+                    saved_counts['blocked'],
+                    resume_cursor=cursor,
+                )
                 last_progress_count = processed
                 last_progress_update = now
 
-            # Задержка между батчами для rate limiting
-            await asyncio.sleep(_TG_BATCH_DELAY)
+        async def keyed_recipients() -> AsyncIterator[tuple[int, int | None]]:
+            if isinstance(recipients, list):
+                for position, telegram_id in enumerate(recipients, start=1):
+                    if position > start.cursor:
+                        yield position, telegram_id
+                return
+            async with contextlib.aclosing(recipients):
+                async for item in recipients:
+                    yield item
+
+        cancelled = False
+        try:
+            stream = keyed_recipients()
+            async with contextlib.aclosing(stream):
+                async for key, telegram_id in stream:
+                    if cancel_event.is_set():
+                        cancelled = True
+                        break
+                    if telegram_id is None:
+                        scanned_cursor = max(scanned_cursor, key)
+                        continue
+
+                    await window.acquire()
+                    task = asyncio.create_task(send_single(telegram_id))
+                    in_flight[key] = task
+                    scanned_cursor = max(scanned_cursor, key)
+                    task.add_done_callback(functools.partial(on_done, key))
+                    await maybe_update_progress()
+
+            if in_flight:
+                await asyncio.gather(*in_flight.values(), return_exceptions=True)
+                # Колбэки завершения выполняются на следующей итерации цикла.
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            for task in list(in_flight.values()):
+                task.cancel()
+            raise
+
+        if cancelled:
+            await self._mark_cancelled(broadcast_id, sent_count, failed_count, blocked_count)
+            return sent_count, failed_count, blocked_count, True
 
         return sent_count, failed_count, blocked_count, False
 
@@ -469,6 +708,7 @@ class BroadcastService:
         blocked_count: int = 0,
         *,
         cancelled: bool,
+        total_count: int | None = None,
     ) -> None:
         await self._safe_status_update(
             broadcast_id,
@@ -478,6 +718,7 @@ class BroadcastService:
             status='cancelled'
             if cancelled
             else ('completed' if failed_count == 0 and blocked_count == 0 else 'partial'),
+            total_count=total_count,
         )
 
     async def _mark_cancelled(
@@ -516,8 +757,10 @@ class BroadcastService:
         sent_count: int,
         failed_count: int,
         blocked_count: int = 0,
+        *,
+        resume_cursor: int | None = None,
     ) -> None:
-        """Периодически обновляет прогресс рассылки, чтобы держать соединение активным."""
+        """Периодически обновляет прогресс рассылки и курсор для продолжения после рестарта."""
 
         await self._safe_status_update(
             broadcast_id,
@@ -526,6 +769,7 @@ class BroadcastService:
             blocked_count,
             status='in_progress',
             update_completed_at=False,
+            resume_cursor=resume_cursor,
         )
 
     async def _safe_status_update(
@@ -537,6 +781,8 @@ class BroadcastService:
         *,
         status: str,
         update_completed_at: bool = True,
+        resume_cursor: int | None = None,
+        total_count: int | None = None,
     ) -> None:
         attempts = 0
 
@@ -551,6 +797,10 @@ class BroadcastService:
                     broadcast.failed_count = failed_count
                     broadcast.blocked_count = blocked_count
                     broadcast.status = status
+                    if resume_cursor is not None:
+                        broadcast.resume_cursor = resume_cursor
+                    if total_count is not None:
+                        broadcast.total_count = total_count
 
                     if update_completed_at:
                         broadcast.completed_at = datetime.now(UTC)
@@ -0,0 +1,212 @@
+"""Пакетная запись кликов по кнопкам и команд бота (`button_click_logs`).
+
+Раньше ButtonStatsMiddleware на каждый клик запускал отдельную задачу со
+своей сессией БД и одиночным INSERT — в пике это соединение из пула и
+транзакция на каждое нажатие, конкурирующие с настоящими хендлерами.
+Теперь клики складываются в ограниченный буфер, а один фоновый воркер раз в
+BUTTON_CLICK_LOG_FLUSH_INTERVAL_MS (или при накоплении
+BUTTON_CLICK_LOG_BATCH_SIZE строк) пишет их одним многострочным INSERT.
+При переполнении буфера клики отбрасываются со счётчиком — аналитика не
+должна тормозить бота. На остановке буфер сбрасывается в БД.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+import structlog
+from sqlalchemy import insert, or_, select
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.database.models import ButtonClickLog, User
+
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass(slots=True)
+class _PendingClick:
+    button_id: str
+    user_id: int | None
+    callback_data: str | None
+    button_type: str | None
+    button_text: str | None
+    clicked_at: datetime
+
+
+class ButtonClickLogWriter:
+    """Ограниченный буфер кликов с одним фоновым пакетным писателем."""
+
+    def __init__(self) -> None:
+        self._buffer: deque[_PendingClick] = deque()
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def _interval(self) -> float:
+        return max(0.05, int(settings.BUTTON_CLICK_LOG_FLUSH_INTERVAL_MS) / 1000)
+
+    @property
+    def _batch_size(self) -> int:
+        return max(1, int(settings.BUTTON_CLICK_LOG_BATCH_SIZE))
+
+    @property
+    def _buffer_size(self) -> int:
+        return max(self._batch_size, int(settings.BUTTON_CLICK_LOG_BUFFER_SIZE))
+
+    def is_running(self) -> bool:
+        return self._running and self._task is not None and not self._task.done()
+
+    def record(
+        self,
+        *,
+        button_id: str,
+        user_id: int | None = None,
+        callback_data: str | None = None,
+        button_type: str | None = None,
+        button_text: str | None = None,
+    ) -> bool:
+        """Ставит клик в буфер.
+
+        Возвращает False, если писатель не запущен — тогда вызывающий код
+        пишет клик сам (прежнее поведение). Переполненный буфер считается
+        принятым: клик отбрасывается и учитывается в ``dropped``.
+        """
+        if not self.is_running():
+            return False
+        if len(self._buffer) >= self._buffer_size:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning('Буфер кликов переполнен, клики отбрасываются', dropped=self.dropped)
+            return True
+        self._buffer.append(
+            _PendingClick(
+                button_id=button_id,
+                user_id=user_id,
+                callback_data=callback_data,
+                button_type=button_type,
+                button_text=button_text,
+                clicked_at=datetime.now(UTC),
+            )
+        )
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+        return True
+
+    async def start(self) -> None:
+        if not settings.BUTTON_CLICK_LOG_BATCH_ENABLED:
+            logger.info('Пакетная запись кликов отключена настройками')
+            return
+        if self.is_running():
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(
+            'Пакетная запись кликов запущена',
+            interval=self._interval,
+            batch_size=self._batch_size,
+            buffer_size=self._buffer_size,
+        )
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    async def _loop(self) -> None:
+        while self._running:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._interval)
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+                while await self.flush() >= self._batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error('Ошибка пакетной записи кликов', error=error)
+
+    @staticmethod
+    async def _resolve_user_ids(db, raw_ids: set[int]) -> dict[int, int]:
+        """Сопоставляет telegram_id (из бота) или User.id (из кабинета) с User.id для FK."""
+        if not raw_ids:
+            return {}
+        result = await db.execute(
+            select(User.id, User.telegram_id).where(or_(User.telegram_id.in_(raw_ids), User.id.in_(raw_ids)))
+        )
+        by_telegram: dict[int, int] = {}
+        by_id: dict[int, int] = {}
+        for user_id, telegram_id in result.all():
+            if telegram_id in raw_ids:
+                by_telegram[telegram_id] = user_id
+            if user_id in raw_ids:
+                by_id[user_id] = user_id
+        # Как и при одиночной записи, совпадение по telegram_id приоритетнее.
+        return {**by_id, **by_telegram}
+
+    async def flush(self) -> int:
+        """Пишет одну пачку из буфера; возвращает число записанных строк."""
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            batch = [self._buffer.popleft() for _ in range(min(self._batch_size, len(self._buffer)))]
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    user_ids = await self._resolve_user_ids(
+                        db, {click.user_id for click in batch if click.user_id is not None}
+                    )
+                    rows = [
+                        {
+                            'button_id': click.button_id,
+                            'user_id': user_ids.get(click.user_id) if click.user_id is not None else None,
+                            'callback_data': click.callback_data,
+                            'button_type': click.button_type,
+                            'button_text': click.button_text,
+                            'clicked_at': click.clicked_at,
+                        }
+                        for click in batch
+                    ]
+                    await db.execute(insert(ButtonClickLog), rows)
+                    await db.commit()
+            except Exception as error:
+                # Аналитика не критична: не копим пачку бесконечно при лежащей БД.
+                self.failed += len(batch)
+                logger.warning('Не удалось записать пачку кликов', error=error, rows=len(batch))
+                return 0
+
+            self.flushes += 1
+            self.written += len(batch)
+            return len(batch)
+
+    def get_stats(self) -> dict[str, int | bool]:
+        return {
+            'running': self.is_running(),
+            'pending': len(self._buffer),
+            'flushes': self.flushes,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+button_click_log_writer = ButtonClickLogWriter()
@@ -9,10 +9,11 @@ import time
 from typing import Any
 from urllib.parse import unquote_plus
 
-import httpx
+import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -72,23 +73,21 @@ class CloudPaymentsService:
         url = f'{self.api_url}/{path.lstrip("/")}'
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.request(
-                    method,
-                    url,
-                    json=json,
-                    headers=self._build_headers(),
-                )
-
-                data = response.json()
-
-                if response.status_code >= 400:
-                    logger.error('CloudPayments API error', status_code=response.status_code, data=data)
-                    raise CloudPaymentsAPIError(f'CloudPayments API returned status {response.status_code}')
+            async with http_transport.session('cloudpayments').request(
+                method,
+                url,
+                json=json,
+                headers=self._build_headers(),
+            ) as response:
+                data = await response.json(content_type=None)
+
+                if response.status >= 400:
+                    logger.error('CloudPayments API error', status_code=response.status, data=data)
+                    raise CloudPaymentsAPIError(f'CloudPayments API returned status {response.status}')
 
                 return data
 
-        except httpx.RequestError as error:
+        except (aiohttp.ClientError, TimeoutError) as error:
             logger.error('Error communicating with CloudPayments API', error=error)
             raise CloudPaymentsAPIError('Failed to communicate with CloudPayments API') from error
 
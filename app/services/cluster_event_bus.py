@@ -0,0 +1,272 @@
+"""Cross-instance relay of WebSocket deliveries over Redis pub/sub.
+
+Every WebSocket manager (``event_emitter``, ``cabinet_ws_manager``,
+``support_ws_manager``) only knows sockets connected to its own process. With
+EVENT_BUS_CLUSTER_ENABLED each local delivery is also published to a Redis
+channel per kind, and every other instance hands the message to the handler
+registered for that kind, which delivers it to *its* local sockets.
+
+Only socket deliveries are relayed — never listeners, webhooks or other side
+effects — so an event still has exactly one origin that acts on it.
+
+Envelopes carry an id and the origin instance id. The origin never re-applies
+its own messages (it already delivered locally), and ids already seen are
+ignored for EVENT_BUS_DEDUP_TTL_SECONDS, so a redelivered message does not
+reach a socket twice. Delivery latency (publish → receive on another
+instance) is tracked for ``get_stats``.
+
+Publishing is fire-and-forget through a bounded queue: the emitting code path
+never waits for Redis.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import redis.asyncio as redis
+import structlog
+
+from app.config import settings
+
+
+logger = structlog.get_logger(__name__)
+
+RemoteHandler = Callable[[dict[str, Any]], Awaitable[None] | None]
+
+_DEDUP_MAX_ENTRIES = 50_000
+_LATENCY_SAMPLES = 1000
+
+
+class ClusterEventBus:
+    """Шина событий между экземплярами приложения поверх Redis pub/sub."""
+
+    def __init__(
+        self,
+        *,
+        instance_id: str | None = None,
+        redis_factory: Callable[[], Any] | None = None,
+    ) -> None:
+        self.instance_id = instance_id or uuid.uuid4().hex
+        self._redis_factory = redis_factory
+        self._handlers: dict[str, RemoteHandler] = {}
+        self._redis: Any | None = None
+        self._outgoing: asyncio.Queue[tuple[str, str]] | None = None
+        self._publisher_task: asyncio.Task | None = None
+        self._listener_task: asyncio.Task | None = None
+        self._handler_tasks: set[asyncio.Task] = set()
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._latencies_ms: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self.published = 0
+        self.publish_dropped = 0
+        self.publish_errors = 0
+        self.received = 0
+        self.duplicates = 0
+        self.handler_errors = 0
+
+    # ------------------------------------------------------------------
+    # Регистрация и жизненный цикл
+    # ------------------------------------------------------------------
+
+    def subscribe(self, kind: str, handler: RemoteHandler) -> None:
+        """Назначить обработчик сообщений вида ``kind`` от других экземпляров."""
+        self._handlers[kind] = handler
+
+    def _channel(self, kind: str) -> str:
+        return f'{settings.EVENT_BUS_CHANNEL_PREFIX}:{kind}'
+
+    def is_running(self) -> bool:
+        return self._listener_task is not None and not self._listener_task.done()
+
+    async def start(self) -> None:
+        if not settings.EVENT_BUS_CLUSTER_ENABLED or self.is_running():
+            return
+
+        if self._redis_factory is not None:
+            self._redis = self._redis_factory()
+        else:
+            self._redis = redis.from_url(settings.EVENT_BUS_REDIS_URL or settings.REDIS_URL)
+
+        self._outgoing = asyncio.Queue(maxsize=max(1, settings.EVENT_BUS_PUBLISH_QUEUE_SIZE))
+        self._publisher_task = asyncio.create_task(self._publisher_loop(self._outgoing), name='cluster-event-publisher')
+        ready = asyncio.Event()
+        self._listener_task = asyncio.create_task(self._listener_loop(ready), name='cluster-event-listener')
+        await ready.wait()
+        logger.info('Кластерная шина событий запущена', instance_id=self.instance_id)
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._listener_task, self._publisher_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._listener_task = None
+        self._publisher_task = None
+        self._outgoing = None
+
+        if self._handler_tasks:
+            await asyncio.gather(*list(self._handler_tasks), return_exceptions=True)
+
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception as error:
+                logger.debug('Ошибка закрытия Redis шины событий', error=error)
+            self._redis = None
+
+    # ------------------------------------------------------------------
+    # Публикация
+    # ------------------------------------------------------------------
+
+    def publish(self, kind: str, data: dict[str, Any]) -> bool:
+        """Передать локально доставленное сообщение другим экземплярам.
+
+        No-op, если кластерный режим выключен. Не ждёт Redis: при переполненной
+        очереди сообщение отбрасывается и учитывается в ``publish_dropped``.
+        """
+        if self._outgoing is None:
+            return False
+
+        envelope = {
+            'id': uuid.uuid4().hex,
+            'origin': self.instance_id,
+            'ts': time.time(),
+            'data': data,
+        }
+        try:
+            self._outgoing.put_nowait((self._channel(kind), json.dumps(envelope, default=str, ensure_ascii=False)))
+        except asyncio.QueueFull:
+            self.publish_dropped += 1
+            logger.warning('Очередь кластерной шины переполнена, сообщение отброшено', kind=kind)
+            return False
+        return True
+
+    async def _publisher_loop(self, queue: asyncio.Queue[tuple[str, str]]) -> None:
+        while True:
+            channel, message = await queue.get()
+            try:
+                await self._redis.publish(channel, message)
+                self.published += 1
+            except Exception as error:
+                self.publish_errors += 1
+                logger.warning('Не удалось опубликовать событие в Redis', channel=channel, error=error)
+
+    # ------------------------------------------------------------------
+    # Приём
+    # ------------------------------------------------------------------
+
+    async def _listener_loop(self, ready: asyncio.Event) -> None:
+        prefix = f'{settings.EVENT_BUS_CHANNEL_PREFIX}:'
+        backoff = 1.0
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                # Подписка по шаблону: обработчики, зарегистрированные после start(), тоже работают
+                await pubsub.psubscribe(f'{prefix}*')
+                ready.set()
+                backoff = 1.0
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or message.get('type') != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    kind = channel.removeprefix(prefix)
+                    if kind in self._handlers:
+                        self._handle_message(kind, message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                ready.set()
+                logger.warning('Подписка кластерной шины прервана, переподключение', error=error, retry_in=backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def _handle_message(self, kind: str, raw: bytes | str) -> None:
+        try:
+            envelope = json.loads(raw)
+            message_id = envelope['id']
+            origin = envelope['origin']
+            data = envelope['data']
+        except (ValueError, KeyError, TypeError) as error:
+            self.handler_errors += 1
+            logger.warning('Некорректное сообщение кластерной шины', kind=kind, error=error)
+            return
+
+        if origin == self.instance_id:
+            return
+        if not self._mark_seen(message_id):
+            self.duplicates += 1
+            return
+
+        self.received += 1
+        sent_at = envelope.get('ts')
+        if isinstance(sent_at, int | float):
+            self._latencies_ms.append(max(0.0, (time.time() - sent_at) * 1000))
+
+        handler = self._handlers[kind]
+        try:
+            result = handler(data)
+        except Exception as error:
+            self.handler_errors += 1
+            logger.exception('Ошибка обработчика кластерной шины', kind=kind, error=error)
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(self._await_handler(kind, result))
+            self._handler_tasks.add(task)
+            task.add_done_callback(self._handler_tasks.discard)
+
+    async def _await_handler(self, kind: str, coroutine: Awaitable[None]) -> None:
+        try:
+            await coroutine
+        except Exception as error:
+            self.handler_errors += 1
+            logger.warning('Ошибка доставки события из кластерной шины', kind=kind, error=error)
+
+    def _mark_seen(self, message_id: str) -> bool:
+        now = time.monotonic()
+        while self._seen:
+            oldest_id, expires_at = next(iter(self._seen.items()))
+            if expires_at > now and len(self._seen) < _DEDUP_MAX_ENTRIES:
+                break
+            self._seen.pop(oldest_id)
+        if message_id in self._seen:
+            return False
+        self._seen[message_id] = now + settings.EVENT_BUS_DEDUP_TTL_SECONDS
+        return True
+
+    def get_stats(self) -> dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+
+        def _percentile(fraction: float) -> float | None:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 2)
+
+        return {
+            'enabled': self.is_running(),
+            'instance_id': self.instance_id,
+            'published': self.published,
+            'publish_dropped': self.publish_dropped,
+            'publish_errors': self.publish_errors,
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'handler_errors': self.handler_errors,
+            'latency_ms_p50': _percentile(0.5),
+            'latency_ms_p95': _percentile(0.95),
+            'latency_ms_max': round(latencies[-1], 2) if latencies else None,
+        }
+
+
+cluster_event_bus = ClusterEventBus()
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import asyncio
-import json
 from collections.abc import Callable
 from datetime import UTC, datetime
 from typing import Any
@@ -9,7 +8,9 @@ from typing import Any
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.services.cluster_event_bus import cluster_event_bus
 from app.services.webhook_service import webhook_service
+from app.services.websocket_fanout import WebSocketFanout
 
 
 logger = structlog.get_logger(__name__)
@@ -20,7 +21,8 @@ class EventEmitter:
 
     def __init__(self) -> None:
         self._listeners: dict[str, list[Callable]] = {}
-        self._websocket_connections: set[Any] = set()
+        self._websockets = WebSocketFanout('events')
+        self._listener_tasks: set[asyncio.Task] = set()
 
     def on(self, event_type: str, callback: Callable) -> None:
         """Подписаться на событие."""
@@ -38,17 +40,13 @@ class EventEmitter:
 
     def register_websocket(self, websocket: Any) -> None:
         """Зарегистрировать WebSocket подключение."""
-        self._websocket_connections.add(websocket)
-        logger.debug(
-            'WebSocket connection registered. Total', websocket_connections_count=len(self._websocket_connections)
-        )
+        self._websockets.register(websocket)
+        logger.debug('WebSocket connection registered. Total', websocket_connections_count=len(self._websockets))
 
     def unregister_websocket(self, websocket: Any) -> None:
         """Отменить регистрацию WebSocket подключения."""
-        self._websocket_connections.discard(websocket)
-        logger.debug(
-            'WebSocket connection unregistered. Total', websocket_connections_count=len(self._websocket_connections)
-        )
+        self._websockets.unregister(websocket)
+        logger.debug('WebSocket connection unregistered. Total', websocket_connections_count=len(self._websockets))
 
     async def emit(
         self,
@@ -56,7 +54,12 @@ class EventEmitter:
         payload: dict[str, Any],
         db: AsyncSession | None = None,
     ) -> None:
-        """Отправить событие всем подписчикам."""
+        """Отправить событие всем подписчикам.
+
+        Ничего не ждёт по сети: асинхронные слушатели запускаются отдельными
+        задачами, WebSocket-клиенты получают событие через очереди хаба, а
+        webhooks (если передан ``db``) уходят в фоновую очередь доставки.
+        """
         event_data = {
             'type': event_type,
             'payload': payload,
@@ -64,42 +67,50 @@ class EventEmitter:
         }
 
         # Вызываем локальные слушатели
-        if event_type in self._listeners:
-            for callback in self._listeners[event_type]:
-                try:
-                    if asyncio.iscoroutinefunction(callback):
-                        await callback(event_data)
-                    else:
-                        callback(event_data)
-                except Exception as error:
-                    logger.exception('Error in event listener', event_type=event_type, error=error)
-
-        # Отправляем через WebSocket
-        await self._broadcast_to_websockets(event_data)
-
-        # Отправляем webhooks
-        if db:
-            await webhook_service.send_webhook(db, event_type, payload)
-
-    async def _broadcast_to_websockets(self, event_data: dict[str, Any]) -> None:
-        """Отправить событие всем подключенным WebSocket клиентам."""
-        if not self._websocket_connections:
-            return
-
-        disconnected = set()
-        message = json.dumps(event_data, default=str, ensure_ascii=False)
-
-        for ws in self._websocket_connections:
+        for callback in list(self._listeners.get(event_type, ())):
             try:
-                await ws.send_text(message)
+                if asyncio.iscoroutinefunction(callback):
+                    task = asyncio.create_task(self._run_listener(callback, event_type, event_data))
+                    self._listener_tasks.add(task)
+                    task.add_done_callback(self._listener_tasks.discard)
+                else:
+                    callback(event_data)
             except Exception as error:
-                logger.warning('Failed to send WebSocket message', error=error)
-                disconnected.add(ws)
+                logger.exception('Error in event listener', event_type=event_type, error=error)
+
+        # Отправляем через WebSocket (сериализация один раз на событие)
+        self._websockets.publish(event_data)
+        # В кластерном режиме — и сокетам, подключённым к другим экземплярам
+        cluster_event_bus.publish('events', event_data)
 
-        # Удаляем отключенные соединения
-        for ws in disconnected:
-            self.unregister_websocket(ws)
+        # Отправляем webhooks
+        if db:
+            webhook_service.enqueue(event_type, payload)
+
+    def deliver_remote(self, event_data: dict[str, Any]) -> None:
+        """Доставить событие другого экземпляра локальным WebSocket-клиентам.
+
+        Слушатели и webhooks не вызываются: их уже отработал экземпляр-источник.
+        """
+        self._websockets.publish(event_data)
+
+    @staticmethod
+    async def _run_listener(callback: Callable, event_type: str, event_data: dict[str, Any]) -> None:
+        try:
+            await callback(event_data)
+        except Exception as error:
+            logger.exception('Error in event listener', event_type=event_type, error=error)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Счётчики хаба WebSocket и очереди webhooks."""
+        return {
+            'websockets': self._websockets.get_stats(),
+            'cluster': cluster_event_bus.get_stats(),
+            'webhooks': webhook_service.get_queue_stats(),
+            'pending_listeners': len(self._listener_tasks),
+        }
 
 
 # Глобальный экземпляр event emitter
 event_emitter = EventEmitter()
+cluster_event_bus.subscribe('events', event_emitter.deliver_remote)
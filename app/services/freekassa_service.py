@@ -12,6 +12,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -332,15 +333,11 @@ class FreekassaService:
         logger.info('Freekassa API create_order params', params=params)
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/orders/create',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('freekassa').post(
+                f'{API_BASE_URL}/orders/create',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 text = await response.text()
                 logger.info('Freekassa API response', text=text)
 
@@ -398,15 +395,11 @@ class FreekassaService:
         logger.debug('Freekassa get_order_status params', params=params)
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/orders',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('freekassa').post(
+                f'{API_BASE_URL}/orders',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 text = await response.text()
                 logger.debug('Freekassa get_order_status response', text=text)
                 return await response.json()
@@ -423,15 +416,11 @@ class FreekassaService:
         params['signature'] = self._generate_api_signature(params)
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/balance',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('freekassa').post(
+                f'{API_BASE_URL}/balance',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 return await response.json()
         except aiohttp.ClientError as e:
             logger.exception('Freekassa API connection error', error=e)
@@ -446,15 +435,11 @@ class FreekassaService:
         params['signature'] = self._generate_api_signature(params)
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/currencies',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('freekassa').post(
+                f'{API_BASE_URL}/currencies',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 return await response.json()
         except aiohttp.ClientError as e:
             logger.exception('Freekassa API connection error', error=e)
@@ -9,6 +9,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -27,9 +28,6 @@ class JupiterAPIError(Exception):
 class JupiterService:
     """Клиент для FPGate P2P v2.1 (Jupiter / app.juppiter.tech)."""
 
-    def __init__(self) -> None:
-        self._session: aiohttp.ClientSession | None = None
-
     @property
     def base_url(self) -> str:
         return (settings.JUPITER_BASE_URL or 'https://app.juppiter.tech').rstrip('/')
@@ -52,16 +50,7 @@ class JupiterService:
         return (settings.JUPITER_METHOD_DESCRIPTION or 'SBP').strip() or 'SBP'
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-            )
-        return self._session
-
-    async def close(self) -> None:
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        return http_transport.session('jupiter')
 
     @staticmethod
     def _build_signature_string(parts: list[tuple[str, Any]]) -> str:
@@ -10,6 +10,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -194,15 +195,11 @@ class KassaAiService:
         )
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/orders/create',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('kassa_ai').post(
+                f'{API_BASE_URL}/orders/create',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 text = await response.text()
                 logger.info('KassaAI API response', text=text)
 
@@ -275,15 +272,11 @@ class KassaAiService:
         logger.info('KassaAI get_order_status: order_id', order_id=order_id)
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/orders',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('kassa_ai').post(
+                f'{API_BASE_URL}/orders',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 text = await response.text()
                 logger.info('KassaAI get_order_status response', text=text)
                 return await response.json()
@@ -300,15 +293,11 @@ class KassaAiService:
         params['signature'] = self._generate_hmac_signature(params)
 
         try:
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(
-                    f'{API_BASE_URL}/balance',
-                    json=params,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response,
-            ):
+            async with http_transport.session('kassa_ai').post(
+                f'{API_BASE_URL}/balance',
+                json=params,
+                headers={'Content-Type': 'application/json'},
+            ) as response:
                 return await response.json()
         except aiohttp.ClientError as e:
             logger.exception('KassaAI API connection error', error=e)
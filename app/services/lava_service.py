@@ -29,6 +29,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -66,9 +67,6 @@ class LavaService:
     * ``LAVA_WEBHOOK_SECRET`` — shop_webhook_additional_key, подписывает входящие webhook'и.
     """
 
-    def __init__(self) -> None:
-        self._session: aiohttp.ClientSession | None = None
-
     @property
     def base_url(self) -> str:
         return (settings.LAVA_BASE_URL or 'https://api.lava.ru').rstrip('/')
@@ -86,16 +84,7 @@ class LavaService:
         return settings.LAVA_WEBHOOK_SECRET or ''
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-            )
-        return self._session
-
-    async def close(self) -> None:
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        return http_transport.session('lava')
 
     @staticmethod
     def _canonical_json(payload: dict[str, Any]) -> str:
@@ -0,0 +1,211 @@
+"""Планировщик этапов мониторинга.
+
+Каждый этап (автоплатежи, истечения, уведомления, чистка, сверки с провайдерами)
+выполняется в своей сессии и транзакции, со своим интервалом и таймаутом.
+Этапы одной группы идут последовательно в заданном порядке (например, автоплатёж
+раньше истечения подписок), разные группы работают параллельно — медленный
+запрос к панели или провайдеру не задерживает уведомления об истечении, а
+поздняя ошибка откатывает только свой этап.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import AsyncSessionLocal
+
+
+logger = structlog.get_logger(__name__)
+
+# Пауза группы между проверками, если ближайший этап ещё не созрел
+_MIN_SLEEP_SECONDS = 1.0
+_MAX_SLEEP_SECONDS = 60.0
+
+
+@dataclass(slots=True)
+class MonitoringStage:
+    name: str
+    title: str
+    run: Callable[[AsyncSession], Awaitable[Any]]
+    group: str
+    interval_seconds: float
+    timeout_seconds: float
+
+
+@dataclass(slots=True)
+class StageStats:
+    runs: int = 0
+    failures: int = 0
+    running: bool = False
+    last_started_at: datetime | None = None
+    last_finished_at: datetime | None = None
+    last_duration: float | None = None
+    last_rows: int | None = None
+    last_success_at: datetime | None = None
+    last_error: str | None = None
+    last_error_at: datetime | None = None
+
+
+class _RowCounter:
+    """Считает строки, записанные сессией этапа: flush ORM-объектов и массовые UPDATE/DELETE."""
+
+    def __init__(self, db: AsyncSession):
+        self.rows = 0
+        self._session = db.sync_session
+
+    def __enter__(self):
+        event.listen(self._session, 'after_flush', self._after_flush)
+        event.listen(self._session, 'after_bulk_update', self._after_bulk)
+        event.listen(self._session, 'after_bulk_delete', self._after_bulk)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self._session, 'after_flush', self._after_flush)
+        event.remove(self._session, 'after_bulk_update', self._after_bulk)
+        event.remove(self._session, 'after_bulk_delete', self._after_bulk)
+
+    def _after_flush(self, session, _flush_context) -> None:
+        self.rows += len(session.new) + len(session.dirty) + len(session.deleted)
+
+    def _after_bulk(self, context) -> None:
+        self.rows += max(context.result.rowcount or 0, 0)
+
+
+class StageScheduler:
+    def __init__(
+        self,
+        stages: Sequence[MonitoringStage],
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        on_failure: Callable[[MonitoringStage, str], Awaitable[None]] | None = None,
+    ):
+        self.stages = list(stages)
+        self.stats: dict[str, StageStats] = {stage.name: StageStats() for stage in self.stages}
+        self._session_factory = session_factory
+        self._on_failure = on_failure
+
+    @property
+    def groups(self) -> dict[str, list[MonitoringStage]]:
+        groups: dict[str, list[MonitoringStage]] = {}
+        for stage in self.stages:
+            groups.setdefault(stage.group, []).append(stage)
+        return groups
+
+    def seconds_until_due(self, stage: MonitoringStage, now: float | None = None) -> float:
+        started = self.stats[stage.name].last_started_at
+        if started is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return max(0.0, started.timestamp() + stage.interval_seconds - now)
+
+    async def run_stage(self, stage: MonitoringStage) -> bool:
+        stats = self.stats[stage.name]
+        stats.running = True
+        stats.runs += 1
+        stats.last_started_at = datetime.now(UTC)
+        started = time.perf_counter()
+        error: str | None = None
+
+        try:
+            async with self._session_factory() as db:
+                with _RowCounter(db) as counter:
+                    try:
+                        await asyncio.wait_for(stage.run(db), timeout=stage.timeout_seconds)
+                        await db.commit()
+                    except TimeoutError:
+                        error = f'таймаут {stage.timeout_seconds:g} с'
+                    except Exception as e:
+                        error = str(e) or type(e).__name__
+                    if error is not None:
+                        try:
+                            await db.rollback()
+                        except Exception as rollback_error:
+                            logger.warning(
+                                'Не удалось откатить транзакцию этапа мониторинга',
+                                stage=stage.name,
+                                error=rollback_error,
+                            )
+                stats.last_rows = counter.rows
+        except Exception as e:
+            error = error or str(e) or type(e).__name__
+        finally:
+            stats.running = False
+            stats.last_duration = time.perf_counter() - started
+            stats.last_finished_at = datetime.now(UTC)
+
+        if error is None:
+            stats.last_success_at = stats.last_finished_at
+            logger.debug(
+                'Этап мониторинга выполнен',
+                stage=stage.name,
+                duration=round(stats.last_duration, 3),
+                rows=stats.last_rows,
+            )
+            return True
+
+        stats.failures += 1
+        stats.last_error = error
+        stats.last_error_at = stats.last_finished_at
+        logger.error(
+            'Ошибка этапа мониторинга',
+            stage=stage.name,
+            error=error,
+            duration=round(stats.last_duration, 3),
+        )
+        if self._on_failure is not None:
+            try:
+                await self._on_failure(stage, error)
+            except Exception as e:
+                logger.error('Ошибка обработчика сбоя этапа мониторинга', stage=stage.name, error=e)
+        return False
+
+    async def run_group(self, stages: Sequence[MonitoringStage], force: bool = False) -> None:
+        """Выполняет созревшие этапы группы по порядку; сбой этапа не останавливает следующие."""
+        for stage in stages:
+            if force or self.seconds_until_due(stage) <= 0:
+                await self.run_stage(stage)
+
+    async def run_due(self, force: bool = False) -> None:
+        """Один проход: все группы параллельно."""
+        await asyncio.gather(*(self.run_group(stages, force) for stages in self.groups.values()))
+
+    async def run_group_forever(self, stages: Sequence[MonitoringStage], is_running: Callable[[], bool]) -> None:
+        while is_running():
+            try:
+                await self.run_group(stages)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error('Ошибка в группе этапов мониторинга', group=stages[0].group, error=e)
+            delay = min(self.seconds_until_due(stage) for stage in stages)
+            await asyncio.sleep(min(max(delay, _MIN_SLEEP_SECONDS), _MAX_SLEEP_SECONDS))
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        rows = []
+        for stage in self.stages:
+            stats = self.stats[stage.name]
+            rows.append(
+                {
+                    'name': stage.name,
+                    'title': stage.title,
+                    'group': stage.group,
+                    'interval_seconds': stage.interval_seconds,
+                    'timeout_seconds': stage.timeout_seconds,
+                    'runs': stats.runs,
+                    'failures': stats.failures,
+                    'running': stats.running,
+                    'last_started_at': stats.last_started_at,
+                    'last_duration': stats.last_duration,
+                    'last_rows': stats.last_rows,
+                    'last_success_at': stats.last_success_at,
+                    'last_error': stats.last_error,
+                    'last_error_at': stats.last_error_at,
+                }
+            )
+        return rows
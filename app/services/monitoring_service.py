@@ -21,6 +21,7 @@ from app.database.crud.notification import (
     notification_sent,
     record_notification,
 )
+from app.database.crud.payment_index import PaymentIndexBackfill
 from app.database.crud.subscription import (
     deactivate_subscription,
     extend_subscription,
@@ -55,6 +56,7 @@ from app.external.remnawave_api import (
 )
 from app.localization.texts import get_texts
 from app.services.grace_access_runtime import update_panel_user_grace_safe
+from app.services.monitoring_scheduler import MonitoringStage, StageScheduler
 from app.services.notification_delivery_service import (
     NotificationType,
     notification_delivery_service,
@@ -196,6 +198,10 @@ logger = structlog.get_logger(__name__)
 
 LOGO_PATH = Path(settings.LOGO_FILE)
 
+# Досборка payment_index: раз в минуту, не больше 20 пачек по 500 платежей за проход
+_PAYMENT_INDEX_BACKFILL_INTERVAL = 60
+_PAYMENT_INDEX_BACKFILL_BATCHES = 20
+
 
 class MonitoringService:
     def __init__(self, bot=None):
@@ -204,7 +210,9 @@ class MonitoringService:
         self.bot = bot
         self._notified_users: set[str] = set()
         self._last_cleanup = datetime.now(UTC)
-        self._sla_task = None
+        self._scheduler = StageScheduler(self._build_stages(), on_failure=self._on_stage_failure)
+        self._group_tasks: list[asyncio.Task] = []
+        self._payment_index_backfill = PaymentIndexBackfill()
         # In-memory fallback состояния уведомлений об ошибке автоплатежа (на случай
         # недоступности Redis). Ключ — (subscription_id, cycle_token=int(end_date.timestamp())).
         self._autopay_fail_state: dict[tuple[int, int], dict] = {}
@@ -313,6 +321,73 @@ class MonitoringService:
 
         return False
 
+    def _build_stages(self) -> list[MonitoringStage]:
+        """Этапы цикла мониторинга. Порядок внутри группы важен, группы независимы."""
+        default_interval = settings.MONITORING_INTERVAL * 60
+        intervals = settings.get_monitoring_stage_intervals()
+        timeouts = settings.get_monitoring_stage_timeouts()
+        try:
+            sla_interval = max(10, int(getattr(settings, 'SUPPORT_TICKET_SLA_CHECK_INTERVAL_SECONDS', 300)))
+        except Exception:
+            sla_interval = 60
+
+        specs = (
+            ('expired_offers', 'Просроченные скидочные предложения', self._deactivate_expired_offers, 'promo'),
+            ('promo_discounts', 'Истёкшие скидки промо-предложений', self._cleanup_expired_promo_discounts, 'promo'),
+            ('test_access', 'Тестовые доступы к сквадам', self._cleanup_expired_test_access, 'promo'),
+            # ВАЖНО: autopay ПЕРЕД expired — иначе подписки с автоплатой
+            # экспайрятся до того, как autopay успеет их продлить.
+            # Реконсилиации Platega/Lava — страховка на случай потерянных
+            # коллбеков, тоже до истечения.
+            ('notification_cache', 'Кеш уведомлений', self._cleanup_notification_cache_stage, 'subscriptions'),
+            ('autopay', 'Автоплатежи с баланса', self._process_autopayments, 'subscriptions'),
+            ('recurrent_autopay', 'Рекуррентные автоплатежи', self._process_recurrent_payments, 'subscriptions'),
+            ('platega_reconcile', 'Сверка подписок Platega', self._reconcile_platega_subscriptions, 'subscriptions'),
+            ('lava_reconcile', 'Сверка подписок Lava', self._reconcile_lava_subscriptions, 'subscriptions'),
+            ('expired', 'Истёкшие подписки', self._check_expired_subscriptions, 'subscriptions'),
+            ('expiring', 'Истекающие подписки', self._check_expiring_subscriptions, 'subscriptions'),
+            (
+                'expired_followups',
+                'Напоминания после истечения',
+                self._check_expired_subscription_followups,
+                'subscriptions',
+            ),
+            ('low_balance', 'Низкий баланс', self._check_low_balance_alerts, 'subscriptions'),
+            ('trial_expiring', 'Окончание триалов', self._check_trial_expiring_soon, 'trials'),
+            ('trial_channels', 'Подписка триалов на канал', self._check_trial_channel_subscriptions, 'trials'),
+            ('traffic_warnings', 'Предупреждения о трафике', self._check_traffic_warnings, 'traffic'),
+            ('guest_purchases', 'Зависшие гостевые покупки', self._retry_stuck_guest_purchases, 'guest_purchases'),
+            ('refresh_tokens', 'Чистка refresh-токенов', self._cleanup_expired_refresh_tokens, 'cleanup'),
+            ('button_click_logs', 'Чистка лога действий', self._cleanup_button_click_logs, 'cleanup'),
+            ('inactive_users', 'Удаление неактивных', self._cleanup_inactive_users, 'cleanup'),
+            ('panel_sync', 'Синхронизация с RemnaWave', self._sync_with_remnawave, 'panel'),
+            ('ticket_sla', 'SLA тикетов', self._check_ticket_sla, 'support'),
+            ('payment_index', 'Досборка индекса платежей', self._backfill_payment_index, 'payment_index'),
+        )
+        default_intervals = {'ticket_sla': sla_interval, 'payment_index': _PAYMENT_INDEX_BACKFILL_INTERVAL}
+
+        return [
+            MonitoringStage(
+                name=name,
+                title=title,
+                run=run,
+                group=group,
+                interval_seconds=intervals[name] * 60
+                if name in intervals
+                else default_intervals.get(name, default_interval),
+                timeout_seconds=timeouts.get(name, settings.MONITORING_STAGE_TIMEOUT_SECONDS),
+            )
+            for name, title, run, group in specs
+        ]
+
+    def _refresh_stages(self) -> None:
+        """Пересобирает этапы под текущие настройки, сохраняя накопленную статистику."""
+        previous = self._scheduler.stats
+        self._scheduler = StageScheduler(self._build_stages(), on_failure=self._on_stage_failure)
+        for name, stats in previous.items():
+            if name in self._scheduler.stats:
+                self._scheduler.stats[name] = stats
+
     async def start_monitoring(self):
         if self.is_running:
             logger.warning('Мониторинг уже запущен')
@@ -320,110 +395,91 @@ class MonitoringService:
 
         self.is_running = True
         logger.info('🔄 Запуск службы мониторинга')
-        # Start dedicated SLA loop with its own interval for timely 5-min checks
+        self._refresh_stages()
+        self._group_tasks = [
+            asyncio.create_task(self._scheduler.run_group_forever(stages, lambda: self.is_running))
+            for stages in self._scheduler.groups.values()
+        ]
         try:
-            if not self._sla_task or self._sla_task.done():
-                self._sla_task = asyncio.create_task(self._sla_loop())
-        except Exception as e:
-            logger.error('Не удалось запустить SLA-мониторинг', error=e)
-
-        while self.is_running:
-            try:
-                await self._monitoring_cycle()
-                await asyncio.sleep(settings.MONITORING_INTERVAL * 60)
-
-            except Exception as e:
-                logger.error('Ошибка в цикле мониторинга', error=e)
-                await asyncio.sleep(60)
+            await asyncio.gather(*self._group_tasks)
+        except asyncio.CancelledError:
+            # Отменили саму задачу мониторинга, а не stop_monitoring
+            if self.is_running:
+                raise
+        finally:
+            self.is_running = False
+            for task in self._group_tasks:
+                task.cancel()
+            self._group_tasks = []
 
     def stop_monitoring(self):
         self.is_running = False
         logger.info('ℹ️ Мониторинг остановлен')
-        try:
-            if self._sla_task and not self._sla_task.done():
-                self._sla_task.cancel()
-        except Exception:
-            pass
+        for task in self._group_tasks:
+            if not task.done():
+                task.cancel()
+
+    async def _monitoring_cycle(self, force: bool = False):
+        """Один проход по созревшим этапам (``force`` — по всем), группы параллельно."""
+        await self._scheduler.run_due(force=force)
 
-    async def _monitoring_cycle(self):
+    def get_stage_stats(self) -> list[dict[str, Any]]:
+        return self._scheduler.snapshot()
+
+    async def _on_stage_failure(self, stage: MonitoringStage, error: str) -> None:
         async with AsyncSessionLocal() as db:
-            try:
-                await self._cleanup_notification_cache()
+            await self._log_monitoring_event(
+                db,
+                'monitoring_stage_error',
+                f'Ошибка этапа мониторинга «{stage.title}»: {error}',
+                {'stage': stage.name, 'error': error},
+                is_success=False,
+            )
 
-                expired_offers = await deactivate_expired_offers(db)
-                if expired_offers:
-                    logger.info('🧹 Деактивировано просроченных скидочных предложений', expired_offers=expired_offers)
+    async def _deactivate_expired_offers(self, db: AsyncSession):
+        expired_offers = await deactivate_expired_offers(db)
+        if expired_offers:
+            logger.info('🧹 Деактивировано просроченных скидочных предложений', expired_offers=expired_offers)
 
-                expired_active_discounts = await cleanup_expired_promo_offer_discounts(db)
-                if expired_active_discounts:
-                    logger.info(
-                        '🧹 Сброшено активных скидок промо-предложений с истекшим сроком',
-                        expired_active_discounts=expired_active_discounts,
-                    )
+    async def _cleanup_expired_promo_discounts(self, db: AsyncSession):
+        expired_active_discounts = await cleanup_expired_promo_offer_discounts(db)
+        if expired_active_discounts:
+            logger.info(
+                '🧹 Сброшено активных скидок промо-предложений с истекшим сроком',
+                expired_active_discounts=expired_active_discounts,
+            )
 
-                cleaned_test_access = await promo_offer_service.cleanup_expired_test_access(db)
-                if cleaned_test_access:
-                    logger.info(
-                        '🧹 Отозвано истекших тестовых доступов к сквадам', cleaned_test_access=cleaned_test_access
-                    )
+    async def _cleanup_expired_test_access(self, db: AsyncSession):
+        cleaned_test_access = await promo_offer_service.cleanup_expired_test_access(db)
+        if cleaned_test_access:
+            logger.info('🧹 Отозвано истекших тестовых доступов к сквадам', cleaned_test_access=cleaned_test_access)
 
-                # ВАЖНО: autopay ПЕРЕД check_expired — иначе подписки с автоплатой
-                # экспайрятся до того, как autopay успеет их продлить
-                # Продление с баланса работает всегда, если у подписки autopay_enabled=True
-                await self._process_autopayments(db)
-                # Рекуррентные автоплатежи с карты: требуют ENABLE_AUTOPAY + YOOKASSA_RECURRENT_ENABLED
-                if settings.ENABLE_AUTOPAY and settings.YOOKASSA_RECURRENT_ENABLED:
-                    try:
-                        from app.services.recurrent_payment_service import process_recurrent_payments
+    async def _process_recurrent_payments(self, db: AsyncSession):
+        # Рекуррентные автоплатежи с карты: требуют ENABLE_AUTOPAY + YOOKASSA_RECURRENT_ENABLED.
+        # Продление с баланса (этап autopay) работает всегда, если у подписки autopay_enabled=True
+        if not (settings.ENABLE_AUTOPAY and settings.YOOKASSA_RECURRENT_ENABLED):
+            return
+        try:
+            from app.services.recurrent_payment_service import process_recurrent_payments
 
-                        await process_recurrent_payments(db=db, bot=self.bot)
-                    except Exception as recurrent_error:
-                        logger.error(
-                            'Ошибка рекуррентных автоплатежей',
-                            error=recurrent_error,
-                            exc_info=True,
-                        )
-                # Реконсилиация Platega SBP-подписок: страховка на случай потерянных
-                # коллбеков / зависших PENDING. Гейт внутри метода (PLATEGA_RECURRENT_ENABLED).
-                await self._reconcile_platega_subscriptions(db)
-
-                # Реконсилиация рекуррентных подписок Lava: та же страховка на
-                # случай потерянных вебхуков / недошедших отмен.
-                await self._reconcile_lava_subscriptions(db)
-                await self._check_expired_subscriptions(db)
-                await self._check_expiring_subscriptions(db)
-                await self._check_trial_expiring_soon(db)
-                await self._check_trial_channel_subscriptions(db)
-                await self._check_expired_subscription_followups(db)
-                await self._check_traffic_warnings(db)
-                await self._check_low_balance_alerts(db)
-                await self._retry_stuck_guest_purchases(db)
-                await self._cleanup_expired_refresh_tokens(db)
-                await self._cleanup_button_click_logs(db)
-                await self._cleanup_inactive_users(db)
-                await self._sync_with_remnawave(db)
+            await process_recurrent_payments(db=db, bot=self.bot)
+        except Exception as recurrent_error:
+            logger.error(
+                'Ошибка рекуррентных автоплатежей',
+                error=recurrent_error,
+                exc_info=True,
+            )
 
-                await self._log_monitoring_event(
-                    db,
-                    'monitoring_cycle_completed',
-                    'Цикл мониторинга успешно завершен',
-                    {'timestamp': datetime.now(UTC).isoformat()},
-                )
-                await db.commit()
+    async def _cleanup_notification_cache_stage(self, _db: AsyncSession):
+        await self._cleanup_notification_cache()
 
-            except Exception as e:
-                logger.error('Ошибка в цикле мониторинга', error=e)
-                try:
-                    await self._log_monitoring_event(
-                        db,
-                        'monitoring_cycle_error',
-                        f'Ошибка в цикле мониторинга: {e!s}',
-                        {'error': str(e)},
-                        is_success=False,
-                    )
-                except Exception:
-                    pass
-                await db.rollback()
+    async def _backfill_payment_index(self, db: AsyncSession):
+        # Пачки ограничены, чтобы этап укладывался в таймаут; пройдя все таблицы, этап ничего не делает
+        if self._payment_index_backfill.done:
+            return
+        indexed = await self._payment_index_backfill.run(db, max_batches=_PAYMENT_INDEX_BACKFILL_BATCHES)
+        if indexed:
+            logger.info('📇 Досборка индекса платежей', indexed=indexed, done=self._payment_index_backfill.done)
 
     async def _cleanup_notification_cache(self):
         current_time = datetime.now(UTC)
@@ -3066,26 +3122,6 @@ class MonitoringService:
         except Exception as e:
             logger.error('Ошибка проверки SLA тикетов', error=e)
 
-    async def _sla_loop(self):
-        try:
-            interval_seconds = max(10, int(getattr(settings, 'SUPPORT_TICKET_SLA_CHECK_INTERVAL_SECONDS', 300)))
-        except Exception:
-            interval_seconds = 60
-        while self.is_running:
-            try:
-                async with AsyncSessionLocal() as db:
-                    try:
-                        await self._check_ticket_sla(db)
-                        await db.commit()
-                    except Exception as e:
-                        logger.error('Ошибка в SLA-проверке', error=e)
-                        await db.rollback()
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error('Ошибка в SLA-цикле', error=e)
-            await asyncio.sleep(interval_seconds)
-
     async def _log_monitoring_event(
         self, db: AsyncSession, event_type: str, message: str, data: dict[str, Any] = None, is_success: bool = True
     ):
@@ -3133,6 +3169,7 @@ class MonitoringService:
                     'failed': failed_events,
                     'success_rate': round(successful_events / len(events_24h) * 100, 1) if events_24h else 0,
                 },
+                'stages': self.get_stage_stats(),
             }
 
         except Exception as e:
@@ -3142,6 +3179,7 @@ class MonitoringService:
                 'last_update': datetime.now(UTC),
                 'recent_events': [],
                 'stats_24h': {'total_events': 0, 'successful': 0, 'failed': 0, 'success_rate': 0},
+                'stages': self.get_stage_stats(),
             }
 
     async def force_check_subscriptions(self, db: AsyncSession) -> dict[str, int]:
@@ -7,6 +7,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -20,7 +21,6 @@ class MulenPayService:
         self.shop_id = settings.MULENPAY_SHOP_ID
         self.secret_key = settings.MULENPAY_SECRET_KEY
         self.base_url = settings.MULENPAY_BASE_URL.rstrip('/')
-        self._timeout = aiohttp.ClientTimeout(total=30, connect=10, sock_read=25)
         self._max_retries = 3
         self._retry_delay = 0.5
         self._retryable_statuses = {500, 502, 503, 504}
@@ -51,16 +51,14 @@ class MulenPayService:
 
         for attempt in range(1, self._max_retries + 1):
             try:
-                async with (
-                    aiohttp.ClientSession(timeout=self._timeout) as session,
-                    session.request(
-                        method,
-                        url,
-                        headers=headers,
-                        json=json_data,
-                        params=params,
-                    ) as response,
-                ):
+                # Повторы с логированием по попыткам ведёт сам клиент — у транспорта они выключены
+                async with http_transport.session('mulenpay', max_retries=0).request(
+                    method,
+                    url,
+                    headers=headers,
+                    json=json_data,
+                    params=params,
+                ) as response:
                     data, raw_text = await self._deserialize_response(response)
 
                     if response.status >= 400:
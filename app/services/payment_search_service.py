@@ -1,53 +1,30 @@
-"""Search service for querying payments across all provider tables."""
+"""Search service for querying payments across all providers.
+
+Filtering, ordering, pagination and stats run against the denormalized
+``payment_index`` table (one row per invoice of any provider, maintained by ORM
+hooks on the provider models). Provider rows are loaded only for the page being
+returned.
+"""
 
 from __future__ import annotations
 
+import base64
+import binascii
 import enum
-from collections import Counter
+import json
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 from typing import Any
 
 import structlog
-from sqlalchemy import cast, desc, or_, select
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlalchemy.types import String as SAString
-
-from app.database.models import (
-    AntilopayPayment,
-    AuraPayPayment,
-    CisPayPayment,
-    CloudPaymentsPayment,
-    CryptoBotPayment,
-    DonutPayment,
-    EtoplatezhiPayment,
-    FreekassaPayment,
-    HeleketPayment,
-    JupiterPayment,
-    KassaAiPayment,
-    LavaPayment,
-    MulenPayPayment,
-    OverpayPayment,
-    Pal24Payment,
-    PaymentMethod,
-    PayPearPayment,
-    PlategaPayment,
-    RioPayPayment,
-    RollyPayPayment,
-    SeverPayPayment,
-    Transaction,
-    TransactionType,
-    User,
-    WataPayment,
-    YooKassaPayment,
-)
-from app.services.payment_verification_service import (
-    PendingPayment,
-    _build_record,
-    _metadata_is_balance,
-    _parse_cryptobot_amount_kopeks,
-)
+
+from app.database.crud.payment_index import PAYMENT_INDEX_SOURCES, PaymentIndexSource
+from app.database.models import PaymentIndex, PaymentMethod, User
+from app.services.payment_verification_service import PendingPayment, _build_record
+from app.utils.text_search import search_text_clause
 
 
 logger = structlog.get_logger(__name__)
@@ -60,18 +37,10 @@ logger = structlog.get_logger(__name__)
 MAX_ALL_TIME_DAYS: int = 365
 """Safety limit for 'all time' queries to prevent unbounded scans."""
 
-MAX_RECORDS_PER_PROVIDER: int = 5000
-"""Hard limit on rows fetched from each provider table to prevent memory exhaustion."""
-
 DEFAULT_PER_PAGE: int = 20
 MAX_PER_PAGE: int = 100
 
 
-def _escape_like(value: str) -> str:
-    """Escape LIKE/ILIKE wildcard characters to prevent pattern injection."""
-    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
-
-
 class StatusFilter(str, enum.Enum):
     """Supported status filter values."""
 
@@ -97,21 +66,9 @@ _PERIOD_DELTAS: dict[PeriodPreset, timedelta] = {
     PeriodPreset.ALL: timedelta(days=MAX_ALL_TIME_DAYS),
 }
 
-
-# Sets of provider-specific statuses used for classification.
-_CANCELLED_STATUSES: frozenset[str] = frozenset(
-    {
-        'cancel',
-        'canceled',
-        'cancelled',
-        'declined',
-        'error',
-        'expired',
-        'fail',
-        'failed',
-        'amount_mismatch',
-    }
-)
+_SOURCES_BY_METHOD: dict[PaymentMethod, tuple[type, PaymentIndexSource]] = {
+    source.method: (model, source) for model, source in PAYMENT_INDEX_SOURCES.items()
+}
 
 
 # ---------------------------------------------------------------------------
@@ -119,6 +76,28 @@ _CANCELLED_STATUSES: frozenset[str] = frozenset(
 # ---------------------------------------------------------------------------
 
 
+@dataclass(frozen=True, slots=True)
+class SearchCursor:
+    """Position after the last row of a page: ``(created_at, id)`` of its index row."""
+
+    created_at: datetime
+    index_id: int
+
+    def encode(self) -> str:
+        payload = json.dumps([self.created_at.isoformat(), self.index_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, token: str) -> SearchCursor:
+        """Parse a cursor returned by the API; ValueError if it is malformed."""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            created_at, index_id = json.loads(raw)
+            return cls(datetime.fromisoformat(created_at), int(index_id))
+        except (TypeError, ValueError, binascii.Error) as error:
+            raise ValueError('Invalid payment search cursor') from error
+
+
 @dataclass(slots=True)
 class SearchParams:
     """Encapsulates validated search parameters."""
@@ -131,6 +110,8 @@ class SearchParams:
     date_to: datetime | None = None
     page: int = 1
     per_page: int = DEFAULT_PER_PAGE
+    cursor: SearchCursor | None = None
+    """Keyset position; when set, ``page`` is ignored."""
 
     @property
     def cutoff(self) -> datetime:
@@ -156,35 +137,6 @@ class SearchStats:
     by_method: dict[str, int] | None = None
 
 
-# ---------------------------------------------------------------------------
-# Status classification
-# ---------------------------------------------------------------------------
-
-
-_PAID_STATUSES: frozenset[str] = frozenset(
-    {
-        'completed',
-        'confirmed',
-        'paid',
-        'paid_over',
-        'succeeded',
-        'success',
-    }
-)
-
-
-def _classify_status(record: PendingPayment) -> StatusFilter:
-    """Classify a payment record into one of the three buckets."""
-    if record.is_paid:
-        return StatusFilter.PAID
-    status_lower = (record.status or '').lower()
-    if status_lower in _PAID_STATUSES:
-        return StatusFilter.PAID
-    if status_lower in _CANCELLED_STATUSES:
-        return StatusFilter.CANCELLED
-    return StatusFilter.PENDING
-
-
 # ---------------------------------------------------------------------------
 # User search type detection
 # ---------------------------------------------------------------------------
@@ -210,7 +162,7 @@ def _detect_user_search_kind(query: str) -> _UserSearchKind:
 
 
 # ---------------------------------------------------------------------------
-# Per-provider search functions
+# Index query building
 # ---------------------------------------------------------------------------
 
 
@@ -236,836 +188,73 @@ def _apply_user_join_filter(
     """Apply user-based search filters by joining the User table."""
     stmt = stmt.join(User, model.user_id == User.id)
     if search_kind == _UserSearchKind.USERNAME:
-        username = search_value.lstrip('@')
-        stmt = stmt.where(User.username.ilike(f'%{_escape_like(username)}%'))
+        # В search_text username хранится с «@», поэтому термин «@...» попадает именно в него
+        stmt = stmt.where(search_text_clause(User.search_text, '@' + search_value.strip().lstrip('@')))
     elif search_kind == _UserSearchKind.TELEGRAM_ID:
         stmt = stmt.where(User.telegram_id == int(search_value))
     elif search_kind == _UserSearchKind.EMAIL:
-        stmt = stmt.where(User.email.ilike(f'%{_escape_like(search_value)}%'))
+        stmt = stmt.where(search_text_clause(User.search_text, search_value))
     return stmt
 
 
-async def _search_yookassa(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(YooKassaPayment).options(selectinload(YooKassaPayment.user)).order_by(desc(YooKassaPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, YooKassaPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            stmt = stmt.where(YooKassaPayment.yookassa_payment_id.ilike(f'%{_escape_like(params.search)}%'))
-        else:
-            stmt = _apply_user_join_filter(stmt, YooKassaPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        if not _metadata_is_balance(payment):
-            continue
-        record = _build_record(
-            PaymentMethod.YOOKASSA,
-            payment,
-            identifier=payment.yookassa_payment_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(getattr(payment, 'is_paid', False)),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_cryptobot(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(CryptoBotPayment)
-        .options(selectinload(CryptoBotPayment.user))
-        .order_by(desc(CryptoBotPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, CryptoBotPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            stmt = stmt.where(CryptoBotPayment.invoice_id.ilike(f'%{_escape_like(params.search)}%'))
-        else:
-            stmt = _apply_user_join_filter(stmt, CryptoBotPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        amount_kopeks = _parse_cryptobot_amount_kopeks(payment)
-        record = _build_record(
-            PaymentMethod.CRYPTOBOT,
-            payment,
-            identifier=payment.invoice_id,
-            amount_kopeks=amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_heleket(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(HeleketPayment).options(selectinload(HeleketPayment.user)).order_by(desc(HeleketPayment.created_at))
-    stmt = _apply_date_filter(stmt, HeleketPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            stmt = stmt.where(
-                or_(
-                    HeleketPayment.uuid.ilike(f'%{_escape_like(params.search)}%'),
-                    HeleketPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                )
-            )
-        else:
-            stmt = _apply_user_join_filter(stmt, HeleketPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.HELEKET,
-            payment,
-            identifier=payment.uuid,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_mulenpay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(MulenPayPayment).options(selectinload(MulenPayPayment.user)).order_by(desc(MulenPayPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, MulenPayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [MulenPayPayment.uuid.ilike(f'%{_escape_like(params.search)}%')]
-            # mulen_payment_id is Integer -- cast for ILIKE
-            if params.search.isdigit():
-                conditions.append(MulenPayPayment.mulen_payment_id == int(params.search))
-            else:
-                conditions.append(
-                    cast(MulenPayPayment.mulen_payment_id, SAString).ilike(f'%{_escape_like(params.search)}%')
-                )
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, MulenPayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.MULENPAY,
-            payment,
-            identifier=payment.uuid,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_pal24(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(Pal24Payment).options(selectinload(Pal24Payment.user)).order_by(desc(Pal24Payment.created_at))
-    stmt = _apply_date_filter(stmt, Pal24Payment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                Pal24Payment.bill_id.ilike(f'%{_escape_like(params.search)}%'),
-                Pal24Payment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, Pal24Payment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.PAL24,
-            payment,
-            identifier=payment.bill_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_wata(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(WataPayment).options(selectinload(WataPayment.user)).order_by(desc(WataPayment.created_at))
-    stmt = _apply_date_filter(stmt, WataPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                WataPayment.payment_link_id.ilike(f'%{_escape_like(params.search)}%'),
-                WataPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, WataPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.WATA,
-            payment,
-            identifier=payment.payment_link_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_platega(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(PlategaPayment).options(selectinload(PlategaPayment.user)).order_by(desc(PlategaPayment.created_at))
-    stmt = _apply_date_filter(stmt, PlategaPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                PlategaPayment.correlation_id.ilike(f'%{_escape_like(params.search)}%'),
-                PlategaPayment.platega_transaction_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, PlategaPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        identifier = payment.platega_transaction_id or payment.correlation_id or str(payment.id)
-        record = _build_record(
-            PaymentMethod.PLATEGA,
-            payment,
-            identifier=identifier,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_cloudpayments(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(CloudPaymentsPayment)
-        .options(selectinload(CloudPaymentsPayment.user))
-        .order_by(desc(CloudPaymentsPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, CloudPaymentsPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [CloudPaymentsPayment.invoice_id.ilike(f'%{_escape_like(params.search)}%')]
-            # transaction_id_cp is BigInteger -- cast for ILIKE
-            if params.search.isdigit():
-                conditions.append(CloudPaymentsPayment.transaction_id_cp == int(params.search))
-            else:
-                conditions.append(
-                    cast(CloudPaymentsPayment.transaction_id_cp, SAString).ilike(f'%{_escape_like(params.search)}%')
-                )
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, CloudPaymentsPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.CLOUDPAYMENTS,
-            payment,
-            identifier=payment.invoice_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_freekassa(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(FreekassaPayment)
-        .options(selectinload(FreekassaPayment.user))
-        .order_by(desc(FreekassaPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, FreekassaPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                FreekassaPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                FreekassaPayment.freekassa_order_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, FreekassaPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.FREEKASSA,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_kassa_ai(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(KassaAiPayment).options(selectinload(KassaAiPayment.user)).order_by(desc(KassaAiPayment.created_at))
-    stmt = _apply_date_filter(stmt, KassaAiPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                KassaAiPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                KassaAiPayment.kassa_ai_order_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, KassaAiPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.KASSA_AI,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_riopay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(RioPayPayment).options(selectinload(RioPayPayment.user)).order_by(desc(RioPayPayment.created_at))
-    stmt = _apply_date_filter(stmt, RioPayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                RioPayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                RioPayPayment.riopay_order_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, RioPayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.RIOPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_severpay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(SeverPayPayment).options(selectinload(SeverPayPayment.user)).order_by(desc(SeverPayPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, SeverPayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                SeverPayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                SeverPayPayment.severpay_id.ilike(f'%{_escape_like(params.search)}%'),
-                SeverPayPayment.severpay_uid.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, SeverPayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.SEVERPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_overpay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(OverpayPayment).options(selectinload(OverpayPayment.user)).order_by(desc(OverpayPayment.created_at))
-    stmt = _apply_date_filter(stmt, OverpayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                OverpayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                OverpayPayment.overpay_payment_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, OverpayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.OVERPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_paypear(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(PayPearPayment).options(selectinload(PayPearPayment.user)).order_by(desc(PayPearPayment.created_at))
-    stmt = _apply_date_filter(stmt, PayPearPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                PayPearPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                PayPearPayment.paypear_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, PayPearPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.PAYPEAR,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_rollypay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(RollyPayPayment).options(selectinload(RollyPayPayment.user)).order_by(desc(RollyPayPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, RollyPayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                RollyPayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                RollyPayPayment.rollypay_payment_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, RollyPayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.ROLLYPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_aurapay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(AuraPayPayment).options(selectinload(AuraPayPayment.user)).order_by(desc(AuraPayPayment.created_at))
-    stmt = _apply_date_filter(stmt, AuraPayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                AuraPayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                AuraPayPayment.aurapay_invoice_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, AuraPayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.AURAPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
+def _apply_index_filters(stmt: Any, params: SearchParams, *, with_status: bool = True) -> Any:
+    """Filters shared by the page, count and stats queries over ``payment_index``."""
+    # Платежи без пользователя в админке никогда не показывались
+    stmt = stmt.where(PaymentIndex.user_id.is_not(None))
+    stmt = _apply_date_filter(stmt, PaymentIndex.created_at, params.cutoff, params.upper_bound)
 
-
-async def _search_etoplatezhi(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(EtoplatezhiPayment)
-        .options(selectinload(EtoplatezhiPayment.user))
-        .order_by(desc(EtoplatezhiPayment.created_at))
-    )
-    stmt = _apply_date_filter(stmt, EtoplatezhiPayment.created_at, params.cutoff, params.upper_bound)
+    if params.method_filter is not None:
+        stmt = stmt.where(PaymentIndex.method == params.method_filter.value)
+    if with_status and params.status_filter != StatusFilter.ALL:
+        stmt = stmt.where(PaymentIndex.status == params.status_filter.value)
 
     if params.search:
         kind = _detect_user_search_kind(params.search)
         if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                EtoplatezhiPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                EtoplatezhiPayment.etoplatezhi_payment_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
+            stmt = stmt.where(search_text_clause(PaymentIndex.external_ids, params.search))
         else:
-            stmt = _apply_user_join_filter(stmt, EtoplatezhiPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.ETOPLATEZHI,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
+            stmt = _apply_user_join_filter(stmt, PaymentIndex, kind, params.search)
+    return stmt
 
 
-async def _search_antilopay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(AntilopayPayment)
-        .options(selectinload(AntilopayPayment.user))
-        .order_by(desc(AntilopayPayment.created_at))
+def _build_search_record(source: PaymentIndexSource, payment: Any) -> PendingPayment | None:
+    return _build_record(
+        source.method,
+        payment,
+        identifier=source.identifier(payment),
+        amount_kopeks=source.amount(payment),
+        status=source.status(payment),
+        is_paid=bool(source.is_paid(payment)),
+        expires_at=getattr(payment, 'expires_at', None),
     )
-    stmt = _apply_date_filter(stmt, AntilopayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                AntilopayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                AntilopayPayment.antilopay_payment_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, AntilopayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.ANTILOPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_jupiter(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(JupiterPayment).options(selectinload(JupiterPayment.user)).order_by(desc(JupiterPayment.created_at))
-    stmt = _apply_date_filter(stmt, JupiterPayment.created_at, params.cutoff, params.upper_bound)
 
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                JupiterPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                JupiterPayment.jupiter_transaction_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, JupiterPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.JUPITER,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_donut(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(DonutPayment).options(selectinload(DonutPayment.user)).order_by(desc(DonutPayment.created_at))
-    stmt = _apply_date_filter(stmt, DonutPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                DonutPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                DonutPayment.donut_transaction_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, DonutPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.DONUT,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_lava(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(LavaPayment).options(selectinload(LavaPayment.user)).order_by(desc(LavaPayment.created_at))
-    stmt = _apply_date_filter(stmt, LavaPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                LavaPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                LavaPayment.lava_invoice_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, LavaPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.LAVA,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_cispay(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = select(CisPayPayment).options(selectinload(CisPayPayment.user)).order_by(desc(CisPayPayment.created_at))
-    stmt = _apply_date_filter(stmt, CisPayPayment.created_at, params.cutoff, params.upper_bound)
-
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            conditions = [
-                CisPayPayment.order_id.ilike(f'%{_escape_like(params.search)}%'),
-                CisPayPayment.cispay_payment_id.ilike(f'%{_escape_like(params.search)}%'),
-            ]
-            stmt = stmt.where(or_(*conditions))
-        else:
-            stmt = _apply_user_join_filter(stmt, CisPayPayment, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for payment in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.CISPAY,
-            payment,
-            identifier=payment.order_id,
-            amount_kopeks=payment.amount_kopeks,
-            status=payment.status or '',
-            is_paid=bool(payment.is_paid),
-            expires_at=getattr(payment, 'expires_at', None),
-        )
-        if record:
-            records.append(record)
-    return records
-
-
-async def _search_stars(db: AsyncSession, params: SearchParams) -> list[PendingPayment]:
-    stmt = (
-        select(Transaction)
-        .options(selectinload(Transaction.user))
-        .where(
-            Transaction.type == TransactionType.DEPOSIT.value,
-            Transaction.payment_method == PaymentMethod.TELEGRAM_STARS.value,
-        )
-        .order_by(desc(Transaction.created_at))
-    )
-    stmt = _apply_date_filter(stmt, Transaction.created_at, params.cutoff, params.upper_bound)
 
-    if params.search:
-        kind = _detect_user_search_kind(params.search)
-        if kind == _UserSearchKind.INVOICE:
-            stmt = stmt.where(Transaction.external_id.ilike(f'%{_escape_like(params.search)}%'))
-        else:
-            stmt = _apply_user_join_filter(stmt, Transaction, kind, params.search)
-
-    stmt = stmt.limit(MAX_RECORDS_PER_PROVIDER)
-    result = await db.execute(stmt)
-    records: list[PendingPayment] = []
-    for transaction in result.scalars().all():
-        record = _build_record(
-            PaymentMethod.TELEGRAM_STARS,
-            transaction,
-            identifier=transaction.external_id or str(transaction.id),
-            amount_kopeks=transaction.amount_kopeks,
-            status='paid' if transaction.is_completed else 'pending',
-            is_paid=bool(transaction.is_completed),
-        )
-        if record:
-            records.append(record)
+async def _load_records(db: AsyncSession, rows: list[Any]) -> list[PendingPayment]:
+    """Load provider rows for the page's index rows, one query per provider, keeping the order."""
+    ids_by_method: dict[str, list[int]] = {}
+    for row in rows:
+        ids_by_method.setdefault(row.method, []).append(row.local_id)
+
+    records_by_key: dict[tuple[str, int], PendingPayment] = {}
+    for method_value, local_ids in ids_by_method.items():
+        model, source = _SOURCES_BY_METHOD[PaymentMethod(method_value)]
+        result = await db.execute(select(model).options(selectinload(model.user)).where(model.id.in_(local_ids)))
+        for payment in result.scalars().all():
+            record = _build_search_record(source, payment)
+            if record is not None:
+                records_by_key[(method_value, payment.id)] = record
+
+    records = []
+    for row in rows:
+        record = records_by_key.get((row.method, row.local_id))
+        if record is None:
+            # Строку провайдера удалили в обход хуков — индекс догонит досборка
+            logger.debug('Stale payment index row', method=row.method, local_id=row.local_id)
+            continue
+        records.append(record)
     return records
 
 
-# ---------------------------------------------------------------------------
-# Provider -> search function mapping
-# ---------------------------------------------------------------------------
-
-_PROVIDER_SEARCH_MAP: dict[PaymentMethod, Any] = {
-    PaymentMethod.YOOKASSA: _search_yookassa,
-    PaymentMethod.CRYPTOBOT: _search_cryptobot,
-    PaymentMethod.HELEKET: _search_heleket,
-    PaymentMethod.MULENPAY: _search_mulenpay,
-    PaymentMethod.PAL24: _search_pal24,
-    PaymentMethod.WATA: _search_wata,
-    PaymentMethod.PLATEGA: _search_platega,
-    PaymentMethod.CLOUDPAYMENTS: _search_cloudpayments,
-    PaymentMethod.FREEKASSA: _search_freekassa,
-    PaymentMethod.KASSA_AI: _search_kassa_ai,
-    PaymentMethod.RIOPAY: _search_riopay,
-    PaymentMethod.SEVERPAY: _search_severpay,
-    PaymentMethod.OVERPAY: _search_overpay,
-    PaymentMethod.PAYPEAR: _search_paypear,
-    PaymentMethod.ROLLYPAY: _search_rollypay,
-    PaymentMethod.AURAPAY: _search_aurapay,
-    PaymentMethod.ETOPLATEZHI: _search_etoplatezhi,
-    PaymentMethod.ANTILOPAY: _search_antilopay,
-    PaymentMethod.JUPITER: _search_jupiter,
-    PaymentMethod.DONUT: _search_donut,
-    PaymentMethod.LAVA: _search_lava,
-    PaymentMethod.CISPAY: _search_cispay,
-    PaymentMethod.TELEGRAM_STARS: _search_stars,
-}
-
-
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
@@ -1074,44 +263,36 @@ _PROVIDER_SEARCH_MAP: dict[PaymentMethod, Any] = {
 async def search_payments(
     db: AsyncSession,
     params: SearchParams,
-) -> tuple[list[PendingPayment], int]:
+) -> tuple[list[PendingPayment], int, SearchCursor | None]:
     """Search payments across all (or filtered) providers.
 
     Returns:
-        Tuple of ``(page_items, total_count)`` where *page_items* is
-        a slice according to ``params.page`` / ``params.per_page``.
+        Tuple of ``(page_items, total_count, next_cursor)``. The page starts
+        after ``params.cursor`` when it is set, otherwise at ``params.page``;
+        *next_cursor* is ``None`` on the last page.
     """
-
-    # Determine which providers to query
-    if params.method_filter is not None:
-        search_fn = _PROVIDER_SEARCH_MAP.get(params.method_filter)
-        if search_fn is None:
-            return [], 0
-        provider_results: list[list[PendingPayment]] = [await search_fn(db, params)]
+    if params.method_filter is not None and params.method_filter not in _SOURCES_BY_METHOD:
+        return [], 0, None
+
+    total = (await db.execute(_apply_index_filters(select(func.count(PaymentIndex.id)), params))).scalar_one()
+    if not total:
+        return [], 0, None
+
+    stmt = _apply_index_filters(
+        select(PaymentIndex.id, PaymentIndex.method, PaymentIndex.local_id, PaymentIndex.created_at), params
+    ).order_by(PaymentIndex.created_at.desc(), PaymentIndex.id.desc())
+    if params.cursor is not None:
+        stmt = stmt.where(
+            tuple_(PaymentIndex.created_at, PaymentIndex.id) < (params.cursor.created_at, params.cursor.index_id)
+        )
     else:
-        provider_results = []
-        for search_fn in _PROVIDER_SEARCH_MAP.values():
-            provider_results.append(await search_fn(db, params))
-
-    # Flatten
-    all_records: list[PendingPayment] = []
-    for batch in provider_results:
-        all_records.extend(batch)
-
-    # Apply status filter in Python (status classification depends on provider logic)
-    if params.status_filter != StatusFilter.ALL:
-        all_records = [r for r in all_records if _classify_status(r) == params.status_filter]
-
-    # Sort globally by created_at desc
-    all_records.sort(key=lambda r: r.created_at, reverse=True)
+        stmt = stmt.offset((params.page - 1) * params.per_page)
+    rows = (await db.execute(stmt.limit(params.per_page))).all()
 
-    total = len(all_records)
-
-    # Paginate
-    start_idx = (params.page - 1) * params.per_page
-    page_items = all_records[start_idx : start_idx + params.per_page]
-
-    return page_items, total
+    next_cursor = None
+    if len(rows) == params.per_page:
+        next_cursor = SearchCursor(rows[-1].created_at, rows[-1].id)
+    return await _load_records(db, rows), total, next_cursor
 
 
 async def search_payments_stats(
@@ -1120,52 +301,23 @@ async def search_payments_stats(
 ) -> SearchStats:
     """Compute aggregated statistics for the given search filters.
 
-    Pagination params are ignored -- stats cover the full result set.
+    Pagination and status filter are ignored -- stats cover every status.
     """
-
-    # Reuse the same search logic but force ALL statuses for counting
-    stats_params = SearchParams(
-        search=params.search,
-        status_filter=StatusFilter.ALL,
-        method_filter=params.method_filter,
-        period=params.period,
-        date_from=params.date_from,
-        date_to=params.date_to,
-        page=1,
-        per_page=MAX_PER_PAGE,
-    )
-
-    # Query all providers
-    if stats_params.method_filter is not None:
-        search_fn = _PROVIDER_SEARCH_MAP.get(stats_params.method_filter)
-        if search_fn is None:
-            return SearchStats()
-        all_records: list[PendingPayment] = await search_fn(db, stats_params)
-    else:
-        all_records = []
-        for search_fn in _PROVIDER_SEARCH_MAP.values():
-            all_records.extend(await search_fn(db, stats_params))
-
-    # Classify
-    pending_count = 0
-    paid_count = 0
-    cancelled_count = 0
-    method_counter: Counter[str] = Counter()
-
-    for record in all_records:
-        status = _classify_status(record)
-        if status == StatusFilter.PAID:
-            paid_count += 1
-        elif status == StatusFilter.CANCELLED:
-            cancelled_count += 1
+    if params.method_filter is not None and params.method_filter not in _SOURCES_BY_METHOD:
+        return SearchStats()
+
+    stmt = _apply_index_filters(
+        select(PaymentIndex.status, PaymentIndex.method, func.count(PaymentIndex.id)), params, with_status=False
+    ).group_by(PaymentIndex.status, PaymentIndex.method)
+
+    stats = SearchStats(by_method={})
+    for status, method, count in (await db.execute(stmt)).tuples():
+        stats.total += count
+        if status == StatusFilter.PAID.value:
+            stats.paid += count
+        elif status == StatusFilter.CANCELLED.value:
+            stats.cancelled += count
         else:
-            pending_count += 1
-        method_counter[record.method.value] += 1
-
-    return SearchStats(
-        total=len(all_records),
-        pending=pending_count,
-        paid=paid_count,
-        cancelled=cancelled_count,
-        by_method=dict(method_counter),
-    )
+            stats.pending += count
+        stats.by_method[method] = stats.by_method.get(method, 0) + count
+    return stats
@@ -3,9 +3,9 @@
 from __future__ import annotations
 
 import asyncio
-import re
-from collections import Counter
-from collections.abc import Iterable
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 from typing import TYPE_CHECKING, Any
@@ -32,6 +32,7 @@ from app.database.models import (
     LavaPayment,
     MulenPayPayment,
     Pal24Payment,
+    PaymentIndex,
     PaymentMethod,
     PayPearPayment,
     PlategaPayment,
@@ -51,6 +52,15 @@ logger = structlog.get_logger(__name__)
 
 PENDING_MAX_AGE = timedelta(hours=24)
 
+# Следующая автопроверка — через такую долю возраста счёта (см. recheck_delay)
+RECHECK_AGE_FACTOR = 0.1
+# Истёкший счёт ещё немного перепроверяется: оплата могла пройти в последний момент
+EXPIRED_GRACE = timedelta(minutes=5)
+_SCHEDULER_TICK_SECONDS = 10
+_STATS_LOG_INTERVAL_SECONDS = 600
+# Сколько счетов сверяется одним пакетным запросом статусов
+_BATCH_STATUS_SIZE = 100
+
 
 @dataclass(slots=True)
 class PendingPayment:
@@ -223,12 +233,110 @@ def get_enabled_auto_methods() -> list[PaymentMethod]:
     return [method for method in SUPPORTED_AUTO_CHECK_METHODS if _method_is_enabled(method)]
 
 
+def recheck_delay(age: timedelta) -> timedelta:
+    """Через сколько перепроверить счёт возраста ``age``.
+
+    Десятая доля возраста в пределах от PAYMENT_VERIFICATION_MIN_RECHECK_SECONDS
+    до PAYMENT_VERIFICATION_AUTO_CHECK_INTERVAL_MINUTES: только что выставленный
+    счёт опрашивается раз в полминуты, часовой — раз в несколько минут.
+    """
+    min_delay = timedelta(seconds=settings.get_payment_verification_min_recheck_seconds())
+    max_delay = max(min_delay, timedelta(minutes=settings.get_payment_verification_auto_check_interval()))
+    return min(max(age * RECHECK_AGE_FACTOR, min_delay), max_delay)
+
+
+@dataclass(slots=True)
+class ProviderCheckStats:
+    """Счётчики автопроверки одного провайдера с момента запуска сервиса."""
+
+    checks: int = 0
+    paid: int = 0
+    status_changes: int = 0
+    errors: int = 0
+    batched: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def record(self, latency: float) -> None:
+        self.checks += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.checks if self.checks else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля проверок, нашедших оплату или смену статуса."""
+        return (self.paid + self.status_changes) / self.checks if self.checks else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'checks': self.checks,
+            'paid': self.paid,
+            'status_changes': self.status_changes,
+            'errors': self.errors,
+            'batched': self.batched,
+            'avg_latency_ms': round(self.avg_latency * 1000, 1),
+            'max_latency_ms': round(self.max_latency * 1000, 1),
+            'hit_rate': round(self.hit_rate, 4),
+        }
+
+
+class _ProviderLimiter:
+    """Ограничение параллельных запросов и частоты обращений к API одного провайдера."""
+
+    def __init__(self, concurrency: int, rate_per_second: float) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._semaphore:
+            if self._interval:
+                # Слот резервируется под замком, а ждут его уже без замка
+                async with self._lock:
+                    now = asyncio.get_running_loop().time()
+                    wait = self._next_slot - now
+                    self._next_slot = max(now, self._next_slot) + self._interval
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield
+
+
+@dataclass(frozen=True, slots=True)
+class _DueCheck:
+    method: PaymentMethod
+    local_id: int
+    identifier: str | None
+    provider_status: str | None
+    created_at: datetime
+
+    @property
+    def key(self) -> tuple[PaymentMethod, int]:
+        return self.method, self.local_id
+
+
 class AutoPaymentVerificationService:
-    """Background checker that periodically refreshes pending payments."""
+    """Background checker that refreshes pending payments on an age-based schedule.
+
+    Candidates come from ``payment_index``; every invoice has its own next check
+    time (see :func:`recheck_delay`), providers are polled in parallel under
+    per-provider concurrency and rate limits, each check in its own session.
+    """
 
     def __init__(self) -> None:
         self._task: asyncio.Task[None] | None = None
         self._payment_service: PaymentService | None = None
+        # None — счёт больше не перепроверяется (оплачен, отменён или истёк)
+        self._next_check_at: dict[tuple[PaymentMethod, int], datetime | None] = {}
+        self._in_flight: set[tuple[PaymentMethod, int]] = set()
+        self._check_tasks: set[asyncio.Task[None]] = set()
+        self._limiters: dict[PaymentMethod, _ProviderLimiter] = {}
+        self._stats: dict[PaymentMethod, ProviderCheckStats] = {}
 
     def set_payment_service(self, payment_service: PaymentService) -> None:
         self._payment_service = payment_service
@@ -236,6 +344,10 @@ class AutoPaymentVerificationService:
     def is_running(self) -> bool:
         return self._task is not None and not self._task.done()
 
+    def get_provider_stats(self) -> dict[str, dict[str, Any]]:
+        """Задержка и доля результативных проверок по провайдерам с момента запуска."""
+        return {method.value: stats.as_dict() for method, stats in self._stats.items()}
+
     async def start(self) -> None:
         await self.stop()
 
@@ -253,12 +365,18 @@ class AutoPaymentVerificationService:
             return
 
         display_names = ', '.join(sorted(method_display_name(method) for method in methods))
-        interval_minutes = settings.get_payment_verification_auto_check_interval()
 
+        # Лимиты пересоздаются на каждый запуск, чтобы подхватить изменённые настройки
+        self._limiters.clear()
+        self._stats.clear()
+        self._next_check_at.clear()
         self._task = asyncio.create_task(self._auto_check_loop())
         logger.info(
             '🔄 Автопроверка пополнений запущена',
-            interval_minutes=interval_minutes,
+            min_recheck_seconds=settings.get_payment_verification_min_recheck_seconds(),
+            max_recheck_minutes=settings.get_payment_verification_auto_check_interval(),
+            provider_concurrency=settings.get_payment_verification_provider_concurrency(),
+            provider_rate_limit=settings.get_payment_verification_provider_rate_limit(),
             display_names=display_names,
         )
 
@@ -271,10 +389,18 @@ class AutoPaymentVerificationService:
                 pass
         self._task = None
 
+        for task in list(self._check_tasks):
+            task.cancel()
+        if self._check_tasks:
+            await asyncio.gather(*self._check_tasks, return_exceptions=True)
+        self._check_tasks.clear()
+        self._in_flight.clear()
+
     async def _auto_check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        stats_logged_at = loop.time()
         try:
             while True:
-                interval_minutes = settings.get_payment_verification_auto_check_interval()
                 try:
                     if settings.is_payment_verification_auto_check_enabled() and self._payment_service:
                         methods = get_enabled_auto_methods()
@@ -289,89 +415,230 @@ class AutoPaymentVerificationService:
                 except Exception as error:
                     logger.error('Ошибка автопроверки пополнений', error=error, exc_info=True)
 
-                await asyncio.sleep(max(1, interval_minutes) * 60)
+                if loop.time() - stats_logged_at >= _STATS_LOG_INTERVAL_SECONDS:
+                    stats_logged_at = loop.time()
+                    self._log_stats()
+
+                await asyncio.sleep(_SCHEDULER_TICK_SECONDS)
         except asyncio.CancelledError:
             logger.info('Автопроверка пополнений остановлена')
             raise
 
+    async def _load_candidates(self, methods: Iterable[PaymentMethod], now: datetime) -> list[_DueCheck]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    PaymentIndex.method,
+                    PaymentIndex.local_id,
+                    PaymentIndex.identifier,
+                    PaymentIndex.provider_status,
+                    PaymentIndex.created_at,
+                ).where(
+                    PaymentIndex.status == 'pending',
+                    PaymentIndex.method.in_([method.value for method in methods]),
+                    PaymentIndex.created_at >= now - PENDING_MAX_AGE,
+                    PaymentIndex.user_id.is_not(None),
+                )
+            )
+            rows = result.all()
+
+        return [
+            _DueCheck(
+                method=PaymentMethod(row.method),
+                local_id=row.local_id,
+                identifier=row.identifier,
+                provider_status=row.provider_status,
+                created_at=row.created_at if row.created_at.tzinfo else row.created_at.replace(tzinfo=UTC),
+            )
+            for row in rows
+        ]
+
     async def _run_checks(self, methods: list[PaymentMethod]) -> None:
+        """Один такт планировщика: раздаёт провайдерам счета, которым подошло время проверки."""
         if not self._payment_service:
             return
 
-        async with AsyncSessionLocal() as session:
-            try:
-                pending = await list_recent_pending_payments(session)
-                candidates = [record for record in pending if record.method in methods and not record.is_paid]
+        now = datetime.now(UTC)
+        # Провайдеры без предиката ожидания (OVERPAY) вручную не проверяются — как и раньше
+        candidates = await self._load_candidates(
+            [method for method in methods if method in _PENDING_PREDICATES],
+            now,
+        )
 
-                if not candidates:
-                    logger.debug('Автопроверка пополнений: подходящих ожидающих платежей нет')
-                    return
+        due: dict[PaymentMethod, list[_DueCheck]] = {}
+        for candidate in candidates:
+            if candidate.key in self._in_flight:
+                continue
+            next_check_at = self._next_check_at.get(candidate.key, now)
+            if next_check_at is None or next_check_at > now:
+                continue
+            due.setdefault(candidate.method, []).append(candidate)
+
+        # Счета, вышедшие из окна или переставшие ждать оплаты, расписанию больше не нужны
+        pending_keys = {candidate.key for candidate in candidates}
+        for key in self._next_check_at.keys() - pending_keys - self._in_flight:
+            del self._next_check_at[key]
+
+        if not due:
+            logger.debug('Автопроверка пополнений: подходящих ожидающих платежей нет')
+            return
 
-                counts = Counter(record.method for record in candidates)
-                summary = ', '.join(
-                    f'{method_display_name(method)}: {count}'
-                    for method, count in sorted(counts.items(), key=lambda item: method_display_name(item[0]))
+        summary = ', '.join(
+            f'{method_display_name(method)}: {len(checks)}'
+            for method, checks in sorted(due.items(), key=lambda item: method_display_name(item[0]))
+        )
+        logger.debug('🔄 Автопроверка пополнений: к проверке', due_count=sum(map(len, due.values())), summary=summary)
+
+        for method, checks in due.items():
+            self._in_flight.update(check.key for check in checks)
+            task = asyncio.create_task(self._check_provider(method, checks))
+            self._check_tasks.add(task)
+            task.add_done_callback(self._check_tasks.discard)
+
+    def _limiter(self, method: PaymentMethod) -> _ProviderLimiter:
+        limiter = self._limiters.get(method)
+        if limiter is None:
+            limiter = _ProviderLimiter(
+                settings.get_payment_verification_provider_concurrency(),
+                settings.get_payment_verification_provider_rate_limit(),
+            )
+            self._limiters[method] = limiter
+        return limiter
+
+    def _provider_stats(self, method: PaymentMethod) -> ProviderCheckStats:
+        return self._stats.setdefault(method, ProviderCheckStats())
+
+    async def _check_provider(self, method: PaymentMethod, checks: list[_DueCheck]) -> None:
+        try:
+            limiter = self._limiter(method)
+            fetch_statuses = _BATCH_STATUS_FETCHERS.get(method)
+            if fetch_statuses is not None:
+                checks = await self._skip_unchanged(method, checks, fetch_statuses, limiter)
+            await asyncio.gather(*(self._check_one(check, limiter) for check in checks))
+        finally:
+            self._in_flight.difference_update(check.key for check in checks)
+
+    async def _skip_unchanged(
+        self,
+        method: PaymentMethod,
+        checks: list[_DueCheck],
+        fetch_statuses: Callable[[PaymentService, list[str]], Awaitable[dict[str, str]]],
+        limiter: _ProviderLimiter,
+    ) -> list[_DueCheck]:
+        """Сверяет статусы пачкой и возвращает только счета, требующие полной проверки.
+
+        Полную проверку (с зачислением) проходят счета, у которых статус в API
+        отличается от локального или которые пачкой не нашлись.
+        """
+        stats = self._provider_stats(method)
+        remaining: list[_DueCheck] = []
+        for start in range(0, len(checks), _BATCH_STATUS_SIZE):
+            chunk = checks[start : start + _BATCH_STATUS_SIZE]
+            async with limiter.slot():
+                started = time.monotonic()
+                try:
+                    remote = await fetch_statuses(self._payment_service, [str(check.identifier) for check in chunk])
+                except Exception as error:
+                    logger.warning(
+                        'Пакетная сверка статусов не удалась, проверяем по одному',
+                        method_display_name=method_display_name(method),
+                        error=error,
+                    )
+                    remaining.extend(chunk)
+                    continue
+                latency = time.monotonic() - started
+
+            now = datetime.now(UTC)
+            for check in chunk:
+                remote_status = remote.get(str(check.identifier))
+                if remote_status is None or remote_status != (check.provider_status or '').lower():
+                    remaining.append(check)
+                    continue
+                stats.record(latency)
+                stats.batched += 1
+                self._next_check_at[check.key] = now + recheck_delay(now - check.created_at)
+        remaining_keys = {check.key for check in remaining}
+        self._in_flight.difference_update(check.key for check in checks if check.key not in remaining_keys)
+        return remaining
+
+    async def _check_one(self, check: _DueCheck, limiter: _ProviderLimiter) -> None:
+        stats = self._provider_stats(check.method)
+        async with limiter.slot():
+            started = time.monotonic()
+            try:
+                async with AsyncSessionLocal() as session:
+                    refreshed = await run_manual_check(session, check.method, check.local_id, self._payment_service)
+                    if session.in_transaction():
+                        await session.commit()
+            except Exception as check_error:
+                refreshed = None
+                logger.error(
+                    'Ошибка проверки платежа',
+                    method_display_name=method_display_name(check.method),
+                    identifier=check.identifier,
+                    error=check_error,
                 )
+            latency = time.monotonic() - started
+
+        stats.record(latency)
+        now = datetime.now(UTC)
+        self._next_check_at[check.key] = self._next_check_time(check, refreshed, now)
+
+        if not refreshed:
+            stats.errors += 1
+            logger.debug(
+                'Автопроверка пополнений: не удалось обновить',
+                method_display_name=method_display_name(check.method),
+                identifier=check.identifier,
+            )
+            return
+
+        if refreshed.is_paid:
+            stats.paid += 1
+            logger.info(
+                '✅ отмечен как оплаченный после автопроверки',
+                method_display_name=method_display_name(refreshed.method),
+                identifier=refreshed.identifier,
+            )
+        elif (refreshed.status or '').lower() != (check.provider_status or '').lower():
+            stats.status_changes += 1
+            logger.info(
+                'ℹ️ Статус платежа обновлён',
+                method_display_name=method_display_name(refreshed.method),
+                identifier=refreshed.identifier,
+                record_status=check.provider_status or '—',
+                refreshed_status=refreshed.status or '—',
+            )
+        else:
+            logger.debug(
+                'Автопроверка пополнений: без изменений',
+                method_display_name=method_display_name(refreshed.method),
+                identifier=refreshed.identifier,
+                refreshed_status=refreshed.status or '—',
+            )
+
+    @staticmethod
+    def _next_check_time(check: _DueCheck, refreshed: PendingPayment | None, now: datetime) -> datetime | None:
+        if refreshed is not None:
+            if refreshed.is_paid or not _PENDING_PREDICATES[check.method](refreshed.payment):
+                return None
+            expires_at = refreshed.expires_at
+            if expires_at is not None:
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=UTC)
+                if now > expires_at + EXPIRED_GRACE:
+                    return None
+        return now + recheck_delay(now - check.created_at)
+
+    def _log_stats(self) -> None:
+        for method, stats in sorted(self._stats.items(), key=lambda item: item[0].value):
+            if stats.checks:
                 logger.info(
-                    '🔄 Автопроверка пополнений: найдено инвойсов', candidates_count=len(candidates), summary=summary
+                    '📊 Автопроверка пополнений: статистика провайдера',
+                    method_display_name=method_display_name(method),
+                    **stats.as_dict(),
                 )
 
-                for record in candidates:
-                    try:
-                        refreshed = await run_manual_check(
-                            session,
-                            record.method,
-                            record.local_id,
-                            self._payment_service,
-                        )
-                    except Exception as check_error:
-                        logger.error(
-                            'Ошибка проверки платежа, откатываем сессию',
-                            method_display_name=method_display_name(record.method),
-                            identifier=record.identifier,
-                            error=check_error,
-                        )
-                        if session.in_transaction():
-                            await session.rollback()
-                        continue
-
-                    if not refreshed:
-                        logger.debug(
-                            'Автопроверка пополнений: не удалось обновить',
-                            method_display_name=method_display_name(record.method),
-                            identifier=record.identifier,
-                        )
-                        continue
-
-                    if refreshed.is_paid and not record.is_paid:
-                        logger.info(
-                            '✅ отмечен как оплаченный после автопроверки',
-                            method_display_name=method_display_name(refreshed.method),
-                            identifier=refreshed.identifier,
-                        )
-                    elif refreshed.status != record.status:
-                        logger.info(
-                            'ℹ️ Статус платежа обновлён',
-                            method_display_name=method_display_name(refreshed.method),
-                            identifier=refreshed.identifier,
-                            record_status=record.status or '—',
-                            refreshed_status=refreshed.status or '—',
-                        )
-                    else:
-                        logger.debug(
-                            'Автопроверка пополнений: без изменений',
-                            method_display_name=method_display_name(refreshed.method),
-                            identifier=refreshed.identifier,
-                            refreshed_status=refreshed.status or '—',
-                        )
-
-                if session.in_transaction():
-                    await session.commit()
-            except Exception:
-                if session.in_transaction():
-                    await session.rollback()
-                raise
-
 
 auto_payment_verification_service = AutoPaymentVerificationService()
 
@@ -528,21 +795,49 @@ def _is_cispay_pending(payment: CisPayPayment) -> bool:
     return status == 'pending'
 
 
+# Провайдеры, которые автопроверка умеет перепроверять, и признак «счёт ещё ждёт оплаты»
+_PENDING_PREDICATES: dict[PaymentMethod, Callable[[Any], bool]] = {
+    PaymentMethod.YOOKASSA: _is_yookassa_pending,
+    PaymentMethod.MULENPAY: _is_mulenpay_pending,
+    PaymentMethod.PAL24: _is_pal24_pending,
+    PaymentMethod.WATA: _is_wata_pending,
+    PaymentMethod.PLATEGA: _is_platega_pending,
+    PaymentMethod.HELEKET: _is_heleket_pending,
+    PaymentMethod.CRYPTOBOT: _is_cryptobot_pending,
+    PaymentMethod.CLOUDPAYMENTS: _is_cloudpayments_pending,
+    PaymentMethod.FREEKASSA: _is_freekassa_pending,
+    PaymentMethod.KASSA_AI: _is_kassa_ai_pending,
+    PaymentMethod.RIOPAY: _is_riopay_pending,
+    PaymentMethod.SEVERPAY: _is_severpay_pending,
+    PaymentMethod.PAYPEAR: _is_paypear_pending,
+    PaymentMethod.ROLLYPAY: _is_rollypay_pending,
+    PaymentMethod.AURAPAY: _is_aurapay_pending,
+    PaymentMethod.CISPAY: _is_cispay_pending,
+}
+
+
+async def _fetch_cryptobot_statuses(payment_service: PaymentService, invoice_ids: list[str]) -> dict[str, str]:
+    """Статусы пачки CryptoBot invoice одним запросом getInvoices."""
+    cryptobot_service = getattr(payment_service, 'cryptobot_service', None)
+    if cryptobot_service is None:
+        return {}
+    invoices = await cryptobot_service.get_invoices(invoice_ids=invoice_ids, count=len(invoice_ids))
+    return {str(item.get('invoice_id')): (item.get('status') or '').lower() for item in invoices or ()}
+
+
+# Провайдеры с пакетным запросом статусов: неизменившиеся счета отсеиваются без
+# похода в API по каждому. У остальных поддерживаемых провайдеров такого метода нет.
+_BATCH_STATUS_FETCHERS: dict[PaymentMethod, Callable[[PaymentService, list[str]], Awaitable[dict[str, str]]]] = {
+    PaymentMethod.CRYPTOBOT: _fetch_cryptobot_statuses,
+}
+
+
 def _parse_cryptobot_amount_kopeks(payment: CryptoBotPayment) -> int:
-    payload = payment.payload or ''
-    match = re.search(r'_(\d+)$', payload)
-    if match:
-        try:
-            return int(match.group(1))
-        except ValueError:
-            return 0
-    return 0
+    return payment.payload_amount_kopeks
 
 
 def _metadata_is_balance(payment: YooKassaPayment) -> bool:
-    metadata = getattr(payment, 'metadata_json', {}) or {}
-    payment_type = str(metadata.get('type') or metadata.get('payment_type') or '').lower()
-    return payment_type.startswith('balance_topup')
+    return payment.is_balance_topup
 
 
 def _build_record(
@@ -0,0 +1,420 @@
+"""Durable inbox for payment provider callbacks.
+
+Providers that are always answered 200 used to be processed inline (or in an
+in-memory background task) after the signature check: an exception in the
+processor, a crash or a deploy in the middle of processing lost the credit,
+because the provider does not redeliver a callback it saw acknowledged.
+
+Now the webhook route only verifies and parses the callback and persists it in
+``payment_webhook_inbox`` before answering:
+
+* ``enqueue()`` inserts the row in its own transaction; a redelivery of the same
+  body is dropped by the ``(provider, idempotency_key)`` unique key;
+* a dispatcher claims due rows with a lease and hands them to a pool of
+  PAYMENT_WEBHOOK_INBOX_WORKERS workers, each attempt in a fresh session;
+* a failed attempt (exception or a falsy processor result) is rescheduled with
+  exponential backoff and jitter; after PAYMENT_WEBHOOK_INBOX_MAX_ATTEMPTS the
+  row stays ``failed`` until an admin replays it;
+* rows left mid-attempt by a stopped process become due again once the lease
+  expires, so shutdown no longer has to wait for processing to finish.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import random
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+import structlog
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.database.models import PaymentWebhookInboxItem
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.services.payment_service import PaymentService
+
+
+logger = structlog.get_logger(__name__)
+
+# Сколько захваченная строка невидима другим воркерам; после падения процесса
+# посреди обработки она снова станет доступна по истечении аренды.
+_CLAIM_LEASE = timedelta(minutes=5)
+_PURGE_INTERVAL = timedelta(hours=1)
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+@dataclass(slots=True)
+class InboxItem:
+    id: int
+    provider: str
+    handler: str
+    payload: Any
+    attempts: int
+    received_at: datetime
+    lease_until: datetime
+
+
+def idempotency_key(raw_body: bytes) -> str:
+    """Ключ повторной доставки: провайдеры повторяют коллбек тем же телом."""
+    return hashlib.sha256(raw_body).hexdigest()
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter: a random delay in ``[d/2, d]``, ``d = base * 2^(attempts-1)``."""
+    base = max(1, settings.PAYMENT_WEBHOOK_INBOX_BASE_DELAY_SECONDS)
+    delay = min(settings.PAYMENT_WEBHOOK_INBOX_MAX_DELAY_SECONDS, base * 2 ** max(0, attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class PaymentWebhookInbox:
+    def __init__(self) -> None:
+        self._payment_service: PaymentService | None = None
+        self._task: asyncio.Task | None = None
+        self._workers: set[asyncio.Task] = set()
+        self._in_flight: set[int] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._running = False
+        self._purged_at: datetime | None = None
+        self.succeeded = 0
+        self.failed = 0
+        self.exhausted = 0
+        # Задержка от приёма коллбека до успешной обработки — по провайдерам
+        self._lag_totals: dict[str, tuple[int, float, float]] = {}
+
+    def set_payment_service(self, payment_service: PaymentService) -> None:
+        self._payment_service = payment_service
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def enqueue(self, provider: str, handler: str, payload: Any, raw_body: bytes) -> bool:
+        """Сохраняет проверенный коллбек; False — такой уже был принят раньше.
+
+        Исключение (БД недоступна) пробрасывается: вебхук должен ответить ошибкой,
+        чтобы провайдер повторил доставку.
+        """
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            insert_factory = pg_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+            stmt = (
+                insert_factory(PaymentWebhookInboxItem)
+                .values(
+                    provider=provider,
+                    handler=handler,
+                    idempotency_key=idempotency_key(raw_body),
+                    payload=payload,
+                    status=STATUS_PENDING,
+                    attempts=0,
+                    next_attempt_at=now,
+                    received_at=now,
+                )
+                .on_conflict_do_nothing(index_elements=['provider', 'idempotency_key'])
+            )
+            result = await db.execute(stmt)
+            await db.commit()
+
+        if result.rowcount != 1:
+            logger.info('Повторная доставка платёжного вебхука пропущена', provider=provider)
+            return False
+        self._wake()
+        return True
+
+    async def replay(self, item_id: int) -> bool:
+        """Ставит обработанный или отказавший коллбек на повторную обработку (из админки)."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(PaymentWebhookInboxItem)
+                .where(PaymentWebhookInboxItem.id == item_id, PaymentWebhookInboxItem.status != STATUS_PENDING)
+                .values(status=STATUS_PENDING, attempts=0, next_attempt_at=datetime.now(UTC), processed_at=None)
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            return False
+        logger.info('Платёжный вебхук поставлен на повторную обработку', item_id=item_id)
+        self._wake()
+        return True
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim_due_items(self, limit: int) -> list[InboxItem]:
+        now = datetime.now(UTC)
+        lease_until = now + _CLAIM_LEASE
+        claimed: list[InboxItem] = []
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(PaymentWebhookInboxItem)
+                .where(
+                    PaymentWebhookInboxItem.status == STATUS_PENDING,
+                    PaymentWebhookInboxItem.next_attempt_at <= now,
+                )
+                .order_by(PaymentWebhookInboxItem.next_attempt_at)
+                .limit(limit + len(self._in_flight))
+            )
+            for row in result.scalars().all():
+                if len(claimed) >= limit:
+                    break
+                if row.id in self._in_flight:
+                    continue
+                # Аренда: другой процесс, выбравший ту же строку, не пройдёт условие по next_attempt_at
+                claim = await db.execute(
+                    update(PaymentWebhookInboxItem)
+                    .where(
+                        and_(
+                            PaymentWebhookInboxItem.id == row.id,
+                            PaymentWebhookInboxItem.status == STATUS_PENDING,
+                            PaymentWebhookInboxItem.next_attempt_at == row.next_attempt_at,
+                        )
+                    )
+                    .values(next_attempt_at=lease_until)
+                )
+                if claim.rowcount == 1:
+                    claimed.append(
+                        InboxItem(
+                            id=row.id,
+                            provider=row.provider,
+                            handler=row.handler,
+                            payload=row.payload,
+                            attempts=row.attempts,
+                            received_at=row.received_at,
+                            lease_until=lease_until,
+                        )
+                    )
+            await db.commit()
+        return claimed
+
+    async def process_pending(self) -> int:
+        """Claims due items up to the free worker slots and starts them; returns the number started."""
+        free = max(1, settings.PAYMENT_WEBHOOK_INBOX_WORKERS) - len(self._in_flight)
+        if free <= 0 or self._payment_service is None:
+            return 0
+        items = await self._claim_due_items(free)
+        for item in items:
+            self._in_flight.add(item.id)
+            task = asyncio.create_task(self._process_item(item))
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+        return len(items)
+
+    async def _process_item(self, item: InboxItem) -> None:
+        item.attempts += 1
+        try:
+            try:
+                async with AsyncSessionLocal() as db:
+                    try:
+                        process_callback = getattr(self._payment_service, item.handler)
+                        success = await process_callback(db, item.payload)
+                        await db.commit()
+                    except Exception:
+                        await db.rollback()
+                        raise
+            except Exception as error:
+                logger.exception(
+                    'Ошибка обработки платёжного вебхука', provider=item.provider, item_id=item.id, error=error
+                )
+                await self._reschedule(item, repr(error))
+                return
+
+            if not success:
+                await self._reschedule(item, f'{item.handler} returned {success!r}')
+                return
+            await self._finish(item)
+        except Exception as persist_error:
+            # Строка останется с арендой и вернётся в работу после её истечения
+            logger.error(
+                'Не удалось записать результат обработки платёжного вебхука',
+                provider=item.provider,
+                item_id=item.id,
+                error=persist_error,
+            )
+        finally:
+            self._in_flight.discard(item.id)
+            self._wake()
+
+    def _claimed(self, item: InboxItem):
+        return and_(
+            PaymentWebhookInboxItem.id == item.id,
+            PaymentWebhookInboxItem.next_attempt_at == item.lease_until,
+        )
+
+    async def _finish(self, item: InboxItem) -> None:
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(PaymentWebhookInboxItem)
+                .where(self._claimed(item))
+                .values(status=STATUS_DONE, attempts=item.attempts, processed_at=now, last_error=None)
+            )
+            await db.commit()
+        self.succeeded += 1
+        count, total, worst = self._lag_totals.get(item.provider, (0, 0.0, 0.0))
+        lag = (now - item.received_at).total_seconds()
+        self._lag_totals[item.provider] = (count + 1, total + lag, max(worst, lag))
+
+    async def _reschedule(self, item: InboxItem, error: str) -> None:
+        self.failed += 1
+        values: dict[str, Any] = {'attempts': item.attempts, 'last_error': error[:2000]}
+        if item.attempts >= settings.PAYMENT_WEBHOOK_INBOX_MAX_ATTEMPTS:
+            self.exhausted += 1
+            values['status'] = STATUS_FAILED
+            logger.error(
+                'Платёжный вебхук не обработан после всех попыток — нужен ручной повтор из админки',
+                provider=item.provider,
+                item_id=item.id,
+                attempts=item.attempts,
+                error=error,
+            )
+        else:
+            delay = retry_delay_seconds(item.attempts)
+            values['next_attempt_at'] = datetime.now(UTC) + timedelta(seconds=delay)
+            logger.warning(
+                'Платёжный вебхук не обработан, повтор запланирован',
+                provider=item.provider,
+                item_id=item.id,
+                attempts=item.attempts,
+                retry_in_seconds=round(delay),
+                error=error,
+            )
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(PaymentWebhookInboxItem).where(self._claimed(item)).values(**values))
+            await db.commit()
+
+    async def purge_processed(self) -> int:
+        """Удаляет обработанные коллбеки старше PAYMENT_WEBHOOK_INBOX_RETENTION_DAYS."""
+        cutoff = datetime.now(UTC) - timedelta(days=max(1, settings.PAYMENT_WEBHOOK_INBOX_RETENTION_DAYS))
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(PaymentWebhookInboxItem).where(
+                    PaymentWebhookInboxItem.status == STATUS_DONE,
+                    PaymentWebhookInboxItem.processed_at < cutoff,
+                )
+            )
+            await db.commit()
+        return result.rowcount or 0
+
+    async def get_metrics(self) -> dict[str, Any]:
+        """Queue depth and lag per provider for monitoring."""
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(
+                        PaymentWebhookInboxItem.provider,
+                        func.count().filter(PaymentWebhookInboxItem.status == STATUS_PENDING),
+                        func.count().filter(PaymentWebhookInboxItem.status == STATUS_FAILED),
+                        func.min(PaymentWebhookInboxItem.received_at).filter(
+                            PaymentWebhookInboxItem.status == STATUS_PENDING
+                        ),
+                    )
+                    .where(PaymentWebhookInboxItem.status != STATUS_DONE)
+                    .group_by(PaymentWebhookInboxItem.provider)
+                )
+            ).all()
+
+        providers: dict[str, dict[str, Any]] = {}
+        for provider, pending, failed, oldest in rows:
+            if oldest is not None and oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=UTC)
+            providers[provider] = {
+                'pending': int(pending or 0),
+                'failed': int(failed or 0),
+                'queue_lag_seconds': int((now - oldest).total_seconds()) if oldest else 0,
+            }
+        for provider, (count, total, worst) in self._lag_totals.items():
+            entry = providers.setdefault(provider, {'pending': 0, 'failed': 0, 'queue_lag_seconds': 0})
+            entry['processed'] = count
+            entry['avg_processing_lag_seconds'] = round(total / count, 3)
+            entry['max_processing_lag_seconds'] = round(worst, 3)
+        return {
+            'providers': providers,
+            'in_flight': len(self._in_flight),
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'exhausted': self.exhausted,
+        }
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        # Незавершённые попытки не ждём: их строки вернутся в работу после аренды
+        for task in list(self._workers):
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._in_flight.clear()
+
+    async def _run_loop(self) -> None:
+        while self._running:
+            self._wakeup.clear()
+            started = 0
+            try:
+                started = await self.process_pending()
+                await self._maybe_purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error('Ошибка обработки входящей очереди платёжных вебхуков', error=error)
+            if started:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(1, settings.PAYMENT_WEBHOOK_INBOX_POLL_SECONDS))
+            except TimeoutError:
+                pass
+
+    async def _maybe_purge(self) -> None:
+        now = datetime.now(UTC)
+        if self._purged_at is not None and now - self._purged_at < _PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        purged = await self.purge_processed()
+        if purged:
+            logger.info('Очищены обработанные платёжные вебхуки', purged=purged)
+
+
+async def list_inbox_items(
+    db: AsyncSession,
+    *,
+    status: str | None = None,
+    provider: str | None = None,
+    item_id: int | None = None,
+    limit: int = 50,
+) -> list[PaymentWebhookInboxItem]:
+    """Последние коллбеки входящей очереди для админки, новые первыми."""
+    stmt = select(PaymentWebhookInboxItem).order_by(PaymentWebhookInboxItem.id.desc()).limit(limit)
+    if status is not None:
+        stmt = stmt.where(PaymentWebhookInboxItem.status == status)
+    if provider is not None:
+        stmt = stmt.where(PaymentWebhookInboxItem.provider == provider)
+    if item_id is not None:
+        stmt = stmt.where(PaymentWebhookInboxItem.id == item_id)
+    return list((await db.execute(stmt)).scalars().all())
+
+
+payment_webhook_inbox = PaymentWebhookInbox()
@@ -10,6 +10,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -29,9 +30,6 @@ class PayPearAPIError(Exception):
 class PayPearService:
     """Сервис для работы с API PayPear."""
 
-    def __init__(self):
-        self._session: aiohttp.ClientSession | None = None
-
     @property
     def shop_id(self) -> str:
         return settings.PAYPEAR_SHOP_ID or ''
@@ -47,18 +45,8 @@ class PayPearService:
         return f'Basic {encoded}'
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Возвращает переиспользуемую HTTP-сессию."""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-            )
-        return self._session
-
-    async def close(self) -> None:
-        """Закрывает HTTP-сессию."""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        """Возвращает общую HTTP-сессию провайдера из транспорта; закрывать её не нужно."""
+        return http_transport.session('paypear')
 
     async def create_payment(
         self,
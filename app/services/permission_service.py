@@ -7,9 +7,11 @@ attribute-based access policies (time ranges, IP whitelists).
 from __future__ import annotations
 
 import ipaddress
+import re
+from dataclasses import dataclass, field
 from datetime import UTC, datetime
-from fnmatch import fnmatch
-from typing import TYPE_CHECKING
+from fnmatch import fnmatch, translate
+from typing import TYPE_CHECKING, Any
 
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -18,6 +20,8 @@ from app.database.crud.rbac import SUPERADMIN_LEVEL, AccessPolicyCRUD, AuditLogC
 
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
     from app.database.models import AccessPolicy, User
 
 
@@ -202,6 +206,97 @@ def _evaluate_conditions(
     return True
 
 
+def _evaluate_policies(
+    policies: Sequence[AccessPolicy | PolicySnapshot],
+    required_permission: str,
+    *,
+    user_id: int,
+    ip_address: str | None = None,
+) -> tuple[bool, str]:
+    """Apply ABAC policies (sorted by priority desc); deny is final."""
+    for policy in policies:
+        if not _policy_matches_resource(policy, required_permission):
+            continue
+
+        conditions_met = _evaluate_conditions(
+            policy.conditions,
+            ip_address=ip_address,
+        )
+        if not conditions_met:
+            # Conditions not satisfied -- this policy does not apply
+            continue
+
+        if policy.effect == 'deny':
+            logger.debug(
+                'Permission denied by ABAC policy',
+                user_id=user_id,
+                required=required_permission,
+                policy_id=policy.id,
+                policy_name=policy.name,
+            )
+            return False, f'Denied by policy: {policy.name}'
+
+        # effect == 'allow' does not override a prior deny at higher priority,
+        # but since policies are sorted desc and deny returns immediately,
+        # reaching here means no deny has fired yet -- just continue.
+
+    return True, 'Granted by RBAC + ABAC'
+
+
+# ---------------------------------------------------------------------------
+# Preloaded RBAC/ABAC state (cached per cabinet principal)
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True, slots=True)
+class PolicySnapshot:
+    """Detached copy of an ``AccessPolicy`` row, safe to share between sessions."""
+
+    id: int
+    name: str
+    resource: str
+    actions: tuple[str, ...]
+    effect: str
+    conditions: dict[str, Any] | None
+
+    @classmethod
+    def from_model(cls, policy: AccessPolicy) -> PolicySnapshot:
+        return cls(
+            id=policy.id,
+            name=policy.name,
+            resource=policy.resource,
+            actions=tuple(policy.actions or ()),
+            effect=policy.effect,
+            conditions=policy.conditions,
+        )
+
+
+def compile_permission_matcher(permissions: Sequence[str]) -> re.Pattern[str] | None:
+    """Compile the user's wildcard permissions into a single regex (same semantics as ``permission_matches``)."""
+    if not permissions:
+        return None
+    return re.compile('|'.join(f'(?:{translate(perm)})' for perm in permissions))
+
+
+@dataclass(frozen=True, slots=True)
+class RbacSnapshot:
+    permissions: tuple[str, ...]
+    role_names: tuple[str, ...]
+    role_level: int
+    policies: tuple[PolicySnapshot, ...]
+    valid_until: datetime | None = None
+    matcher: re.Pattern[str] | None = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'matcher', compile_permission_matcher(self.permissions))
+
+    def grants(self, required_permission: str) -> bool:
+        return self.matcher is not None and self.matcher.match(required_permission) is not None
+
+    def is_expired(self, now: datetime | None = None) -> bool:
+        return self.valid_until is not None and self.valid_until <= (now or datetime.now(UTC))
+
+
 # ---------------------------------------------------------------------------
 # Service class
 # ---------------------------------------------------------------------------
@@ -267,42 +362,53 @@ class PermissionService:
             return True, 'Granted by RBAC'
 
         # Step 4 -- evaluate ABAC policies (highest priority first, already sorted)
-        explicit_deny = False
-        deny_reason = ''
+        return _evaluate_policies(policies, required_permission, user_id=user.id, ip_address=ip_address)
 
-        for policy in policies:
-            if not _policy_matches_resource(policy, required_permission):
-                continue
+    @staticmethod
+    async def load_rbac_snapshot(db: AsyncSession, user_id: int) -> RbacSnapshot:
+        """Load everything ``evaluate_snapshot`` needs in one pass (roles + ABAC policies)."""
+        now = datetime.now(UTC)
+        user_roles = await UserRoleCRUD.get_user_roles(db, user_id)
+        permissions, role_names, max_level = UserRoleCRUD.aggregate_permissions(user_roles, now)
+        policies = await AccessPolicyCRUD.get_policies_for_user(db, [ur.role_id for ur in user_roles])
+
+        # The snapshot must not outlive the first role assignment that expires
+        expirations = [ur.expires_at for ur in user_roles if ur.expires_at is not None and ur.expires_at > now]
+        return RbacSnapshot(
+            permissions=tuple(permissions),
+            role_names=tuple(role_names),
+            role_level=max_level,
+            policies=tuple(PolicySnapshot.from_model(policy) for policy in policies),
+            valid_until=min(expirations) if expirations else None,
+        )
 
-            conditions_met = _evaluate_conditions(
-                policy.conditions,
-                ip_address=ip_address,
-            )
-            if not conditions_met:
-                # Conditions not satisfied -- this policy does not apply
-                continue
+    @staticmethod
+    def evaluate_snapshot(
+        user: User,
+        snapshot: RbacSnapshot | None,
+        required_permission: str,
+        *,
+        ip_address: str | None = None,
+    ) -> tuple[bool, str]:
+        """Same decision as ``check_permission``, computed from a preloaded snapshot without queries.
 
-            if policy.effect == 'deny':
-                explicit_deny = True
-                deny_reason = f'Denied by policy: {policy.name}'
-                logger.debug(
-                    'Permission denied by ABAC policy',
-                    user_id=user.id,
-                    required=required_permission,
-                    policy_id=policy.id,
-                    policy_name=policy.name,
-                )
-                # Deny is final -- stop evaluation
-                break
-
-            # effect == 'allow' does not override a prior deny at higher priority,
-            # but since policies are sorted desc and deny breaks immediately,
-            # reaching here means no deny has fired yet -- just continue.
-
-        if explicit_deny:
-            return False, deny_reason
-
-        return True, 'Granted by RBAC + ABAC'
+        ``snapshot`` may be omitted for legacy config-based admins.
+        """
+        if _is_legacy_admin(user):
+            return True, 'Granted by legacy admin config'
+        if snapshot is None or not snapshot.permissions:
+            return False, 'No active roles assigned'
+        if not snapshot.grants(required_permission):
+            logger.debug(
+                'Permission denied: RBAC mismatch',
+                user_id=user.id,
+                required=required_permission,
+                permissions=list(snapshot.permissions),
+            )
+            return False, 'Permission not granted by any role'
+        if not snapshot.policies:
+            return True, 'Granted by RBAC'
+        return _evaluate_policies(snapshot.policies, required_permission, user_id=user.id, ip_address=ip_address)
 
     @staticmethod
     async def get_user_permissions(db: AsyncSession, user_id: int, user: User | None = None) -> dict:
@@ -11,6 +11,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -58,7 +59,6 @@ class PlategaService:
         self.api_version = forced_version or self._normalize_api_version(settings.PLATEGA_API_VERSION)
         self.merchant_id = settings.PLATEGA_MERCHANT_ID
         self.secret = settings.PLATEGA_SECRET
-        self._timeout = aiohttp.ClientTimeout(total=30, connect=10, sock_read=25)
         self._max_retries = 3
         self._retry_delay = 0.5
         self._retryable_statuses = {500, 502, 503, 504}
@@ -246,16 +246,14 @@ class PlategaService:
 
         for attempt in range(1, self._max_retries + 1):
             try:
-                async with (
-                    aiohttp.ClientSession(timeout=self._timeout) as session,
-                    session.request(
-                        method,
-                        url,
-                        json=json_data,
-                        params=params,
-                        headers=headers,
-                    ) as response,
-                ):
+                # Повторы с логированием по попыткам ведёт сам клиент — у транспорта они выключены
+                async with http_transport.session('platega', max_retries=0).request(
+                    method,
+                    url,
+                    json=json_data,
+                    params=params,
+                    headers=headers,
+                ) as response:
                     data, raw_text = await self._deserialize_response(response)
 
                     if response.status >= 400:
@@ -75,7 +75,7 @@ async def process_recurrent_payments(db: AsyncSession, bot: Bot | None = None) -
     у которых недостаточно баланса, и пополняет баланс с сохранённой карты.
 
     Args:
-        db: Сессия БД из вызывающего кода (_monitoring_cycle)
+        db: Сессия БД из вызывающего кода (этап мониторинга recurrent_autopay)
         bot: Экземпляр бота для уведомлений
 
     Returns:
@@ -0,0 +1,144 @@
+"""Отложенный пересчёт итогов реферальных веток (``User.referral_branch_*``).
+
+Раньше каждая завершённая оплата подписки сдвигала итоги у всех предков
+плательщика прямо в своей транзакции: ``UPDATE users … WHERE id IN (предки)``
+держал блокировки строк рефереров верхних уровней до коммита платежа, и
+одновременные оплаты в одной ветке выстраивались в очередь или дедлочили.
+
+Теперь хуки трат обновляют только строку самого плательщика и откладывают его
+id в ``session.info`` (``defer_branch_refresh``). После коммита id попадают
+сюда, и фоновый цикл раз в REFERRAL_BRANCH_FLUSH_INTERVAL_SECONDS пересчитывает
+итоги у них и их предков пачками, каждая в своей короткой транзакции; строки
+блокируются в порядке id.
+"""
+
+import asyncio
+from typing import Any
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.crud.referral_closure import BRANCH_REFRESH_INFO_KEY, refresh_referral_branch_totals
+from app.database.database import AsyncSessionLocal
+
+
+logger = structlog.get_logger(__name__)
+
+# Сколько пользователей пересчитывается в одной транзакции
+_FLUSH_BATCH_SIZE = 500
+
+
+class ReferralBranchService:
+    def __init__(self) -> None:
+        self._dirty_user_ids: set[int] = set()
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self._lock = asyncio.Lock()
+        self.refreshed_users = 0
+        self.failures = 0
+
+    def is_running(self) -> bool:
+        return self._running and self._task is not None and not self._task.done()
+
+    def mark_dirty(self, user_ids: set[int]) -> None:
+        self._dirty_user_ids.update(user_ids)
+
+    async def start(self) -> None:
+        if self.is_running():
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._loop())
+        logger.info(
+            'Сервис итогов реферальных веток запущен',
+            flush_interval=settings.REFERRAL_BRANCH_FLUSH_INTERVAL_SECONDS,
+        )
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        # Досчитываем накопленное, чтобы итоги не отстали до следующего запуска
+        try:
+            await self.flush_dirty_users()
+        except Exception as error:
+            logger.error('Ошибка пересчёта итогов реферальных веток при остановке', error=error)
+
+    async def _loop(self) -> None:
+        while self._running:
+            try:
+                await asyncio.sleep(max(1, int(settings.REFERRAL_BRANCH_FLUSH_INTERVAL_SECONDS)))
+                await self.flush_dirty_users()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.failures += 1
+                logger.error('Ошибка пересчёта итогов реферальных веток', error=error)
+
+    async def flush_dirty_users(self) -> int:
+        if not self._dirty_user_ids:
+            return 0
+        user_ids = sorted(self._dirty_user_ids)
+        self._dirty_user_ids.clear()
+        for start in range(0, len(user_ids), _FLUSH_BATCH_SIZE):
+            batch = user_ids[start : start + _FLUSH_BATCH_SIZE]
+            try:
+                await self._refresh(batch)
+            except Exception:
+                self._dirty_user_ids.update(user_ids[start:])
+                raise
+        return len(user_ids)
+
+    async def _refresh(self, user_ids: list[int]) -> None:
+        async with self._lock, AsyncSessionLocal() as db:
+            try:
+                await refresh_referral_branch_totals(db, user_ids, include_self=True)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        self.refreshed_users += len(user_ids)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            'running': self.is_running(),
+            'pending_users': len(self._dirty_user_ids),
+            'refreshed_users': self.refreshed_users,
+            'failures': self.failures,
+        }
+
+
+referral_branch_service = ReferralBranchService()
+
+
+def _mark_after_commit(session: Session) -> None:
+    user_ids = session.info.pop(BRANCH_REFRESH_INFO_KEY, None)
+    if user_ids:
+        referral_branch_service.mark_dirty(user_ids)
+
+
+def _discard_after_rollback(session: Session, previous_transaction: Any) -> None:
+    if not getattr(previous_transaction, 'nested', False):
+        session.info.pop(BRANCH_REFRESH_INFO_KEY, None)
+
+
+_registered = False
+
+
+def register_branch_tracking() -> None:
+    """Подписывается на события ORM-сессии, чтобы коммиты передавали отложенные id сервису."""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_commit', _mark_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _registered = True
+
+
+register_branch_tracking()
@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.database.crud.referral import create_referral_earning, get_commission_payment_count, get_user_campaign_id
+from app.database.crud.referral_closure import relink_referrals
 from app.database.crud.user import add_user_balance, get_user_by_id
 from app.database.models import ReferralEarning, TransactionType, User
 from app.services.notification_delivery_service import (
@@ -287,6 +288,10 @@ async def attach_referrer_if_missing(
             _sa_update(User).where(User.id == user.id, User.referred_by_id.is_(None)).values(referred_by_id=referrer.id)
         )
         result = await db.execute(update_stmt)
+        if result.rowcount == 1:
+            # Core UPDATE проходит мимо хуков User — замыкание и итоги веток
+            # переносим в той же транзакции.
+            await relink_referrals(db, [user.id])
         await db.commit()
     except Exception as exc:
         logger.error(
@@ -1,25 +1,47 @@
 """Deferred retry queue for failed RemnaWave API calls.
 
 When create_remnawave_user() fails during purchase, the subscription exists
-in the bot DB but not in the panel. This queue retries the operation
-periodically until it succeeds or max retries are exhausted.
+in the bot DB but not in the panel. This queue retries the operation until it
+succeeds or REMNAWAVE_RETRY_MAX_ATTEMPTS are exhausted.
+
+The queue is persisted in ``remnawave_retry_items`` (one row per subscription),
+so a panel outage followed by a deploy does not lose pending syncs:
+
+* ``enqueue()`` stays synchronous for its many callers: it coalesces the item
+  into an in-memory buffer keyed by subscription id and schedules a write;
+  repeated enqueues of the same subscription merge into one row (``create``
+  wins over ``update``) and bump its ``version``;
+* the worker claims due rows with a lease, processes them in parallel with
+  REMNAWAVE_RETRY_CONCURRENCY workers (a fresh session each) and reschedules
+  failures with exponential backoff and jitter;
+* a successful attempt deletes the row only if its version is unchanged, so a
+  re-enqueue that raced with the attempt is not lost.
 """
 
 from __future__ import annotations
 
 import asyncio
-from collections import deque
+import random
 from dataclasses import dataclass, field
-from datetime import UTC, datetime
-from typing import Literal
+from datetime import UTC, datetime, timedelta
+from typing import Any, Literal
 
 import structlog
+from sqlalchemy import and_, case, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from app.config import settings
 from app.database.database import AsyncSessionLocal
+from app.database.models import RemnaWaveRetryItem
 
 
 logger = structlog.get_logger(__name__)
 
+# Сколько захваченная строка невидима другим воркерам; после падения процесса
+# посреди попытки она снова станет доступна по истечении аренды.
+_CLAIM_LEASE = timedelta(minutes=10)
+
 
 @dataclass
 class RetryItem:
@@ -27,20 +49,37 @@ class RetryItem:
     user_id: int
     action: Literal['create', 'update']
     attempts: int = 0
+    version: int = 0
     created_at: datetime = field(default_factory=lambda: datetime.now(UTC))
     last_error: str | None = None
 
 
+def _merge_action(current: str, new: str) -> Literal['create', 'update']:
+    return 'create' if 'create' in (current, new) else 'update'
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter: a random delay in ``[d/2, d]``, ``d = base * 2^(attempts-1)``."""
+    base = max(1, settings.REMNAWAVE_RETRY_BASE_DELAY_SECONDS)
+    delay = min(settings.REMNAWAVE_RETRY_MAX_DELAY_SECONDS, base * 2 ** max(0, attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
 class RemnaWaveRetryQueue:
-    def __init__(self, max_retries: int = 5, interval_seconds: int = 120) -> None:
-        self._queue: deque[RetryItem] = deque()
-        self._max_retries = max_retries
-        self._interval = interval_seconds
+    def __init__(self) -> None:
+        # Ещё не записанные в БД постановки; ключ — subscription_id
+        self._buffer: dict[int, RetryItem] = {}
+        self._in_flight: set[int] = set()
         self._task: asyncio.Task | None = None
+        self._persist_task: asyncio.Task | None = None
+        self._running = False
+        self.succeeded = 0
+        self.failed = 0
+        self.exhausted = 0
 
     @property
-    def pending_count(self) -> int:
-        return len(self._queue)
+    def buffered_count(self) -> int:
+        return len(self._buffer)
 
     def enqueue(
         self,
@@ -48,87 +87,226 @@ class RemnaWaveRetryQueue:
         user_id: int,
         action: Literal['create', 'update'] = 'create',
     ) -> None:
-        # Deduplicate by subscription_id
-        for item in self._queue:
-            if item.subscription_id == subscription_id:
-                return
-        self._queue.append(
-            RetryItem(
-                subscription_id=subscription_id,
-                user_id=user_id,
-                action=action,
-            )
-        )
+        existing = self._buffer.get(subscription_id)
+        if existing is not None:
+            existing.action = _merge_action(existing.action, action)
+            existing.user_id = user_id
+        else:
+            self._buffer[subscription_id] = RetryItem(subscription_id=subscription_id, user_id=user_id, action=action)
         logger.info(
             'Enqueued RemnaWave retry',
             subscription_id=subscription_id,
             user_id=user_id,
             action=action,
-            queue_size=len(self._queue),
+            buffered=len(self._buffer),
         )
+        self._schedule_persist()
 
-    async def process_pending(self) -> None:
-        if not self._queue:
+    def _schedule_persist(self) -> None:
+        # До start() (и в тестах) элементы ждут в буфере: start() запишет их сам
+        if not self._running or (self._persist_task and not self._persist_task.done()):
             return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._persist_task = loop.create_task(self._persist_buffer())
 
-        from app.database.crud.subscription import get_subscription_by_id
-        from app.services.subscription_service import SubscriptionService
+    async def _persist_buffer(self) -> int:
+        if not self._buffer:
+            return 0
+        items = list(self._buffer.values())
+        self._buffer.clear()
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._upsert_items(db, items)
+                await db.commit()
+        except Exception as error:
+            # БД недоступна — вернём элементы в буфер, следующий тик попробует снова
+            for item in items:
+                pending = self._buffer.get(item.subscription_id)
+                if pending is not None:
+                    pending.action = _merge_action(pending.action, item.action)
+                else:
+                    self._buffer[item.subscription_id] = item
+            logger.error('Не удалось сохранить очередь повторов RemnaWave', error=error, buffered=len(self._buffer))
+            return 0
+        return len(items)
 
-        batch = list(self._queue)
-        self._queue.clear()
+    @staticmethod
+    async def _upsert_items(db, items: list[RetryItem]) -> None:
+        now = datetime.now(UTC)
+        first_attempt_at = now + timedelta(seconds=max(1, settings.REMNAWAVE_RETRY_BASE_DELAY_SECONDS))
+        insert_factory = pg_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+        table = RemnaWaveRetryItem.__table__
+        stmt = insert_factory(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.subscription_id],
+            set_={
+                'user_id': stmt.excluded.user_id,
+                'action': case(
+                    (or_(table.c.action == 'create', stmt.excluded.action == 'create'), 'create'),
+                    else_='update',
+                ),
+                # Новая постановка — новые изменения для панели: счётчик попыток заново
+                'attempts': 0,
+                'version': table.c.version + 1,
+                'next_attempt_at': case(
+                    (table.c.next_attempt_at < stmt.excluded.next_attempt_at, table.c.next_attempt_at),
+                    else_=stmt.excluded.next_attempt_at,
+                ),
+                'updated_at': now,
+            },
+        )
+        await db.execute(
+            stmt,
+            [
+                {
+                    'subscription_id': item.subscription_id,
+                    'user_id': item.user_id,
+                    'action': item.action,
+                    'attempts': 0,
+                    'version': 1,
+                    'next_attempt_at': first_attempt_at,
+                    'created_at': now,
+                    'updated_at': now,
+                }
+                for item in items
+            ],
+        )
 
-        for item in batch:
-            item.attempts += 1
-            try:
-                async with AsyncSessionLocal() as db:
-                    sub = await get_subscription_by_id(db, item.subscription_id)
-                    if not sub:
-                        logger.warning(
-                            'Retry: subscription not found, dropping',
-                            subscription_id=item.subscription_id,
+    async def _claim_due_items(self) -> list[RetryItem]:
+        now = datetime.now(UTC)
+        claimed: list[RetryItem] = []
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(RemnaWaveRetryItem)
+                .where(RemnaWaveRetryItem.next_attempt_at <= now)
+                .order_by(RemnaWaveRetryItem.next_attempt_at)
+                .limit(max(1, settings.REMNAWAVE_RETRY_BATCH_SIZE))
+            )
+            for row in result.scalars().all():
+                if row.subscription_id in self._in_flight:
+                    continue
+                # Аренда: другой процесс, выбравший ту же строку, не пройдёт условие по version/next_attempt_at
+                claim = await db.execute(
+                    update(RemnaWaveRetryItem)
+                    .where(
+                        and_(
+                            RemnaWaveRetryItem.subscription_id == row.subscription_id,
+                            RemnaWaveRetryItem.version == row.version,
+                            RemnaWaveRetryItem.next_attempt_at <= now,
+                        )
+                    )
+                    .values(next_attempt_at=now + _CLAIM_LEASE)
+                )
+                if claim.rowcount == 1:
+                    claimed.append(
+                        RetryItem(
+                            subscription_id=row.subscription_id,
+                            user_id=row.user_id,
+                            action=row.action,
+                            attempts=row.attempts,
+                            version=row.version,
+                            created_at=row.created_at,
+                            last_error=row.last_error,
                         )
-                        continue
-
-                    service = SubscriptionService()
-                    if not service.is_configured:
-                        self._requeue(item, 'RemnaWave not configured')
-                        continue
-
-                    if item.action == 'create':
-                        result = await service.create_remnawave_user(db, sub)
-                    else:
-                        result = await service.update_remnawave_user(db, sub)
-
-                    # create_remnawave_user / update_remnawave_user проглатывают
-                    # RemnaWaveAPIError внутри себя и возвращают None (не
-                    # пробрасывают). Без проверки результата воркер счёл бы
-                    # провал успехом и выбросил бы элемент из очереди после
-                    # первого тика — подписка осталась бы без юзера в панели.
-                    if result is None:
-                        self._requeue(item, f'{item.action}_remnawave_user returned None')
-                        continue
-
-                    logger.info(
-                        'Retry succeeded',
+                    )
+            await db.commit()
+        return claimed
+
+    async def process_pending(self) -> int:
+        """Persists buffered items and processes every due one; returns the number processed."""
+        await self._persist_buffer()
+        items = await self._claim_due_items()
+        if not items:
+            return 0
+
+        semaphore = asyncio.Semaphore(max(1, settings.REMNAWAVE_RETRY_CONCURRENCY))
+
+        async def _run(item: RetryItem) -> None:
+            async with semaphore:
+                await self._process_item(item)
+
+        self._in_flight.update(item.subscription_id for item in items)
+        try:
+            await asyncio.gather(*(_run(item) for item in items))
+        finally:
+            self._in_flight.difference_update(item.subscription_id for item in items)
+        return len(items)
+
+    async def _process_item(self, item: RetryItem) -> None:
+        from app.database.crud.subscription import get_subscription_by_id
+        from app.services.subscription_service import SubscriptionService
+
+        item.attempts += 1
+        try:
+            async with AsyncSessionLocal() as db:
+                sub = await get_subscription_by_id(db, item.subscription_id)
+                if not sub:
+                    logger.warning(
+                        'Retry: subscription not found, dropping',
                         subscription_id=item.subscription_id,
-                        attempts=item.attempts,
                     )
+                    await self._finish(item)
+                    return
 
-            except Exception as error:
-                self._requeue(item, str(error))
+                service = SubscriptionService()
+                if not service.is_configured:
+                    await self._reschedule(item, 'RemnaWave not configured')
+                    return
 
-    def _requeue(self, item: RetryItem, error: str) -> None:
-        item.last_error = error
-        if item.attempts < self._max_retries:
-            self._queue.append(item)
-            logger.warning(
-                'Retry failed, re-enqueued',
+                if item.action == 'create':
+                    result = await service.create_remnawave_user(db, sub)
+                else:
+                    result = await service.update_remnawave_user(db, sub)
+
+                # create_remnawave_user / update_remnawave_user проглатывают
+                # RemnaWaveAPIError внутри себя и возвращают None (не
+                # пробрасывают). Без проверки результата воркер счёл бы
+                # провал успехом и удалил бы элемент из очереди после
+                # первой попытки — подписка осталась бы без юзера в панели.
+                if result is None:
+                    await self._reschedule(item, f'{item.action}_remnawave_user returned None')
+                    return
+
+            await self._finish(item)
+            self.succeeded += 1
+            logger.info(
+                'Retry succeeded',
                 subscription_id=item.subscription_id,
                 attempts=item.attempts,
-                max_retries=self._max_retries,
-                error=error,
             )
-        else:
+
+        except Exception as error:
+            try:
+                await self._reschedule(item, str(error))
+            except Exception as persist_error:
+                # Строка останется с арендой и вернётся в работу после её истечения
+                logger.error(
+                    'Не удалось перепланировать повтор RemnaWave',
+                    subscription_id=item.subscription_id,
+                    error=persist_error,
+                )
+
+    @staticmethod
+    def _same_version(item: RetryItem):
+        return and_(
+            RemnaWaveRetryItem.subscription_id == item.subscription_id,
+            RemnaWaveRetryItem.version == item.version,
+        )
+
+    async def _finish(self, item: RetryItem) -> None:
+        # Если за время попытки подписку поставили заново (version вырос), строка остаётся
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(RemnaWaveRetryItem).where(self._same_version(item)))
+            await db.commit()
+
+    async def _reschedule(self, item: RetryItem, error: str) -> None:
+        item.last_error = error
+        self.failed += 1
+        if item.attempts >= settings.REMNAWAVE_RETRY_MAX_ATTEMPTS:
+            self.exhausted += 1
             logger.error(
                 'Retry exhausted, dropping (MANUAL INTERVENTION NEEDED)',
                 subscription_id=item.subscription_id,
@@ -136,27 +314,86 @@ class RemnaWaveRetryQueue:
                 attempts=item.attempts,
                 error=error,
             )
+            await self._finish(item)
+            return
+
+        delay = retry_delay_seconds(item.attempts)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(RemnaWaveRetryItem)
+                .where(self._same_version(item))
+                .values(
+                    attempts=item.attempts,
+                    last_error=error[:2000],
+                    next_attempt_at=datetime.now(UTC) + timedelta(seconds=delay),
+                )
+            )
+            await db.commit()
+        logger.warning(
+            'Retry failed, rescheduled',
+            subscription_id=item.subscription_id,
+            attempts=item.attempts,
+            max_retries=settings.REMNAWAVE_RETRY_MAX_ATTEMPTS,
+            retry_in_seconds=round(delay),
+            error=error,
+        )
+
+    async def get_metrics(self) -> dict[str, Any]:
+        """Queue depth and age for monitoring."""
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            depth, due, oldest = (
+                await db.execute(
+                    select(
+                        func.count(),
+                        func.count().filter(RemnaWaveRetryItem.next_attempt_at <= now),
+                        func.min(RemnaWaveRetryItem.created_at),
+                    ).select_from(RemnaWaveRetryItem)
+                )
+            ).one()
+        if oldest is not None and oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=UTC)
+        return {
+            'depth': int(depth or 0),
+            'due': int(due or 0),
+            'oldest_age_seconds': int((now - oldest).total_seconds()) if oldest else 0,
+            'buffered': len(self._buffer),
+            'in_flight': len(self._in_flight),
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'exhausted': self.exhausted,
+        }
 
     async def start(self) -> None:
         if self._task and not self._task.done():
             return
+        self._running = True
         self._task = asyncio.create_task(self._run_loop())
 
     async def stop(self) -> None:
+        self._running = False
         if self._task and not self._task.done():
             self._task.cancel()
             try:
                 await self._task
             except asyncio.CancelledError:
                 pass
+        if self._persist_task and not self._persist_task.done():
+            await asyncio.gather(self._persist_task, return_exceptions=True)
+        # Всё, что успели поставить в очередь, должно пережить рестарт
+        await self._persist_buffer()
 
     async def _run_loop(self) -> None:
-        try:
-            while True:
-                await asyncio.sleep(self._interval)
-                await self.process_pending()
-        except asyncio.CancelledError:
-            raise
+        while self._running:
+            try:
+                processed = await self.process_pending()
+                if processed:
+                    logger.info('RemnaWave retry tick', processed=processed, **await self.get_metrics())
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error('Ошибка обработки очереди повторов RemnaWave', error=error)
+            await asyncio.sleep(max(1, settings.REMNAWAVE_RETRY_POLL_SECONDS))
 
 
 # Global instance
@@ -1,5 +1,6 @@
 import asyncio
 import re
+import time
 from contextlib import AsyncExitStack, asynccontextmanager
 from dataclasses import asdict, is_dataclass
 from datetime import UTC, datetime, timedelta
@@ -7,7 +8,7 @@ from typing import Any, Optional
 from zoneinfo import ZoneInfo
 
 import structlog
-from sqlalchemy import String, and_, cast, delete, func, select, update
+from sqlalchemy import String, and_, cast, delete, func, or_, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -20,6 +21,7 @@ from app.database.crud.subscription import (
 from app.database.crud.user import (
     create_user_no_commit,
     get_user_by_telegram_id,
+    refresh_user_spending,
 )
 from app.database.models import (
     ServerSquad,
@@ -37,6 +39,11 @@ from app.external.remnawave_api import (
     is_user_not_found_error,
 )
 from app.services.subscription_service import get_traffic_reset_strategy
+from app.utils.panel_sync_fingerprints import (
+    panel_sync_fingerprints,
+    panel_user_fingerprint,
+    register_fingerprint_invalidation,
+)
 from app.utils.subscription_utils import (
     coerce_panel_device_limit,
     device_limit_needs_heal,
@@ -47,6 +54,8 @@ from app.utils.timezone import get_local_timezone
 
 logger = structlog.get_logger(__name__)
 
+register_fingerprint_invalidation()
+
 
 def _get_user_traffic_bytes(panel_user: dict[str, Any]) -> int:
     """Извлекает usedTrafficBytes из панельного пользователя (совместимо с новым и старым API)"""
@@ -1385,246 +1394,381 @@ class RemnaWaveService:
         finally:
             await exit_stack.aclose()
 
+    @staticmethod
+    def _panel_user_to_sync_dict(user_obj: Any) -> dict[str, Any]:
+        """Снимок пользователя панели в формате, который ждут методы синхронизации."""
+        return {
+            'id': user_obj.id,
+            'shortUuid': user_obj.short_uuid,
+            'username': user_obj.username,
+            'status': user_obj.status.value,
+            'telegramId': user_obj.telegram_id,
+            'email': user_obj.email,  # Email для синхронизации email-only пользователей
+            'expireAt': user_obj.expire_at.isoformat(),
+            'trafficLimitBytes': user_obj.traffic_limit_bytes,
+            'usedTrafficBytes': user_obj.used_traffic_bytes,
+            'hwidDeviceLimit': user_obj.hwid_device_limit,
+            'subscriptionUrl': user_obj.subscription_url,
+            'subscriptionCryptoLink': user_obj.happ_crypto_link,
+            'activeInternalSquads': user_obj.active_internal_squads,
+        }
+
+    async def _load_bot_users_for_panel_page(
+        self,
+        db: AsyncSession,
+        *,
+        telegram_ids: set[int],
+        panel_ids: set[int],
+        emails: set[str],
+    ) -> list[User]:
+        """Загружает только тех пользователей бота, которых касается страница панели."""
+        conditions = []
+        if telegram_ids:
+            conditions.append(User.telegram_id.in_(telegram_ids))
+        if panel_ids:
+            conditions.append(User.remnawave_id.in_(panel_ids))
+        if emails:
+            conditions.append(func.lower(User.email).in_(emails))
+        if not conditions:
+            return []
+
+        result = await db.execute(
+            select(User)
+            .options(selectinload(User.subscriptions).selectinload(Subscription.tariff))
+            .where(or_(*conditions))
+        )
+        return list(result.scalars().all())
+
     async def sync_users_from_panel(self, db: AsyncSession, sync_type: str = 'all') -> dict[str, int]:
+        """Синхронизирует пользователей панели в бот постранично.
+
+        Каждая страница ``/api/users/stream`` сверяется только с теми
+        пользователями бота, которых она касается, и коммитится целиком.
+        Пользователи, чья запись в панели не изменилась с прошлого прохода
+        (см. ``panel_sync_fingerprints``), пропускаются без обращений к БД.
+        """
         # In multi-tariff mode, match panel users to subscriptions by remnawave_id
         if settings.is_multi_tariff_enabled():
             return await self._sync_users_from_panel_multi(db, sync_type)
 
         try:
-            stats = {'created': 0, 'updated': 0, 'errors': 0, 'deleted': 0}
+            stats = {'created': 0, 'updated': 0, 'errors': 0, 'deleted': 0, 'unchanged': 0}
 
             logger.info('🔄 Начинаем синхронизацию типа', sync_type=sync_type)
 
+            from app.services.grace_access_runtime import get_open_grace_subscription_ids
+
+            open_grace_ids = await get_open_grace_subscription_ids(db)
+
+            # telegram_id → expireAt/status лучшей записи панели: дедупликация
+            # между страницами и список тех, кто в панели есть (для деактивации).
+            seen_panel_users: dict[int, dict[str, Any]] = {}
+            page_size = max(1, int(settings.REMNAWAVE_SYNC_PAGE_SIZE))
+            run_started = time.monotonic()
+            pages = 0
+            completed = True
+
             async with self.get_api_client() as api:
-                panel_users = []
                 cursor: str | None = None
-                size = 500  # Размер страницы курсорной пагинации
 
                 while True:
-                    logger.info('📥 Загружаем пользователей', cursor=cursor, size=size)
-
+                    page_started = time.monotonic()
                     # 2.8.0: курсорная (keyset) пагинация /api/users/stream — устойчива
                     # к мутациям во время обхода. enrich_happ_links=False: bulk-список
                     # не содержит happ.cryptoLink, а обогащать каждого пользователя
                     # отдельным запросом дорого (и happ-encrypt удалён в 2.8.0).
-                    page = await api.get_all_users_page_stream(cursor=cursor, size=size, enrich_happ_links=False)
-                    users_batch = page['users']
+                    page = await api.get_all_users_page_stream(cursor=cursor, size=page_size, enrich_happ_links=False)
+                    panel_page = [self._panel_user_to_sync_dict(user_obj) for user_obj in page['users']]
+                    before = dict(stats)
+
+                    completed = await self._reconcile_panel_page(
+                        db,
+                        panel_page,
+                        sync_type,
+                        stats,
+                        seen_panel_users,
+                        open_grace_ids,
+                    )
 
+                    pages += 1
+                    elapsed = time.monotonic() - page_started
                     logger.info(
-                        '📊 Получена партия пользователей из панели',
-                        users_batch_count=len(users_batch),
-                        loaded_so_far=len(panel_users) + len(users_batch),
+                        '📦 Страница синхронизации обработана',
+                        page=pages,
+                        panel_users=len(panel_page),
+                        seconds=round(elapsed, 3),
+                        users_per_sec=round(len(panel_page) / elapsed, 1) if elapsed > 0 else None,
+                        created=stats['created'] - before['created'],
+                        updated=stats['updated'] - before['updated'],
+                        unchanged=stats['unchanged'] - before['unchanged'],
+                        errors=stats['errors'] - before['errors'],
                     )
 
-                    for user_obj in users_batch:
-                        user_dict = {
-                            'id': user_obj.id,
-                            'shortUuid': user_obj.short_uuid,
-                            'username': user_obj.username,
-                            'status': user_obj.status.value,
-                            'telegramId': user_obj.telegram_id,
-                            'email': user_obj.email,  # Email для синхронизации email-only пользователей
-                            'expireAt': user_obj.expire_at.isoformat(),
-                            'trafficLimitBytes': user_obj.traffic_limit_bytes,
-                            'usedTrafficBytes': user_obj.used_traffic_bytes,
-                            'hwidDeviceLimit': user_obj.hwid_device_limit,
-                            'subscriptionUrl': user_obj.subscription_url,
-                            'subscriptionCryptoLink': user_obj.happ_crypto_link,
-                            'activeInternalSquads': user_obj.active_internal_squads,
-                        }
-                        panel_users.append(user_dict)
-
-                    if not page['hasMore'] or not page['nextCursor']:
+                    if not completed or not page['hasMore'] or not page['nextCursor']:
                         break
 
                     cursor = page['nextCursor']
 
-                logger.info('✅ Всего загружено пользователей из панели', panel_users_count=len(panel_users))
+            if sync_type == 'all':
+                if completed:
+                    await self._deactivate_users_missing_in_panel(db, set(seen_panel_users), stats)
+                else:
+                    # Без полного списка панели нельзя понять, кого в ней нет.
+                    logger.warning('⚠️ Синхронизация прервана — деактивация отсутствующих в панели пропущена')
 
-            # Загрузка пользователей с их подписками за один запрос (bulk loading)
-            from sqlalchemy import select
-            from sqlalchemy.orm import selectinload
+            logger.info(
+                '🎯 Синхронизация завершена',
+                stats=stats['created'],
+                stats_2=stats['updated'],
+                stats_3=stats['deleted'],
+                stats_4=stats['errors'],
+                unchanged=stats['unchanged'],
+                pages=pages,
+                panel_users=len(seen_panel_users),
+                seconds=round(time.monotonic() - run_started, 3),
+            )
+            return stats
 
-            from app.database.models import Subscription, User
-            from app.services.grace_access_runtime import get_open_grace_subscription_ids
+        except Exception as e:
+            logger.error('❌ Критическая ошибка синхронизации пользователей', error=e)
+            return {'created': 0, 'updated': 0, 'errors': 1, 'deleted': 0}
 
-            open_grace_ids = await get_open_grace_subscription_ids(db)
+    async def _reconcile_panel_page(
+        self,
+        db: AsyncSession,
+        panel_page: list[dict[str, Any]],
+        sync_type: str,
+        stats: dict[str, int],
+        seen_panel_users: dict[int, dict[str, Any]],
+        open_grace_ids: set[int],
+    ) -> bool:
+        """Сверяет одну страницу панели с ботом и коммитит её.
 
-            # Получаем всех пользователей с их подписками за один запрос
-            bot_users_result = await db.execute(
-                select(User).options(selectinload(User.subscriptions).selectinload(Subscription.tariff))
+        Возвращает False, если сессия повреждена и обход нужно прервать.
+        """
+        panel_users_with_tg = [user for user in panel_page if user.get('telegramId') is not None]
+        unique_page_users = self._deduplicate_panel_users_by_telegram_id(panel_users_with_tg)
+
+        # Дубликат из предыдущей страницы обрабатываем, только если он свежее.
+        unique_panel_users: list[dict[str, Any]] = []
+        for telegram_id, panel_user in unique_page_users.items():
+            previous = seen_panel_users.get(telegram_id)
+            if previous is not None and not self._is_preferred_panel_user(candidate=panel_user, current=previous):
+                continue
+            seen_panel_users[telegram_id] = {'expireAt': panel_user.get('expireAt'), 'status': panel_user.get('status')}
+            unique_panel_users.append(panel_user)
+
+        duplicates_count = len(panel_users_with_tg) - len(unique_panel_users)
+        if duplicates_count:
+            logger.info(
+                '♻️ Обнаружено дубликатов пользователей по Telegram ID. Используем самые свежие записи.',
+                duplicates_count=duplicates_count,
             )
-            bot_users = bot_users_result.scalars().all()
-            # Filter out email-only users (telegram_id=None) to avoid None key issues
-            bot_users_by_telegram_id = {user.telegram_id: user for user in bot_users if user.telegram_id is not None}
-            bot_users_by_panel_id = {}
-            for user in bot_users:
-                _user_panel_id = _normalize_panel_user_id(getattr(user, 'remnawave_id', None))
-                if _user_panel_id is not None:
-                    bot_users_by_panel_id[_user_panel_id] = user
-            # Index users by email for email-only sync
-            bot_users_by_email = {user.email.lower(): user for user in bot_users if user.email and user.email_verified}
-            # Also index email-only users by their remnawave_id for sync
-            email_users_count = sum(1 for u in bot_users if u.telegram_id is None)
-            if email_users_count > 0:
-                logger.info('📧 Email-only пользователей (без telegram_id)', email_users_count=email_users_count)
 
-            logger.info('📊 Пользователей в боте', bot_users_count=len(bot_users))
+        # Email-only пользователи из панели (без telegram_id, но с email)
+        panel_users_email_only = [user for user in panel_page if user.get('telegramId') is None and user.get('email')]
+
+        bot_users = await self._load_bot_users_for_panel_page(
+            db,
+            telegram_ids={user['telegramId'] for user in unique_panel_users},
+            panel_ids={
+                panel_id
+                for panel_id in (_normalize_panel_user_id(user.get('id')) for user in panel_page)
+                if panel_id is not None
+            },
+            emails={user['email'].lower() for user in panel_users_email_only},
+        )
+        # Filter out email-only users (telegram_id=None) to avoid None key issues
+        bot_users_by_telegram_id = {user.telegram_id: user for user in bot_users if user.telegram_id is not None}
+        bot_users_by_panel_id: dict[int, User] = {}
+        for user in bot_users:
+            _user_panel_id = _normalize_panel_user_id(getattr(user, 'remnawave_id', None))
+            if _user_panel_id is not None:
+                bot_users_by_panel_id[_user_panel_id] = user
+        # Index users by email for email-only sync
+        bot_users_by_email = {user.email.lower(): user for user in bot_users if user.email and user.email_verified}
+
+        pending_panel_id_mutations: list[_PanelIdMapMutation] = []
+        page_fingerprints: dict[int, str] = {}
+
+        for i, panel_user in enumerate(unique_panel_users):
+            panel_id_mutation: _PanelIdMapMutation | None = None
+            telegram_id = panel_user.get('telegramId')
+            try:
+                if not telegram_id:
+                    continue
 
-            panel_users_with_tg = [user for user in panel_users if user.get('telegramId') is not None]
+                db_user = bot_users_by_telegram_id.get(telegram_id)
+                fingerprint = panel_user_fingerprint(panel_user)
 
-            logger.info('📊 Пользователей в панели с Telegram ID', panel_users_with_tg_count=len(panel_users_with_tg))
+                if not db_user:
+                    if sync_type in ['new_only', 'all']:
+                        logger.info('🆕 Создание пользователя для telegram_id', telegram_id=telegram_id)
 
-            unique_panel_users_map = self._deduplicate_panel_users_by_telegram_id(panel_users_with_tg)
-            unique_panel_users = list(unique_panel_users_map.values())
-            duplicates_count = len(panel_users_with_tg) - len(unique_panel_users)
+                        db_user, is_created = await self._get_or_create_bot_user_from_panel(db, panel_user)
 
-            if duplicates_count:
-                logger.info(
-                    '♻️ Обнаружено дубликатов пользователей по Telegram ID. Используем самые свежие записи.',
-                    duplicates_count=duplicates_count,
-                )
+                        if not db_user:
+                            logger.error(
+                                '❌ Не удалось создать или получить пользователя для telegram_id',
+                                telegram_id=telegram_id,
+                            )
+                            stats['errors'] += 1
+                            continue
 
-            panel_telegram_ids = set(unique_panel_users_map.keys())
+                        bot_users_by_telegram_id[telegram_id] = db_user
 
-            # Email-only пользователи из панели (без telegram_id, но с email)
-            panel_users_email_only = [
-                user for user in panel_users if user.get('telegramId') is None and user.get('email')
-            ]
-            if panel_users_email_only:
-                logger.info(
-                    '📧 Пользователей в панели с Email (без Telegram)',
-                    panel_users_email_only_count=len(panel_users_email_only),
-                )
+                        _, panel_id_mutation = self._ensure_user_remnawave_id(
+                            db_user,
+                            panel_user.get('id'),
+                            bot_users_by_panel_id,
+                        )
 
-            # Для ускорения - подготовим данные о подписках
-            # Соберем все существующие подписки за один запрос
-            existing_subscriptions_result = await db.execute(
-                select(Subscription).join(User).options(selectinload(Subscription.user))
-            )
-            existing_subscriptions = existing_subscriptions_result.scalars().all()
+                        if is_created:
+                            await self._create_subscription_from_panel_data(db, db_user, panel_user)
+                            applied_in_full = True
+                            stats['created'] += 1
+                            logger.info('✅ Создан пользователь с подпиской', telegram_id=telegram_id)
+                        else:
+                            # Обновляем данные существующего пользователя
+                            applied_in_full = await self._update_subscription_from_panel_data(
+                                db,
+                                db_user,
+                                panel_user,
+                                open_grace_ids=open_grace_ids,
+                            )
+                            stats['updated'] += 1
+                            logger.info('♻️ Обновлена подписка существующего пользователя', telegram_id=telegram_id)
+
+                        if applied_in_full and db_user.id is not None:
+                            page_fingerprints[db_user.id] = fingerprint
+
+                elif sync_type in ['update_only', 'all']:
+                    # Запись в панели не менялась с прошлого прохода, а подписку
+                    # в боте с тех пор никто не трогал — сверять нечего.
+                    if panel_sync_fingerprints.matches(db_user.id, fingerprint) and _normalize_panel_user_id(
+                        db_user.remnawave_id
+                    ) == _normalize_panel_user_id(panel_user.get('id')):
+                        stats['unchanged'] += 1
+                        panel_sync_fingerprints.skipped += 1
+                        continue
 
-            # Создадим словарь для быстрого доступа к подпискам
-            {sub.user_id: sub for sub in existing_subscriptions}
+                    logger.debug('🔄 Обновление пользователя', telegram_id=telegram_id)
 
-            # Для оптимизации коммитим изменения каждые N пользователей
-            batch_size = 50
-            pending_panel_id_mutations: list[_PanelIdMapMutation] = []
+                    # Refresh expired ORM-объекты перед sync-доступом.
+                    # После SAVEPOINT rollback или других операций атрибуты
+                    # могут быть expired, что вызывает MissingGreenlet в sync-коде.
+                    from sqlalchemy import inspect as sa_inspect
 
-            for i, panel_user in enumerate(unique_panel_users):
-                panel_id_mutation: _PanelIdMapMutation | None = None
-                try:
-                    telegram_id = panel_user.get('telegramId')
-                    if not telegram_id:
-                        continue
+                    user_state = sa_inspect(db_user)
+                    if user_state.expired_attributes:
+                        await db.refresh(db_user)
 
-                    if (i + 1) % 10 == 0:
-                        logger.info(
-                            '🔄 Обрабатываем пользователя',
-                            i=i + 1,
-                            unique_panel_users_count=len(unique_panel_users),
-                            telegram_id=telegram_id,
-                        )
+                    # Обновляем панельный id ДО операций с подпиской
+                    _, panel_id_mutation = self._ensure_user_remnawave_id(
+                        db_user,
+                        panel_user.get('id'),
+                        bot_users_by_panel_id,
+                    )
 
-                    db_user = bot_users_by_telegram_id.get(telegram_id)
+                    # Используем async запрос вместо доступа к relationship,
+                    # чтобы избежать lazy-load в async контексте
+                    from app.database.crud.subscription import get_subscription_by_user_id as _get_sub
 
-                    if not db_user:
-                        if sync_type in ['new_only', 'all']:
-                            logger.info('🆕 Создание пользователя для telegram_id', telegram_id=telegram_id)
+                    existing_sub = await _get_sub(db, db_user.id)
+                    if existing_sub:
+                        applied_in_full = await self._update_subscription_from_panel_data(
+                            db,
+                            db_user,
+                            panel_user,
+                            open_grace_ids=open_grace_ids,
+                        )
+                    else:
+                        await self._create_subscription_from_panel_data(db, db_user, panel_user)
+                        applied_in_full = True
 
-                            db_user, is_created = await self._get_or_create_bot_user_from_panel(db, panel_user)
+                    stats['updated'] += 1
+                    if applied_in_full:
+                        page_fingerprints[db_user.id] = fingerprint
+                    logger.debug('✅ Обновлён пользователь', telegram_id=telegram_id)
 
-                            if not db_user:
-                                logger.error(
-                                    '❌ Не удалось создать или получить пользователя для telegram_id',
-                                    telegram_id=telegram_id,
-                                )
-                                stats['errors'] += 1
-                                continue
+            except Exception as user_error:
+                logger.error(
+                    '❌ Ошибка обработки пользователя',
+                    telegram_id=telegram_id,
+                    user_error=user_error,
+                    exc_info=True,
+                )
+                stats['errors'] += 1
+                if panel_id_mutation:
+                    panel_id_mutation.rollback()
+                for mutation in reversed(pending_panel_id_mutations):
+                    mutation.rollback()
+                pending_panel_id_mutations.clear()
+                try:
+                    await db.rollback()  # Выполняем rollback при ошибке
+                except Exception:
+                    pass
+                # After rollback all ORM objects in the session are expired.
+                # Accessing their attributes triggers a lazy load which fails
+                # in async context (greenlet_spawn error).  Stop the run to
+                # prevent cascading failures for every remaining user.
+                logger.warning(
+                    '⚠️ Сессия повреждена после rollback, прерываем обработку',
+                    i=i + 1,
+                    unique_panel_users_count=len(unique_panel_users),
+                )
+                return False
 
-                            bot_users_by_telegram_id[telegram_id] = db_user
+            else:
+                if panel_id_mutation and panel_id_mutation.has_changes():
+                    pending_panel_id_mutations.append(panel_id_mutation)
 
-                            # При синхронизации не обновляем имя и username пользователя
-                            # только сохраняем изменения, если были обновлены другие поля (подписка и т.д.)
-                            updated_fields = []
-                            # Если были обновлены другие поля (подписка, статус и т.д.), сохраняем изменения
-                            if updated_fields:
-                                logger.info(
-                                    '🔄 Обновлены поля для пользователя',
-                                    updated_fields=updated_fields,
-                                    telegram_id=telegram_id,
-                                )
-                                await db.flush()  # Сохраняем изменения без коммита
+        # Один коммит на страницу
+        try:
+            await db.commit()
+        except Exception as commit_error:
+            logger.error('❌ Ошибка коммита страницы синхронизации', commit_error=commit_error)
+            await db.rollback()
+            for mutation in reversed(pending_panel_id_mutations):
+                mutation.rollback()
+            stats['errors'] += len(unique_panel_users)
+            return False
 
-                            _, panel_id_mutation = self._ensure_user_remnawave_id(
-                                db_user,
-                                panel_user.get('id'),
-                                bot_users_by_panel_id,
-                            )
+        # Отпечатки запоминаем только после коммита: коммит сам сбрасывает
+        # отпечатки изменённых пользователей, и иначе они бы тут же стёрлись.
+        panel_sync_fingerprints.remember(page_fingerprints)
 
-                            if is_created:
-                                await self._create_subscription_from_panel_data(db, db_user, panel_user)
-                                stats['created'] += 1
-                                logger.info('✅ Создан пользователь с подпиской', telegram_id=telegram_id)
-                            else:
-                                # Обновляем данные существующего пользователя
-                                # Но теперь мы уже загрузили подписку с пользователем, нет необходимости перезагружать
-                                await self._update_subscription_from_panel_data(
-                                    db,
-                                    db_user,
-                                    panel_user,
-                                    open_grace_ids=open_grace_ids,
-                                )
-                                stats['updated'] += 1
-                                logger.info('♻️ Обновлена подписка существующего пользователя', telegram_id=telegram_id)
+        # Обработка email-only пользователей из панели
+        if panel_users_email_only and sync_type in ['new_only', 'all']:
+            logger.info(
+                '📧 Обработка email-only пользователей из панели...',
+                panel_users_email_only_count=len(panel_users_email_only),
+            )
 
-                    elif sync_type in ['update_only', 'all']:
-                        logger.debug('🔄 Обновление пользователя', telegram_id=telegram_id)
+            for panel_user in panel_users_email_only:
+                try:
+                    panel_email = panel_user.get('email', '').lower()
+                    panel_user_id = _normalize_panel_user_id(panel_user.get('id'))
 
-                        # Refresh expired ORM-объекты перед sync-доступом.
-                        # После SAVEPOINT rollback или других операций атрибуты
-                        # могут быть expired, что вызывает MissingGreenlet в sync-коде.
-                        from sqlalchemy import inspect as sa_inspect
+                    if not panel_email:
+                        continue
 
-                        user_state = sa_inspect(db_user)
-                        if user_state.expired_attributes:
-                            await db.refresh(db_user)
+                    # Ищем пользователя по email в боте
+                    db_user = bot_users_by_email.get(panel_email)
 
-                        # Обновляем панельный id ДО операций с подпиской
-                        _, panel_id_mutation = self._ensure_user_remnawave_id(
-                            db_user,
-                            panel_user.get('id'),
-                            bot_users_by_panel_id,
-                        )
+                    # Если не нашли по email, ищем по панельному id
+                    if not db_user and panel_user_id is not None:
+                        db_user = bot_users_by_panel_id.get(panel_user_id)
 
-                        # Используем async запрос вместо доступа к relationship,
-                        # чтобы избежать lazy-load в async контексте
-                        if settings.is_multi_tariff_enabled():
-                            from app.database.crud.subscription import get_active_subscriptions_by_user_id as _get_subs
-
-                            _subs = await _get_subs(db, db_user.id)
-                            # Match by remnawave_id from panel. Пустая идентичность
-                            # никогда не матчится: иначе непровиженный черновик
-                            # (remnawave_id IS NULL) поймал бы панельного юзера
-                            # без id и получил бы его состояние.
-                            _panel_id = _normalize_panel_user_id(panel_user.get('id'))
-                            existing_sub = (
-                                next(
-                                    (s for s in _subs if _normalize_panel_user_id(s.remnawave_id) == _panel_id),
-                                    None,
-                                )
-                                if _panel_id is not None
-                                else None
-                            )
-                            if not existing_sub and _subs:
-                                # No panel-id match — fall back to best non-daily subscription
-                                _non_daily = [s for s in _subs if not getattr(s, 'is_daily_tariff', False)]
-                                _pool = _non_daily or _subs
-                                existing_sub = max(_pool, key=lambda s: s.days_left)
-                        else:
-                            from app.database.crud.subscription import get_subscription_by_user_id as _get_sub
+                    if db_user:
+                        # Обновляем remnawave_id если нет
+                        if panel_user_id is not None and not db_user.remnawave_id:
+                            db_user.remnawave_id = panel_user_id
 
-                            existing_sub = await _get_sub(db, db_user.id)
+                        # Используем async запрос вместо доступа к relationship
+                        from app.database.crud.subscription import get_subscription_by_user_id as _get_sub_email
+
+                        existing_sub = await _get_sub_email(db, db_user.id)
                         if existing_sub:
                             await self._update_subscription_from_panel_data(
                                 db,
@@ -1636,361 +1780,203 @@ class RemnaWaveService:
                             await self._create_subscription_from_panel_data(db, db_user, panel_user)
 
                         stats['updated'] += 1
-                        logger.debug('✅ Обновлён пользователь', telegram_id=telegram_id)
+                        logger.info('📧 Обновлен email-пользователь', panel_email=panel_email)
+                    else:
+                        # Email-only пользователи не создаются автоматически при синхронизации,
+                        # они должны сначала зарегистрироваться через cabinet
+                        logger.debug('📧 Email-пользователь не найден в боте, пропускаем', panel_email=panel_email)
 
-                except Exception as user_error:
-                    logger.error(
-                        '❌ Ошибка обработки пользователя',
-                        telegram_id=telegram_id,
-                        user_error=user_error,
-                        exc_info=True,
-                    )
+                except Exception as email_user_error:
+                    logger.error('❌ Ошибка обработки email-пользователя', email_user_error=email_user_error)
                     stats['errors'] += 1
-                    if panel_id_mutation:
-                        panel_id_mutation.rollback()
-                    if pending_panel_id_mutations:
-                        for mutation in reversed(pending_panel_id_mutations):
-                            mutation.rollback()
-                        pending_panel_id_mutations.clear()
-                    try:
-                        await db.rollback()  # Выполняем rollback при ошибке
-                    except Exception:
-                        pass
-                    # After rollback all ORM objects in the session are expired.
-                    # Accessing their attributes triggers a lazy load which fails
-                    # in async context (greenlet_spawn error).  Break the loop to
-                    # prevent cascading failures for every remaining user.
-                    logger.warning(
-                        '⚠️ Сессия повреждена после rollback, прерываем обработку',
-                        i=i + 1,
-                        unique_panel_users_count=len(unique_panel_users),
-                    )
-                    break
-
-                else:
-                    if panel_id_mutation and panel_id_mutation.has_changes():
-                        pending_panel_id_mutations.append(panel_id_mutation)
 
-                # Коммитим изменения каждые N пользователей для ускорения
-                if (i + 1) % batch_size == 0:
-                    try:
-                        await db.commit()
-                        logger.debug('📦 Коммит изменений после обработки пользователей', i=i + 1)
-                        pending_panel_id_mutations.clear()
-                    except Exception as commit_error:
-                        logger.error(
-                            '❌ Ошибка коммита после обработки пользователей', i=i + 1, commit_error=commit_error
-                        )
-                        await db.rollback()
-                        for mutation in reversed(pending_panel_id_mutations):
-                            mutation.rollback()
-                        pending_panel_id_mutations.clear()
-                        stats['errors'] += batch_size  # Учитываем ошибки за всю группу
-
-            # Коммитим оставшиеся изменения
             try:
                 await db.commit()
-                pending_panel_id_mutations.clear()
-            except Exception as final_commit_error:
-                logger.error('❌ Ошибка финального коммита', final_commit_error=final_commit_error)
+            except Exception as email_commit_error:
+                logger.error('❌ Ошибка коммита email-пользователей', email_commit_error=email_commit_error)
                 await db.rollback()
-                for mutation in reversed(pending_panel_id_mutations):
-                    mutation.rollback()
-                pending_panel_id_mutations.clear()
-
-            # Обработка email-only пользователей из панели
-            if panel_users_email_only and sync_type in ['new_only', 'all']:
-                logger.info(
-                    '📧 Обработка email-only пользователей из панели...',
-                    panel_users_email_only_count=len(panel_users_email_only),
-                )
-
-                for panel_user in panel_users_email_only:
-                    try:
-                        panel_email = panel_user.get('email', '').lower()
-                        panel_user_id = _normalize_panel_user_id(panel_user.get('id'))
 
-                        if not panel_email:
-                            continue
+        return True
 
-                        # Ищем пользователя по email в боте
-                        db_user = bot_users_by_email.get(panel_email)
+    async def _deactivate_users_missing_in_panel(
+        self,
+        db: AsyncSession,
+        panel_telegram_ids: set[int],
+        stats: dict[str, int],
+    ) -> None:
+        """Отключает подписки пользователей бота, которых нет в панели.
 
-                        # Если не нашли по email, ищем по панельному id
-                        if not db_user and panel_user_id is not None:
-                            db_user = bot_users_by_panel_id.get(panel_user_id)
+        Пользователи бота читаются страницами по id, а не все сразу.
+        """
+        logger.info('🗑️ Деактивация подписок пользователей, отсутствующих в панели...')
 
-                        if db_user:
-                            # Обновляем существующего пользователя
-                            # Обновляем remnawave_id если нет
-                            if panel_user_id is not None and not db_user.remnawave_id:
-                                db_user.remnawave_id = panel_user_id
+        from app.database.crud.subscription import is_recently_updated_by_webhook
 
-                            # Используем async запрос вместо доступа к relationship
-                            if settings.is_multi_tariff_enabled():
-                                from app.database.crud.subscription import (
-                                    get_active_subscriptions_by_user_id as _get_subs_email,
-                                )
+        batch_size = 50
+        page_size = max(1, int(settings.REMNAWAVE_SYNC_PAGE_SIZE))
+        processed_count = 0
+        found_count = 0
+        cleanup_panel_id_mutations: list[_PanelIdMapMutation] = []
+        last_user_id = 0
 
-                                _subs_e = await _get_subs_email(db, db_user.id)
-                                # Пустая идентичность не матчится — см. основной цикл.
-                                existing_sub = (
-                                    next(
-                                        (
-                                            s
-                                            for s in _subs_e
-                                            if _normalize_panel_user_id(s.remnawave_id) == panel_user_id
-                                        ),
-                                        None,
-                                    )
-                                    if panel_user_id is not None
-                                    else None
-                                )
-                                if not existing_sub and _subs_e:
-                                    # No panel-id match — fall back to best non-daily subscription
-                                    _non_daily_e = [s for s in _subs_e if not getattr(s, 'is_daily_tariff', False)]
-                                    _pool_e = _non_daily_e or _subs_e
-                                    existing_sub = max(_pool_e, key=lambda s: s.days_left)
-                            else:
-                                from app.database.crud.subscription import get_subscription_by_user_id as _get_sub_email
-
-                                existing_sub = await _get_sub_email(db, db_user.id)
-                            if existing_sub:
-                                await self._update_subscription_from_panel_data(
-                                    db,
-                                    db_user,
-                                    panel_user,
-                                    open_grace_ids=open_grace_ids,
-                                )
-                            else:
-                                await self._create_subscription_from_panel_data(db, db_user, panel_user)
-
-                            stats['updated'] += 1
-                            logger.info('📧 Обновлен email-пользователь', panel_email=panel_email)
-                        else:
-                            # Email-only пользователи не создаются автоматически при синхронизации,
-                            # они должны сначала зарегистрироваться через cabinet
-                            logger.debug('📧 Email-пользователь не найден в боте, пропускаем', panel_email=panel_email)
+        while True:
+            result = await db.execute(
+                select(User)
+                .options(selectinload(User.subscriptions))
+                # BUG-6 fix: Skip users who have a remnawave_id — they exist in panel
+                # but may not have telegram_id set there (OAuth users who linked TG later)
+                .where(User.telegram_id.isnot(None), User.remnawave_id.is_(None), User.id > last_user_id)
+                .order_by(User.id)
+                .limit(page_size)
+            )
+            candidates = list(result.scalars().all())
+            if not candidates:
+                break
+            last_user_id = candidates[-1].id
 
-                    except Exception as email_user_error:
-                        logger.error('❌ Ошибка обработки email-пользователя', email_user_error=email_user_error)
-                        stats['errors'] += 1
+            users_to_deactivate = [
+                (db_user.telegram_id, db_user)
+                for db_user in candidates
+                if db_user.telegram_id not in panel_telegram_ids and (getattr(db_user, 'subscriptions', None) or [])
+            ]
+            found_count += len(users_to_deactivate)
 
+            for telegram_id, db_user in users_to_deactivate:
+                cleanup_mutation: _PanelIdMapMutation | None = None
                 try:
-                    await db.commit()
-                except Exception as email_commit_error:
-                    logger.error('❌ Ошибка коммита email-пользователей', email_commit_error=email_commit_error)
-                    await db.rollback()
+                    user_subscriptions = getattr(db_user, 'subscriptions', None) or []
 
-            if sync_type == 'all':
-                logger.info('🗑️ Деактивация подписок пользователей, отсутствующих в панели...')
-
-                batch_size = 50
-                processed_count = 0
-                cleanup_panel_id_mutations: list[_PanelIdMapMutation] = []
-
-                # Собираем список пользователей для деактивации
-                users_to_deactivate = [
-                    (telegram_id, db_user)
-                    for telegram_id, db_user in bot_users_by_telegram_id.items()
-                    if telegram_id not in panel_telegram_ids
-                    and any(True for _ in (getattr(db_user, 'subscriptions', None) or []))
-                    # BUG-6 fix: Skip users who have a remnawave_id — they exist in panel
-                    # but may not have telegram_id set there (OAuth users who linked TG later)
-                    and not getattr(db_user, 'remnawave_id', None)
-                ]
-
-                if users_to_deactivate:
-                    logger.info(
-                        '📊 Найдено пользователей для деактивации', users_to_deactivate_count=len(users_to_deactivate)
+                    # Skip if all subscriptions were recently updated by webhook
+                    all_recently_updated = all(
+                        is_recently_updated_by_webhook(subscription) for subscription in user_subscriptions
                     )
+                    if user_subscriptions and all_recently_updated:
+                        logger.debug(
+                            'Пропуск деактивации подписок: все обновлены вебхуком недавно',
+                            telegram_id=telegram_id,
+                        )
+                        continue
 
-                # Используем один API клиент для всех операций сброса HWID
-                hwid_api_cm = None
-                try:
-                    hwid_api_cm = self.get_api_client()
-                    await hwid_api_cm.__aenter__()
-                except Exception as api_init_error:
-                    logger.warning('⚠️ Не удалось создать API клиент для сброса HWID', api_init_error=api_init_error)
-                    hwid_api_cm = None
-
-                try:
-                    for telegram_id, db_user in users_to_deactivate:
-                        cleanup_mutation: _PanelIdMapMutation | None = None
-                        try:
-                            user_subscriptions = getattr(db_user, 'subscriptions', None) or []
+                    logger.info('🗑️ Деактивация подписок пользователя (нет в панели)', telegram_id=telegram_id)
 
-                            # Skip if all subscriptions were recently updated by webhook
-                            from app.database.crud.subscription import is_recently_updated_by_webhook
+                    # NOTE: Не сбрасываем HWID здесь — пользователь уже удалён из панели,
+                    # API вернёт 404, панельный id очищается ниже (cleanup_mutation)
 
-                            all_recently_updated = all(
-                                is_recently_updated_by_webhook(subscription) for subscription in user_subscriptions
+                    for subscription in user_subscriptions:
+                        if is_recently_updated_by_webhook(subscription):
+                            logger.debug(
+                                'Пропуск деактивации подписки: обновлена вебхуком недавно',
+                                subscription_id=subscription.id,
                             )
-                            if user_subscriptions and all_recently_updated:
-                                logger.debug(
-                                    'Пропуск деактивации подписок: все обновлены вебхуком недавно',
-                                    telegram_id=telegram_id,
-                                )
-                                continue
-
-                            logger.info('🗑️ Деактивация подписок пользователя (нет в панели)', telegram_id=telegram_id)
-
-                            # NOTE: Не сбрасываем HWID здесь — пользователь уже удалён из панели,
-                            # API вернёт 404, панельный id очищается ниже (cleanup_mutation)
+                            continue
 
-                            for subscription in user_subscriptions:
-                                if is_recently_updated_by_webhook(subscription):
-                                    logger.debug(
-                                        'Пропуск деактивации подписки: обновлена вебхуком недавно',
-                                        subscription_id=subscription.id,
-                                    )
-                                    continue
+                        try:
+                            await decrement_subscription_server_counts(db, subscription)
 
-                                try:
-                                    from sqlalchemy import delete
+                            await db.execute(
+                                delete(SubscriptionServer).where(SubscriptionServer.subscription_id == subscription.id)
+                            )
+                            logger.info(
+                                '🗑️ Удалены серверы подписки',
+                                telegram_id=telegram_id,
+                                subscription_id=subscription.id,
+                            )
+                        except Exception as servers_error:
+                            logger.warning(
+                                '⚠️ Не удалось удалить серверы подписки',
+                                servers_error=servers_error,
+                                subscription_id=subscription.id,
+                            )
 
-                                    from app.database.models import SubscriptionServer
+                        # Проверяем, была ли это платная подписка
+                        was_paid = not subscription.is_trial or getattr(db_user, 'has_had_paid_subscription', False)
 
-                                    await decrement_subscription_server_counts(db, subscription)
+                        subscription.status = SubscriptionStatus.DISABLED.value
 
-                                    await db.execute(
-                                        delete(SubscriptionServer).where(
-                                            SubscriptionServer.subscription_id == subscription.id
-                                        )
-                                    )
-                                    logger.info(
-                                        '🗑️ Удалены серверы подписки',
-                                        telegram_id=telegram_id,
-                                        subscription_id=subscription.id,
-                                    )
-                                except Exception as servers_error:
-                                    logger.warning(
-                                        '⚠️ Не удалось удалить серверы подписки',
-                                        servers_error=servers_error,
-                                        subscription_id=subscription.id,
-                                    )
+                        if was_paid:
+                            # Для платных подписок - НЕ сбрасываем is_trial и end_date!
+                            # Сохраняем оригинальные значения чтобы можно было восстановить
+                            logger.warning(
+                                '⚠️ ПЛАТНАЯ подписка пользователя отключена (нет в панели), но is_trial= и end_date= СОХРАНЕНЫ',
+                                telegram_id=telegram_id,
+                                subscription_id=subscription.id,
+                                is_trial=subscription.is_trial,
+                                end_date=subscription.end_date,
+                            )
+                        else:
+                            # Для триальных подписок - сбрасываем как раньше
+                            subscription.is_trial = True
+                            subscription.end_date = datetime.now(UTC)
+                            subscription.traffic_limit_gb = 0
+                            subscription.traffic_used_gb = 0.0
+                            subscription.device_limit = 1
 
-                                from app.database.models import SubscriptionStatus
+                        subscription.connected_squads = []
+                        subscription.autopay_enabled = False
+                        subscription.remnawave_short_uuid = None
+                        subscription.subscription_url = ''
+                        subscription.subscription_crypto_link = ''
 
-                                # Проверяем, была ли это платная подписка
-                                was_paid = not subscription.is_trial or getattr(
-                                    db_user, 'has_had_paid_subscription', False
-                                )
+                    cleanup_mutation = _PanelIdMapMutation({})
+                    cleanup_mutation.set_user_panel_id(db_user, None)
+                    cleanup_mutation.set_user_updated_at(db_user, datetime.now(UTC))
 
-                                subscription.status = SubscriptionStatus.DISABLED.value
-
-                                if was_paid:
-                                    # Для платных подписок - НЕ сбрасываем is_trial и end_date!
-                                    # Сохраняем оригинальные значения чтобы можно было восстановить
-                                    logger.warning(
-                                        '⚠️ ПЛАТНАЯ подписка пользователя отключена (нет в панели), но is_trial= и end_date= СОХРАНЕНЫ',
-                                        telegram_id=telegram_id,
-                                        subscription_id=subscription.id,
-                                        is_trial=subscription.is_trial,
-                                        end_date=subscription.end_date,
-                                    )
-                                else:
-                                    # Для триальных подписок - сбрасываем как раньше
-                                    subscription.is_trial = True
-                                    subscription.end_date = datetime.now(UTC)
-                                    subscription.traffic_limit_gb = 0
-                                    subscription.traffic_used_gb = 0.0
-                                    subscription.device_limit = 1
-
-                                subscription.connected_squads = []
-                                subscription.autopay_enabled = False
-                                subscription.remnawave_short_uuid = None
-                                subscription.subscription_url = ''
-                                subscription.subscription_crypto_link = ''
-
-                            old_panel_id = _normalize_panel_user_id(getattr(db_user, 'remnawave_id', None))
-                            cleanup_mutation = _PanelIdMapMutation(bot_users_by_panel_id)
-                            if old_panel_id is not None:
-                                cleanup_mutation.remove_map_entry(old_panel_id)
-                            cleanup_mutation.set_user_panel_id(db_user, None)
-                            cleanup_mutation.set_user_updated_at(db_user, datetime.now(UTC))
-
-                            stats['deleted'] += 1
-                            logger.info(
-                                '✅ Деактивированы подписки пользователя (сохранен баланс)', telegram_id=telegram_id
-                            )
+                    stats['deleted'] += 1
+                    logger.info('✅ Деактивированы подписки пользователя (сохранен баланс)', telegram_id=telegram_id)
 
-                            processed_count += 1
+                    processed_count += 1
 
-                        except Exception as delete_error:
-                            logger.error(
-                                '❌ Ошибка деактивации подписки', telegram_id=telegram_id, delete_error=delete_error
-                            )
-                            stats['errors'] += 1
-                            if cleanup_mutation:
-                                cleanup_mutation.rollback()
-                            if cleanup_panel_id_mutations:
-                                for mutation in reversed(cleanup_panel_id_mutations):
-                                    mutation.rollback()
-                                cleanup_panel_id_mutations.clear()
-                            try:
-                                await db.rollback()
-                            except:
-                                pass
-                        else:
-                            if cleanup_mutation and cleanup_mutation.has_changes():
-                                cleanup_panel_id_mutations.append(cleanup_mutation)
-
-                            # Коммитим изменения каждые N пользователей
-                            if processed_count % batch_size == 0:
-                                try:
-                                    await db.commit()
-                                    logger.debug(
-                                        '📦 Коммит изменений после деактивации подписок',
-                                        processed_count=processed_count,
-                                    )
-                                    cleanup_panel_id_mutations.clear()
-                                except Exception as commit_error:
-                                    logger.error(
-                                        '❌ Ошибка коммита после деактивации подписок',
-                                        processed_count=processed_count,
-                                        commit_error=commit_error,
-                                    )
-                                    await db.rollback()
-                                    for mutation in reversed(cleanup_panel_id_mutations):
-                                        mutation.rollback()
-                                    cleanup_panel_id_mutations.clear()
-                                    stats['errors'] += batch_size
-                                    break  # Прерываем цикл при ошибке коммита
-
-                    # Коммитим оставшиеся изменения
+                except Exception as delete_error:
+                    logger.error('❌ Ошибка деактивации подписки', telegram_id=telegram_id, delete_error=delete_error)
+                    stats['errors'] += 1
+                    if cleanup_mutation:
+                        cleanup_mutation.rollback()
+                    for mutation in reversed(cleanup_panel_id_mutations):
+                        mutation.rollback()
+                    cleanup_panel_id_mutations.clear()
                     try:
-                        await db.commit()
-                        cleanup_panel_id_mutations.clear()
-                    except Exception as final_commit_error:
-                        logger.error(
-                            '❌ Ошибка финального коммита при деактивации', final_commit_error=final_commit_error
-                        )
                         await db.rollback()
-                        for mutation in reversed(cleanup_panel_id_mutations):
-                            mutation.rollback()
-                        cleanup_panel_id_mutations.clear()
+                    except Exception:
+                        pass
+                else:
+                    if cleanup_mutation and cleanup_mutation.has_changes():
+                        cleanup_panel_id_mutations.append(cleanup_mutation)
 
-                finally:
-                    # Закрываем API клиент
-                    if hwid_api_cm:
+                    # Коммитим изменения каждые N пользователей
+                    if processed_count % batch_size == 0:
                         try:
-                            await hwid_api_cm.__aexit__(None, None, None)
-                        except Exception:
-                            pass
+                            await db.commit()
+                            logger.debug(
+                                '📦 Коммит изменений после деактивации подписок',
+                                processed_count=processed_count,
+                            )
+                            cleanup_panel_id_mutations.clear()
+                        except Exception as commit_error:
+                            logger.error(
+                                '❌ Ошибка коммита после деактивации подписок',
+                                processed_count=processed_count,
+                                commit_error=commit_error,
+                            )
+                            await db.rollback()
+                            for mutation in reversed(cleanup_panel_id_mutations):
+                                mutation.rollback()
+                            cleanup_panel_id_mutations.clear()
+                            stats['errors'] += batch_size
+                            return  # Прерываем деактивацию при ошибке коммита
 
-            logger.info(
-                '🎯 Синхронизация завершена',
-                stats=stats['created'],
-                stats_2=stats['updated'],
-                stats_3=stats['deleted'],
-                stats_4=stats['errors'],
-            )
-            return stats
+        if found_count:
+            logger.info('📊 Найдено пользователей для деактивации', users_to_deactivate_count=found_count)
 
-        except Exception as e:
-            logger.error('❌ Критическая ошибка синхронизации пользователей', error=e)
-            return {'created': 0, 'updated': 0, 'errors': 1, 'deleted': 0}
+        # Коммитим оставшиеся изменения
+        try:
+            await db.commit()
+            cleanup_panel_id_mutations.clear()
+        except Exception as final_commit_error:
+            logger.error('❌ Ошибка финального коммита при деактивации', final_commit_error=final_commit_error)
+            await db.rollback()
+            for mutation in reversed(cleanup_panel_id_mutations):
+                mutation.rollback()
+            cleanup_panel_id_mutations.clear()
 
     async def _sync_users_from_panel_multi(self, db: AsyncSession, sync_type: str) -> dict[str, int]:
         """Multi-tariff sync: match panel users to subscriptions by remnawave_id."""
@@ -2417,7 +2403,14 @@ class RemnaWaveService:
         panel_user,
         *,
         open_grace_ids: set[int] | None = None,
-    ):
+    ) -> bool:
+        """Переносит состояние пользователя панели в подписку бота.
+
+        Возвращает True, только если состояние панели применено целиком: при
+        свежем вебхуке, открытом grace или отложенной деактивации часть полей
+        пропущена, и отпечаток панели запоминать нельзя — иначе пропущенное
+        не сверится, пока запись в панели не изменится.
+        """
         try:
             from app.database.crud.subscription import get_subscription_by_user_id, is_recently_updated_by_webhook
             from app.database.models import SubscriptionStatus
@@ -2445,7 +2438,7 @@ class RemnaWaveService:
 
             if not subscription:
                 await self._create_subscription_from_panel_data(db, user, panel_user)
-                return
+                return True
 
             if open_grace_ids is None:
                 from app.services.grace_access_runtime import get_open_grace_subscription_ids
@@ -2463,8 +2456,9 @@ class RemnaWaveService:
                 logger.debug(
                     'Пропуск синхронизации подписки : обновлена вебхуком недавно', subscription_id=subscription.id
                 )
-                return
+                return False
 
+            applied_in_full = not grace_open
             panel_status = panel_user.get('status', 'ACTIVE')
             expire_at_str = panel_user.get('expireAt', '')
 
@@ -2536,6 +2530,7 @@ class RemnaWaveService:
                         current_time=current_time,
                     )
                     new_status = subscription.status  # Сохраняем текущий статус
+                    applied_in_full = False
                 else:
                     new_status = SubscriptionStatus.EXPIRED.value
             else:
@@ -2607,6 +2602,7 @@ class RemnaWaveService:
 
             # Коммитим изменения позже, в основном цикле, чтобы уменьшить количество транзакций
             logger.debug('✅ Обновлена подписка для пользователя', telegram_id=user.telegram_id)
+            return applied_in_full
 
         except Exception as e:
             logger.error('❌ Ошибка обновления подписки для пользователя', telegram_id=user.telegram_id, error=e)
@@ -3299,7 +3295,9 @@ class RemnaWaveService:
             try:
                 from sqlalchemy import delete
 
+                from app.database.crud.payment_index import delete_payment_index_entries
                 from app.database.models import (
+                    PaymentMethod,
                     ReferralEarning,
                     SubscriptionServer,
                     SubscriptionStatus,
@@ -3314,6 +3312,8 @@ class RemnaWaveService:
                     logger.info('🗑️ Удалены серверы подписок пользователя', user_id_display=user_id_display)
 
                 await db.execute(delete(Transaction).where(Transaction.user_id == user.id))
+                await refresh_user_spending(db, [user.id])
+                await delete_payment_index_entries(db, user.id, PaymentMethod.TELEGRAM_STARS)
                 logger.info('🗑️ Удалены транзакции пользователя', user_id_display=user_id_display)
 
                 await db.execute(delete(ReferralEarning).where(ReferralEarning.user_id == user.id))
@@ -8,6 +8,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -29,7 +30,6 @@ class RioPayService:
 
     def __init__(self):
         self._api_token: str | None = None
-        self._session: aiohttp.ClientSession | None = None
 
     @property
     def api_token(self) -> str:
@@ -50,18 +50,8 @@ class RioPayService:
         }
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Возвращает переиспользуемую HTTP-сессию."""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-            )
-        return self._session
-
-    async def close(self) -> None:
-        """Закрывает HTTP-сессию."""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        """Возвращает общую HTTP-сессию провайдера из транспорта; закрывать её не нужно."""
+        return http_transport.session('riopay')
 
     async def create_order(
         self,
@@ -9,6 +9,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -28,9 +29,6 @@ class RollyPayAPIError(Exception):
 class RollyPayService:
     """Сервис для работы с API RollyPay."""
 
-    def __init__(self):
-        self._session: aiohttp.ClientSession | None = None
-
     @property
     def api_key(self) -> str:
         return settings.ROLLYPAY_API_KEY or ''
@@ -40,18 +38,8 @@ class RollyPayService:
         return settings.ROLLYPAY_SIGNING_SECRET or ''
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Возвращает переиспользуемую HTTP-сессию."""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-            )
-        return self._session
-
-    async def close(self) -> None:
-        """Закрывает HTTP-сессию."""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        """Возвращает общую HTTP-сессию провайдера из транспорта; закрывать её не нужно."""
+        return http_transport.session('rollypay')
 
     def _build_headers(self) -> dict[str, str]:
         """Строит заголовки запроса с X-API-Key и X-Nonce."""
@@ -0,0 +1,265 @@
+"""Поддержка дневных агрегатов статистики (``daily_*_rollups``).
+
+Админ-дашборд на каждую загрузку пересчитывал суммы транзакций за месяц и за
+всё время, график выручки и покупки по таблице ``transactions``. Теперь эти
+цифры читаются из дневных агрегатов, а сервис держит их в актуальном
+состоянии:
+
+* коммит, который вставил/изменил/удалил транзакцию, подписку, конверсию или
+  создал пользователя, помечает затронутые дни (события ORM-сессии);
+* фоновый цикл раз в STATS_ROLLUP_FLUSH_INTERVAL_SECONDS пересчитывает
+  помеченные дни целиком;
+* раз в сутки в STATS_ROLLUP_RECONCILE_HOUR (UTC) сверщик пересчитывает
+  последние STATS_ROLLUP_RECONCILE_DAYS дней — это ловит записи в обход ORM и
+  из других процессов;
+* при первом запуске (пустые агрегаты) и после восстановления бекапа вся
+  история пересчитывается заново.
+
+Пока агрегаты не построены, ``is_ready()`` возвращает False и читатели
+считают статистику по исходным таблицам, как раньше.
+"""
+
+import asyncio
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+import structlog
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.crud.stats_rollup import get_first_activity_day, has_rollups, recompute_rollups
+from app.database.database import AsyncSessionLocal
+
+
+logger = structlog.get_logger(__name__)
+
+_SESSION_INFO_KEY = 'stats_rollup_dirty_days'
+# Полный пересчёт идёт окнами, чтобы не держать одну огромную транзакцию
+_REBUILD_WINDOW_DAYS = 90
+
+
+class StatsRollupService:
+    def __init__(self) -> None:
+        self._dirty_days: set[date] = set()
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self._ready = False
+        self._rebuild_requested = False
+        self._last_reconcile_day: date | None = None
+        self._lock = asyncio.Lock()
+        self.recomputed_days = 0
+        self.failures = 0
+
+    def is_running(self) -> bool:
+        return self._running and self._task is not None and not self._task.done()
+
+    def is_ready(self) -> bool:
+        """Агрегаты построены и поддерживаются этим процессом."""
+        return bool(settings.STATS_ROLLUPS_ENABLED) and self._ready and self.is_running()
+
+    def mark_dirty(self, days: set[date]) -> None:
+        if self._running:
+            self._dirty_days.update(days)
+
+    def request_rebuild(self) -> None:
+        """Пересчитать всю историю (например, после восстановления бекапа)."""
+        self._ready = False
+        self._rebuild_requested = True
+
+    async def start(self) -> None:
+        if not settings.STATS_ROLLUPS_ENABLED:
+            logger.info('Дневные агрегаты статистики отключены настройками')
+            return
+        if self.is_running():
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._loop())
+        logger.info(
+            'Сервис дневных агрегатов статистики запущен',
+            flush_interval=settings.STATS_ROLLUP_FLUSH_INTERVAL_SECONDS,
+            reconcile_hour=settings.STATS_ROLLUP_RECONCILE_HOUR,
+        )
+
+    async def stop(self) -> None:
+        self._running = False
+        self._ready = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._dirty_days.clear()
+
+    async def _loop(self) -> None:
+        try:
+            await self._initialize()
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            self.failures += 1
+            logger.error('Ошибка построения дневных агрегатов статистики', error=error)
+
+        while self._running:
+            try:
+                await asyncio.sleep(max(1, int(settings.STATS_ROLLUP_FLUSH_INTERVAL_SECONDS)))
+                if self._rebuild_requested or not self._ready:
+                    await self.rebuild()
+                await self.flush_dirty_days()
+                await self._reconcile_if_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.failures += 1
+                logger.error('Ошибка обновления дневных агрегатов статистики', error=error)
+
+    async def _initialize(self) -> None:
+        async with AsyncSessionLocal() as db:
+            populated = await has_rollups(db)
+        if populated:
+            # Агрегаты уже есть: догоняем дни, пропущенные, пока бот был остановлен
+            await self.reconcile()
+            self._ready = True
+        else:
+            await self.rebuild()
+
+    async def rebuild(self) -> None:
+        """Пересчитывает агрегаты за всю историю."""
+        self._rebuild_requested = False
+        async with AsyncSessionLocal() as db:
+            first_day = await get_first_activity_day(db)
+        today = datetime.now(UTC).date()
+        if first_day is None:
+            self._ready = True
+            return
+
+        started = datetime.now(UTC)
+        window_start = first_day
+        while window_start <= today:
+            window_end = min(window_start + timedelta(days=_REBUILD_WINDOW_DAYS - 1), today)
+            await self._recompute(window_start, window_end)
+            window_start = window_end + timedelta(days=1)
+
+        self._ready = not self._rebuild_requested
+        logger.info(
+            '✅ Дневные агрегаты статистики пересчитаны',
+            first_day=first_day.isoformat(),
+            days=(today - first_day).days + 1,
+            seconds=round((datetime.now(UTC) - started).total_seconds(), 2),
+        )
+
+    async def reconcile(self) -> None:
+        today = datetime.now(UTC).date()
+        days = max(1, int(settings.STATS_ROLLUP_RECONCILE_DAYS))
+        await self._recompute(today - timedelta(days=days - 1), today)
+        self._last_reconcile_day = today
+        logger.info('🔁 Сверка дневных агрегатов статистики выполнена', days=days)
+
+    async def _reconcile_if_due(self) -> None:
+        now = datetime.now(UTC)
+        if self._last_reconcile_day == now.date() or now.hour < int(settings.STATS_ROLLUP_RECONCILE_HOUR):
+            return
+        await self.reconcile()
+
+    async def flush_dirty_days(self) -> int:
+        if not self._dirty_days:
+            return 0
+        days = sorted(self._dirty_days)
+        self._dirty_days.clear()
+        try:
+            for day in days:
+                await self._recompute(day, day)
+        except Exception:
+            self._dirty_days.update(days)
+            raise
+        return len(days)
+
+    async def _recompute(self, start_day: date, end_day: date) -> None:
+        async with self._lock, AsyncSessionLocal() as db:
+            try:
+                await recompute_rollups(db, start_day, end_day)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        self.recomputed_days += (end_day - start_day).days + 1
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            'running': self.is_running(),
+            'ready': self.is_ready(),
+            'pending_days': len(self._dirty_days),
+            'recomputed_days': self.recomputed_days,
+            'failures': self.failures,
+            'last_reconcile_day': self._last_reconcile_day.isoformat() if self._last_reconcile_day else None,
+        }
+
+
+stats_rollup_service = StatsRollupService()
+
+
+def _instance_days(instance: Any, attribute: str) -> set[date]:
+    """Дни, к которым относится запись: текущее и прежнее значение колонки.
+
+    Значение читается из ``__dict__``, без ленивой загрузки: в async-сессии
+    она невозможна. Незагруженное значение (``default=func.now()`` до
+    refresh) означает «сейчас».
+    """
+    days: set[date] = set()
+    values = [instance.__dict__.get(attribute)]
+    try:
+        values.extend(sa_inspect(instance).attrs[attribute].history.deleted or ())
+    except Exception:
+        pass
+    for value in values:
+        if isinstance(value, datetime):
+            days.add((value if value.tzinfo else value.replace(tzinfo=UTC)).astimezone(UTC).date())
+    if not days:
+        days.add(datetime.now(UTC).date())
+    return days
+
+
+def _collect_dirty_days(session: Session, flush_context: Any) -> None:
+    from app.database.models import Subscription, SubscriptionConversion, Transaction, User
+
+    days: set[date] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, (Transaction, Subscription)):
+            days |= _instance_days(instance, 'created_at')
+        elif isinstance(instance, SubscriptionConversion):
+            days |= _instance_days(instance, 'converted_at')
+    for instance in session.new:
+        if isinstance(instance, User):
+            days |= _instance_days(instance, 'created_at')
+    if days:
+        session.info.setdefault(_SESSION_INFO_KEY, set()).update(days)
+
+
+def _mark_after_commit(session: Session) -> None:
+    days = session.info.pop(_SESSION_INFO_KEY, None)
+    if days:
+        stats_rollup_service.mark_dirty(days)
+
+
+def _discard_after_rollback(session: Session, previous_transaction: Any) -> None:
+    if not getattr(previous_transaction, 'nested', False):
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+_registered = False
+
+
+def register_rollup_tracking() -> None:
+    """Подписывается на события ORM-сессии, чтобы коммиты помечали дни для пересчёта."""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_flush', _collect_dirty_days)
+    event.listen(Session, 'after_commit', _mark_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _registered = True
+
+
+register_rollup_tracking()
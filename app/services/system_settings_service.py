@@ -23,6 +23,7 @@ from app.database.crud.system_setting import (
 )
 from app.database.database import AsyncSessionLocal
 from app.database.models import SystemSetting
+from app.localization.texts import TEXTS_DEPENDENT_SETTINGS, invalidate_texts_cache
 from app.services.web_api_token_service import ensure_default_web_api_token
 
 
@@ -384,6 +385,9 @@ class BotConfigurationService:
         'NOTIFICATION_CACHE_HOURS': 'NOTIFICATIONS',
         'MONITORING_LOGS_RETENTION_DAYS': 'MONITORING',
         'MONITORING_INTERVAL': 'MONITORING',
+        'MONITORING_STAGE_TIMEOUT_SECONDS': 'MONITORING',
+        'MONITORING_STAGE_INTERVALS': 'MONITORING',
+        'MONITORING_STAGE_TIMEOUTS': 'MONITORING',
         'TRAFFIC_MONITORING_ENABLED': 'MONITORING',
         'TRAFFIC_MONITORING_INTERVAL_HOURS': 'MONITORING',
         'TRAFFIC_MONITORED_NODES': 'MONITORING',
@@ -845,12 +849,35 @@ class BotConfigurationService:
             'warning': 'Требует активных интеграций YooKassa, {mulenpay_name}, PayPalych, WATA или CryptoBot.',
         },
         'PAYMENT_VERIFICATION_AUTO_CHECK_INTERVAL_MINUTES': {
-            'description': ('Интервал между автоматическими проверками ожидающих пополнений в минутах.'),
+            'description': (
+                'Максимальный интервал повторной проверки ожидающего пополнения в минутах. '
+                'Свежие счета проверяются чаще — через десятую долю их возраста.'
+            ),
             'format': 'Целое число не меньше 1.',
             'example': '10',
             'warning': 'Слишком малый интервал может привести к частым обращениям к платёжным API.',
             'dependencies': 'PAYMENT_VERIFICATION_AUTO_CHECK_ENABLED',
         },
+        'PAYMENT_VERIFICATION_MIN_RECHECK_SECONDS': {
+            'description': 'Минимальный интервал повторной проверки только что выставленного счёта в секундах.',
+            'format': 'Целое число не меньше 5.',
+            'example': '30',
+            'warning': 'Малое значение увеличивает число запросов к API в первые минуты после оплаты.',
+            'dependencies': 'PAYMENT_VERIFICATION_AUTO_CHECK_ENABLED',
+        },
+        'PAYMENT_VERIFICATION_PROVIDER_CONCURRENCY': {
+            'description': 'Сколько проверок к одному провайдеру выполняется одновременно.',
+            'format': 'Целое число не меньше 1.',
+            'example': '4',
+            'dependencies': 'PAYMENT_VERIFICATION_AUTO_CHECK_ENABLED',
+        },
+        'PAYMENT_VERIFICATION_PROVIDER_RATE_LIMIT': {
+            'description': 'Не больше стольких запросов в секунду к API одного провайдера при автопроверке.',
+            'format': 'Число; 0 — без ограничения.',
+            'example': '5',
+            'warning': 'Провайдеры ограничивают частоту запросов — превышение приводит к ошибкам 429.',
+            'dependencies': 'PAYMENT_VERIFICATION_AUTO_CHECK_ENABLED',
+        },
         'BASE_PROMO_GROUP_PERIOD_DISCOUNTS_ENABLED': {
             'description': ('Включает применение базовых скидок на периоды подписок в групповых промо.'),
             'format': 'Булево значение.',
@@ -1981,6 +2008,8 @@ class BotConfigurationService:
             return
         try:
             setattr(settings, key, value)
+            if key in TEXTS_DEPENDENT_SETTINGS:
+                invalidate_texts_cache()
             if key == 'SALES_MODE':
                 if settings.is_classic_mode():
                     clear_db_period_prices()
@@ -13,6 +13,7 @@ import structlog
 
 from app.config import settings
 from app.database.database import AsyncSessionLocal
+from app.services.button_click_log_service import button_click_log_writer
 
 
 logger = structlog.get_logger(__name__)
@@ -43,6 +44,13 @@ def schedule_cabinet_action_log(user_id: int, method: str, path: str) -> None:
     """Fire-and-forget запись действия юзера в кабинете — не задерживает запрос."""
     if not should_log_cabinet_action(method, path):
         return
+    if button_click_log_writer.record(
+        button_id=f'{method.upper()} {normalize_cabinet_path(path)}'[:100],
+        user_id=user_id,
+        callback_data=path[:255],
+        button_type=CABINET_BUTTON_TYPE,
+    ):
+        return
     asyncio.create_task(_write_cabinet_action(user_id, method.upper(), path))
 
 
@@ -0,0 +1,137 @@
+"""Фоновое коалесцирование записи `users.last_activity`.
+
+Раньше AuthMiddleware выставлял `db_user.last_activity` на каждом апдейте, и
+каждое сообщение/колбэк заканчивалось UPDATE+COMMIT строки пользователя.
+Теперь middleware лишь отмечает время в памяти (`record`), а сервис раз в
+USER_ACTIVITY_FLUSH_INTERVAL_SECONDS пишет накопившиеся значения одним
+пакетным UPDATE (executemany по первичному ключу). На остановке буфер
+сбрасывается в БД.
+"""
+
+import asyncio
+from datetime import datetime
+
+import structlog
+from sqlalchemy import update
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.database.models import User
+
+
+logger = structlog.get_logger(__name__)
+
+
+class UserActivityCoalescer:
+    """Буфер last_activity по user.id с периодическим пакетным сбросом."""
+
+    def __init__(self) -> None:
+        self._pending: dict[int, datetime] = {}
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self._flush_lock = asyncio.Lock()
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.coalesced = 0
+
+    @property
+    def _interval(self) -> float:
+        return max(1.0, float(settings.USER_ACTIVITY_FLUSH_INTERVAL_SECONDS))
+
+    @property
+    def _batch_size(self) -> int:
+        return max(1, int(settings.USER_ACTIVITY_FLUSH_BATCH_SIZE))
+
+    def is_running(self) -> bool:
+        return self._running and self._task is not None and not self._task.done()
+
+    def record(self, user_id: int, activity_at: datetime) -> bool:
+        """Отмечает активность пользователя.
+
+        Возвращает False, если сервис не запущен — тогда вызывающий код должен
+        записать last_activity сам (прежнее поведение).
+        """
+        if not self.is_running():
+            return False
+        previous = self._pending.get(user_id)
+        if previous is not None:
+            self.coalesced += 1
+            if previous >= activity_at:
+                return True
+        self._pending[user_id] = activity_at
+        return True
+
+    async def start(self) -> None:
+        if not settings.USER_ACTIVITY_COALESCING_ENABLED:
+            logger.info('Коалесцирование last_activity отключено настройками')
+            return
+        if self.is_running():
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._loop())
+        logger.info('Сервис коалесцирования активности запущен', interval=self._interval)
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while self._running:
+            try:
+                await asyncio.sleep(self._interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error('Ошибка сброса last_activity', error=error)
+
+    async def flush(self) -> int:
+        """Пишет накопленные значения пакетами; возвращает число строк."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            rows = [{'id': user_id, 'last_activity': activity_at} for user_id, activity_at in pending.items()]
+
+            written = 0
+            try:
+                async with AsyncSessionLocal() as db:
+                    for start in range(0, len(rows), self._batch_size):
+                        batch = rows[start : start + self._batch_size]
+                        # updated_at оставляем как есть: это не правка профиля, а от
+                        # него зависят штампы кэшей (например, кэш мини-аппа).
+                        await db.execute(update(User).values(updated_at=User.updated_at), batch)
+                        written += len(batch)
+                    await db.commit()
+            except Exception as error:
+                # Возвращаем несброшенное в буфер, не затирая более свежие отметки.
+                for user_id, activity_at in pending.items():
+                    current = self._pending.get(user_id)
+                    if current is None or current < activity_at:
+                        self._pending[user_id] = activity_at
+                logger.warning('Не удалось записать last_activity, повторим позже', error=error, rows=len(rows))
+                return 0
+
+            self.flushes += 1
+            self.flushed_rows += written
+            logger.debug('last_activity записан пакетом', rows=written)
+            return written
+
+    def get_stats(self) -> dict[str, int | bool]:
+        return {
+            'running': self.is_running(),
+            'pending': len(self._pending),
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'coalesced': self.coalesced,
+        }
+
+
+user_activity_coalescer = UserActivityCoalescer()
@@ -10,6 +10,7 @@ from sqlalchemy.orm import selectinload
 
 from app.config import settings
 from app.database.crud.promo_group import get_promo_group_by_id
+from app.database.crud.referral_closure import relink_referrals
 from app.database.crud.subscription import get_subscription_by_user_id
 from app.database.crud.transaction import get_user_transactions_count
 from app.database.crud.user import (
@@ -651,6 +652,8 @@ class UserService:
             if to_remove:
                 await db.execute(update(User).where(User.id.in_(to_remove)).values(referred_by_id=None))
 
+            await relink_referrals(db, [*to_assign, *to_remove])
+
             await db.commit()
 
             logger.info(
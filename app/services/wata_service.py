@@ -11,6 +11,7 @@ import aiohttp
 import structlog
 
 from app.config import settings
+from app.external.http_transport import http_transport
 
 
 logger = structlog.get_logger(__name__)
@@ -92,16 +93,14 @@ class WataService:
         last_error: WataAPIError | None = None
         for attempt in range(1 + self._MAX_RETRIES):
             try:
-                async with (
-                    aiohttp.ClientSession(timeout=timeout) as session,
-                    session.request(
-                        method,
-                        url,
-                        json=json,
-                        params=params,
-                        headers=self._build_headers(),
-                    ) as response,
-                ):
+                async with http_transport.session('wata').request(
+                    method,
+                    url,
+                    json=json,
+                    params=params,
+                    headers=self._build_headers(),
+                    timeout=timeout,
+                ) as response:
                     response_text = await response.text()
 
                     if response.status == 429:
@@ -11,11 +11,13 @@ import aiohttp
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.database.crud.webhook import (
     get_active_webhooks_for_event,
     record_webhook_delivery,
     update_webhook_stats,
 )
+from app.database.database import AsyncSessionLocal
 
 
 logger = structlog.get_logger(__name__)
@@ -39,6 +41,12 @@ class WebhookService:
 
     def __init__(self) -> None:
         self._session: aiohttp.ClientSession | None = None
+        # Фоновая очередь доставки: emit() не ждёт HTTP-запросов к внешним endpoint-ам
+        self._queue: asyncio.Queue[tuple[str, dict[str, Any]]] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.enqueued = 0
+        self.dropped = 0
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """Получить или создать HTTP сессию."""
@@ -48,10 +56,63 @@ class WebhookService:
         return self._session
 
     async def close(self) -> None:
-        """Закрыть HTTP сессию."""
+        """Дождаться доставки поставленных в очередь событий и закрыть HTTP сессию."""
+        if self._queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=settings.WEBHOOK_DELIVERY_DRAIN_TIMEOUT_SECONDS)
+            except TimeoutError:
+                logger.warning('Не все webhooks доставлены до остановки', pending=self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
         if self._session and not self._session.closed:
             await self._session.close()
 
+    def enqueue(self, event_type: str, payload: dict[str, Any]) -> bool:
+        """Поставить событие в фоновую очередь доставки webhooks.
+
+        Воркеры запускаются лениво при первом событии и работают со своей
+        сессией БД. При переполненной очереди событие отбрасывается.
+        """
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=max(1, settings.WEBHOOK_DELIVERY_QUEUE_SIZE))
+            self._workers = [
+                asyncio.create_task(self._delivery_worker(self._queue), name=f'webhook-delivery-{index}')
+                for index in range(max(1, settings.WEBHOOK_DELIVERY_WORKERS))
+            ]
+        try:
+            self._queue.put_nowait((event_type, payload))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning('Очередь webhooks переполнена, событие отброшено', event_type=event_type)
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _delivery_worker(self, queue: asyncio.Queue[tuple[str, dict[str, Any]]]) -> None:
+        while True:
+            event_type, payload = await queue.get()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.send_webhook(db, event_type, payload)
+            except Exception as error:
+                logger.exception('Ошибка фоновой доставки webhook', event_type=event_type, error=error)
+            finally:
+                queue.task_done()
+
+    def get_queue_stats(self) -> dict[str, int]:
+        return {
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+        }
+
     def _sign_payload(self, payload: str, secret: str) -> str:
         """Подписать payload с помощью секрета."""
         return hmac.new(
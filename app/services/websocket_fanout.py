@@ -0,0 +1,173 @@
+"""Non-blocking fan-out of messages to WebSocket subscribers.
+
+``publish`` serializes a message once and puts the text into a bounded
+per-connection queue; a dedicated writer task per connection does the actual
+``send_text``. The publisher (payment, ticket and notification code paths)
+never awaits a network write, so one slow browser tab cannot stall it.
+
+A subscriber whose queue is full or whose send does not finish within
+EVENT_HUB_SEND_TIMEOUT_SECONDS is dropped and its socket is closed with
+code 1013 (try again later) — the client reconnects and resyncs over REST.
+Owners that keep their own connection maps pass ``on_drop`` to hear about
+subscribers the hub removes by itself (slow consumer or failed send).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import structlog
+
+from app.config import settings
+
+
+logger = structlog.get_logger(__name__)
+
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    websocket: Any
+    queue: asyncio.Queue[str]
+    writer: asyncio.Task | None = None
+    sent: int = field(default=0)
+
+
+class WebSocketFanout:
+    """Хаб рассылки сообщений по WebSocket с очередью и writer-задачей на каждое подключение."""
+
+    def __init__(self, name: str, *, on_drop: Callable[[Any], None] | None = None) -> None:
+        self.name = name
+        self._on_drop = on_drop
+        self._subscribers: dict[Any, _Subscriber] = {}
+        self._background_tasks: set[asyncio.Task] = set()
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+        self.lagging_events = 0
+        self.send_failures = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def __contains__(self, websocket: Any) -> bool:
+        return websocket in self._subscribers
+
+    def register(self, websocket: Any) -> None:
+        """Подписать соединение и запустить для него writer-задачу."""
+        if websocket in self._subscribers:
+            return
+        subscriber = _Subscriber(
+            websocket=websocket,
+            queue=asyncio.Queue(maxsize=max(1, settings.EVENT_HUB_SEND_QUEUE_SIZE)),
+        )
+        subscriber.writer = asyncio.create_task(self._writer(subscriber), name=f'ws-fanout-{self.name}')
+        self._subscribers[websocket] = subscriber
+
+    def unregister(self, websocket: Any) -> None:
+        """Отписать соединение; неотправленные сообщения отбрасываются."""
+        subscriber = self._subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        if subscriber.writer is not None and subscriber.writer is not asyncio.current_task():
+            subscriber.writer.cancel()
+
+    def publish(self, message: dict[str, Any] | str, targets: list[Any] | None = None) -> int:
+        """Поставить сообщение в очереди подписчиков, не дожидаясь отправки.
+
+        ``targets`` ограничивает рассылку заданными соединениями (по умолчанию —
+        все подписчики). Возвращает число очередей, принявших сообщение.
+        """
+        if targets is None:
+            subscribers = list(self._subscribers.values())
+        else:
+            subscribers = [self._subscribers[ws] for ws in targets if ws in self._subscribers]
+        if not subscribers:
+            return 0
+
+        text = message if isinstance(message, str) else json.dumps(message, default=str, ensure_ascii=False)
+        self.published += 1
+
+        accepted = 0
+        for subscriber in subscribers:
+            queue = subscriber.queue
+            if queue.qsize() * 2 >= queue.maxsize:
+                self.lagging_events += 1
+            try:
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                self._drop(subscriber, reason='queue_full')
+                continue
+            accepted += 1
+        return accepted
+
+    async def _writer(self, subscriber: _Subscriber) -> None:
+        websocket = subscriber.websocket
+        while True:
+            text = await subscriber.queue.get()
+            try:
+                await asyncio.wait_for(websocket.send_text(text), timeout=settings.EVENT_HUB_SEND_TIMEOUT_SECONDS)
+            except TimeoutError:
+                self._drop(subscriber, reason='send_timeout')
+                return
+            except Exception as error:
+                self.send_failures += 1
+                logger.debug('WebSocket send failed', hub=self.name, error=error)
+                self._evict(websocket)
+                return
+            subscriber.sent += 1
+            self.delivered += 1
+
+    def _drop(self, subscriber: _Subscriber, *, reason: str) -> None:
+        """Отключить медленного подписчика, не дожидаясь закрытия сокета."""
+        if self._subscribers.get(subscriber.websocket) is not subscriber:
+            return
+        self._evict(subscriber.websocket)
+        self.dropped_subscribers += 1
+        logger.warning(
+            'Медленный WebSocket-подписчик отключён',
+            hub=self.name,
+            reason=reason,
+            queued=subscriber.queue.qsize(),
+            sent=subscriber.sent,
+        )
+        task = asyncio.create_task(self._close_slow(subscriber.websocket))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _evict(self, websocket: Any) -> None:
+        """Отписать соединение по решению хаба и сообщить владельцу."""
+        self.unregister(websocket)
+        if self._on_drop is None:
+            return
+        try:
+            self._on_drop(websocket)
+        except Exception as error:
+            logger.warning('Ошибка обработчика отключения WebSocket', hub=self.name, error=error)
+
+    @staticmethod
+    async def _close_slow(websocket: Any) -> None:
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason='Slow consumer'),
+                timeout=settings.EVENT_HUB_SEND_TIMEOUT_SECONDS,
+            )
+        except Exception:
+            pass
+
+    def get_stats(self) -> dict[str, int]:
+        lagging = sum(1 for sub in self._subscribers.values() if sub.queue.qsize() * 2 >= sub.queue.maxsize)
+        return {
+            'subscribers': len(self._subscribers),
+            'lagging_subscribers': lagging,
+            'published': self.published,
+            'delivered': self.delivered,
+            'lagging_events': self.lagging_events,
+            'dropped_subscribers': self.dropped_subscribers,
+            'send_failures': self.send_failures,
+        }
@@ -0,0 +1,511 @@
+"""Versioned in-process snapshot of the sales catalog: tariffs, server squads, promo groups.
+
+The catalog changes only on admin edits and panel syncs, yet ``get_tariff_by_id``,
+``get_tariffs_for_user`` and ``get_available_server_squads`` ran on every menu
+render. :class:`CatalogCache` loads the whole catalog once into immutable
+snapshots and serves the hot read paths from memory.
+
+Consistency:
+  * every committed ORM write touching ``tariffs``, ``server_squads``,
+    ``promo_groups`` or their promo-group link tables marks the local snapshot
+    stale and bumps ``catalog:version`` in Redis
+    (see :func:`register_catalog_invalidation`, called by the CRUD layer);
+  * other processes compare that version at most once per
+    ``CATALOG_CACHE_VERSION_CHECK_SECONDS`` and rebuild on mismatch;
+  * ``CATALOG_CACHE_MAX_AGE_SECONDS`` bounds staleness when Redis is down.
+
+``ServerSquad.current_users`` is deliberately not part of the snapshot: it moves
+with every purchase, so capacity checks keep reading the database.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import Any
+
+import structlog
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, noload, selectinload
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.database.models import (
+    PromoGroup,
+    ServerSquad,
+    Tariff,
+    server_squad_promo_groups,
+    tariff_promo_groups,
+)
+from app.utils.cache import cache
+
+
+logger = structlog.get_logger(__name__)
+
+_VERSION_KEY = 'catalog:version'
+_SESSION_INFO_KEY = 'catalog_cache_invalidate'
+_CATALOG_MODELS = (Tariff, ServerSquad, PromoGroup)
+_CATALOG_TABLES = frozenset(
+    {
+        Tariff.__tablename__,
+        ServerSquad.__tablename__,
+        PromoGroup.__tablename__,
+        server_squad_promo_groups.name,
+        tariff_promo_groups.name,
+    }
+)
+# Поля, которые не входят в снимок и меняются слишком часто, чтобы сбрасывать каталог.
+_VOLATILE_ATTRIBUTES = frozenset(
+    {
+        'current_users',
+        'created_at',
+        'updated_at',
+        # Обратные стороны связей с пользователями и подписками.
+        'users',
+        'user_promo_groups',
+        'subscriptions',
+        'subscription_servers',
+    }
+)
+
+
+def _copy_columns(snapshot_cls: type, instance: Any, **overrides: Any) -> dict[str, Any]:
+    values: dict[str, Any] = {}
+    for field in fields(snapshot_cls):
+        if field.name in overrides:
+            values[field.name] = overrides[field.name]
+            continue
+        value = getattr(instance, field.name)
+        if isinstance(value, list):
+            value = tuple(value)
+        elif isinstance(value, dict):
+            value = copy.deepcopy(value)
+        values[field.name] = value
+    return values
+
+
+@dataclass(frozen=True, slots=True)
+class PromoGroupSnapshot:
+    id: int
+    name: str
+    priority: int
+    server_discount_percent: int
+    traffic_discount_percent: int
+    device_discount_percent: int
+    period_discounts: dict | None
+    auto_assign_total_spent_kopeks: int | None
+    apply_discounts_to_addons: bool
+    is_default: bool
+
+    _get_period_discounts_map = PromoGroup._get_period_discounts_map
+    _get_period_discount = PromoGroup._get_period_discount
+    get_discount_percent = PromoGroup.get_discount_percent
+
+    @classmethod
+    def from_model(cls, promo_group: PromoGroup) -> PromoGroupSnapshot:
+        return cls(**_copy_columns(cls, promo_group))
+
+
+@dataclass(frozen=True, slots=True)
+class TariffSnapshot:
+    id: int
+    name: str
+    description: str | None
+    display_order: int
+    is_active: bool
+    traffic_limit_gb: int
+    device_limit: int
+    device_price_kopeks: int | None
+    max_device_limit: int | None
+    allowed_squads: tuple[str, ...]
+    server_traffic_limits: dict | None
+    period_prices: dict
+    tier_level: int
+    is_trial_available: bool
+    allow_traffic_topup: bool
+    traffic_topup_enabled: bool
+    traffic_topup_packages: dict | None
+    max_topup_traffic_gb: int
+    is_daily: bool
+    daily_price_kopeks: int
+    lava_product_id: str | None
+    custom_days_enabled: bool
+    price_per_day_kopeks: int
+    min_days: int
+    max_days: int
+    custom_traffic_enabled: bool
+    traffic_price_per_gb_kopeks: int
+    min_traffic_gb: int
+    max_traffic_gb: int
+    show_in_gift: bool
+    traffic_reset_mode: str | None
+    external_squad_uuid: str | None
+    allowed_promo_groups: tuple[PromoGroupSnapshot, ...]
+
+    # Бизнес-логика не дублируется: методы модели работают только с полями.
+    is_unlimited_traffic = Tariff.is_unlimited_traffic
+    is_free = Tariff.is_free
+    get_price_for_period = Tariff.get_price_for_period
+    get_available_periods = Tariff.get_available_periods
+    get_purchasable_periods = Tariff.get_purchasable_periods
+    get_purchasable_price_for_period = Tariff.get_purchasable_price_for_period
+    get_shortest_period = Tariff.get_shortest_period
+    get_price_rubles = Tariff.get_price_rubles
+    get_traffic_limit_for_server = Tariff.get_traffic_limit_for_server
+    is_available_for_promo_group = Tariff.is_available_for_promo_group
+    get_traffic_topup_packages = Tariff.get_traffic_topup_packages
+    get_traffic_topup_price = Tariff.get_traffic_topup_price
+    get_available_traffic_packages = Tariff.get_available_traffic_packages
+    can_topup_traffic = Tariff.can_topup_traffic
+    get_daily_price_rubles = Tariff.get_daily_price_rubles
+    get_price_for_custom_days = Tariff.get_price_for_custom_days
+    get_price_for_custom_traffic = Tariff.get_price_for_custom_traffic
+    can_purchase_custom_days = Tariff.can_purchase_custom_days
+    can_purchase_custom_traffic = Tariff.can_purchase_custom_traffic
+
+    @classmethod
+    def from_model(cls, tariff: Tariff, promo_groups: Mapping[int, PromoGroupSnapshot]) -> TariffSnapshot:
+        allowed = tuple(promo_groups[group.id] for group in tariff.allowed_promo_groups if group.id in promo_groups)
+        return cls(**_copy_columns(cls, tariff, allowed_promo_groups=allowed))
+
+
+@dataclass(frozen=True, slots=True)
+class ServerSquadSnapshot:
+    id: int
+    squad_uuid: str
+    display_name: str
+    original_name: str | None
+    country_code: str | None
+    is_available: bool | None
+    is_trial_eligible: bool
+    price_kopeks: int | None
+    description: str | None
+    sort_order: int | None
+    max_users: int | None
+    allowed_promo_groups: tuple[PromoGroupSnapshot, ...]
+
+    price_rubles = ServerSquad.price_rubles
+
+    @classmethod
+    def from_model(cls, squad: ServerSquad, promo_groups: Mapping[int, PromoGroupSnapshot]) -> ServerSquadSnapshot:
+        allowed = tuple(promo_groups[group.id] for group in squad.allowed_promo_groups if group.id in promo_groups)
+        return cls(**_copy_columns(cls, squad, allowed_promo_groups=allowed))
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    version: int
+    tariffs: tuple[TariffSnapshot, ...]  # display_order, id
+    server_squads: tuple[ServerSquadSnapshot, ...]  # sort_order, display_name
+    promo_groups: tuple[PromoGroupSnapshot, ...]
+    tariffs_by_id: Mapping[int, TariffSnapshot]
+    server_squads_by_uuid: Mapping[str, ServerSquadSnapshot]
+    promo_groups_by_id: Mapping[int, PromoGroupSnapshot]
+
+    @classmethod
+    def build(
+        cls,
+        version: int,
+        tariffs: tuple[TariffSnapshot, ...],
+        server_squads: tuple[ServerSquadSnapshot, ...],
+        promo_groups: tuple[PromoGroupSnapshot, ...],
+    ) -> CatalogSnapshot:
+        return cls(
+            version=version,
+            tariffs=tariffs,
+            server_squads=server_squads,
+            promo_groups=promo_groups,
+            tariffs_by_id=MappingProxyType({tariff.id: tariff for tariff in tariffs}),
+            server_squads_by_uuid=MappingProxyType({squad.squad_uuid: squad for squad in server_squads}),
+            promo_groups_by_id=MappingProxyType({group.id: group for group in promo_groups}),
+        )
+
+    def get_tariff(self, tariff_id: int | None) -> TariffSnapshot | None:
+        if tariff_id is None:
+            return None
+        return self.tariffs_by_id.get(tariff_id)
+
+    def get_server_squad(self, squad_uuid: str) -> ServerSquadSnapshot | None:
+        return self.server_squads_by_uuid.get(squad_uuid)
+
+    def get_promo_group(self, promo_group_id: int | None) -> PromoGroupSnapshot | None:
+        if promo_group_id is None:
+            return None
+        return self.promo_groups_by_id.get(promo_group_id)
+
+    def tariffs_for_promo_group(self, promo_group_id: int | None) -> list[TariffSnapshot]:
+        """Same rules as ``crud.tariff.get_tariffs_for_user``."""
+        available: list[TariffSnapshot] = []
+        for tariff in self.tariffs:
+            if not tariff.is_active:
+                continue
+            # Без ограничений — всем; с ограничениями — только своей промогруппе.
+            if not tariff.allowed_promo_groups or any(
+                group.id == promo_group_id for group in tariff.allowed_promo_groups
+            ):
+                available.append(tariff)
+        return available
+
+    def available_server_squads(self, promo_group_id: int | None = None) -> list[ServerSquadSnapshot]:
+        """Same rules as ``crud.server_squad.get_available_server_squads``."""
+        squads = [squad for squad in self.server_squads if squad.is_available]
+        if promo_group_id is not None:
+            squads = [
+                squad for squad in squads if any(group.id == promo_group_id for group in squad.allowed_promo_groups)
+            ]
+        return squads
+
+
+class CatalogCache:
+    def __init__(self) -> None:
+        self._snapshot: CatalogSnapshot | None = None
+        self._loaded_at = 0.0
+        self._next_version_check = 0.0
+        # Номер локальной инвалидации: снимок, собранный до неё, считается устаревшим,
+        # даже если сигнал пришёл во время пересборки.
+        self._generation = 0
+        self._built_generation = -1
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.rebuilds = 0
+        self.invalidations = 0
+        self.load_errors = 0
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.CATALOG_CACHE_ENABLED)
+
+    async def _remote_version(self) -> int | None:
+        value = await cache.get(_VERSION_KEY)
+        return value if isinstance(value, int) else None
+
+    async def _is_fresh(self, snapshot: CatalogSnapshot) -> bool:
+        if self._built_generation != self._generation:
+            return False
+        now = time.monotonic()
+        if now - self._loaded_at >= settings.CATALOG_CACHE_MAX_AGE_SECONDS:
+            return False
+        if now < self._next_version_check:
+            return True
+        self._next_version_check = now + settings.CATALOG_CACHE_VERSION_CHECK_SECONDS
+        remote = await self._remote_version()
+        return remote is None or remote == snapshot.version
+
+    async def get(self) -> CatalogSnapshot | None:
+        """Current snapshot; ``None`` when disabled or the catalog could not be loaded."""
+        if not self.is_enabled():
+            return None
+
+        snapshot = self._snapshot
+        if snapshot is not None and await self._is_fresh(snapshot):
+            self.hits += 1
+            return snapshot
+
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог пересобрать соседний запрос.
+            if self._snapshot is not snapshot and self._built_generation == self._generation:
+                return self._snapshot
+            try:
+                return await self._rebuild()
+            except Exception as error:
+                self.load_errors += 1
+                logger.warning('Не удалось загрузить каталог тарифов и серверов', error=error)
+                return None
+
+    async def _rebuild(self) -> CatalogSnapshot:
+        generation = self._generation
+        # Версию читаем до загрузки: правка во время загрузки поднимет её и вызовет повторную сборку.
+        version = await self._remote_version() or 0
+
+        async with AsyncSessionLocal() as db:
+            promo_group_rows = (
+                (
+                    await db.execute(
+                        select(PromoGroup)
+                        .options(noload(PromoGroup.server_squads))
+                        .order_by(PromoGroup.priority.desc(), PromoGroup.id)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            tariff_rows = (
+                (
+                    await db.execute(
+                        select(Tariff)
+                        .options(selectinload(Tariff.allowed_promo_groups))
+                        .order_by(Tariff.display_order, Tariff.id)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            squad_rows = (
+                (
+                    await db.execute(
+                        select(ServerSquad)
+                        .options(selectinload(ServerSquad.allowed_promo_groups))
+                        .order_by(ServerSquad.sort_order, ServerSquad.display_name)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+
+            promo_groups = tuple(PromoGroupSnapshot.from_model(group) for group in promo_group_rows)
+            groups_by_id = {group.id: group for group in promo_groups}
+            snapshot = CatalogSnapshot.build(
+                version,
+                tariffs=tuple(TariffSnapshot.from_model(tariff, groups_by_id) for tariff in tariff_rows),
+                server_squads=tuple(ServerSquadSnapshot.from_model(squad, groups_by_id) for squad in squad_rows),
+                promo_groups=promo_groups,
+            )
+
+        now = time.monotonic()
+        self._snapshot = snapshot
+        self._loaded_at = now
+        self._next_version_check = now + settings.CATALOG_CACHE_VERSION_CHECK_SECONDS
+        self._built_generation = generation
+        self.rebuilds += 1
+        logger.debug(
+            'Каталог загружен в память',
+            version=version,
+            tariffs=len(snapshot.tariffs),
+            server_squads=len(snapshot.server_squads),
+            promo_groups=len(snapshot.promo_groups),
+        )
+        return snapshot
+
+    def invalidate_local(self) -> None:
+        self._generation += 1
+        self.invalidations += 1
+
+    async def invalidate(self) -> None:
+        """Drops the local snapshot and tells other processes to rebuild theirs."""
+        self.invalidate_local()
+        await cache.increment(_VERSION_KEY)
+
+    def clear(self) -> None:
+        self._snapshot = None
+        self._built_generation = -1
+
+    def get_stats(self) -> dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot is not None else None,
+            'tariffs': len(snapshot.tariffs) if snapshot is not None else 0,
+            'server_squads': len(snapshot.server_squads) if snapshot is not None else 0,
+            'promo_groups': len(snapshot.promo_groups) if snapshot is not None else 0,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if snapshot is not None else None,
+            'hits': self.hits,
+            'rebuilds': self.rebuilds,
+            'invalidations': self.invalidations,
+            'load_errors': self.load_errors,
+        }
+
+
+catalog_cache = CatalogCache()
+
+
+async def get_cached_tariff(db: Any, tariff_id: int) -> TariffSnapshot | Tariff | None:
+    """Read-only tariff for rendering; falls back to the database when the cache is unavailable."""
+    snapshot = await catalog_cache.get()
+    if snapshot is not None:
+        return snapshot.get_tariff(tariff_id)
+
+    from app.database.crud.tariff import get_tariff_by_id
+
+    return await get_tariff_by_id(db, tariff_id)
+
+
+async def get_cached_tariffs_for_user(
+    db: Any, promo_group_id: int | None = None
+) -> list[TariffSnapshot] | list[Tariff]:
+    snapshot = await catalog_cache.get()
+    if snapshot is not None:
+        return snapshot.tariffs_for_promo_group(promo_group_id)
+
+    from app.database.crud.tariff import get_tariffs_for_user
+
+    return await get_tariffs_for_user(db, promo_group_id)
+
+
+async def get_cached_available_server_squads(
+    db: Any, promo_group_id: int | None = None
+) -> list[ServerSquadSnapshot] | list[ServerSquad]:
+    snapshot = await catalog_cache.get()
+    if snapshot is not None:
+        return snapshot.available_server_squads(promo_group_id)
+
+    from app.database.crud.server_squad import get_available_server_squads
+
+    return await get_available_server_squads(db, promo_group_id=promo_group_id)
+
+
+def _has_catalog_changes(instance: Any) -> bool:
+    return any(attr.history.has_changes() for attr in inspect(instance).attrs if attr.key not in _VOLATILE_ATTRIBUTES)
+
+
+def _collect_catalog_changes(session: Session, flush_context: Any) -> None:
+    if session.info.get(_SESSION_INFO_KEY):
+        return
+    if any(isinstance(instance, _CATALOG_MODELS) for instance in (*session.new, *session.deleted)) or any(
+        isinstance(instance, _CATALOG_MODELS) and _has_catalog_changes(instance) for instance in session.dirty
+    ):
+        session.info[_SESSION_INFO_KEY] = True
+
+
+def _updated_columns(statement: Any) -> set[str]:
+    # У UPDATE нет публичного списка SET-колонок; пустое множество = «неизвестно».
+    values = getattr(statement, '_values', None) or {}
+    return {getattr(key, 'key', key) for key in values}
+
+
+def _collect_bulk_statement(orm_execute_state: Any) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    statement = orm_execute_state.statement
+    table = getattr(statement, 'table', None)
+    if getattr(table, 'name', None) not in _CATALOG_TABLES:
+        return
+    if orm_execute_state.is_update:
+        columns = _updated_columns(statement)
+        if columns and columns <= _VOLATILE_ATTRIBUTES:
+            return
+    orm_execute_state.session.info[_SESSION_INFO_KEY] = True
+
+
+def _invalidate_after_commit(session: Session) -> None:
+    if not session.info.pop(_SESSION_INFO_KEY, None):
+        return
+    catalog_cache.invalidate_local()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(cache.increment(_VERSION_KEY))
+
+
+def _discard_after_rollback(session: Session, previous_transaction: Any) -> None:
+    # Откат SAVEPOINT не отменяет изменения внешней транзакции.
+    if not getattr(previous_transaction, 'nested', False):
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+_registered = False
+
+
+def register_catalog_invalidation() -> None:
+    """Hooks ORM session events so committed catalog writes bump the catalog version."""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_flush', _collect_catalog_changes)
+    event.listen(Session, 'do_orm_execute', _collect_bulk_statement)
+    event.listen(Session, 'after_commit', _invalidate_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _registered = True
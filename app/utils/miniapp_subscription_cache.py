@@ -0,0 +1,105 @@
+"""Short-lived per-user cache of the mini app ``/subscription`` response.
+
+Opening the mini app builds the whole subscription payload: a usage sync and
+links/devices/squad lookups against the panel plus a dozen DB queries. Users
+reopen it several times within seconds, so the finished response is kept for
+MINIAPP_SUBSCRIPTION_CACHE_TTL_SECONDS.
+
+An entry is keyed by ``telegram_id`` and stamped with a version built from the
+freshly loaded user and its subscriptions (``updated_at``, balance, status,
+expiry, traffic, promo offer). The user row is still read on every request, so
+any change to the user or a subscription — from this or another process —
+misses the cache immediately; the TTL only bounds staleness of data outside
+the stamp (transaction history, promo offers, panel device list).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any
+
+from app.config import settings
+
+
+def subscription_version_stamp(user: Any, subscriptions: list[Any]) -> str:
+    """Hash of the user/subscription fields whose change must bypass the cache.
+
+    ``subscriptions`` is passed explicitly: after ``db.refresh(user)`` the
+    relationship may be unloaded, and lazy loading is not possible here.
+    """
+    parts: list[Any] = [
+        user.id,
+        getattr(user, 'updated_at', None),
+        getattr(user, 'balance_kopeks', None),
+        getattr(user, 'status', None),
+        getattr(user, 'language', None),
+        getattr(user, 'promo_group_id', None),
+        getattr(user, 'promo_offer_discount_percent', None),
+        getattr(user, 'promo_offer_discount_expires_at', None),
+    ]
+    for subscription in sorted(subscriptions, key=lambda item: item.id or 0):
+        parts.append(
+            (
+                subscription.id,
+                subscription.updated_at,
+                subscription.status,
+                subscription.end_date,
+                subscription.traffic_used_gb,
+                subscription.device_limit,
+                subscription.autopay_enabled,
+            )
+        )
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+class MiniAppSubscriptionCache:
+    def __init__(self) -> None:
+        self._entries: dict[int, tuple[float, str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.MINIAPP_SUBSCRIPTION_CACHE_TTL_SECONDS > 0
+
+    def get(self, telegram_id: int, stamp: str) -> Any | None:
+        if not self.is_enabled():
+            return None
+        entry = self._entries.get(telegram_id)
+        if entry is not None:
+            expires_at, cached_stamp, response = entry
+            if expires_at > time.monotonic() and cached_stamp == stamp:
+                self.hits += 1
+                return response
+            self._entries.pop(telegram_id, None)
+        self.misses += 1
+        return None
+
+    def put(self, telegram_id: int, stamp: str, response: Any) -> None:
+        if not self.is_enabled():
+            return
+        if len(self._entries) >= settings.MINIAPP_SUBSCRIPTION_CACHE_MAX_SIZE and telegram_id not in self._entries:
+            self._evict_expired()
+            if len(self._entries) >= settings.MINIAPP_SUBSCRIPTION_CACHE_MAX_SIZE:
+                return
+        expires_at = time.monotonic() + settings.MINIAPP_SUBSCRIPTION_CACHE_TTL_SECONDS
+        self._entries[telegram_id] = (expires_at, stamp, response)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._entries.pop(telegram_id, None)
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for telegram_id, (expires_at, _, _) in list(self._entries.items()):
+            if expires_at <= now:
+                self._entries.pop(telegram_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+miniapp_subscription_cache = MiniAppSubscriptionCache()
@@ -0,0 +1,127 @@
+"""Fingerprints of panel users already reconciled by the panel→bot sync.
+
+``RemnaWaveService.sync_users_from_panel`` used to re-apply every panel user to
+its bot subscription on each run, even when nothing changed on either side.
+After a page is committed the sync remembers a hash of each panel record
+(expireAt, traffic, status, squads, links...) per bot ``User.id``; on the next
+run a user whose panel record hashes the same is skipped entirely.
+
+Bot-side edits must not be masked by a stale fingerprint, so every committed
+flush that touches a ``User`` or ``Subscription`` drops the fingerprints of the
+affected users (same ORM-event scheme as ``user_snapshot_cache``). A TTL bounds
+drift from writes made by other processes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+
+_SESSION_INFO_KEY = 'panel_sync_fingerprint_invalidate'
+
+
+def panel_user_fingerprint(panel_user: dict[str, Any]) -> str:
+    """Stable hash of everything the sync copies from a panel user."""
+    payload = dict(panel_user)
+    squads = payload.get('activeInternalSquads') or []
+    payload['activeInternalSquads'] = sorted(
+        str(squad.get('uuid') if isinstance(squad, dict) else squad) for squad in squads
+    )
+    raw = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+class PanelSyncFingerprints:
+    def __init__(self) -> None:
+        self._entries: dict[int, tuple[float, str]] = {}
+        self.skipped = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.REMNAWAVE_SYNC_SKIP_UNCHANGED)
+
+    def matches(self, user_id: int, fingerprint: str) -> bool:
+        if not self.is_enabled():
+            return False
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False
+        expires_at, known = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(user_id, None)
+            return False
+        return known == fingerprint
+
+    def remember(self, fingerprints: dict[int, str]) -> None:
+        if not self.is_enabled() or not fingerprints:
+            return
+        expires_at = time.monotonic() + settings.REMNAWAVE_SYNC_FINGERPRINT_TTL_SECONDS
+        for user_id, fingerprint in fingerprints.items():
+            self._entries[user_id] = (expires_at, fingerprint)
+
+    def invalidate(self, user_ids: set[int]) -> None:
+        for user_id in user_ids:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'skipped': self.skipped,
+            'invalidations': self.invalidations,
+        }
+
+
+panel_sync_fingerprints = PanelSyncFingerprints()
+
+
+def _collect_changed_users(session: Session, flush_context: Any) -> None:
+    from app.database.models import Subscription, User
+
+    user_ids: set[int] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User):
+            if instance.id is not None:
+                user_ids.add(instance.id)
+        elif isinstance(instance, Subscription):
+            if instance.user_id is not None:
+                user_ids.add(instance.user_id)
+    if user_ids:
+        session.info.setdefault(_SESSION_INFO_KEY, set()).update(user_ids)
+
+
+def _invalidate_after_commit(session: Session) -> None:
+    user_ids = session.info.pop(_SESSION_INFO_KEY, None)
+    if user_ids:
+        panel_sync_fingerprints.invalidate(user_ids)
+
+
+def _discard_after_rollback(session: Session, previous_transaction: Any) -> None:
+    if not getattr(previous_transaction, 'nested', False):
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+_registered = False
+
+
+def register_fingerprint_invalidation() -> None:
+    """Hooks ORM session events so committed user/subscription writes drop fingerprints."""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_flush', _collect_changed_users)
+    event.listen(Session, 'after_commit', _invalidate_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _registered = True
@@ -13,16 +13,40 @@
 
 ASCII-термины не трогаем: для них `ILIKE` работает и так, а лишние OR только
 замедлили бы запрос.
+
+Для пользователей варианты больше не нужны: у `users` есть колонка `search_text`
+с уже нормализованными именем, username, email и реферальным кодом (casefold, «ё» → «е»,
+плюс транслитерация кириллицы). Её поддерживают ORM-хуки модели, а на PostgreSQL
+по ней построен триграммный индекс, поэтому `LIKE '%терм%'` не сканирует таблицу.
+Термин нормализуется той же функцией, что и колонка — см. `search_text_clause`.
 """
 
 from __future__ import annotations
 
+import re
+import unicodedata
 from collections.abc import Iterable
 from typing import Any
 
 from sqlalchemy import or_
 
 
+# Упрощённая транслитерация кириллицы — так имена обычно пишут латиницей:
+# поиск по «ivan» находит «Иван», а по «иван» — «Ivan» не находит, и это ожидаемо.
+_TRANSLIT = str.maketrans(
+    {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z',
+        'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+        'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch',
+        'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+        'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g', 'ў': 'u',
+    }
+)  # fmt: skip
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_LIKE_SPECIAL_RE = re.compile(r'([\\%_])')
+
+
 def case_variants(term: str) -> list[str]:
     """Регистровые варианты термина, по которым имеет смысл искать.
 
@@ -48,3 +72,45 @@ def contains_conditions(columns: Iterable[Any], term: str) -> list[Any]:
 def contains_clause(columns: Iterable[Any], term: str) -> Any:
     """Готовое OR-условие «хотя бы одна колонка содержит term»."""
     return or_(*contains_conditions(columns, term))
+
+
+def normalize_search_text(value: str | None) -> str:
+    """Свёртка регистра без участия локали базы: NFKC, casefold, «ё» → «е», одиночные пробелы."""
+    if not value:
+        return ''
+    normalized = unicodedata.normalize('NFKC', value).casefold().replace('ё', 'е')
+    return _WHITESPACE_RE.sub(' ', normalized).strip()
+
+
+def transliterate(value: str) -> str:
+    """Латинская запись нормализованной строки (кириллица → латиница, остальное как есть)."""
+    return value.translate(_TRANSLIT)
+
+
+def build_user_search_text(user: Any) -> str | None:
+    """Значение `users.search_text`: нормализованные поля профиля одной строкой.
+
+    Username хранится с «@», поэтому поиск по «@ivan» попадает именно в username.
+    К полям с не-ASCII символами в конце добавляется их транслитерация.
+    """
+    username = normalize_search_text(getattr(user, 'username', None)).lstrip('@')
+    parts = [
+        normalize_search_text(getattr(user, 'first_name', None)),
+        normalize_search_text(getattr(user, 'last_name', None)),
+        f'@{username}' if username else '',
+        normalize_search_text(getattr(user, 'email', None)),
+        normalize_search_text(getattr(user, 'referral_code', None)),
+    ]
+    parts = [part for part in parts if part]
+    parts += [latin for latin in (transliterate(part) for part in parts if not part.isascii()) if latin not in parts]
+    return ' '.join(parts) or None
+
+
+def escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE (`%`, `_`, `\\`) для использования с escape='\\'."""
+    return _LIKE_SPECIAL_RE.sub(r'\\\1', value)
+
+
+def search_text_clause(column: Any, term: str) -> Any:
+    """Условие «нормализованная колонка содержит term» — один LIKE без вариантов регистра."""
+    return column.like(f'%{escape_like(normalize_search_text(term))}%', escape='\\')
@@ -0,0 +1,256 @@
+"""Short-TTL snapshot cache of bot users for the AuthMiddleware hot path.
+
+AuthMiddleware used to run ``get_user_by_telegram_id`` (four ``selectinload``s)
+for every message and callback, even when the handler never touches the ORM
+user. A :class:`UserSnapshot` keeps just the fields the middleware needs to
+gate an update (status, profile names, language) so handlers that don't take
+``db_user`` can be served without the heavy load. ``next_expiry_at`` is the
+earliest ``end_date`` of an active subscription that SubscriptionStatusMiddleware
+would have to expire: once it has passed, the snapshot is no longer enough.
+
+Two levels:
+  * L1 — in-process dict with a few seconds of TTL (bounds cross-process
+    staleness, since other processes can't invalidate it);
+  * L2 — Redis (``user_snapshot:{telegram_id}``) shared by all processes.
+
+Invalidation is driven by the ORM: every committed flush that inserts, updates
+or deletes a ``User`` or ``Subscription`` drops the affected snapshots
+(see :func:`register_snapshot_invalidation`, called by the CRUD layer).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.utils.cache import cache
+
+
+logger = structlog.get_logger(__name__)
+
+_REDIS_KEY_PREFIX = 'user_snapshot:'
+_SESSION_INFO_KEY = 'user_snapshot_invalidate'
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    id: int
+    telegram_id: int
+    status: str
+    language: str | None
+    username: str | None
+    first_name: str | None
+    last_name: str | None
+    remnawave_id: int | None = None
+    # Unix-время; 0.0 — подписки не загружены, снимок сам по себе не годится.
+    next_expiry_at: float | None = None
+
+    @classmethod
+    def from_user(cls, user: Any) -> UserSnapshot:
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            status=user.status,
+            language=user.language,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            remnawave_id=user.remnawave_id,
+            next_expiry_at=_next_expiry_at(user),
+        )
+
+    def expiry_due(self, now: float) -> bool:
+        return self.next_expiry_at is not None and self.next_expiry_at <= now
+
+    def profile_matches(self, username: str | None, first_name: str | None, last_name: str | None) -> bool:
+        return self.username == username and self.first_name == first_name and self.last_name == last_name
+
+
+def _next_expiry_at(user: Any) -> float | None:
+    from app.database.models import SubscriptionStatus
+
+    # Ленивая загрузка в async-контексте невозможна — читаем только то, что уже загружено.
+    subscriptions = getattr(user, '__dict__', {}).get('subscriptions')
+    if subscriptions is None:
+        return 0.0
+    end_dates = []
+    for subscription in subscriptions:
+        if subscription.status != SubscriptionStatus.ACTIVE.value or not subscription.end_date:
+            continue
+        tariff = subscription.__dict__.get('tariff')
+        # Суточные подписки экспайрит DailySubscriptionService, а не middleware
+        if tariff is not None and getattr(tariff, 'is_daily', False) and not subscription.is_daily_paused:
+            continue
+        end_dates.append(subscription.end_date.timestamp())
+    return min(end_dates, default=None)
+
+
+class UserSnapshotCache:
+    def __init__(self) -> None:
+        self._l1: dict[int, tuple[float, UserSnapshot]] = {}
+        # user.id -> telegram_id: подписки знают только user_id.
+        self._telegram_ids: dict[int, int] = {}
+        self.hits_l1 = 0
+        self.hits_l2 = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.USER_SNAPSHOT_CACHE_ENABLED)
+
+    @staticmethod
+    def _redis_key(telegram_id: int) -> str:
+        return f'{_REDIS_KEY_PREFIX}{telegram_id}'
+
+    def _remember(self, snapshot: UserSnapshot) -> None:
+        if len(self._l1) >= settings.USER_SNAPSHOT_L1_MAX_SIZE and snapshot.telegram_id not in self._l1:
+            self._evict_expired()
+            if len(self._l1) >= settings.USER_SNAPSHOT_L1_MAX_SIZE:
+                return
+        self._l1[snapshot.telegram_id] = (time.monotonic() + settings.USER_SNAPSHOT_L1_TTL_SECONDS, snapshot)
+        self._telegram_ids[snapshot.id] = snapshot.telegram_id
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for telegram_id, (expires_at, snapshot) in list(self._l1.items()):
+            if expires_at <= now:
+                self._l1.pop(telegram_id, None)
+                self._telegram_ids.pop(snapshot.id, None)
+
+    async def get(self, telegram_id: int) -> UserSnapshot | None:
+        if not self.is_enabled():
+            return None
+
+        entry = self._l1.get(telegram_id)
+        if entry is not None:
+            expires_at, snapshot = entry
+            if expires_at > time.monotonic():
+                self.hits_l1 += 1
+                return snapshot
+            self._l1.pop(telegram_id, None)
+
+        payload = await cache.get(self._redis_key(telegram_id))
+        if isinstance(payload, dict):
+            try:
+                snapshot = UserSnapshot(**payload)
+            except TypeError:
+                snapshot = None
+            if snapshot is not None:
+                self.hits_l2 += 1
+                self._remember(snapshot)
+                return snapshot
+
+        self.misses += 1
+        return None
+
+    async def put(self, snapshot: UserSnapshot) -> None:
+        if not self.is_enabled():
+            return
+        self._remember(snapshot)
+        await cache.set(
+            self._redis_key(snapshot.telegram_id),
+            asdict(snapshot),
+            expire=settings.USER_SNAPSHOT_TTL_SECONDS,
+        )
+
+    def invalidate_local(self, telegram_ids: set[int], user_ids: set[int]) -> set[int]:
+        """Drops L1 entries; returns the full set of affected telegram ids."""
+        affected = set(telegram_ids)
+        for user_id in user_ids:
+            telegram_id = self._telegram_ids.pop(user_id, None)
+            if telegram_id is not None:
+                affected.add(telegram_id)
+        for telegram_id in affected:
+            self._l1.pop(telegram_id, None)
+        self.invalidations += len(affected)
+        return affected
+
+    async def invalidate(self, telegram_id: int) -> None:
+        self.invalidate_local({telegram_id}, set())
+        await cache.delete(self._redis_key(telegram_id))
+
+    async def _invalidate_remote(self, telegram_ids: set[int]) -> None:
+        for telegram_id in telegram_ids:
+            await cache.delete(self._redis_key(telegram_id))
+
+    def clear(self) -> None:
+        self._l1.clear()
+        self._telegram_ids.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            'l1_size': len(self._l1),
+            'hits_l1': self.hits_l1,
+            'hits_l2': self.hits_l2,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+user_snapshot_cache = UserSnapshotCache()
+
+
+def _collect_changed_users(session: Session, flush_context: Any) -> None:
+    from app.database.models import Subscription, User
+
+    telegram_ids: set[int] = set()
+    user_ids: set[int] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User):
+            if instance.telegram_id is not None:
+                telegram_ids.add(instance.telegram_id)
+            if instance.id is not None:
+                user_ids.add(instance.id)
+        elif isinstance(instance, Subscription):
+            owner = instance.__dict__.get('user')  # только если связь уже загружена
+            if owner is not None and owner.telegram_id is not None:
+                telegram_ids.add(owner.telegram_id)
+            if instance.user_id is not None:
+                user_ids.add(instance.user_id)
+
+    if telegram_ids or user_ids:
+        pending = session.info.setdefault(_SESSION_INFO_KEY, (set(), set()))
+        pending[0].update(telegram_ids)
+        pending[1].update(user_ids)
+
+
+def _invalidate_after_commit(session: Session) -> None:
+    pending = session.info.pop(_SESSION_INFO_KEY, None)
+    if not pending:
+        return
+    affected = user_snapshot_cache.invalidate_local(*pending)
+    if not affected:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(user_snapshot_cache._invalidate_remote(affected))
+
+
+def _discard_after_rollback(session: Session, previous_transaction: Any) -> None:
+    # Откат SAVEPOINT не отменяет изменения внешней транзакции.
+    if not getattr(previous_transaction, 'nested', False):
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+_registered = False
+
+
+def register_snapshot_invalidation() -> None:
+    """Hooks ORM session events so committed user/subscription writes drop snapshots."""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_flush', _collect_changed_users)
+    event.listen(Session, 'after_commit', _invalidate_after_commit)
+    event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+    _registered = True
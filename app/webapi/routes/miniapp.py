@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import dataclasses
 import math
 import re
-from collections.abc import Collection
+from collections.abc import Awaitable, Collection
 from datetime import UTC, datetime, timedelta
 from decimal import ROUND_FLOOR, ROUND_HALF_UP, ROUND_UP, Decimal, InvalidOperation
 from typing import Any
@@ -92,6 +93,7 @@ from app.services.trial_activation_service import (
 )
 from app.services.tribute_service import TributeService
 from app.utils.currency_converter import currency_converter
+from app.utils.miniapp_subscription_cache import miniapp_subscription_cache, subscription_version_stamp
 from app.utils.pricing_utils import (
     apply_percentage_discount,
     calculate_price_per_month,
@@ -2768,7 +2770,9 @@ async def _resolve_connected_servers(
         try:
             service = RemnaWaveService()
             if service.is_configured:
-                squads = await service.get_all_squads()
+                squads = await asyncio.wait_for(
+                    service.get_all_squads(), timeout=settings.MINIAPP_PANEL_LOOKUP_TIMEOUT_SECONDS
+                )
                 for squad in squads:
                     uuid = squad.get('uuid')
                     name = squad.get('name')
@@ -2776,6 +2780,8 @@ async def _resolve_connected_servers(
                         resolved[uuid] = name
         except RemnaWaveConfigurationError:
             logger.debug('RemnaWave is not configured; skipping server name enrichment')
+        except TimeoutError:
+            logger.warning('Timed out resolving server names from RemnaWave')
         except Exception as error:  # pragma: no cover - defensive logging
             logger.warning('Failed to resolve server names from RemnaWave', error=error)
 
@@ -2787,6 +2793,17 @@ async def _resolve_connected_servers(
     return connected_servers
 
 
+async def _with_panel_timeout(lookup: Awaitable[Any], fallback: Any, field: str) -> tuple[Any, bool]:
+    """Runs a panel lookup with MINIAPP_PANEL_LOOKUP_TIMEOUT_SECONDS; returns ``(value, degraded)``."""
+    try:
+        return await asyncio.wait_for(lookup, timeout=settings.MINIAPP_PANEL_LOOKUP_TIMEOUT_SECONDS), False
+    except TimeoutError:
+        logger.warning('Panel lookup for miniapp timed out', field=field)
+    except Exception as error:
+        logger.warning('Panel lookup for miniapp failed', field=field, error=error)
+    return fallback, True
+
+
 async def _load_devices_info(user: User, subscription=None) -> tuple[int, list[MiniAppDevice]]:
     # Multi-tariff: каждая подписка — свой пользователь панели, поэтому берём
     # id подписки в панели, а не общий user.remnawave_id (иначе показали бы устройства
@@ -2798,12 +2815,9 @@ async def _load_devices_info(user: User, subscription=None) -> tuple[int, list[M
     if not panel_user_id:
         return 0, []
 
-    try:
-        service = RemnaWaveService()
-    except Exception as error:  # pragma: no cover - defensive logging
-        logger.warning('Failed to initialise RemnaWave service', error=error)
-        return 0, []
-
+    # Ошибки панели не глушим: _with_panel_timeout пометит ответ деградированным,
+    # и пустой список устройств не попадёт в кэш.
+    service = RemnaWaveService()
     if not service.is_configured:
         return 0, []
 
@@ -2813,9 +2827,6 @@ async def _load_devices_info(user: User, subscription=None) -> tuple[int, list[M
     except RemnaWaveConfigurationError:
         logger.debug('RemnaWave configuration missing while loading devices')
         return 0, []
-    except Exception as error:  # pragma: no cover - defensive logging
-        logger.warning('Failed to load devices from RemnaWave', error=error)
-        return 0, []
 
     total_devices = int(response.get('total') or 0)
     devices_payload = response.get('devices') or []
@@ -2889,12 +2900,10 @@ async def _load_subscription_links(
     if not subscription.remnawave_short_uuid or not _is_remnawave_configured():
         return {}
 
-    try:
-        service = SubscriptionService()
-        info = await service.get_subscription_info(subscription.remnawave_short_uuid)
-    except Exception as error:  # pragma: no cover - defensive logging
-        logger.warning('Failed to load subscription info from RemnaWave', error=error)
-        return {}
+    # Без SubscriptionService.get_subscription_info: он превращает ошибку панели в
+    # None, а её нужно донести до _with_panel_timeout, чтобы ответ не кэшировался.
+    async with SubscriptionService().get_api_client() as api:
+        info = await api.get_subscription_info(subscription.remnawave_short_uuid)
 
     if not info:
         return {}
@@ -3118,6 +3127,12 @@ async def get_subscription_details(
         )
 
     subs = getattr(user, 'subscriptions', None) or []
+
+    # Повторное открытие без изменений пользователя/подписок — ответ из кеша, без панели
+    cached_response = miniapp_subscription_cache.get(telegram_id, subscription_version_stamp(user, subs))
+    if cached_response is not None:
+        return cached_response
+
     if subs:
         # Prefer non-daily active subscription with most days remaining
         active = [s for s in subs if s.is_active]
@@ -3155,6 +3170,15 @@ async def get_subscription_details(
         subscription = getattr(user, 'subscription', subscription)
     lifetime_used = _bytes_to_gb(getattr(user, 'lifetime_used_traffic_bytes', 0))
 
+    # Запросы к панели не зависят от БД: запускаем их сразу, пока ниже идут запросы
+    # к БД в сессии запроса (сама AsyncSession параллельных запросов не допускает).
+    links_task = (
+        asyncio.create_task(_with_panel_timeout(_load_subscription_links(subscription), {}, 'links'))
+        if subscription
+        else None
+    )
+    devices_task = asyncio.create_task(_with_panel_timeout(_load_devices_info(user, subscription), (0, []), 'devices'))
+
     transactions_query = (
         select(Transaction).where(Transaction.user_id == user.id).order_by(Transaction.created_at.desc()).limit(10)
     )
@@ -3343,6 +3367,7 @@ async def get_subscription_details(
         )
 
     links_payload: dict[str, Any] = {}
+    links_degraded = False
     connected_squads: list[str] = []
     connected_servers: list[MiniAppConnectedServer] = []
     links: list[str] = []
@@ -3364,7 +3389,7 @@ async def get_subscription_details(
         traffic_limit_value = subscription.traffic_limit_gb or 0
         status_actual = subscription.actual_status
         subscription_status_value = subscription.status
-        links_payload = await _load_subscription_links(subscription)
+        links_payload, links_degraded = await links_task
         # Флаг скрытия ссылки (скрывается только текст, кнопки работают)
         hide_subscription_link = settings.should_hide_subscription_link()
         subscription_url = links_payload.get('subscription_url') or subscription.subscription_url
@@ -3388,7 +3413,7 @@ async def get_subscription_details(
         autopay_payload,
     )
 
-    devices_count, devices = await _load_devices_info(user, subscription)
+    (devices_count, devices), devices_degraded = await devices_task
 
     # Загружаем данные суточного тарифа
     is_daily_tariff = False
@@ -3508,7 +3533,7 @@ async def get_subscription_details(
                 }
             )
 
-    return MiniAppSubscriptionResponse(
+    response = MiniAppSubscriptionResponse(
         traffic_purchases=traffic_purchases_data,
         subscription_id=getattr(subscription, 'id', None),
         remnawave_short_uuid=remnawave_short_uuid,
@@ -3569,6 +3594,12 @@ async def get_subscription_details(
         **autopay_extras,
     )
 
+    # Ответ без данных панели (таймаут/ошибка) не кешируем — следующее открытие попробует снова
+    if not links_degraded and not devices_degraded:
+        miniapp_subscription_cache.put(telegram_id, subscription_version_stamp(user, subs), response)
+
+    return response
+
 
 async def _get_current_tariff_model(db: AsyncSession, subscription, user=None) -> MiniAppCurrentTariff | None:
     """Возвращает модель текущего тарифа пользователя."""
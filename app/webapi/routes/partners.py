@@ -16,7 +16,7 @@ from app.database.crud.user import (
 )
 from app.database.models import User
 from app.services.partner_stats_service import PartnerStatsService
-from app.utils.text_search import contains_conditions
+from app.utils.text_search import search_text_clause
 from app.utils.user_utils import (
     get_detailed_referral_list,
     get_effective_referral_commission_percent,
@@ -57,13 +57,10 @@ router = APIRouter()
 
 
 def _apply_search_filter(query, search: str):
-    # lower() в SQL сворачивает регистр по локали базы: под `C` (наш docker-compose)
-    # кириллица не сворачивается, и «поз» не находил «Позитив».
-    # См. app/utils/text_search.py.
-    conditions = contains_conditions(
-        (User.username, User.first_name, User.last_name, User.referral_code),
-        search,
-    )
+    # Имя, username, email и реферальный код ищутся по нормализованной колонке:
+    # lower()/ILIKE под локалью базы `C` не сворачивают кириллицу, а OR по
+    # вариантам регистра не использует индекс. См. app/utils/text_search.py.
+    conditions = [search_text_clause(User.search_text, search)]
 
     if search.isdigit():
         conditions.append(User.telegram_id == int(search))
@@ -30,7 +30,7 @@ from app.database.crud.user import (
 from app.database.models import PaymentMethod, PromoGroup, Subscription, User, UserStatus
 from app.services.manual_topup_service import ManualTopupKeyConflict, credit_manual_topup
 from app.services.subscription_service import SubscriptionService
-from app.utils.text_search import contains_conditions
+from app.utils.text_search import search_text_clause
 
 from ..dependencies import get_db_session, require_api_token
 from ..schemas.users import (
@@ -123,13 +123,10 @@ def _serialize_user(user: User) -> UserResponse:
 
 
 def _apply_search_filter(query, search: str):
-    # lower() в SQL сворачивает регистр по локали базы: под `C` (наш docker-compose)
-    # кириллица не сворачивается, и «поз» не находил «Позитив».
-    # См. app/utils/text_search.py.
-    conditions = contains_conditions(
-        (User.username, User.first_name, User.last_name, User.referral_code),
-        search,
-    )
+    # Имя, username, email и реферальный код ищутся по нормализованной колонке:
+    # lower()/ILIKE под локалью базы `C` не сворачивают кириллицу, а OR по
+    # вариантам регистра не использует индекс. См. app/utils/text_search.py.
+    conditions = [search_text_clause(User.search_text, search)]
 
     if search.isdigit():
         numeric_search = int(search)
@@ -20,45 +20,27 @@ from app.external.tribute import TributeService as TributeAPI
 from app.external.wata_webhook import WataWebhookHandler
 from app.services.pal24_service import Pal24Service
 from app.services.payment_service import PaymentService
+from app.services.payment_webhook_inbox import payment_webhook_inbox
 from app.services.tribute_service import TributeService
 
 
 logger = structlog.get_logger(__name__)
 
-# Strong refs to fire-and-forget webhook background tasks so they are not
-# garbage-collected mid-execution (per asyncio.create_task docs).
-_webhook_bg_tasks: set[asyncio.Task] = set()
 
+async def _enqueue_webhook(provider: str, handler: str, payload: dict, raw_body: bytes) -> bool:
+    """Сохранить проверенный коллбек во входящую очередь до ответа провайдеру.
 
-def _spawn_webhook_bg(coro) -> None:
-    task = asyncio.create_task(coro)
-    _webhook_bg_tasks.add(task)
-    task.add_done_callback(_webhook_bg_tasks.discard)
-
-
-async def drain_webhook_bg_tasks(timeout: float = 30.0) -> None:
-    """Дождаться фоновых обработчиков вебхуков перед остановкой процесса.
-
-    Вебхук отвечает 200 сразу после проверки подписи, то есть провайдер уже
-    считает коллбек доставленным и повторять его не будет. Уйти в shutdown с
-    незавершёнными задачами значит потерять зачисление: деньги у провайдера
-    прошли, у нас — нет, и никто об этом не узнает.
-
-    Ждём с потолком, чтобы застрявшая задача не держала выкат бесконечно;
-    что не успело — пишем ошибкой, по ней платёж можно найти руками.
+    Провайдерам ниже отвечаем 200 независимо от исхода обработки, и после 200
+    коллбек они не повторят — поэтому обработка идёт не в запросе, а из
+    ``payment_webhook_inbox`` с повторами. False — сохранить не удалось (БД
+    недоступна): тогда вебхук отвечает ошибкой, чтобы провайдер доставил его снова.
     """
-    pending = [task for task in _webhook_bg_tasks if not task.done()]
-    if not pending:
-        return
-
-    logger.info('Дожидаемся фоновой обработки вебхуков перед остановкой', count=len(pending))
-    _, still_pending = await asyncio.wait(pending, timeout=timeout)
-    if still_pending:
-        logger.error(
-            'Фоновая обработка вебхуков не завершилась за отведённое время — '
-            'зачисление могло не примениться, проверьте платежи вручную',
-            count=len(still_pending),
-        )
+    try:
+        await payment_webhook_inbox.enqueue(provider, handler, payload, raw_body)
+    except Exception as error:
+        logger.exception('Не удалось сохранить платёжный вебхук во входящую очередь', provider=provider, error=error)
+        return False
+    return True
 
 
 def _create_cors_response() -> Response:
@@ -927,11 +909,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 return JSONResponse({'code': 13})
 
             # Обрабатываем платёж
-            await _process_payment_service_callback(
-                payment_service,
-                webhook_data,
-                'process_cloudpayments_pay_webhook',
-            )
+            if not await _enqueue_webhook('cloudpayments', 'process_cloudpayments_pay_webhook', webhook_data, raw_body):
+                return JSONResponse({'code': 13}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
 
             return JSONResponse({'code': 0})
 
@@ -962,11 +941,10 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 return JSONResponse({'code': 13})
 
             # Обрабатываем неуспешный платёж
-            await _process_payment_service_callback(
-                payment_service,
-                webhook_data,
-                'process_cloudpayments_fail_webhook',
-            )
+            if not await _enqueue_webhook(
+                'cloudpayments', 'process_cloudpayments_fail_webhook', webhook_data, raw_body
+            ):
+                return JSONResponse({'code': 13}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
 
             return JSONResponse({'code': 0})
 
@@ -1017,11 +995,10 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
 
                 if status_value in ('Declined', 'Cancelled'):
                     # Неуспешная оплата (Fail notification)
-                    await _process_payment_service_callback(
-                        payment_service,
-                        webhook_data,
-                        'process_cloudpayments_fail_webhook',
-                    )
+                    if not await _enqueue_webhook(
+                        'cloudpayments', 'process_cloudpayments_fail_webhook', webhook_data, raw_body
+                    ):
+                        return JSONResponse({'code': 13}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
                 elif status_value in ('Completed', 'Authorized') and is_pay_notification:
                     # Успешная оплата (Pay notification) - есть Reason или AuthCode
                     logger.info(
@@ -1030,11 +1007,10 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                         reason=reason,
                         auth_code=auth_code,
                     )
-                    await _process_payment_service_callback(
-                        payment_service,
-                        webhook_data,
-                        'process_cloudpayments_pay_webhook',
-                    )
+                    if not await _enqueue_webhook(
+                        'cloudpayments', 'process_cloudpayments_pay_webhook', webhook_data, raw_body
+                    ):
+                        return JSONResponse({'code': 13}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
                 else:
                     # Check notification или другой тип - просто разрешаем (code=0)
                     # Check приходит ДО оплаты для валидации, не зачисляем баланс
@@ -1319,19 +1295,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('SeverPay webhook: invalid signature')
                 return JSONResponse({'status': False}, status_code=status.HTTP_403_FORBIDDEN)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_severpay_webhook',
-                )
-                if not success:
-                    logger.error(
-                        'SeverPay webhook processing failed',
-                        data=payload.get('data'),
-                    )
-            except Exception as e:
-                logger.exception('SeverPay webhook processing error', error=e)
+            if not await _enqueue_webhook('severpay', 'process_severpay_webhook', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 {"status": true} — SeverPay retries on any non-200
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1369,19 +1334,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('PayPear webhook: invalid signature and IP', client_ip=client_ip)
                 return JSONResponse({'status': False}, status_code=status.HTTP_403_FORBIDDEN)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_paypear_webhook',
-                )
-                if not success:
-                    logger.error(
-                        'PayPear webhook processing failed',
-                        data=payload.get('object'),
-                    )
-            except Exception as e:
-                logger.exception('PayPear webhook processing error', error=e)
+            if not await _enqueue_webhook('paypear', 'process_paypear_webhook', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 — PayPear may retry on non-200
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1419,19 +1373,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('RollyPay webhook: invalid signature')
                 return JSONResponse({'status': False}, status_code=status.HTTP_403_FORBIDDEN)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_rollypay_webhook',
-                )
-                if not success:
-                    logger.error(
-                        'RollyPay webhook processing failed',
-                        data=payload.get('payment_id'),
-                    )
-            except Exception as e:
-                logger.exception('RollyPay webhook processing error', error=e)
+            if not await _enqueue_webhook('rollypay', 'process_rollypay_webhook', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 — RollyPay retries on non-200 with exponential backoff
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1494,19 +1437,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 except StopAsyncIteration:
                     pass
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_overpay_webhook',
-                )
-                if not success:
-                    logger.error(
-                        'Overpay webhook processing failed',
-                        data=payload.get('id'),
-                    )
-            except Exception as e:
-                logger.exception('Overpay webhook processing error', error=e)
+            if not await _enqueue_webhook('overpay', 'process_overpay_webhook', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 — Overpay expects HTTP 200
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1543,19 +1475,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('AuraPay webhook: invalid signature')
                 return JSONResponse({'status': False}, status_code=status.HTTP_403_FORBIDDEN)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_aurapay_webhook',
-                )
-                if not success:
-                    logger.error(
-                        'AuraPay webhook processing failed',
-                        data=payload.get('id'),
-                    )
-            except Exception as e:
-                logger.exception('AuraPay webhook processing error', error=e)
+            if not await _enqueue_webhook('aurapay', 'process_aurapay_webhook', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 — AuraPay retries on non-200 (5 attempts)
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1590,27 +1511,11 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('Etoplatezhi webhook: invalid signature')
                 return JSONResponse({'status': False}, status_code=status.HTTP_400_BAD_REQUEST)
 
-            # ACK instantly, process in background. Under callback bursts the
-            # synchronous processing made EtoPlatezhi's client time out
-            # (499/408) before we responded, triggering retries. The processor
-            # opens its own DB session and row-locks per payment, so concurrent
-            # callbacks stay safe. EtoPlatezhi still retries on non-200/timeout.
-            async def _process_etoplatezhi_bg() -> None:
-                try:
-                    success = await _process_payment_service_callback(
-                        payment_service,
-                        payload,
-                        'process_etoplatezhi_callback',
-                    )
-                    if not success:
-                        logger.error(
-                            'Etoplatezhi webhook processing failed',
-                            data=payload.get('payment', {}).get('id'),
-                        )
-                except Exception as e:
-                    logger.exception('Etoplatezhi webhook processing error', error=e)
-
-            _spawn_webhook_bg(_process_etoplatezhi_bg())
+            # Под пачкой коллбеков синхронная обработка не успевала ответить до
+            # таймаута клиента EtoPlatezhi (499/408), и платформа слала всё заново.
+            # Ответ уходит сразу после записи во входящую очередь.
+            if not await _enqueue_webhook('etoplatezhi', 'process_etoplatezhi_callback', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 — Etoplatezhi expects 200 for valid signature
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1646,19 +1551,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('Antilopay webhook: invalid signature')
                 return JSONResponse({'status': False}, status_code=status.HTTP_400_BAD_REQUEST)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_antilopay_callback',
-                )
-                if not success:
-                    logger.error(
-                        'Antilopay webhook processing failed',
-                        data=payload.get('payment_id'),
-                    )
-            except Exception as e:
-                logger.exception('Antilopay webhook processing error', error=e)
+            if not await _enqueue_webhook('antilopay', 'process_antilopay_callback', payload, raw_body):
+                return JSONResponse({'status': False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Always return 200 — Antilopay retries every 3min for 1hr on non-200
             return JSONResponse({'status': True}, status_code=status.HTTP_200_OK)
 
@@ -1692,19 +1586,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('Jupiter webhook: invalid signature')
                 return JSONResponse({'status': 'error'}, status_code=status.HTTP_400_BAD_REQUEST)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_jupiter_callback',
-                )
-                if not success:
-                    logger.error(
-                        'Jupiter webhook processing failed',
-                        transaction_id=payload.get('transaction_id'),
-                    )
-            except Exception as e:
-                logger.exception('Jupiter webhook processing error', error=e)
+            if not await _enqueue_webhook('jupiter', 'process_jupiter_callback', payload, raw_body):
+                return JSONResponse({'status': 'error'}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # FPGate ожидает HTTP 200 как подтверждение приёма callback
             return JSONResponse({'status': 'ok'}, status_code=status.HTTP_200_OK)
 
@@ -1750,21 +1633,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 else 'process_lava_callback'
             )
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    callback_method,
-                )
-                if not success:
-                    logger.error(
-                        'Lava webhook processing failed',
-                        order_id=payload.get('order_id'),
-                        invoice_id=payload.get('invoice_id'),
-                        handler=callback_method,
-                    )
-            except Exception as e:
-                logger.exception('Lava webhook processing error', error=e)
+            if not await _enqueue_webhook('lava', callback_method, payload, raw_body):
+                return JSONResponse({'status': 'error'}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Lava ожидает HTTP 200 как подтверждение приёма; иначе будет повтор до 5 раз раз в 150с
             return JSONResponse({'status': 'ok'}, status_code=status.HTTP_200_OK)
 
@@ -1853,19 +1723,8 @@ def create_payment_router(bot: Bot, payment_service: PaymentService) -> APIRoute
                 logger.warning('Donut webhook: invalid signature')
                 return JSONResponse({'status': 'error'}, status_code=status.HTTP_400_BAD_REQUEST)
 
-            try:
-                success = await _process_payment_service_callback(
-                    payment_service,
-                    payload,
-                    'process_donut_callback',
-                )
-                if not success:
-                    logger.error(
-                        'Donut webhook processing failed',
-                        transaction_id=payload.get('transaction_id'),
-                    )
-            except Exception as e:
-                logger.exception('Donut webhook processing error', error=e)
+            if not await _enqueue_webhook('donut', 'process_donut_callback', payload, raw_body):
+                return JSONResponse({'status': 'error'}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
             # Donut ожидает HTTP 200 как подтверждение приёма callback
             return JSONResponse({'status': 'ok'}, status_code=status.HTTP_200_OK)
 
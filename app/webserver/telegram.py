@@ -27,8 +27,52 @@ class TelegramWebhookOverloadedError(TelegramWebhookProcessorError):
     """Очередь переполнена и не успевает обрабатывать новые обновления."""
 
 
+class TelegramWebhookHotUserError(TelegramWebhookProcessorError):
+    """У одного пользователя скопилось слишком много необработанных обновлений."""
+
+
+def _resolve_update_key(update: Update) -> int | None:
+    """Ключ шардирования: пользователь, иначе чат; None — распределяем по update_id."""
+    try:
+        event = update.event
+    except Exception:  # pragma: no cover - неизвестный тип апдейта
+        return None
+    from_user = getattr(event, 'from_user', None)
+    if from_user is not None and getattr(from_user, 'id', None) is not None:
+        return int(from_user.id)
+    chat = getattr(event, 'chat', None)
+    if chat is not None and getattr(chat, 'id', None) is not None:
+        return int(chat.id)
+    return None
+
+
+def _is_floodable_update(update: Update) -> bool:
+    """Апдейты, которые можно отбросить при флуде: нажатия кнопок и обычные сообщения.
+
+    Платежи (``pre_checkout_query``, ``successful_payment``), членство в чатах и
+    прочие служебные апдейты лимит пользователя не ограничивает: их потеря
+    необратима — например, оплата Stars не будет зачислена.
+    """
+    if update.callback_query is not None:
+        return True
+    message = update.message
+    if message is None:
+        return False
+    return message.successful_payment is None and getattr(message, 'refunded_payment', None) is None
+
+
 class TelegramWebhookProcessor:
-    """Асинхронная очередь обработки Telegram webhook-ов."""
+    """Асинхронная очередь обработки Telegram webhook-ов.
+
+    По умолчанию одна общая очередь разбирается ``worker_count`` воркерами.
+    При ``shard_count > 0`` включается шардированный режим: апдейт попадает в
+    очередь шарда по id пользователя (или чата), у каждого шарда ровно один
+    воркер — апдейты одного пользователя обрабатываются строго по порядку, а
+    разные пользователи параллельно. ``per_user_max_pending`` ограничивает число
+    необработанных апдейтов одного пользователя: сверх лимита его нажатия кнопок
+    и сообщения отбрасываются, не забивая очередь остальным. Платёжные и
+    служебные апдейты ставятся в очередь всегда.
+    """
 
     def __init__(
         self,
@@ -39,6 +83,8 @@ class TelegramWebhookProcessor:
         worker_count: int,
         enqueue_timeout: float,
         shutdown_timeout: float,
+        shard_count: int = 0,
+        per_user_max_pending: int = 0,
     ) -> None:
         self._bot = bot
         self._dispatcher = dispatcher
@@ -46,41 +92,74 @@ class TelegramWebhookProcessor:
         self._worker_count = max(0, worker_count)
         self._enqueue_timeout = max(0.0, enqueue_timeout)
         self._shutdown_timeout = max(1.0, shutdown_timeout)
-        self._queue: asyncio.Queue[Update | object] = asyncio.Queue(maxsize=self._queue_maxsize)
+        self._shard_count = max(0, shard_count)
+        self._per_user_max_pending = max(0, per_user_max_pending)
+        self._queues: list[asyncio.Queue[tuple[int | None, Update] | object]] = self._build_queues()
         self._workers: list[asyncio.Task[None]] = []
         self._running = False
         self._stop_sentinel: object = object()
         self._lifecycle_lock = asyncio.Lock()
+        self._pending_by_key: dict[int, int] = {}
+        self._dropped_hot_user = 0
+        self._rejected_overloaded = 0
+        self._processed = 0
 
     @property
     def is_running(self) -> bool:
         return self._running
 
+    @property
+    def is_sharded(self) -> bool:
+        return self._shard_count > 0
+
+    @property
+    def _queue(self) -> asyncio.Queue:
+        # Общая очередь несшардированного режима (и первая очередь шардов).
+        return self._queues[0]
+
+    def _build_queues(self) -> list[asyncio.Queue]:
+        if not self.is_sharded:
+            return [asyncio.Queue(maxsize=self._queue_maxsize)]
+        shard_maxsize = max(1, self._queue_maxsize // self._shard_count)
+        return [asyncio.Queue(maxsize=shard_maxsize) for _ in range(self._shard_count)]
+
+    def _effective_worker_count(self) -> int:
+        if not self._worker_count:
+            return 0
+        return self._shard_count if self.is_sharded else self._worker_count
+
     async def start(self) -> None:
         async with self._lifecycle_lock:
             if self._running:
                 return
 
             self._running = True
-            self._queue = asyncio.Queue(maxsize=self._queue_maxsize)
+            self._queues = self._build_queues()
+            self._pending_by_key.clear()
             self._workers.clear()
 
-            for index in range(self._worker_count):
+            for index in range(self._effective_worker_count()):
+                queue_index = index if self.is_sharded else 0
                 task = asyncio.create_task(
-                    self._worker_loop(index),
+                    self._worker_loop(index, self._queues[queue_index]),
                     name=f'telegram-webhook-worker-{index}',
                 )
                 self._workers.append(task)
 
-            if self._worker_count:
+            if self._workers:
                 logger.info(
                     '🚀 Telegram webhook processor запущен',
-                    worker_count=self._worker_count,
+                    worker_count=len(self._workers),
                     queue_maxsize=self._queue_maxsize,
+                    shard_count=self._shard_count,
+                    per_user_max_pending=self._per_user_max_pending,
                 )
             else:
                 logger.warning('Telegram webhook processor запущен без воркеров — обновления не будут обрабатываться')
 
+    async def _join_all(self) -> None:
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
     async def stop(self) -> None:
         async with self._lifecycle_lock:
             if not self._running:
@@ -88,9 +167,9 @@ class TelegramWebhookProcessor:
 
             self._running = False
 
-            if self._worker_count > 0:
+            if self._workers:
                 try:
-                    await asyncio.wait_for(self._queue.join(), timeout=self._shutdown_timeout)
+                    await asyncio.wait_for(self._join_all(), timeout=self._shutdown_timeout)
                 except TimeoutError:
                     logger.warning(
                         '⏱️ Не удалось дождаться завершения очереди Telegram webhook',
@@ -98,65 +177,110 @@ class TelegramWebhookProcessor:
                     )
             else:
                 drained = 0
-                while not self._queue.empty():
-                    try:
-                        self._queue.get_nowait()
-                    except asyncio.QueueEmpty:  # pragma: no cover - гонка состояния
-                        break
-                    else:
-                        drained += 1
-                        self._queue.task_done()
+                for queue in self._queues:
+                    while not queue.empty():
+                        try:
+                            queue.get_nowait()
+                        except asyncio.QueueEmpty:  # pragma: no cover - гонка состояния
+                            break
+                        else:
+                            drained += 1
+                            queue.task_done()
                 if drained:
                     logger.warning('Очередь Telegram webhook остановлена без воркеров', drained=drained)
 
-            for _ in range(len(self._workers)):
+            for index in range(len(self._workers)):
+                queue = self._queues[index if self.is_sharded else 0]
                 try:
-                    self._queue.put_nowait(self._stop_sentinel)
+                    queue.put_nowait(self._stop_sentinel)
                 except asyncio.QueueFull:
                     # Очередь переполнена, подождём пока освободится место
-                    await self._queue.put(self._stop_sentinel)
+                    await queue.put(self._stop_sentinel)
 
             if self._workers:
                 await asyncio.gather(*self._workers, return_exceptions=True)
             self._workers.clear()
+            self._pending_by_key.clear()
             logger.info('🛑 Telegram webhook processor остановлен')
 
     async def enqueue(self, update: Update) -> None:
         if not self._running:
             raise TelegramWebhookProcessorNotRunningError
 
+        key: int | None = None
+        queue = self._queue
+        if self.is_sharded:
+            key = _resolve_update_key(update)
+            shard_source = key if key is not None else update.update_id
+            queue = self._queues[abs(shard_source) % self._shard_count]
+
+            if key is not None and self._per_user_max_pending and _is_floodable_update(update):
+                if self._pending_by_key.get(key, 0) >= self._per_user_max_pending:
+                    self._dropped_hot_user += 1
+                    raise TelegramWebhookHotUserError(key)
+
         try:
             if self._enqueue_timeout <= 0:
-                self._queue.put_nowait(update)
+                queue.put_nowait((key, update))
             else:
-                await asyncio.wait_for(self._queue.put(update), timeout=self._enqueue_timeout)
+                await asyncio.wait_for(queue.put((key, update)), timeout=self._enqueue_timeout)
         except asyncio.QueueFull as error:  # pragma: no cover - защитный сценарий
+            self._rejected_overloaded += 1
             raise TelegramWebhookOverloadedError from error
         except TimeoutError as error:
+            self._rejected_overloaded += 1
             raise TelegramWebhookOverloadedError from error
 
+        if key is not None:
+            self._pending_by_key[key] = self._pending_by_key.get(key, 0) + 1
+
     async def wait_until_drained(self, timeout: float | None = None) -> None:
-        if not self._running or self._worker_count == 0:
+        if not self._running or not self._workers:
             return
         if timeout is None:
-            await self._queue.join()
+            await self._join_all()
             return
-        await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        await asyncio.wait_for(self._join_all(), timeout=timeout)
 
-    async def _worker_loop(self, worker_id: int) -> None:
+    def _release_key(self, key: int | None) -> None:
+        if key is None:
+            return
+        remaining = self._pending_by_key.get(key, 0) - 1
+        if remaining > 0:
+            self._pending_by_key[key] = remaining
+        else:
+            self._pending_by_key.pop(key, None)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            'mode': 'sharded' if self.is_sharded else 'shared',
+            'running': self._running,
+            'workers': len(self._workers),
+            'shard_count': self._shard_count,
+            'queue_depths': [queue.qsize() for queue in self._queues],
+            'queue_maxsize': self._queue_maxsize,
+            'per_user_max_pending': self._per_user_max_pending,
+            'users_pending': len(self._pending_by_key),
+            'max_user_pending': max(self._pending_by_key.values(), default=0),
+            'dropped_hot_user': self._dropped_hot_user,
+            'rejected_overloaded': self._rejected_overloaded,
+            'processed': self._processed,
+        }
+
+    async def _worker_loop(self, worker_id: int, queue: asyncio.Queue) -> None:
         try:
             while True:
                 try:
-                    item = await self._queue.get()
+                    item = await queue.get()
                 except asyncio.CancelledError:  # pragma: no cover - остановка приложения
                     logger.debug('Worker cancelled', worker_id=worker_id)
                     raise
 
                 if item is self._stop_sentinel:
-                    self._queue.task_done()
+                    queue.task_done()
                     break
 
-                update = item
+                key, update = item
                 try:
                     await self._dispatcher.feed_update(self._bot, update)  # type: ignore[arg-type]
                 except asyncio.CancelledError:  # pragma: no cover - остановка приложения
@@ -165,7 +289,9 @@ class TelegramWebhookProcessor:
                 except Exception as error:  # pragma: no cover - логируем сбой обработчика
                     logger.exception('Ошибка обработки Telegram update в worker', worker_id=worker_id, error=error)
                 finally:
-                    self._queue.task_done()
+                    self._processed += 1
+                    self._release_key(key)
+                    queue.task_done()
         finally:
             logger.debug('Worker завершён', worker_id=worker_id)
 
@@ -180,6 +306,12 @@ async def _dispatch_update(
     if processor is not None:
         try:
             await processor.enqueue(update)
+        except TelegramWebhookHotUserError as error:
+            # Отвечаем 200: иначе Telegram будет повторять апдейт и держать
+            # доставку всем остальным. Лишние апдейты одного пользователя
+            # (флуд кнопками) просто отбрасываем.
+            logger.warning('Апдейт отброшен: у пользователя переполнена очередь', key=error.args[0])
+            return
         except TelegramWebhookOverloadedError as error:
             logger.warning('Очередь Telegram webhook переполнена', error=error)
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='webhook_queue_full') from error
@@ -240,6 +372,8 @@ def create_telegram_router(
                 'webhook_configured': bool(settings.get_telegram_webhook_url()),
                 'queue_maxsize': settings.get_webhook_queue_maxsize(),
                 'workers': settings.get_webhook_worker_count(),
+                'shard_count': settings.get_webhook_shard_count(),
+                'processor': processor.get_stats() if processor is not None else None,
             }
         )
 
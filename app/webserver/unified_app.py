@@ -13,8 +13,12 @@ from fastapi.staticfiles import StaticFiles
 
 from app.cabinet.apple_iap import apple_iap_only_router
 from app.config import settings
+from app.external.http_transport import http_transport
+from app.external.remnawave_session_pool import remnawave_session_pool
 from app.services.disposable_email_service import disposable_email_service
 from app.services.payment_service import PaymentService
+from app.services.payment_webhook_inbox import payment_webhook_inbox
+from app.utils.catalog_cache import catalog_cache
 from app.webapi.docs import add_redoc_endpoint
 
 from . import payments, telegram
@@ -184,11 +188,13 @@ def create_unified_app(
     if payments_router:
         app.include_router(payments_router)
 
-        # ПЕРВЫМ в порядке shutdown: часть платёжных вебхуков отвечает 200 сразу
-        # и дорабатывает в фоне, а провайдер после 200 коллбек не повторит. Дренаж
-        # обязан отработать, пока живы и telegram-процессор (фон шлёт уведомление
-        # о зачислении), и пул БД — то есть до всех остановок ниже.
-        shutdown_handlers.append(payments.drain_webhook_bg_tasks)
+        # Часть платёжных вебхуков отвечает 200 сразу после записи во входящую
+        # очередь, а обрабатывают её воркеры. Останавливаем их ПЕРВЫМИ, пока живы
+        # telegram-процессор (обработка шлёт уведомление о зачислении) и пул БД;
+        # прерванные попытки не теряются — строки вернутся в работу после аренды.
+        payment_webhook_inbox.set_payment_service(payment_service)
+        startup_handlers.append(payment_webhook_inbox.start)
+        shutdown_handlers.append(payment_webhook_inbox.stop)
 
     # Mount RemnaWave incoming webhook router
     remnawave_webhook_enabled = settings.is_remnawave_webhook_enabled()
@@ -238,6 +244,8 @@ def create_unified_app(
             worker_count=settings.get_webhook_worker_count(),
             enqueue_timeout=settings.get_webhook_enqueue_timeout(),
             shutdown_timeout=settings.get_webhook_shutdown_timeout(),
+            shard_count=settings.get_webhook_shard_count(),
+            per_user_max_pending=settings.get_webhook_per_user_max_pending(),
         )
         app.state.telegram_webhook_processor = telegram_processor
 
@@ -285,6 +293,8 @@ def create_unified_app(
             'secret_configured': bool(settings.WEBHOOK_SECRET_TOKEN),
             'queue_maxsize': settings.get_webhook_queue_maxsize(),
             'workers': settings.get_webhook_worker_count(),
+            'shard_count': settings.get_webhook_shard_count(),
+            'processor': telegram_processor.get_stats() if telegram_processor else None,
         }
 
         payment_state = {
@@ -312,6 +322,9 @@ def create_unified_app(
                 'telegram_webhook': telegram_state,
                 'remnawave_webhook': remnawave_webhook_state,
                 'miniapp_static': miniapp_state,
+                'remnawave_api_pool': remnawave_session_pool.get_stats(),
+                'payment_http_transport': http_transport.get_stats(),
+                'catalog_cache': catalog_cache.get_stats(),
             }
         )
 
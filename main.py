@@ -15,11 +15,15 @@ from app.config import settings
 from app.database.database import sync_postgres_sequences
 from app.database.migrations import run_alembic_upgrade
 from app.database.models import PaymentMethod
+from app.external.http_transport import http_transport
+from app.external.remnawave_session_pool import remnawave_session_pool
 from app.localization.loader import ensure_locale_templates
 from app.logging_config import _resolve_log_level, setup_logging
 from app.services.backup_service import backup_service
 from app.services.ban_notification_service import ban_notification_service
 from app.services.broadcast_service import broadcast_service
+from app.services.button_click_log_service import button_click_log_writer
+from app.services.cluster_event_bus import cluster_event_bus
 from app.services.contest_rotation_service import contest_rotation_service
 from app.services.daily_subscription_service import daily_subscription_service
 from app.services.grace_access_runtime import grace_access_runtime
@@ -35,14 +39,17 @@ from app.services.payment_verification_service import (
     get_enabled_auto_methods,
     method_display_name,
 )
+from app.services.referral_branch_service import referral_branch_service
 from app.services.referral_contest_service import referral_contest_service
 from app.services.remnawave_sync_service import remnawave_sync_service
 from app.services.reporting_service import reporting_service
-from app.services.riopay_service import riopay_service
+from app.services.stats_rollup_service import stats_rollup_service
 from app.services.system_settings_service import bot_configuration_service
 from app.services.traffic_monitoring_service import traffic_monitoring_scheduler
+from app.services.user_activity_service import user_activity_coalescer
 from app.services.version_service import version_service
 from app.services.web_api_token_service import ensure_default_web_api_token
+from app.services.webhook_service import webhook_service
 from app.utils.log_handlers import ExcludePaymentFilter, LevelFilterHandler
 from app.utils.payment_logger import configure_payment_logger
 from app.utils.startup_timeline import StartupTimeline
@@ -316,6 +323,12 @@ async def main():
         monitoring_service.bot = bot
         maintenance_service.set_bot(bot)
         broadcast_service.set_bot(bot)
+        try:
+            resumed_broadcasts = await broadcast_service.resume_interrupted()
+            if resumed_broadcasts:
+                logger.info('Продолжены прерванные рассылки', count=resumed_broadcasts)
+        except Exception as e:
+            logger.error('Не удалось продолжить прерванные рассылки', error=e)
         ban_notification_service.set_bot(bot)
         traffic_monitoring_scheduler.set_bot(bot)
         daily_subscription_service.set_bot(bot)
@@ -367,6 +380,69 @@ async def main():
                 stage.warning(f'Ошибка инициализации сервиса бекапов: {e}')
                 logger.error('❌ Ошибка инициализации сервиса бекапов', error=e)
 
+        async with timeline.stage(
+            'Пакетная запись активности',
+            '🕒',
+            success_message='Коалесцер last_activity готов',
+        ) as stage:
+            try:
+                await user_activity_coalescer.start()
+                if not user_activity_coalescer.is_running():
+                    stage.skip('Коалесцирование активности отключено настройками')
+            except Exception as e:
+                stage.warning(f'Ошибка запуска коалесцера активности: {e}')
+                logger.error('❌ Ошибка запуска коалесцера активности', error=e)
+
+        async with timeline.stage(
+            'Пакетная запись кликов',
+            '🖱️',
+            success_message='Буфер кликов по кнопкам готов',
+        ) as stage:
+            try:
+                await button_click_log_writer.start()
+                if not button_click_log_writer.is_running():
+                    stage.skip('Пакетная запись кликов отключена настройками')
+            except Exception as e:
+                stage.warning(f'Ошибка запуска записи кликов: {e}')
+                logger.error('❌ Ошибка запуска пакетной записи кликов', error=e)
+
+        async with timeline.stage(
+            'Кластерная шина событий',
+            '🔀',
+            success_message='События WebSocket доставляются на все реплики',
+        ) as stage:
+            try:
+                await cluster_event_bus.start()
+                if not cluster_event_bus.is_running():
+                    stage.skip('Кластерный режим отключен настройками')
+            except Exception as e:
+                stage.warning(f'Ошибка запуска кластерной шины событий: {e}')
+                logger.error('❌ Ошибка запуска кластерной шины событий', error=e)
+
+        async with timeline.stage(
+            'Дневные агрегаты статистики',
+            '📈',
+            success_message='Агрегаты статистики обновляются в фоне',
+        ) as stage:
+            try:
+                await stats_rollup_service.start()
+                if not stats_rollup_service.is_running():
+                    stage.skip('Дневные агрегаты статистики отключены настройками')
+            except Exception as e:
+                stage.warning(f'Ошибка запуска агрегатов статистики: {e}')
+                logger.error('❌ Ошибка запуска сервиса дневных агрегатов статистики', error=e)
+
+        async with timeline.stage(
+            'Итоги реферальных веток',
+            '🌳',
+            success_message='Итоги веток пересчитываются в фоне',
+        ) as stage:
+            try:
+                await referral_branch_service.start()
+            except Exception as e:
+                stage.warning(f'Ошибка запуска пересчёта итогов веток: {e}')
+                logger.error('❌ Ошибка запуска сервиса итогов реферальных веток', error=e)
+
         async with timeline.stage(
             'Сервис отчетов',
             '📊',
@@ -516,9 +592,12 @@ async def main():
             if settings.is_payment_verification_auto_check_enabled():
                 auto_methods = get_enabled_auto_methods()
                 if auto_methods:
+                    min_seconds = settings.get_payment_verification_min_recheck_seconds()
                     interval_minutes = settings.get_payment_verification_auto_check_interval()
                     auto_labels = ', '.join(sorted(method_display_name(method) for method in auto_methods))
-                    stage.log(f'Автопроверка каждые {interval_minutes} мин: {auto_labels}')
+                    stage.log(
+                        f'Автопроверка по возрасту счёта (от {min_seconds} с до {interval_minutes} мин): {auto_labels}'
+                    )
                 else:
                     stage.log('Автопроверка включена, но нет активных провайдеров')
             else:
@@ -957,6 +1036,42 @@ async def main():
         except Exception as e:
             logger.error('Ошибка остановки очереди чеков NaloGO', error=e)
 
+        logger.info('ℹ️ Сброс накопленной активности пользователей...')
+        try:
+            await user_activity_coalescer.stop()
+        except Exception as e:
+            logger.error('Ошибка остановки коалесцера активности', error=e)
+
+        logger.info('ℹ️ Сброс буфера кликов по кнопкам...')
+        try:
+            await button_click_log_writer.stop()
+        except Exception as e:
+            logger.error('Ошибка остановки записи кликов', error=e)
+
+        logger.info('ℹ️ Остановка кластерной шины событий...')
+        try:
+            await cluster_event_bus.stop()
+        except Exception as e:
+            logger.error('Ошибка остановки кластерной шины событий', error=e)
+
+        logger.info('ℹ️ Доставка оставшихся webhooks...')
+        try:
+            await webhook_service.close()
+        except Exception as e:
+            logger.error('Ошибка остановки очереди webhooks', error=e)
+
+        logger.info('ℹ️ Остановка сервиса дневных агрегатов статистики...')
+        try:
+            await stats_rollup_service.stop()
+        except Exception as e:
+            logger.error('Ошибка остановки сервиса дневных агрегатов статистики', error=e)
+
+        logger.info('ℹ️ Остановка сервиса итогов реферальных веток...')
+        try:
+            await referral_branch_service.stop()
+        except Exception as e:
+            logger.error('Ошибка остановки сервиса итогов реферальных веток', error=e)
+
         logger.info('ℹ️ Остановка сервиса бекапов...')
         try:
             await backup_service.stop_auto_backup()
@@ -987,9 +1102,14 @@ async def main():
                 logger.error('Ошибка остановки веб-API', error=error)
 
         try:
-            await riopay_service.close()
+            await http_transport.close()
+        except Exception as e:
+            logger.error('Ошибка закрытия HTTP-транспорта платёжных шлюзов', error=e)
+
+        try:
+            await remnawave_session_pool.close()
         except Exception as e:
-            logger.error('Ошибка закрытия сессии RioPay', error=e)
+            logger.error('Ошибка закрытия пула соединений RemnaWave', error=e)
 
         if 'bot' in locals():
             try:
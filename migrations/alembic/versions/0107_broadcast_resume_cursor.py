@@ -0,0 +1,46 @@
+"""broadcast_history: курсор продолжения рассылки
+
+Revision ID: 0107
+Revises: 0106
+Create Date: 2026-10-17
+
+Добавляет ``resume_cursor`` и ``resume_state`` в ``broadcast_history``.
+Telegram-рассылка периодически сохраняет курсор — ключ получателя, до
+которого включительно всё уже отправлено, — и после рестарта бота
+продолжает с него, а не теряет прогресс. ``resume_state`` хранит выбранные
+кнопки, которых нет в остальных колонках записи.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0107'
+down_revision: Union[str, None] = '0106'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'broadcast_history' not in inspector.get_table_names():
+        return
+    existing = {col['name'] for col in inspector.get_columns('broadcast_history')}
+    if 'resume_cursor' not in existing:
+        op.add_column('broadcast_history', sa.Column('resume_cursor', sa.BigInteger(), nullable=True))
+    if 'resume_state' not in existing:
+        op.add_column('broadcast_history', sa.Column('resume_state', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'broadcast_history' not in inspector.get_table_names():
+        return
+    existing = {col['name'] for col in inspector.get_columns('broadcast_history')}
+    if 'resume_state' in existing:
+        op.drop_column('broadcast_history', 'resume_state')
+    if 'resume_cursor' in existing:
+        op.drop_column('broadcast_history', 'resume_cursor')
@@ -0,0 +1,59 @@
+"""daily_transaction_rollups / daily_subscription_rollups: дневные агрегаты статистики
+
+Revision ID: 0108
+Revises: 0107
+Create Date: 2026-10-17
+
+Таблицы дневных агрегатов для админ-дашборда и статистики продаж. Их
+заполняет ``stats_rollup_service`` (первичный бэкфилл при старте, затем
+пересчёт затронутых дней и ночная сверка), поэтому миграция данных не
+переносит.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0108'
+down_revision: Union[str, None] = '0107'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    if 'daily_transaction_rollups' not in tables:
+        op.create_table(
+            'daily_transaction_rollups',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('type', sa.String(length=50), nullable=False),
+            sa.Column('payment_method', sa.String(length=50), nullable=False, server_default=''),
+            sa.Column('transactions_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('amount_kopeks', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('day', 'type', 'payment_method'),
+        )
+
+    if 'daily_subscription_rollups' not in tables:
+        op.create_table(
+            'daily_subscription_rollups',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('registrations', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('trials_started', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('trial_conversions', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('day'),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    if 'daily_subscription_rollups' in tables:
+        op.drop_table('daily_subscription_rollups')
+    if 'daily_transaction_rollups' in tables:
+        op.drop_table('daily_transaction_rollups')
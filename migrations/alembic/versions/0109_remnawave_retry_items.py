@@ -0,0 +1,48 @@
+"""remnawave_retry_items: персистентная очередь повторной синхронизации с панелью
+
+Revision ID: 0109
+Revises: 0108
+Create Date: 2026-10-17
+
+Раньше очередь ``remnawave_retry_queue`` жила только в памяти процесса, и
+деплой во время недоступности панели терял отложенные create/update — оплаченные
+подписки оставались без пользователя в панели. Одна строка на подписку.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0109'
+down_revision: Union[str, None] = '0108'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if 'remnawave_retry_items' in sa.inspect(bind).get_table_names():
+        return
+
+    op.create_table(
+        'remnawave_retry_items',
+        sa.Column('subscription_id', sa.Integer(), nullable=False, autoincrement=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.String(length=16), nullable=False, server_default='create'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('subscription_id'),
+    )
+    op.create_index('ix_remnawave_retry_items_next_attempt', 'remnawave_retry_items', ['next_attempt_at'])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if 'remnawave_retry_items' in sa.inspect(bind).get_table_names():
+        op.drop_index('ix_remnawave_retry_items_next_attempt', table_name='remnawave_retry_items')
+        op.drop_table('remnawave_retry_items')
@@ -0,0 +1,159 @@
+"""users.search_text: нормализованная колонка для админ-поиска пользователей
+
+Revision ID: 0110
+Revises: 0109
+Create Date: 2026-10-17
+
+Поиск пользователей в админке OR-ил до пяти регистровых вариантов ``%term%`` по
+нескольким колонкам (обход ASCII-only ILIKE под локалью ``C``) — такой запрос не
+может использовать индекс и на каждый поиск читает всю ``users``.
+
+``search_text`` хранит имя, фамилию, ``@username``, email и реферальный код,
+нормализованные на стороне приложения (casefold, «ё» → «е», транслитерация
+кириллицы — ``app.utils.text_search.build_user_search_text``; миграция держит
+копию нормализатора на момент своего создания, чтобы её результат не зависел
+от последующих правок кода приложения), поэтому искать
+можно одним ``LIKE``. На PostgreSQL по колонке строится GIN-индекс ``pg_trgm``,
+который обслуживает ``LIKE '%term%'``. Индекс строится ``CONCURRENTLY`` вне
+транзакции, как и остальные индексы на ``users`` (см. 0086). Если расширение
+``pg_trgm`` недоступно, колонка всё равно заполняется и поиск работает, но
+без индекса. На SQLite триграммных индексов нет: там поиск остаётся одним
+``LIKE`` по уже нормализованной колонке.
+
+Колонку дальше поддерживают ORM-хуки модели ``User``; здесь заполняются
+существующие строки пачками по первичному ключу.
+"""
+
+import re
+import unicodedata
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import structlog
+from alembic import op
+
+revision: str = '0110'
+down_revision: Union[str, None] = '0109'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = structlog.get_logger(__name__)
+
+INDEX_NAME = 'ix_users_search_text_trgm'
+_BACKFILL_BATCH = 5000
+
+# Копия app.utils.text_search на момент миграции — не импортируем код приложения.
+_TRANSLIT = str.maketrans(
+    {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z',
+        'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+        'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch',
+        'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+        'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g', 'ў': 'u',
+    }
+)  # fmt: skip
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(value: str | None) -> str:
+    if not value:
+        return ''
+    normalized = unicodedata.normalize('NFKC', value).casefold().replace('ё', 'е')
+    return _WHITESPACE_RE.sub(' ', normalized).strip()
+
+
+def build_user_search_text(row) -> str | None:
+    username = _normalize(row.username).lstrip('@')
+    parts = [
+        _normalize(row.first_name),
+        _normalize(row.last_name),
+        f'@{username}' if username else '',
+        _normalize(row.email),
+        _normalize(row.referral_code),
+    ]
+    parts = [part for part in parts if part]
+    parts += [
+        latin for latin in (part.translate(_TRANSLIT) for part in parts if not part.isascii()) if latin not in parts
+    ]
+    return ' '.join(parts) or None
+
+
+def _backfill(bind: sa.Connection) -> None:
+    users = sa.table(
+        'users',
+        sa.column('id', sa.Integer),
+        sa.column('first_name', sa.String),
+        sa.column('last_name', sa.String),
+        sa.column('username', sa.String),
+        sa.column('email', sa.String),
+        sa.column('referral_code', sa.String),
+        sa.column('search_text', sa.Text),
+    )
+    update_stmt = users.update().where(users.c.id == sa.bindparam('user_id')).values(search_text=sa.bindparam('value'))
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                users.c.id,
+                users.c.first_name,
+                users.c.last_name,
+                users.c.username,
+                users.c.email,
+                users.c.referral_code,
+            )
+            .where(users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(_BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        values = [
+            {'user_id': row.id, 'value': value} for row in rows if (value := build_user_search_text(row)) is not None
+        ]
+        if values:
+            bind.execute(update_stmt, values)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'users' not in inspector.get_table_names():
+        return
+
+    if 'search_text' not in {column['name'] for column in inspector.get_columns('users')}:
+        op.add_column('users', sa.Column('search_text', sa.Text(), nullable=True))
+
+    _backfill(bind)
+
+    if bind.dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        try:
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except Exception as error:
+            logger.warning(
+                'Расширение pg_trgm недоступно, поиск пользователей будет работать без индекса',
+                error=error,
+            )
+            return
+        op.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON users USING gin (search_text gin_trgm_ops)'
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'users' not in inspector.get_table_names():
+        return
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+    if 'search_text' in {column['name'] for column in inspector.get_columns('users')}:
+        with op.batch_alter_table('users') as batch:
+            batch.drop_column('search_text')
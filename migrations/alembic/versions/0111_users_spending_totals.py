@@ -0,0 +1,129 @@
+"""users: нарастающие итоги трат и индексы keyset-пагинации админского списка
+
+Revision ID: 0111
+Revises: 0110
+Create Date: 2026-10-17
+
+Сортировка админского списка по тратам/числу покупок join-ила агрегат по всем
+транзакциям, а для страницы траты агрегировались ещё раз. Теперь итоги лежат в
+``users`` (``total_spent_kopeks``, ``purchase_count``, ``last_purchase_at``) и
+ведутся ORM-хуками ``Transaction``; здесь они заполняются по существующим
+транзакциям по тем же правилам — завершённые оплаты подписок.
+
+Индексы ``(ключ, created_at, id)`` обслуживают keyset-пагинацию списка. На
+PostgreSQL они строятся ``CONCURRENTLY`` вне транзакции (см. 0086).
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0111'
+down_revision: Union[str, None] = '0110'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = {
+    'ix_users_created_id': ('created_at', 'id'),
+    'ix_users_balance_created_id': ('balance_kopeks', 'created_at', 'id'),
+    'ix_users_total_spent_created_id': ('total_spent_kopeks', 'created_at', 'id'),
+    'ix_users_purchase_count_created_id': ('purchase_count', 'created_at', 'id'),
+}
+
+COLUMNS = (
+    sa.Column('total_spent_kopeks', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('purchase_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_purchase_at', sa.DateTime(timezone=True), nullable=True),
+)
+
+
+def _backfill(bind: sa.Connection) -> None:
+    users = sa.table(
+        'users',
+        sa.column('id', sa.Integer),
+        sa.column('total_spent_kopeks', sa.BigInteger),
+        sa.column('purchase_count', sa.Integer),
+        sa.column('last_purchase_at', sa.DateTime(timezone=True)),
+    )
+    transactions = sa.table(
+        'transactions',
+        sa.column('user_id', sa.Integer),
+        sa.column('type', sa.String),
+        sa.column('amount_kopeks', sa.Integer),
+        sa.column('is_completed', sa.Boolean),
+        sa.column('created_at', sa.DateTime(timezone=True)),
+        sa.column('completed_at', sa.DateTime(timezone=True)),
+    )
+    totals = (
+        sa.select(
+            transactions.c.user_id,
+            sa.func.sum(sa.func.abs(transactions.c.amount_kopeks)).label('total_spent'),
+            sa.func.count().label('purchase_count'),
+            sa.func.max(sa.func.coalesce(transactions.c.completed_at, transactions.c.created_at)).label('last_at'),
+        )
+        .where(
+            transactions.c.type == 'subscription_payment',
+            transactions.c.is_completed.is_(True),
+        )
+        .group_by(transactions.c.user_id)
+        .subquery()
+    )
+    bind.execute(
+        users.update()
+        .where(users.c.id == totals.c.user_id)
+        .values(
+            total_spent_kopeks=totals.c.total_spent,
+            purchase_count=totals.c.purchase_count,
+            last_purchase_at=totals.c.last_at,
+        )
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if 'users' not in tables:
+        return
+
+    existing_columns = {column['name'] for column in inspector.get_columns('users')}
+    added = [column for column in COLUMNS if column.name not in existing_columns]
+    for column in added:
+        op.add_column('users', column)
+    if added and 'transactions' in tables:
+        _backfill(bind)
+
+    existing_indexes = {index['name'] for index in inspector.get_indexes('users')}
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES.items():
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users ({", ".join(columns)})')
+    else:
+        for name, columns in INDEXES.items():
+            if name not in existing_indexes:
+                op.create_index(name, 'users', list(columns), unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'users' not in inspector.get_table_names():
+        return
+
+    existing_indexes = {index['name'] for index in inspector.get_indexes('users')}
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name in INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    else:
+        for name in INDEXES:
+            if name in existing_indexes:
+                op.drop_index(name, table_name='users')
+
+    existing_columns = {column['name'] for column in inspector.get_columns('users')}
+    with op.batch_alter_table('users') as batch:
+        for column in COLUMNS:
+            if column.name in existing_columns:
+                batch.drop_column(column.name)
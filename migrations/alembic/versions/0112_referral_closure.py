@@ -0,0 +1,113 @@
+"""referral_closure: транзитивное замыкание реферального дерева и итоги веток
+
+Revision ID: 0112
+Revises: 0111
+Create Date: 2026-10-17
+
+Аналитика реферальной сети на каждый запрос обходила ``referred_by_id``
+рекурсивными CTE (ветки, цепочки рефереров) и агрегировала транзакции веток.
+``referral_closure`` хранит строку на каждую пару «предок — потомок» с глубиной,
+а ``users.referral_branch_size``/``referral_branch_spent_kopeks`` — размер и траты
+всей ветки; дальше их ведут ORM-хуки ``User``/``Transaction``.
+
+Здесь замыкание заполняется одним рекурсивным обходом (глубина ограничена 50,
+как в старых CTE, — это же отсекает циклы), итоги веток считаются по нему.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0112'
+down_revision: Union[str, None] = '0111'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLE_NAME = 'referral_closure'
+INDEX_NAME = 'ix_referral_closure_descendant_depth'
+MAX_DEPTH = 50
+
+COLUMNS = (
+    sa.Column('referral_branch_size', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('referral_branch_spent_kopeks', sa.BigInteger(), nullable=False, server_default='0'),
+)
+
+
+def _backfill(bind: sa.Connection) -> None:
+    bind.execute(
+        sa.text(
+            f"""
+            WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+                SELECT referred_by_id, id, 1 FROM users WHERE referred_by_id IS NOT NULL
+                UNION ALL
+                SELECT u.referred_by_id, walk.descendant_id, walk.depth + 1
+                FROM walk JOIN users u ON u.id = walk.ancestor_id
+                WHERE u.referred_by_id IS NOT NULL AND walk.depth < {MAX_DEPTH}
+            )
+            INSERT INTO {TABLE_NAME} (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM walk
+            WHERE ancestor_id <> descendant_id
+            GROUP BY ancestor_id, descendant_id
+            """
+        )
+    )
+    bind.execute(
+        sa.text(
+            f"""
+            UPDATE users SET
+                referral_branch_size = (
+                    SELECT COUNT(*) FROM {TABLE_NAME} c WHERE c.ancestor_id = users.id
+                ),
+                referral_branch_spent_kopeks = (
+                    SELECT COALESCE(SUM(d.total_spent_kopeks), 0)
+                    FROM {TABLE_NAME} c JOIN users d ON d.id = c.descendant_id
+                    WHERE c.ancestor_id = users.id
+                )
+            WHERE id IN (SELECT ancestor_id FROM {TABLE_NAME})
+            """
+        )
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if 'users' not in tables:
+        return
+
+    existing_columns = {column['name'] for column in inspector.get_columns('users')}
+    for column in COLUMNS:
+        if column.name not in existing_columns:
+            op.add_column('users', column)
+
+    if TABLE_NAME in tables:
+        return
+
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('ancestor_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('descendant_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('depth', sa.Integer(), nullable=False),
+    )
+    op.create_index(INDEX_NAME, TABLE_NAME, ['descendant_id', 'depth'], unique=False)
+    _backfill(bind)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    if TABLE_NAME in tables:
+        op.drop_index(INDEX_NAME, table_name=TABLE_NAME)
+        op.drop_table(TABLE_NAME)
+
+    if 'users' in tables:
+        existing_columns = {column['name'] for column in inspector.get_columns('users')}
+        with op.batch_alter_table('users') as batch:
+            for column in COLUMNS:
+                if column.name in existing_columns:
+                    batch.drop_column(column.name)
@@ -0,0 +1,102 @@
+"""payment_index: сводный индекс платежей всех провайдеров для поиска в админке
+
+Revision ID: 0113
+Revises: 0112
+Create Date: 2026-10-17
+
+Поиск платежей в админке опрашивал 23 таблицы провайдеров (до 5000 строк с
+каждой), а статус, сортировку, пагинацию и статистику считал в Python — каждая
+страница и каждый запрос статистики стоили полного обхода всех таблиц.
+
+``payment_index`` держит по строке на счёт: провайдер, локальный id, пользователь,
+сумма, сводный статус (pending/paid/cancelled), дата создания и нормализованные
+внешние номера. Фильтры по статусу/провайдеру/дате и keyset-пагинация по
+``(created_at, id)`` идут по индексам, статистика — одним GROUP BY. На PostgreSQL
+по ``external_ids`` строится GIN-индекс ``pg_trgm`` для поиска по номеру счёта
+(как ``users.search_text`` в 0110); без расширения поиск работает без индекса.
+
+Строки ведут ORM-хуки моделей провайдеров. Существующие платежи здесь не
+переносятся — правила (сумма из payload CryptoBot, пополнения YooKassa по
+metadata) живут в приложении: индекс дособирает этап мониторинга
+``payment_index`` пачками после запуска бота.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import structlog
+from alembic import op
+
+revision: str = '0113'
+down_revision: Union[str, None] = '0112'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = structlog.get_logger(__name__)
+
+TABLE_NAME = 'payment_index'
+TRGM_INDEX_NAME = 'ix_payment_index_external_ids_trgm'
+INDEXES = (
+    ('ix_payment_index_created_id', ['created_at', 'id']),
+    ('ix_payment_index_status_created_id', ['status', 'created_at', 'id']),
+    ('ix_payment_index_method_created_id', ['method', 'created_at', 'id']),
+    ('ix_payment_index_user_created', ['user_id', 'created_at']),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if 'users' not in tables or TABLE_NAME in tables:
+        return
+
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('method', sa.String(length=32), nullable=False),
+        sa.Column('local_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('amount_kopeks', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('provider_status', sa.String(length=64), nullable=True),
+        sa.Column('is_paid', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('identifier', sa.String(length=255), nullable=True),
+        sa.Column('external_ids', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True, server_default=sa.func.now()),
+        sa.UniqueConstraint('method', 'local_id', name='uq_payment_index_method_local_id'),
+    )
+    for index_name, columns in INDEXES:
+        op.create_index(index_name, TABLE_NAME, columns, unique=False)
+
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # Таблица только что создана и пуста — CONCURRENTLY не нужен, но расширение
+    # ставим вне транзакции миграции, чтобы его отсутствие не откатило таблицу
+    with op.get_context().autocommit_block():
+        try:
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except Exception as error:
+            logger.warning(
+                'Расширение pg_trgm недоступно, поиск платежей по номеру будет работать без индекса',
+                error=error,
+            )
+            return
+        op.execute(
+            f'CREATE INDEX IF NOT EXISTS {TRGM_INDEX_NAME} ON {TABLE_NAME} USING gin (external_ids gin_trgm_ops)'
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if TABLE_NAME not in inspector.get_table_names():
+        return
+
+    if bind.dialect.name == 'postgresql':
+        op.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX_NAME}')
+    for index_name, _columns in INDEXES:
+        op.drop_index(index_name, table_name=TABLE_NAME)
+    op.drop_table(TABLE_NAME)
@@ -0,0 +1,63 @@
+"""payment_webhook_inbox: персистентная входящая очередь платёжных коллбеков
+
+Revision ID: 0114
+Revises: 0113
+Create Date: 2026-10-17
+
+Вебхуки провайдеров, которым отвечаем 200 независимо от исхода обработки,
+дорабатывались в памяти процесса: падение или выкат посреди обработки, как и
+ошибка в ней самой, теряли зачисление — провайдер после 200 коллбек не
+повторяет. Теперь проверенный payload сохраняется сюда до ответа, а воркеры
+обрабатывают его с повторами.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0114'
+down_revision: Union[str, None] = '0113'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE_NAME = 'payment_webhook_inbox'
+INDEXES = (
+    ('ix_payment_webhook_inbox_id', ['id']),
+    ('ix_payment_webhook_inbox_status_next_attempt', ['status', 'next_attempt_at']),
+    ('ix_payment_webhook_inbox_provider_status', ['provider', 'status']),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if TABLE_NAME in sa.inspect(bind).get_table_names():
+        return
+
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('provider', sa.String(length=32), nullable=False),
+        sa.Column('handler', sa.String(length=64), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint('provider', 'idempotency_key', name='uq_payment_webhook_inbox_provider_key'),
+    )
+    for index_name, columns in INDEXES:
+        op.create_index(index_name, TABLE_NAME, columns)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if TABLE_NAME not in sa.inspect(bind).get_table_names():
+        return
+
+    for index_name, _columns in INDEXES:
+        op.drop_index(index_name, table_name=TABLE_NAME)
+    op.drop_table(TABLE_NAME)
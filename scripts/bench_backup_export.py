@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Benchmark: memory and time of the JSON database dump used when pg_dump is absent.
+
+Seeds a throwaway SQLite database with synthetic transactions and compares the
+legacy ORM export (``select(model)`` per table, every row materialized and the
+whole table kept in memory before writing) with the streaming NDJSON exporter
+``export_tables_to_ndjson`` (primary-key chunks of raw columns written straight
+into a gzip file).
+
+Usage:
+    python -m scripts.bench_backup_export                      # 1M transactions
+    python -m scripts.bench_backup_export --rows 200000 --chunk-size 10000
+    python -m scripts.bench_backup_export --skip-legacy        # only the streaming exporter
+
+Peak memory is measured with tracemalloc, which slows both runs down; compare the
+numbers with each other, not with production timings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.database.models import Base, Transaction
+from app.services.backup_service import _serialize_backup_value, export_tables_to_ndjson
+
+
+_SEED_BATCH = 50_000
+
+
+async def _seed(engine: AsyncEngine, rows: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=[Transaction.__table__]))
+
+    created_at = datetime(2026, 1, 1, tzinfo=UTC)
+    for start in range(1, rows + 1, _SEED_BATCH):
+        batch = [
+            {
+                'id': index,
+                'user_id': index % 5000 + 1,
+                'type': 'deposit' if index % 3 else 'subscription_payment',
+                'amount_kopeks': index % 100_000,
+                'description': f'Synthetic transaction #{index}',
+                'payment_method': 'yookassa',
+                'external_id': f'ext-{index}',
+                'is_completed': True,
+                'created_at': created_at,
+            }
+            for index in range(start, min(start + _SEED_BATCH, rows + 1))
+        ]
+        async with engine.begin() as conn:
+            await conn.execute(insert(Transaction.__table__), batch)
+
+
+async def _legacy_export(engine: AsyncEngine, dump_path: Path) -> int:
+    maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with maker() as db:
+        records = (await db.execute(select(Transaction))).scalars().all()
+        table_data = [
+            {
+                column.name: _serialize_backup_value(getattr(record, column.name))
+                for column in Transaction.__table__.columns
+            }
+            for record in records
+        ]
+    payload = json.dumps({'data': {'transactions': table_data}}, ensure_ascii=False, indent=2)
+    await asyncio.to_thread(dump_path.write_text, payload)
+    return len(table_data)
+
+
+async def _streaming_export(engine: AsyncEngine, dump_path: Path, chunk_size: int) -> int:
+    exported = await export_tables_to_ndjson(
+        engine,
+        [('transactions', Transaction.__table__)],
+        dump_path,
+        chunk_size=chunk_size,
+    )
+    return exported.get('transactions', 0)
+
+
+async def _measure(label: str, run: Callable[[], Awaitable[int]], dump_path: Path) -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = await run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size_mb = (await asyncio.to_thread(dump_path.stat)).st_size / 1024 / 1024
+    print(
+        f'{label:<10} rows={rows} time={elapsed:.1f}s rows/s={rows / elapsed:,.0f} '
+        f'peak={peak / 1024 / 1024:.1f}MiB file={size_mb:.1f}MiB'
+    )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        engine = create_async_engine(f'sqlite+aiosqlite:///{temp_path / "bench.sqlite"}')
+        try:
+            print(f'seeding {args.rows} transactions...', file=sys.stderr)
+            await _seed(engine, args.rows)
+
+            streaming_path = temp_path / 'database.ndjson.gz'
+            await _measure(
+                'streaming',
+                lambda: _streaming_export(engine, streaming_path, args.chunk_size),
+                streaming_path,
+            )
+            if not args.skip_legacy:
+                legacy_path = temp_path / 'database.json'
+                await _measure('legacy', lambda: _legacy_export(engine, legacy_path), legacy_path)
+        finally:
+            await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='synthetic transactions to seed')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='rows per keyset page')
+    parser.add_argument('--skip-legacy', action='store_true', help='do not run the legacy ORM export')
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Micro-benchmark: blacklist lookup latency for a large list.
+
+Compares the legacy behaviour (two linear scans over the parsed entries, by
+Telegram ID and then by normalized username) with the hash index now built by
+``BlacklistIndex`` at update time. Also reports the one-off cost of parsing and
+compiling the list.
+
+Usage:
+    python -m scripts.bench_blacklist                       # 100k entries, 10k lookups
+    python -m scripts.bench_blacklist --entries 500000 --lookups 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections.abc import Callable
+
+from app.services.blacklist_service import BlacklistIndex, normalize_username, parse_blacklist
+
+
+Entry = tuple[int, str, str]
+
+
+def _generate(entries: int) -> str:
+    lines = ['# synthetic blacklist']
+    for index in range(entries):
+        telegram_id = 1_000_000_000 + index
+        if index % 2:
+            lines.append(f'{telegram_id} # @user_{index} перепродажа подписок')
+        else:
+            lines.append(f'{telegram_id} спам')
+    return '\n'.join(lines)
+
+
+def _legacy_lookup(data: list[Entry]) -> Callable[[int, str | None], Entry | None]:
+    def lookup(telegram_id: int, username: str | None) -> Entry | None:
+        for entry in data:
+            if entry[0] == telegram_id:
+                return entry
+        if username:
+            username_lower = username.lower().lstrip('@')
+            for entry in data:
+                if entry[1] and entry[1].lower().lstrip('@') == username_lower:
+                    return entry
+        return None
+
+    return lookup
+
+
+def _indexed_lookup(index: BlacklistIndex) -> Callable[[int, str | None], Entry | None]:
+    def lookup(telegram_id: int, username: str | None) -> Entry | None:
+        entry = index.by_id.get(telegram_id)
+        if entry is None and username:
+            entry = index.by_username.get(normalize_username(username))
+        return entry
+
+    return lookup
+
+
+def _measure(label: str, lookup: Callable[[int, str | None], Entry | None], queries: list[tuple[int, str]]) -> int:
+    started = time.perf_counter()
+    found = sum(1 for telegram_id, username in queries if lookup(telegram_id, username) is not None)
+    elapsed = time.perf_counter() - started
+    print(f'{label:<8} lookups={len(queries)} found={found} time/lookup={elapsed / len(queries) * 1e6:.2f}µs')
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100_000, help='blacklist size')
+    parser.add_argument('--lookups', type=int, default=10_000, help='checks to run (legacy is sampled)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    content = _generate(args.entries)
+    started = time.perf_counter()
+    data = parse_blacklist(content)
+    parsed = time.perf_counter()
+    index = BlacklistIndex.build(data)
+    built = time.perf_counter()
+    print(
+        f'entries={len(data)} parse={(parsed - started) * 1000:.1f}ms '
+        f'index={(built - parsed) * 1000:.1f}ms ids={len(index.by_id)} usernames={len(index.by_username)}'
+    )
+
+    rng = random.Random(args.seed)
+    queries = []
+    for _ in range(args.lookups):
+        # Большинство проверок — обычные пользователи, которых нет в списке
+        if rng.random() < 0.1:
+            number = rng.randrange(args.entries)
+            queries.append((2_000_000_000 + number, f'@USER_{number}'))
+        else:
+            queries.append((3_000_000_000 + rng.randrange(10**6), f'someone_{rng.randrange(10**6)}'))
+
+    # Линейный поиск медленный, поэтому меряем его на выборке
+    _measure('legacy', _legacy_lookup(data), queries[: max(1, args.lookups // 20)])
+    _measure('indexed', _indexed_lookup(index), queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Micro-benchmark: allocations and latency of get_texts() per update.
+
+Compares the legacy behaviour (a fresh ``Texts`` per call, which copies the
+merged locale and builds the fallback dict) with the compiled per-language
+table now returned by ``get_texts()``.
+
+Usage:
+    python -m scripts.bench_get_texts                 # 1000 simulated updates
+    python -m scripts.bench_get_texts --calls 5000 --per-update 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from app.localization.texts import Texts, get_texts
+
+
+def _measure(label: str, factory: Callable[[str], Texts], updates: int, per_update: int, language: str) -> None:
+    factory(language)  # прогрев: загрузка локали и компиляция таблицы
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    for _ in range(updates):
+        for _ in range(per_update):
+            texts = factory(language)
+            _ = texts.BACK
+    elapsed = time.perf_counter() - started
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    allocated = sum(
+        stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename') if stat.size_diff > 0
+    )
+    allocations = sum(
+        stat.count_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename') if stat.count_diff > 0
+    )
+    print(
+        f'{label:<10} updates={updates} per_update={per_update} '
+        f'time/update={elapsed / updates * 1e6:.1f}µs peak={peak / 1024:.1f}KiB '
+        f'retained={allocated / 1024:.1f}KiB retained_blocks={allocations}'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=1000, help='simulated updates')
+    parser.add_argument('--per-update', type=int, default=4, help='get_texts() calls per update')
+    parser.add_argument('--language', default='ru')
+    args = parser.parse_args()
+
+    _measure('legacy', Texts, args.calls, args.per_update, args.language)
+    _measure('compiled', get_texts, args.calls, args.per_update, args.language)
+
+
+if __name__ == '__main__':
+    main()
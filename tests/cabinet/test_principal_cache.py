@@ -0,0 +1,222 @@
+"""Кэш principal кабинета: повторные запросы не перепроверяют initData и не грузят роли заново."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.cabinet import dependencies
+from app.cabinet.auth import principal_cache as principal_cache_module
+from app.cabinet.auth.principal_cache import cabinet_principal_cache
+from app.database.crud.rbac import AccessPolicyCRUD, UserRoleCRUD
+from app.database.models import AccessPolicy, AdminRole, UserRole, UserStatus
+from app.services.permission_service import PermissionService, RbacSnapshot, permission_matches
+from tests.fixtures.sqlite_memory import memory_session
+
+
+def _user(**overrides) -> SimpleNamespace:
+    values = {
+        'id': 100,
+        'telegram_id': 555,
+        'username': 'admin',
+        'email': None,
+        'email_verified': False,
+        'email_verification_source': None,
+        'status': UserStatus.ACTIVE.value,
+        'cabinet_last_login': datetime.now(UTC),
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _request(init_data: str | None = 'signed-init-data') -> MagicMock:
+    request = MagicMock()
+    request.headers = {'X-Telegram-Init-Data': init_data} if init_data else {}
+    request.state = SimpleNamespace()
+    request.method = 'GET'
+    request.url.path = '/cabinet/admin/users'
+    request.query_params = {}
+    return request
+
+
+def _snapshot(*permissions: str) -> RbacSnapshot:
+    return RbacSnapshot(permissions=permissions, role_names=('moderator',), role_level=10, policies=())
+
+
+@pytest.fixture
+def auth_mocks():
+    user = _user()
+    token_payload = MagicMock(return_value={'sub': '100', 'type': 'access'})
+    validate = MagicMock(return_value={'id': 555})
+    load_user = AsyncMock(return_value=user)
+    with (
+        patch('app.cabinet.dependencies.get_token_payload', token_payload),
+        patch('app.cabinet.dependencies.validate_telegram_init_data', validate),
+        patch('app.cabinet.dependencies.get_user_by_id', load_user),
+        patch('app.cabinet.dependencies.blacklist_service.is_user_blacklisted', AsyncMock(return_value=(False, None))),
+        patch('app.cabinet.dependencies.maintenance_service.is_maintenance_active', return_value=False),
+        patch('app.cabinet.dependencies.settings.CHANNEL_IS_REQUIRED_SUB', False),
+        patch('app.cabinet.dependencies.settings.CABINET_PRINCIPAL_CACHE_TTL_SECONDS', 60),
+    ):
+        yield SimpleNamespace(user=user, token_payload=token_payload, validate=validate, load_user=load_user)
+
+
+async def test_repeat_request_reuses_verified_principal(auth_mocks):
+    db = AsyncMock()
+    credentials = MagicMock(credentials='access.jwt.token')
+
+    for _ in range(3):
+        user = await dependencies.get_current_cabinet_user(request=_request(), credentials=credentials, db=db)
+        assert user is auth_mocks.user
+
+    assert auth_mocks.token_payload.call_count == 1
+    assert auth_mocks.validate.call_count == 1
+    # Пользователь грузится каждый раз: статус и блокировки проверяются по свежим данным
+    assert auth_mocks.load_user.await_count == 3
+
+    # Другой initData — другой ключ кэша
+    await dependencies.get_current_cabinet_user(request=_request('other-init-data'), credentials=credentials, db=db)
+    assert auth_mocks.validate.call_count == 2
+
+
+async def test_cached_mismatch_still_rejects(auth_mocks):
+    auth_mocks.validate.return_value = {'id': 777}
+    credentials = MagicMock(credentials='access.jwt.token')
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await dependencies.get_current_cabinet_user(request=_request(), credentials=credentials, db=AsyncMock())
+        assert exc.value.status_code == 401
+
+    assert auth_mocks.validate.call_count == 1
+
+
+async def test_require_permission_loads_rbac_once_per_principal(auth_mocks, monkeypatch):
+    load_snapshot = AsyncMock(return_value=_snapshot('users:*', 'stats:read'))
+    monkeypatch.setattr(PermissionService, 'load_rbac_snapshot', load_snapshot)
+    monkeypatch.setattr(PermissionService, 'log_action', AsyncMock())
+    dependency = dependencies.require_permission('users:read', 'users:edit', 'stats:read')
+    credentials = MagicMock(credentials='access.jwt.token')
+    db = AsyncMock()
+
+    for _ in range(3):
+        request = _request()
+        user = await dependencies.get_current_cabinet_user(request=request, credentials=credentials, db=db)
+        assert await dependency(request=request, user=user, db=db) is user
+
+    assert load_snapshot.await_count == 1
+
+    denied = dependencies.require_permission('settings:edit')
+    request = _request()
+    user = await dependencies.get_current_cabinet_user(request=request, credentials=credentials, db=db)
+    with pytest.raises(HTTPException) as exc:
+        await denied(request=request, user=user, db=db)
+    assert exc.value.status_code == 403
+    assert load_snapshot.await_count == 1
+
+
+async def test_rbac_reuse_is_bounded_without_cluster_bus(auth_mocks, monkeypatch):
+    load_snapshot = AsyncMock(return_value=_snapshot('users:*'))
+    monkeypatch.setattr(PermissionService, 'load_rbac_snapshot', load_snapshot)
+    monkeypatch.setattr(PermissionService, 'log_action', AsyncMock())
+    monkeypatch.setattr(principal_cache_module.settings, 'CABINET_PRINCIPAL_RBAC_LOCAL_TTL_SECONDS', 0)
+    dependency = dependencies.require_permission('users:read')
+    credentials = MagicMock(credentials='access.jwt.token')
+    db = AsyncMock()
+
+    async def check() -> None:
+        request = _request()
+        user = await dependencies.get_current_cabinet_user(request=request, credentials=credentials, db=db)
+        await dependency(request=request, user=user, db=db)
+
+    # Отзыв роли на другой реплике сюда не дойдёт — роли перечитываются
+    monkeypatch.setattr(principal_cache_module.cluster_event_bus, 'is_running', lambda: False)
+    await check()
+    await check()
+    assert load_snapshot.await_count == 2
+
+    # С кластерной шиной сброс приходит сам, снимок переиспользуется
+    monkeypatch.setattr(principal_cache_module.cluster_event_bus, 'is_running', lambda: True)
+    await check()
+    await check()
+    assert load_snapshot.await_count == 2
+
+
+@pytest.mark.parametrize(
+    ('granted', 'required'),
+    [
+        ('*:*', 'users:read'),
+        ('users:*', 'users:edit'),
+        ('users:read', 'users:read'),
+        ('users:read', 'users:edit'),
+        ('stats:read', 'sales_stats:read'),
+        ('users:re?d', 'users:read'),
+    ],
+)
+def test_compiled_matcher_matches_fnmatch_semantics(granted, required):
+    assert _snapshot(granted).grants(required) is permission_matches(granted, required)
+
+
+async def test_snapshot_matches_check_permission_decision(monkeypatch):
+    async with memory_session(monkeypatch, [AdminRole.__table__, UserRole.__table__, AccessPolicy.__table__]) as db:
+        role = AdminRole(name='support', level=10, permissions=['tickets:*', 'users:read'])
+        db.add(role)
+        await db.flush()
+        db.add(UserRole(user_id=100, role_id=role.id, expires_at=datetime.now(UTC) + timedelta(hours=1)))
+        db.add(
+            AccessPolicy(
+                name='no-ticket-settings',
+                role_id=role.id,
+                priority=10,
+                effect='deny',
+                resource='tickets',
+                actions=['settings'],
+                conditions={},
+            )
+        )
+        await db.commit()
+
+        user = _user()
+        snapshot = await PermissionService.load_rbac_snapshot(db, user.id)
+        assert snapshot.valid_until is not None
+
+        for permission in ('tickets:reply', 'tickets:settings', 'users:read', 'users:edit'):
+            expected = await PermissionService.check_permission(db, user, permission)
+            assert PermissionService.evaluate_snapshot(user, snapshot, permission) == expected
+
+        permissions, _, level = await UserRoleCRUD.get_user_permissions(db, user.id)
+        assert list(snapshot.permissions) == permissions
+        assert snapshot.role_level == level
+        assert len(await AccessPolicyCRUD.get_policies_for_user(db, [role.id])) == len(snapshot.policies)
+
+
+async def test_committed_role_changes_invalidate_cache(monkeypatch):
+    monkeypatch.setattr('app.cabinet.auth.principal_cache.settings.CABINET_PRINCIPAL_CACHE_TTL_SECONDS', 60)
+    cabinet_principal_cache.put('t1', None, user_id=100, init_data_telegram_id=None, init_data_invalid=False)
+    cabinet_principal_cache.put('t2', None, user_id=200, init_data_telegram_id=None, init_data_invalid=False)
+
+    async with memory_session(monkeypatch, [AdminRole.__table__, UserRole.__table__]) as db:
+        role = AdminRole(name='viewer', level=1, permissions=['stats:read'])
+        db.add(role)
+        await db.flush()
+        await db.rollback()
+        # Откат не сбрасывает кэш
+        assert cabinet_principal_cache.get('t1', None) is not None
+
+        role = AdminRole(name='viewer', level=1, permissions=['stats:read'])
+        db.add(role)
+        await db.commit()
+        assert cabinet_principal_cache.get('t1', None) is None
+        assert cabinet_principal_cache.get('t2', None) is None
+
+        cabinet_principal_cache.put('t1', None, user_id=100, init_data_telegram_id=None, init_data_invalid=False)
+        cabinet_principal_cache.put('t2', None, user_id=200, init_data_telegram_id=None, init_data_invalid=False)
+        db.add(UserRole(user_id=200, role_id=role.id))
+        await db.commit()
+
+    assert cabinet_principal_cache.get('t1', None) is not None
+    assert cabinet_principal_cache.get('t2', None) is None
@@ -213,6 +213,16 @@ def registered_paths() -> dict[str, set[str]]:
     return {path: {method.upper() for method in operations} for path, operations in schema.get('paths', {}).items()}
 
 
+@pytest.fixture(autouse=True)
+def _reset_cabinet_principal_cache():
+    """Кэш principal кабинета не должен переносить проверенные токены между тестами."""
+    from app.cabinet.auth.principal_cache import cabinet_principal_cache
+
+    cabinet_principal_cache.clear()
+    yield
+    cabinet_principal_cache.clear()
+
+
 # Auto-load fixture modules so tests don't need explicit imports.
 # Promocode/promo-group tests in tests/services/test_promocode_service.py,
 # tests/crud/test_promocode_crud.py, and tests/integration/test_promocode_promo_group_flow.py
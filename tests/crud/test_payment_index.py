@@ -0,0 +1,222 @@
+"""Сводный индекс платежей: хуки провайдеров, досборка и поиск в админке по индексу."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.database.crud.pal24 import update_pal24_payment_status
+from app.database.crud.payment_index import PAYMENT_INDEX_SOURCES, PaymentIndexBackfill, rebuild_payment_index
+from app.database.models import (
+    CryptoBotPayment,
+    HeleketPayment,
+    Pal24Payment,
+    PaymentIndex,
+    PaymentMethod,
+    Transaction,
+    TransactionType,
+    User,
+    UserStatus,
+    YooKassaPayment,
+)
+from app.services.payment_search_service import (
+    SearchParams,
+    StatusFilter,
+    search_payments,
+    search_payments_stats,
+)
+from tests.fixtures.sqlite_memory import memory_session
+
+
+# Досборка проходит таблицы всех провайдеров
+TABLES = (User.__table__, *(model.__table__ for model in PAYMENT_INDEX_SOURCES))
+NOW = datetime.now(UTC).replace(microsecond=0)
+
+
+def _ago(minutes: int) -> datetime:
+    return NOW - timedelta(minutes=minutes)
+
+
+async def _add_users(db) -> None:
+    for user_id in (1, 2):
+        db.add(
+            User(
+                id=user_id,
+                telegram_id=1000 + user_id,
+                username=f'buyer{user_id}',
+                status=UserStatus.ACTIVE.value,
+                language='ru',
+            )
+        )
+    await db.commit()
+
+
+def _payments() -> list:
+    return [
+        Pal24Payment(
+            user_id=1, bill_id='BILL-AAA', order_id='ord-1', amount_kopeks=10000, status='NEW', created_at=_ago(1)
+        ),
+        HeleketPayment(
+            user_id=2,
+            uuid='hel-uuid-1',
+            order_id='hel-ord-1',
+            amount='12.50',
+            currency='RUB',
+            status='paid',
+            created_at=_ago(2),
+        ),
+        CryptoBotPayment(
+            user_id=1,
+            invoice_id='cb-77',
+            amount='1',
+            asset='USDT',
+            status='expired',
+            payload='balance_1_9900',
+            created_at=_ago(3),
+        ),
+        YooKassaPayment(
+            user_id=2,
+            yookassa_payment_id='yk-topup',
+            amount_kopeks=5000,
+            status='succeeded',
+            is_paid=True,
+            metadata_json={'type': 'balance_topup'},
+            created_at=_ago(4),
+        ),
+        # Оплата подписки напрямую, не пополнение — в поиск не попадает
+        YooKassaPayment(
+            user_id=2,
+            yookassa_payment_id='yk-direct',
+            amount_kopeks=5000,
+            status='pending',
+            metadata_json={'type': 'subscription'},
+            created_at=_ago(5),
+        ),
+        Transaction(
+            user_id=1,
+            type=TransactionType.DEPOSIT.value,
+            amount_kopeks=3000,
+            payment_method=PaymentMethod.TELEGRAM_STARS.value,
+            external_id='stars-charge-1',
+            created_at=_ago(6),
+        ),
+        Transaction(user_id=1, type=TransactionType.SUBSCRIPTION_PAYMENT.value, amount_kopeks=-3000),
+    ]
+
+
+async def _index(db) -> dict[tuple[str, str], tuple]:
+    rows = await db.execute(
+        select(PaymentIndex.method, PaymentIndex.identifier, PaymentIndex.status, PaymentIndex.amount_kopeks)
+    )
+    return {(row.method, row.identifier): (row.status, row.amount_kopeks) for row in rows}
+
+
+EXPECTED_INDEX = {
+    ('pal24', 'BILL-AAA'): ('pending', 10000),
+    ('heleket', 'hel-uuid-1'): ('paid', 1250),
+    ('cryptobot', 'cb-77'): ('cancelled', 9900),
+    ('yookassa', 'yk-topup'): ('paid', 5000),
+    ('telegram_stars', 'stars-charge-1'): ('paid', 3000),
+}
+
+
+@pytest.mark.asyncio
+async def test_hooks_index_payments_and_search_pages_by_cursor(monkeypatch):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_users(db)
+        db.add_all(_payments())
+        await db.commit()
+
+        assert await _index(db) == EXPECTED_INDEX
+
+        seen = []
+        params = SearchParams(per_page=2)
+        while True:
+            items, total, cursor = await search_payments(db, params)
+            assert total == 5
+            seen += [item.identifier for item in items]
+            if cursor is None:
+                break
+            params.cursor = cursor
+        assert seen == ['BILL-AAA', 'hel-uuid-1', 'cb-77', 'yk-topup', 'stars-charge-1']
+
+        # Страница по номеру даёт те же строки, что и курсор
+        items, _total, _cursor = await search_payments(db, SearchParams(per_page=2, page=2))
+        assert [item.identifier for item in items] == ['cb-77', 'yk-topup']
+        assert items[0].amount_kopeks == 9900 and items[0].user.id == 1
+
+        items, total, _cursor = await search_payments(db, SearchParams(status_filter=StatusFilter.PAID))
+        assert total == 3 and {item.method for item in items} == {
+            PaymentMethod.HELEKET,
+            PaymentMethod.YOOKASSA,
+            PaymentMethod.TELEGRAM_STARS,
+        }
+
+        items, total, _cursor = await search_payments(db, SearchParams(search='HEL-ORD'))
+        assert total == 1 and items[0].identifier == 'hel-uuid-1'
+        _items, total, _cursor = await search_payments(db, SearchParams(search='@buyer1'))
+        assert total == 3
+        _items, total, _cursor = await search_payments(db, SearchParams(method_filter=PaymentMethod.TRIBUTE))
+        assert total == 0
+
+        stats = await search_payments_stats(db, SearchParams(status_filter=StatusFilter.PAID))
+        assert (stats.total, stats.pending, stats.paid, stats.cancelled) == (5, 1, 3, 1)
+        assert stats.by_method == {'pal24': 1, 'heleket': 1, 'cryptobot': 1, 'yookassa': 1, 'telegram_stars': 1}
+
+
+@pytest.mark.asyncio
+async def test_updates_and_deletes_follow_provider_rows(monkeypatch):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_users(db)
+        payments = _payments()
+        db.add_all(payments)
+        await db.commit()
+        pal24, _heleket, _cryptobot, topup, direct = payments[:5]
+
+        # Массовый UPDATE в crud досинхронизирует индекс явно
+        await update_pal24_payment_status(db, pal24, status='PAID', is_paid=True)
+        assert (await _index(db))[('pal24', 'BILL-AAA')] == ('paid', 10000)
+
+        direct.metadata_json = {'type': 'balance_topup'}
+        topup.metadata_json = {'type': 'subscription'}
+        await db.commit()
+        index = await _index(db)
+        assert ('yookassa', 'yk-direct') in index and ('yookassa', 'yk-topup') not in index
+
+        await db.delete(pal24)
+        await db.commit()
+        assert ('pal24', 'BILL-AAA') not in await _index(db)
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_in_batches_and_matches_hooks(monkeypatch):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_users(db)
+        db.add_all(_payments())
+        await db.commit()
+        by_hooks = await _index(db)
+
+        # Строки, записанные до миграции (или в обход хуков), индекс не содержит
+        await db.execute(PaymentIndex.__table__.delete())
+        await db.execute(
+            insert(Pal24Payment.__table__).values(
+                user_id=2, bill_id='BILL-OLD', amount_kopeks=700, currency='RUB', type='normal', status='NEW'
+            )
+        )
+        await db.commit()
+
+        backfill = PaymentIndexBackfill(batch_size=1)
+        assert await backfill.run(db, max_batches=2) == 1
+        assert not backfill.done
+        await backfill.run(db)
+        assert backfill.done
+        assert await backfill.run(db) == 0
+        await db.commit()
+
+        assert await _index(db) == {**by_hooks, ('pal24', 'BILL-OLD'): ('pending', 700)}
+
+        assert await rebuild_payment_index(db) == len(by_hooks) + 1
+        await db.commit()
+        assert await _index(db) == {**by_hooks, ('pal24', 'BILL-OLD'): ('pending', 700)}
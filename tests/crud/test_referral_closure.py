@@ -0,0 +1,180 @@
+"""Замыкание реферального дерева и итоги веток: хуки User/Transaction и пересборка."""
+
+from __future__ import annotations
+
+import contextlib
+
+import pytest
+from sqlalchemy import select, update
+
+from app.database.crud.referral_closure import (
+    get_ancestor_ids,
+    get_descendant_ids,
+    rebuild_referral_closure,
+    relink_referrals,
+)
+from app.database.models import Base, ReferralClosure, Transaction, TransactionType, User, UserStatus
+from app.services import referral_branch_service as branch_module
+from tests.fixtures.sqlite_memory import memory_session
+
+
+TABLES = (User.__table__, Transaction.__table__)
+# Удаление пользователя через ORM подгружает все его связи
+ALL_TABLES = tuple(Base.metadata.sorted_tables)
+
+
+@pytest.fixture
+def branch_service(monkeypatch):
+    service = branch_module.ReferralBranchService()
+    monkeypatch.setattr(branch_module, 'referral_branch_service', service)
+    return service
+
+
+async def _settle(service, db) -> None:
+    """Отработать отложенный пересчёт веток на той же in-memory БД."""
+
+    @contextlib.asynccontextmanager
+    async def _same_session():
+        yield db
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(branch_module, 'AsyncSessionLocal', _same_session)
+        await service.flush_dirty_users()
+
+
+def _user(user_id: int, referrer: int | None = None) -> User:
+    return User(
+        id=user_id,
+        telegram_id=1000 + user_id,
+        username=f'user{user_id}',
+        status=UserStatus.ACTIVE.value,
+        language='ru',
+        referred_by_id=referrer,
+    )
+
+
+async def _closure(db) -> set[tuple[int, int, int]]:
+    rows = await db.execute(select(ReferralClosure.ancestor_id, ReferralClosure.descendant_id, ReferralClosure.depth))
+    return set(rows.tuples().all())
+
+
+async def _branches(db) -> dict[int, tuple[int, int]]:
+    rows = await db.execute(select(User.id, User.referral_branch_size, User.referral_branch_spent_kopeks))
+    return {row.id: (row.referral_branch_size, row.referral_branch_spent_kopeks) for row in rows}
+
+
+async def _add_chain(db) -> None:
+    # 1 ← 2 ← 3, 1 ← 4, отдельный корень 5
+    for user in (_user(1), _user(5), _user(2, 1), _user(4, 1), _user(3, 2)):
+        db.add(user)
+        await db.flush()
+    await db.commit()
+
+
+async def _pay(db, user_id: int, amount: int) -> None:
+    db.add(Transaction(user_id=user_id, type=TransactionType.SUBSCRIPTION_PAYMENT.value, amount_kopeks=-amount))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_registration_and_payments_maintain_closure(monkeypatch, branch_service):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_chain(db)
+        await _pay(db, 3, 1000)
+        await _pay(db, 2, 500)
+        await _settle(branch_service, db)
+
+        assert await _closure(db) == {(1, 2, 1), (1, 3, 2), (2, 3, 1), (1, 4, 1)}
+        branches = await _branches(db)
+        assert branches[1] == (3, 1500)
+        assert branches[2] == (1, 1000)
+        assert branches[3] == branches[5] == (0, 0)
+
+        assert await get_descendant_ids(db, {2}) == {2, 3}
+        assert await get_descendant_ids(db, {1}, max_depth=1) == {1, 2, 4}
+        assert await get_ancestor_ids(db, {3}) == {1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_reassigning_referrer_moves_whole_subtree(monkeypatch, branch_service):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_chain(db)
+        await _pay(db, 3, 1000)
+
+        user = await db.get(User, 2)
+        user.referred_by_id = 5
+        await db.commit()
+        await _settle(branch_service, db)
+
+        assert await _closure(db) == {(5, 2, 1), (5, 3, 2), (2, 3, 1), (1, 4, 1)}
+        branches = await _branches(db)
+        assert branches[1] == (1, 0)
+        assert branches[5] == (2, 1000)
+
+        # Реферер из собственной ветки — цикл в замыкание не попадает
+        user = await db.get(User, 5)
+        user.referred_by_id = 3
+        await db.commit()
+        assert (3, 5, 1) not in await _closure(db)
+
+
+@pytest.mark.asyncio
+async def test_deleting_referrer_detaches_branch(monkeypatch, branch_service):
+    async with memory_session(monkeypatch, ALL_TABLES) as db:
+        await _add_chain(db)
+        await _pay(db, 3, 1000)
+
+        # FK в SQLite не форсятся: обнуляем ссылку, как сделал бы ON DELETE SET NULL
+        await db.execute(update(User).where(User.referred_by_id == 2).values(referred_by_id=None))
+        await db.delete(await db.get(User, 2))
+        await db.commit()
+        await _settle(branch_service, db)
+
+        assert await _closure(db) == {(1, 4, 1)}
+        assert (await _branches(db))[1] == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_is_relinked_and_rebuild_matches_hooks(monkeypatch, branch_service):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_chain(db)
+        await _pay(db, 3, 1000)
+
+        await db.execute(update(User).where(User.id.in_([4, 5])).values(referred_by_id=3))
+        await relink_referrals(db, [4, 5])
+        await db.commit()
+        await _settle(branch_service, db)
+        incremental = (await _closure(db), await _branches(db))
+
+        assert (1, 5, 3) in incremental[0]
+        assert incremental[1][3] == (2, 0)
+
+        assert await rebuild_referral_closure(db) == len(incremental[0])
+        await db.commit()
+        assert (await _closure(db), await _branches(db)) == incremental
+
+
+@pytest.mark.asyncio
+async def test_payment_defers_branch_spend_until_after_commit(monkeypatch, branch_service):
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _add_chain(db)
+        await _pay(db, 3, 1000)
+
+        # Транзакция платежа трогает только строку плательщика
+        branches = await _branches(db)
+        assert branches[1] == (3, 0)
+        assert branches[2] == (1, 0)
+        assert (await db.get(User, 3)).total_spent_kopeks == 1000
+        assert branch_service._dirty_user_ids == {3}
+
+        # Откатанная оплата в пересчёт не попадает
+        db.add(Transaction(user_id=4, type=TransactionType.SUBSCRIPTION_PAYMENT.value, amount_kopeks=-700))
+        await db.flush()
+        await db.rollback()
+        assert branch_service._dirty_user_ids == {3}
+
+        await _settle(branch_service, db)
+        branches = await _branches(db)
+        assert branches[1] == (3, 1000)
+        assert branches[2] == (1, 1000)
+        assert branch_service._dirty_user_ids == set()
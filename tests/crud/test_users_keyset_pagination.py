@@ -0,0 +1,253 @@
+"""Keyset-пагинация админского списка и нарастающие итоги трат в users."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.config import settings
+from app.database.crud import user as user_crud
+from app.database.crud.user import (
+    USERS_LIST_SORT_KEYS,
+    UsersListCursor,
+    get_users_count_cached,
+    get_users_page,
+    rebuild_user_spending,
+    refresh_user_spending,
+)
+from app.database.models import (
+    Base,
+    PromoGroup,
+    Subscription,
+    SubscriptionStatus,
+    Tariff,
+    Transaction,
+    TransactionType,
+    User,
+    UserStatus,
+    tariff_promo_groups,
+)
+from tests.fixtures.sqlite_memory import memory_session
+
+
+TABLES = (
+    User.__table__,
+    Subscription.__table__,
+    Tariff.__table__,
+    PromoGroup.__table__,
+    tariff_promo_groups,
+    Transaction.__table__,
+)
+# Удаление транзакции через ORM подгружает backref-связи платёжных таблиц
+TRANSACTION_TABLES = (
+    User.__table__,
+    Transaction.__table__,
+    *(
+        mapper.local_table
+        for mapper in Base.registry.mappers
+        if any(relation.mapper.class_ is Transaction for relation in mapper.relationships) and mapper.class_ is not User
+    ),
+)
+
+
+def _user(index: int, created_at: datetime, **kwargs) -> User:
+    return User(
+        telegram_id=1000 + index,
+        username=f'user{index}',
+        first_name=f'User{index}',
+        status=UserStatus.ACTIVE.value,
+        language='ru',
+        created_at=created_at,
+        **kwargs,
+    )
+
+
+def _payment(user: User, amount: int, **kwargs) -> Transaction:
+    return Transaction(
+        user_id=user.id,
+        type=TransactionType.SUBSCRIPTION_PAYMENT.value,
+        amount_kopeks=amount,
+        **kwargs,
+    )
+
+
+async def _spending(db, user_id: int) -> tuple[int, int, datetime | None]:
+    row = (
+        await db.execute(
+            select(User.total_spent_kopeks, User.purchase_count, User.last_purchase_at).where(User.id == user_id)
+        )
+    ).one()
+    return row.total_spent_kopeks, row.purchase_count, row.last_purchase_at
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('sort_by', USERS_LIST_SORT_KEYS)
+async def test_cursor_pages_match_offset_pages(monkeypatch, sort_by):
+    async with memory_session(monkeypatch, TABLES) as db:
+        now = datetime.now(UTC)
+        # Одинаковые created_at и повторяющиеся значения ключа — проверяем tie-break по id
+        users = [
+            _user(
+                index,
+                now - timedelta(days=index // 3),
+                balance_kopeks=(index % 4) * 100,
+                last_activity=now - timedelta(hours=index % 7),
+            )
+            for index in range(17)
+        ]
+        db.add_all(users)
+        await db.flush()
+        for index, user in enumerate(users):
+            if index % 3:
+                db.add(
+                    Subscription(
+                        user_id=user.id,
+                        status=SubscriptionStatus.ACTIVE.value,
+                        start_date=now,
+                        end_date=now + timedelta(days=index % 4),
+                        traffic_used_gb=float(index % 3),
+                        remnawave_short_id=f'short{index}',
+                    )
+                )
+            for _ in range(index % 3):
+                db.add(_payment(user, -(index % 4 + 1) * 1000))
+        await db.commit()
+
+        expected = []
+        for offset in range(0, 17, 5):
+            page, _ = await get_users_page(db, limit=5, offset=offset, sort_by=sort_by)
+            expected.extend(user.id for user in page)
+
+        walked = []
+        cursor = None
+        while True:
+            page, cursor = await get_users_page(db, limit=5, cursor=cursor, sort_by=sort_by)
+            walked.extend(user.id for user in page)
+            if cursor is None:
+                break
+            cursor = UsersListCursor.decode(cursor.encode())
+
+        assert walked == expected
+        assert sorted(walked) == sorted(user.id for user in users)
+
+
+def test_cursor_decode_rejects_garbage():
+    with pytest.raises(ValueError):
+        UsersListCursor.decode('not-a-cursor')
+    with pytest.raises(ValueError):
+        UsersListCursor.decode(UsersListCursor('unknown', 1, datetime.now(UTC), 1).encode())
+
+
+@pytest.mark.asyncio
+async def test_cursor_for_other_sort_is_rejected(monkeypatch):
+    async with memory_session(monkeypatch, TABLES) as db:
+        cursor = UsersListCursor('balance', 100, datetime.now(UTC), 1)
+        with pytest.raises(ValueError):
+            await get_users_page(db, cursor=cursor, sort_by='created_at')
+
+
+@pytest.mark.asyncio
+async def test_transaction_hooks_maintain_spending_totals(monkeypatch):
+    async with memory_session(monkeypatch, TRANSACTION_TABLES) as db:
+        user = _user(1, datetime.now(UTC))
+        db.add(user)
+        await db.flush()
+
+        completed_at = datetime(2026, 5, 1, tzinfo=UTC)
+        paid = _payment(user, -5000, completed_at=completed_at)
+        pending = _payment(user, -3000, is_completed=False)
+        # NULL не считается завершённой оплатой — как и в get_users_spending_stats
+        unknown = _payment(user, -9000, completed_at=completed_at - timedelta(days=1))
+        deposit = Transaction(user_id=user.id, type=TransactionType.DEPOSIT.value, amount_kopeks=10000)
+        db.add_all([paid, pending, deposit, unknown])
+        await db.flush()
+        assert (await _spending(db, user.id))[:2] == (14000, 2)
+        unknown.is_completed = None
+        await db.flush()
+        assert (await _spending(db, user.id))[:2] == (5000, 1)
+        await db.delete(unknown)
+        await db.commit()
+        assert await _spending(db, user.id) == (5000, 1, completed_at)
+
+        pending.is_completed = True
+        pending.completed_at = completed_at + timedelta(days=1)
+        await db.commit()
+        assert await _spending(db, user.id) == (8000, 2, completed_at + timedelta(days=1))
+
+        paid.amount_kopeks = -7000
+        await db.commit()
+        assert (await _spending(db, user.id))[:2] == (10000, 2)
+
+        await db.delete(pending)
+        await db.commit()
+        assert (await _spending(db, user.id))[:2] == (7000, 1)
+
+
+@pytest.mark.asyncio
+async def test_refresh_user_spending_after_bulk_delete(monkeypatch):
+    async with memory_session(monkeypatch, TABLES) as db:
+        user = _user(1, datetime.now(UTC))
+        db.add(user)
+        await db.flush()
+        last_at = datetime(2026, 6, 1, tzinfo=UTC)
+        first = _payment(user, -2000, completed_at=last_at - timedelta(days=3))
+        second = _payment(user, -4000, completed_at=last_at)
+        db.add_all([first, second])
+        await db.commit()
+
+        # Массовый DELETE не проходит через ORM-хуки
+        await db.execute(delete(Transaction).where(Transaction.id == second.id))
+        assert await _spending(db, user.id) == (6000, 2, last_at)
+
+        await refresh_user_spending(db, [user.id])
+        assert await _spending(db, user.id) == (2000, 1, last_at - timedelta(days=3))
+
+
+@pytest.mark.asyncio
+async def test_rebuild_user_spending_after_restore_bulk_insert(monkeypatch):
+    async with memory_session(monkeypatch, TABLES) as db:
+        users = [_user(index, datetime.now(UTC)) for index in range(3)]
+        db.add_all(users)
+        await db.commit()
+        last_at = datetime(2026, 7, 1, tzinfo=UTC)
+        # Восстановление бекапа пишет транзакции Core-INSERT в обход хуков
+        await db.execute(
+            Transaction.__table__.insert(),
+            [
+                {'user_id': users[0].id, 'type': TransactionType.SUBSCRIPTION_PAYMENT.value, 'amount_kopeks': -1500,
+                 'is_completed': True, 'completed_at': last_at},
+                {'user_id': users[0].id, 'type': TransactionType.SUBSCRIPTION_PAYMENT.value, 'amount_kopeks': -700,
+                 'is_completed': None, 'completed_at': last_at},
+                {'user_id': users[1].id, 'type': TransactionType.DEPOSIT.value, 'amount_kopeks': 9000,
+                 'is_completed': True, 'completed_at': None},
+            ],
+        )  # fmt: skip
+        await db.execute(User.__table__.update().where(User.id == users[2].id).values(total_spent_kopeks=999))
+        assert await _spending(db, users[0].id) == (0, 0, None)
+
+        await rebuild_user_spending(db)
+
+        assert await _spending(db, users[0].id) == (1500, 1, last_at)
+        assert await _spending(db, users[1].id) == (0, 0, None)
+        assert await _spending(db, users[2].id) == (0, 0, None)
+
+
+@pytest.mark.asyncio
+async def test_users_count_is_cached_per_filter_set(monkeypatch):
+    monkeypatch.setattr(settings, 'ADMIN_USERS_COUNT_CACHE_SECONDS', 30)
+    monkeypatch.setattr(user_crud, '_users_count_cache', {})
+    async with memory_session(monkeypatch, TABLES) as db:
+        db.add_all([_user(index, datetime.now(UTC)) for index in range(3)])
+        await db.commit()
+
+        assert await get_users_count_cached(db) == (3, False)
+        assert await get_users_count_cached(db, search='user1', status=None) == (1, False)
+
+        db.add(_user(10, datetime.now(UTC)))
+        await db.commit()
+        assert await get_users_count_cached(db) == (3, False)
+
+        monkeypatch.setattr(settings, 'ADMIN_USERS_COUNT_CACHE_SECONDS', 0)
+        assert await get_users_count_cached(db) == (4, False)
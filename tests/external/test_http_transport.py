@@ -0,0 +1,116 @@
+"""Клиенты платёжных шлюзов ходят через общий HTTP-транспорт.
+
+Сессия одна на провайдера поверх общего коннектора; повторяются только
+неотправленные запросы и идемпотентные методы; лежащий провайдер отключается
+circuit breaker'ом, а задержки и ошибки видны по эндпоинтам.
+"""
+
+from __future__ import annotations
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.config import settings
+from app.external.http_transport import CircuitOpenError, HttpTransport, endpoint_label
+
+
+@pytest.fixture
+def transport(monkeypatch) -> HttpTransport:
+    monkeypatch.setattr(settings, 'HTTP_TRANSPORT_RETRY_BASE_DELAY', 0)
+    monkeypatch.setattr(settings, 'HTTP_TRANSPORT_MAX_RETRIES', 2)
+    monkeypatch.setattr(settings, 'HTTP_TRANSPORT_BREAKER_FAILURES', 3)
+    monkeypatch.setattr(settings, 'HTTP_TRANSPORT_BREAKER_COOLDOWN_SECONDS', 60)
+    return HttpTransport()
+
+
+async def _server(statuses: list[int]) -> tuple[TestServer, list[str]]:
+    hits: list[str] = []
+
+    async def handler(request: web.Request) -> web.Response:
+        hits.append(f'{request.method} {request.path}')
+        status = statuses.pop(0) if statuses else 200
+        return web.json_response({'ok': status < 400}, status=status)
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server, hits
+
+
+def test_endpoint_label_collapses_invoice_ids():
+    assert endpoint_label('get', '/api/v1/bill/BX7a91k2/status') == 'GET /api/v1/bill/{id}/status'
+    assert endpoint_label('POST', '/v2/transaction/process') == 'POST /v2/transaction/process'
+    assert endpoint_label('GET', '/transaction/3f2a6c1e-9b7d-4e55-8c8a-0d1f2e3a4b5c') == 'GET /transaction/{id}'
+
+
+@pytest.mark.asyncio
+async def test_providers_share_connector_and_reuse_their_session(transport):
+    server, _hits = await _server([])
+    try:
+        first = transport.session('lava')
+        assert transport.session('lava') is first
+        other = transport.session('cispay')
+        assert other is not first
+        assert other.connector is first.connector
+
+        async with first.get(server.make_url('/ping')) as response:
+            assert response.status == 200
+        assert not first.closed  # клиент сессию не закрывает
+    finally:
+        await transport.close()
+        await server.close()
+    assert first.closed and other.closed
+
+
+@pytest.mark.asyncio
+async def test_only_idempotent_requests_are_retried_on_gateway_errors(transport):
+    server, hits = await _server([503, 502, 200, 503])
+    try:
+        session = transport.session('platega')
+        async with session.get(server.make_url('/transaction/123456789')) as response:
+            assert response.status == 200
+        # POST создаёт счёт — повтор после отправки мог бы создать его дважды
+        async with session.post(server.make_url('/transaction/process'), json={}) as response:
+            assert response.status == 503
+    finally:
+        await transport.close()
+        await server.close()
+
+    assert hits == ['GET /transaction/123456789'] * 3 + ['POST /transaction/process']
+    endpoints = transport.get_stats()['providers']['platega']['endpoints']
+    assert endpoints['GET /transaction/{id}']['requests'] == 3
+    assert endpoints['GET /transaction/{id}']['retries'] == 2
+    assert endpoints['GET /transaction/{id}']['errors'] == 2
+    assert endpoints['POST /transaction/process']['retries'] == 0
+    assert sum(endpoints['GET /transaction/{id}']['buckets_ms'].values()) == 3
+
+
+@pytest.mark.asyncio
+async def test_unavailable_provider_is_cut_off_until_probe_succeeds(transport, monkeypatch):
+    server, hits = await _server([500, 500, 500])
+    try:
+        session = transport.session('heleket', max_retries=0)
+        for _ in range(3):
+            async with session.post(server.make_url('/v1/payment/info')) as response:
+                assert response.status == 500
+
+        with pytest.raises(CircuitOpenError) as error:
+            await session.post(server.make_url('/v1/payment/info'))
+        assert isinstance(error.value, aiohttp.ClientError)  # существующие except его ловят
+        assert len(hits) == 3
+        assert transport.get_stats()['providers']['heleket']['circuit'] == 'open'
+
+        monkeypatch.setattr(settings, 'HTTP_TRANSPORT_BREAKER_COOLDOWN_SECONDS', 0)
+        async with session.post(server.make_url('/v1/payment/info')) as response:
+            assert response.status == 200
+    finally:
+        await transport.close()
+        await server.close()
+
+    stats = transport.get_stats()['providers']['heleket']
+    assert stats['circuit'] == 'closed'
+    assert stats['circuit_opened_total'] == 1
+    assert stats['consecutive_failures'] == 0
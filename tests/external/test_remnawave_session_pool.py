@@ -0,0 +1,99 @@
+"""Клиенты RemnaWaveAPI арендуют общую keep-alive сессию вместо своей на каждый вызов.
+
+Регрессия, от которой защищаемся: `__aenter__` создавал новый TCPConnector +
+ClientSession, а `__aexit__` его закрывал — каждый вызов панели платил
+TCP+TLS handshake. Теперь сессия одна на конфигурацию и закрывается только
+при смене настроек панели или на shutdown.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from app.config import settings
+from app.external import remnawave_api
+from app.external.remnawave_api import RemnaWaveAPI
+from app.external.remnawave_session_pool import RemnaWaveSessionPool
+
+
+@pytest.fixture
+def pool(monkeypatch) -> RemnaWaveSessionPool:
+    monkeypatch.setattr(settings, 'REMNAWAVE_API_POOL_ENABLED', True)
+    fresh_pool = RemnaWaveSessionPool()
+    monkeypatch.setattr(remnawave_api, 'remnawave_session_pool', fresh_pool)
+    return fresh_pool
+
+
+@pytest.mark.asyncio
+async def test_sequential_clients_share_one_session(pool):
+    async with RemnaWaveAPI(base_url='https://panel.example.com', api_key='key') as first:
+        first_session = first.session
+    async with RemnaWaveAPI(base_url='https://panel.example.com', api_key='key') as second:
+        second_session = second.session
+
+    assert first_session is second_session
+    assert not first_session.closed
+
+    stats = pool.get_stats()
+    assert stats['sessions'] == 1
+    assert stats['leases_in_use'] == 0
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_instance_nested_enters_do_not_close_session(pool):
+    # SubscriptionService держит один экземпляр клиента на все корутины.
+    api = RemnaWaveAPI(base_url='https://panel.example.com', api_key='key')
+    async with api:
+        async with api:
+            assert pool.get_stats()['leases_in_use'] == 2
+        assert not api.session.closed
+        assert pool.get_stats()['leases_in_use'] == 1
+
+    assert not api.session.closed
+    assert pool.get_stats()['leases_in_use'] == 0
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_config_change_closes_stale_session_after_last_lease(pool):
+    old_api = RemnaWaveAPI(base_url='https://panel.example.com', api_key='old')
+    async with old_api:
+        old_session = old_api.session
+        async with RemnaWaveAPI(base_url='https://panel.example.com', api_key='new') as new_api:
+            assert new_api.session is not old_session
+            assert not old_session.closed  # ещё арендована старым клиентом
+
+    assert old_session.closed
+    assert pool.get_stats()['sessions'] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_close_shuts_down_all_sessions(pool):
+    async with RemnaWaveAPI(base_url='https://panel.example.com', api_key='key') as api:
+        session = api.session
+
+    await pool.close()
+
+    assert session.closed
+    assert pool.get_stats()['sessions'] == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_disabled_falls_back_to_per_call_session(pool, monkeypatch):
+    monkeypatch.setattr(settings, 'REMNAWAVE_API_POOL_ENABLED', False)
+
+    async with RemnaWaveAPI(base_url='https://panel.example.com', api_key='key') as api:
+        session = api.session
+
+    assert session.closed
+    assert pool.get_stats()['sessions'] == 0
+
+
+def test_stats_shape_without_sessions():
+    stats = RemnaWaveSessionPool().get_stats()
+
+    assert stats['sessions'] == 0
+    assert stats['handshakes_per_sec'] == 0
+    assert stats['limit_per_host'] <= stats['limit']
@@ -15,7 +15,8 @@ from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.compiler import compiles
 
-from app.database.models import Base
+from app.database.crud.payment_index import PAYMENT_INDEX_SOURCES
+from app.database.models import Base, PaymentIndex, ReferralClosure, User
 
 
 @compiles(JSONB, 'sqlite')
@@ -37,8 +38,19 @@ def ensure_real_aiosqlite(monkeypatch) -> None:
 
 @contextlib.asynccontextmanager
 async def memory_session(monkeypatch, tables: Sequence[Table]) -> AsyncIterator[AsyncSession]:
-    """Сессия к :memory: БД, где созданы только переданные таблицы."""
+    """Сессия к :memory: БД, где созданы только переданные таблицы.
+
+    Вместе с ``users`` всегда создаётся ``referral_closure``: её пишут хуки ``User``
+    и ``Transaction``. Вместе с таблицами платежей — ``payment_index`` (хуки моделей
+    провайдеров и пополнений Stars).
+    """
     ensure_real_aiosqlite(monkeypatch)
+    tables = list(tables)
+    if User.__table__ in tables and ReferralClosure.__table__ not in tables:
+        tables.append(ReferralClosure.__table__)
+    payment_tables = {model.__table__ for model in PAYMENT_INDEX_SOURCES}
+    if PaymentIndex.__table__ not in tables and payment_tables.intersection(tables):
+        tables.append(PaymentIndex.__table__)
     engine = create_async_engine('sqlite+aiosqlite:///:memory:')
     async with engine.begin() as conn:
         await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=list(tables)))
@@ -49,11 +49,11 @@ def _period_tariff(tariff_id: int = 42):
 
 
 async def test_show_tariffs_list_single_tariff_skips_list_and_proceeds(monkeypatch):
-    """Один тариф из get_tariffs_for_user → не рисуем список, сразу _proceed с skip_selection."""
+    """Один тариф из каталога → не рисуем список, сразу _proceed с skip_selection."""
     tariff = SimpleNamespace(id=42, name='Единственный')
     proceed = AsyncMock()
 
-    monkeypatch.setattr(m, 'get_tariffs_for_user', AsyncMock(return_value=[tariff]))
+    monkeypatch.setattr(m, 'get_cached_tariffs_for_user', AsyncMock(return_value=[tariff]))
     monkeypatch.setattr(m, '_proceed_with_selected_tariff', proceed)
     monkeypatch.setattr(m, 'format_tariffs_list_text', MagicMock(return_value='LIST'))
     monkeypatch.setattr(m, 'get_tariffs_keyboard', MagicMock(return_value='KB'))
@@ -75,7 +75,7 @@ async def test_show_tariffs_list_multiple_tariffs_shows_list(monkeypatch):
     ]
     proceed = AsyncMock()
 
-    monkeypatch.setattr(m, 'get_tariffs_for_user', AsyncMock(return_value=tariffs))
+    monkeypatch.setattr(m, 'get_cached_tariffs_for_user', AsyncMock(return_value=tariffs))
     monkeypatch.setattr(m, '_proceed_with_selected_tariff', proceed)
     monkeypatch.setattr(m, 'format_tariffs_list_text', MagicMock(return_value='LIST TEXT'))
     monkeypatch.setattr(m, 'get_tariffs_keyboard', MagicMock(return_value='LIST KB'))
@@ -192,7 +192,7 @@ async def test_single_owned_tariff_shows_the_list_instead_of_a_dead_button(monke
     tariff = SimpleNamespace(id=42, name='Единственный')
     proceed = AsyncMock()
 
-    monkeypatch.setattr(m, 'get_tariffs_for_user', AsyncMock(return_value=[tariff]))
+    monkeypatch.setattr(m, 'get_cached_tariffs_for_user', AsyncMock(return_value=[tariff]))
     monkeypatch.setattr(m, '_proceed_with_selected_tariff', proceed)
     monkeypatch.setattr(m, 'format_tariffs_list_text', MagicMock(return_value='LIST TEXT'))
     monkeypatch.setattr(m, 'get_tariffs_keyboard', MagicMock(return_value='LIST KB'))
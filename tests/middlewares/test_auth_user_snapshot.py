@@ -0,0 +1,312 @@
+"""AuthMiddleware обслуживает лёгкие хендлеры снимком и не пишет last_activity на каждый апдейт.
+
+Раньше каждое сообщение/колбэк грузило User с четырьмя selectinload и
+заканчивалось UPDATE+COMMIT из-за `last_activity`. Теперь:
+  * хендлер без параметра `db_user` получает `user_snapshot` — тяжёлой
+    загрузки нет вовсе;
+  * last_activity копится в коалесцере и уходит пакетным UPDATE;
+  * заблокированный по снимку пользователь отсекается без похода в БД.
+"""
+
+import dataclasses
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.types import CallbackQuery
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import app.middlewares.auth as auth_module
+from app.database.models import SubscriptionStatus, User, UserStatus
+from app.middlewares.display_name_restriction import DisplayNameRestrictionMiddleware
+from app.services.user_activity_service import UserActivityCoalescer
+from app.utils import user_snapshot_cache as snapshot_module
+from app.utils.user_snapshot_cache import UserSnapshot, UserSnapshotCache
+from tests.fixtures.sqlite_memory import memory_session
+
+
+TELEGRAM_ID = 555
+
+
+def _snapshot(status: str = UserStatus.ACTIVE.value) -> UserSnapshot:
+    return UserSnapshot(
+        id=7,
+        telegram_id=TELEGRAM_ID,
+        status=status,
+        language='ru',
+        username='alice',
+        first_name='Alice',
+        last_name=None,
+    )
+
+
+def _callback() -> MagicMock:
+    event = MagicMock(spec=CallbackQuery)
+    event.from_user = SimpleNamespace(
+        id=TELEGRAM_ID, is_bot=False, username='alice', first_name='Alice', last_name=None
+    )
+    event.data = 'menu_info'
+    event.answer = AsyncMock()
+    return event
+
+
+class _FakeSession:
+    def __init__(self) -> None:
+        self.commit = AsyncMock()
+        self.rollback = AsyncMock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def wired(monkeypatch):
+    cache = UserSnapshotCache()
+    coalescer = MagicMock()
+    coalescer.is_running.return_value = True
+    coalescer.record.return_value = True
+    load_user = AsyncMock()
+    monkeypatch.setattr(auth_module, 'user_snapshot_cache', cache)
+    monkeypatch.setattr(auth_module, 'user_activity_coalescer', coalescer)
+    monkeypatch.setattr(auth_module, 'get_user_by_telegram_id', load_user)
+    monkeypatch.setattr(auth_module, 'AsyncSessionLocal', _FakeSession)
+    monkeypatch.setattr(snapshot_module.cache, 'get', AsyncMock(return_value=None))
+    monkeypatch.setattr(snapshot_module.cache, 'set', AsyncMock(return_value=True))
+    return SimpleNamespace(cache=cache, coalescer=coalescer, load_user=load_user)
+
+
+async def test_handler_without_db_user_is_served_from_snapshot(wired):
+    wired.cache._remember(_snapshot())
+    handler = AsyncMock(return_value='ok')
+    data = {'handler': SimpleNamespace(params={'callback', 'db'}, varkw=False)}
+
+    result = await auth_module.AuthMiddleware()(handler, _callback(), data)
+
+    assert result == 'ok'
+    wired.load_user.assert_not_awaited()
+    assert data['user_snapshot'].id == 7
+    assert data['db_user'] is None
+    wired.coalescer.record.assert_called_once()
+
+
+async def test_handler_with_db_user_still_gets_orm_user(wired, monkeypatch):
+    wired.cache._remember(_snapshot())
+    db_user = SimpleNamespace(
+        id=7,
+        telegram_id=TELEGRAM_ID,
+        status=UserStatus.ACTIVE.value,
+        language='ru',
+        username='alice',
+        first_name='Alice',
+        last_name=None,
+        remnawave_id=None,
+        last_activity=None,
+    )
+    wired.load_user.return_value = db_user
+    handler = AsyncMock(return_value='ok')
+    data = {'handler': SimpleNamespace(params={'callback', 'db_user'}, varkw=False)}
+
+    set_committed = MagicMock()
+    monkeypatch.setattr(auth_module, 'set_committed_value', set_committed)
+    await auth_module.AuthMiddleware()(handler, _callback(), data)
+
+    wired.load_user.assert_awaited_once()
+    assert data['db_user'] is db_user
+    wired.coalescer.record.assert_called_once()
+    # last_activity выставлен без пометки строки грязной — UPDATE уйдёт пакетом
+    set_committed.assert_called_once()
+    assert set_committed.call_args.args[1] == 'last_activity'
+
+
+async def test_overdue_subscription_bypasses_snapshot(wired):
+    # Просроченную подписку деактивирует SubscriptionStatusMiddleware, а ему нужен ORM-пользователь
+    overdue = datetime.now(UTC) - timedelta(minutes=10)
+    wired.cache._remember(dataclasses.replace(_snapshot(), next_expiry_at=overdue.timestamp()))
+    wired.load_user.return_value = None
+    data = {'handler': SimpleNamespace(params={'callback'}, varkw=False)}
+
+    await auth_module.AuthMiddleware()(AsyncMock(), _callback(), data)
+
+    wired.load_user.assert_awaited_once()
+
+
+def test_snapshot_tracks_next_expiry_of_active_subscriptions():
+    now = datetime.now(UTC)
+
+    def subscription(status, days, daily=False):
+        return SimpleNamespace(
+            status=status,
+            end_date=now + timedelta(days=days),
+            is_daily_paused=False,
+            tariff=SimpleNamespace(is_daily=daily),
+        )
+
+    user = SimpleNamespace(
+        id=7,
+        telegram_id=TELEGRAM_ID,
+        status=UserStatus.ACTIVE.value,
+        language='ru',
+        username='alice',
+        first_name='Alice',
+        last_name=None,
+        remnawave_id=None,
+        subscriptions=[
+            subscription(SubscriptionStatus.ACTIVE.value, 30),
+            subscription(SubscriptionStatus.ACTIVE.value, 3),
+            subscription(SubscriptionStatus.ACTIVE.value, -1, daily=True),
+            subscription(SubscriptionStatus.EXPIRED.value, -5),
+        ],
+    )
+
+    snapshot = UserSnapshot.from_user(user)
+    assert snapshot.next_expiry_at == (now + timedelta(days=3)).timestamp()
+    assert not snapshot.expiry_due(now.timestamp())
+
+    # Подписки не загружены — о сроках ничего не известно, снимок не годится
+    del user.subscriptions
+    assert UserSnapshot.from_user(user).expiry_due(now.timestamp())
+
+
+async def test_display_name_warning_uses_snapshot_language():
+    data = {'db_user': None, 'user_snapshot': _snapshot()}
+    tg_user = SimpleNamespace(language_code='en')
+
+    assert DisplayNameRestrictionMiddleware._resolve_language(tg_user, data) == 'ru'
+
+
+async def test_profile_change_bypasses_snapshot(wired):
+    wired.cache._remember(
+        UserSnapshot(
+            id=7,
+            telegram_id=TELEGRAM_ID,
+            status=UserStatus.ACTIVE.value,
+            language='ru',
+            username='old_name',
+            first_name='Alice',
+            last_name=None,
+        )
+    )
+    wired.load_user.return_value = None  # дальше не важно: проверяем, что пошли в БД
+    data = {'handler': SimpleNamespace(params={'callback'}, varkw=False)}
+
+    await auth_module.AuthMiddleware()(AsyncMock(), _callback(), data)
+
+    wired.load_user.assert_awaited_once()
+
+
+async def test_blocked_snapshot_rejected_without_db(wired):
+    wired.cache._remember(_snapshot(UserStatus.BLOCKED.value))
+    event = _callback()
+    handler = AsyncMock()
+
+    result = await auth_module.AuthMiddleware()(handler, event, {})
+
+    assert result is None
+    handler.assert_not_awaited()
+    wired.load_user.assert_not_awaited()
+    event.answer.assert_awaited_once()
+
+
+def test_committed_user_change_invalidates_snapshot(monkeypatch):
+    cache = UserSnapshotCache()
+    monkeypatch.setattr(snapshot_module, 'user_snapshot_cache', cache)
+    cache._remember(_snapshot())
+
+    from app.database.models import User
+
+    changed = User(id=7, telegram_id=TELEGRAM_ID)
+    session = SimpleNamespace(new=set(), dirty={changed}, deleted=set(), info={})
+
+    snapshot_module._collect_changed_users(session, None)
+    assert cache._l1  # до коммита снимок живой
+    snapshot_module._invalidate_after_commit(session)
+
+    assert not cache._l1
+
+
+def test_rolled_back_change_keeps_snapshot(monkeypatch):
+    cache = UserSnapshotCache()
+    monkeypatch.setattr(snapshot_module, 'user_snapshot_cache', cache)
+    cache._remember(_snapshot())
+
+    session = SimpleNamespace(info={'user_snapshot_invalidate': ({TELEGRAM_ID}, set())})
+    snapshot_module._discard_after_rollback(session, SimpleNamespace(nested=False))
+    snapshot_module._invalidate_after_commit(session)
+
+    assert cache._l1
+
+
+def test_coalescer_keeps_latest_activity():
+    coalescer = UserActivityCoalescer()
+    coalescer._running = True
+    coalescer._task = MagicMock(done=MagicMock(return_value=False))
+    now = datetime.now(UTC)
+
+    assert coalescer.record(1, now)
+    assert coalescer.record(1, now - timedelta(seconds=5))
+    assert coalescer.record(1, now + timedelta(seconds=5))
+
+    assert coalescer._pending == {1: now + timedelta(seconds=5)}
+    assert coalescer.coalesced == 2
+
+
+def test_coalescer_not_running_asks_caller_to_write():
+    assert UserActivityCoalescer().record(1, datetime.now(UTC)) is False
+
+
+async def test_coalescer_flushes_one_batched_update(monkeypatch):
+    import app.services.user_activity_service as activity_module
+
+    session = _FakeSession()
+    session.execute = AsyncMock()
+    monkeypatch.setattr(activity_module, 'AsyncSessionLocal', lambda: session)
+    coalescer = UserActivityCoalescer()
+    now = datetime.now(UTC)
+    coalescer._pending = {1: now, 2: now, 3: now}
+
+    written = await coalescer.flush()
+
+    assert written == 3
+    session.execute.assert_awaited_once()
+    rows = session.execute.await_args.args[1]
+    assert {row['id'] for row in rows} == {1, 2, 3}
+    session.commit.assert_awaited_once()
+    assert coalescer._pending == {}
+
+
+async def test_coalescer_flush_keeps_updated_at(monkeypatch):
+    import app.services.user_activity_service as activity_module
+
+    async with memory_session(monkeypatch, (User.__table__,)) as db:
+        stamp = datetime(2026, 1, 1, tzinfo=UTC)
+        db.add(User(id=1, telegram_id=TELEGRAM_ID, updated_at=stamp))
+        await db.commit()
+        monkeypatch.setattr(activity_module, 'AsyncSessionLocal', async_sessionmaker(db.bind))
+        coalescer = UserActivityCoalescer()
+        now = datetime.now(UTC)
+        coalescer._pending = {1: now}
+
+        assert await coalescer.flush() == 1
+
+        user = (await db.execute(select(User).execution_options(populate_existing=True))).scalar_one()
+        assert user.last_activity == now
+        assert user.updated_at == stamp
+
+
+async def test_coalescer_requeues_on_failure(monkeypatch):
+    import app.services.user_activity_service as activity_module
+
+    session = _FakeSession()
+    session.execute = AsyncMock(side_effect=RuntimeError('db down'))
+    monkeypatch.setattr(activity_module, 'AsyncSessionLocal', lambda: session)
+    coalescer = UserActivityCoalescer()
+    now = datetime.now(UTC)
+    coalescer._pending = {1: now}
+
+    assert await coalescer.flush() == 0
+    assert coalescer._pending == {1: now}
@@ -153,6 +153,7 @@ def _make_db() -> SimpleNamespace:
         execute=AsyncMock(),
         delete=AsyncMock(),
         flush=AsyncMock(),
+        run_sync=AsyncMock(),
     )
 
 
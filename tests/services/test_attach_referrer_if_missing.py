@@ -615,3 +615,36 @@ async def test_helper_uses_caller_supplied_bot_when_provided(db: AsyncMock) -> N
     fire.assert_awaited_once()
     _args, kwargs = fire.call_args
     assert kwargs.get('bot') is caller_bot
+
+
+@pytest.mark.asyncio
+async def test_attach_updates_referral_closure_and_branch_totals(monkeypatch) -> None:
+    """Условный Core UPDATE идёт мимо хуков User — замыкание переносится явно."""
+    from sqlalchemy import select
+
+    from app.database.models import ReferralClosure, User
+    from tests.fixtures.sqlite_memory import memory_session
+
+    async with memory_session(monkeypatch, (User.__table__,)) as session:
+        root = User(id=1, telegram_id=1001)
+        referrer = User(id=2, telegram_id=1002, referred_by_id=1)
+        user = User(id=3, telegram_id=1003)
+        session.add_all([root, referrer, user])
+        await session.commit()
+
+        with (
+            patch('app.services.referral_service.get_pending_referral', AsyncMock(return_value={'referrer_id': 2})),
+            patch('app.services.referral_service.get_user_by_id', AsyncMock(return_value=referrer)),
+            patch('app.services.referral_service.clear_pending_referral', AsyncMock()),
+            patch('app.services.referral_service.process_referral_registration', AsyncMock()),
+        ):
+            assert await attach_referrer_if_missing(session, user, source='unit_test') == 2
+
+        links = (
+            await session.execute(
+                select(ReferralClosure.ancestor_id, ReferralClosure.depth).where(ReferralClosure.descendant_id == 3)
+            )
+        ).all()
+        assert sorted(links) == [(1, 2), (2, 1)]
+        sizes = dict((await session.execute(select(User.id, User.referral_branch_size))).all())
+        assert sizes == {1: 2, 2: 1, 3: 0}
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from sqlalchemy import select
+
+from app.database.models import Subscription, Tariff, User
+from app.services.backup_service import BackupService
+from tests.fixtures.sqlite_memory import memory_session
+
+
+def _service() -> BackupService:
+    return BackupService.__new__(BackupService)
+
+
+def _user(user_id: int, telegram_id: int, *, referred_by_id: int | None = None, balance: int = 0) -> dict:
+    return {
+        'id': user_id,
+        'telegram_id': telegram_id,
+        'username': f'user{user_id}',
+        'balance_kopeks': balance,
+        'referred_by_id': referred_by_id,
+        'created_at': '2026-01-01T00:00:00+00:00',
+    }
+
+
+async def test_users_are_upserted_in_bulk_and_referrals_backfilled(monkeypatch):
+    service = _service()
+    backup_data = {
+        'users': [
+            _user(1, 1001),
+            _user(2, 1002, referred_by_id=1),
+            _user(3, 1003, referred_by_id=99),  # реферер не попал в бекап
+        ]
+    }
+
+    async with memory_session(monkeypatch, [User.__table__]) as db:
+        db.add(User(id=1, telegram_id=1001, username='stale', balance_kopeks=500))
+        await db.commit()
+
+        await service._restore_users_without_referrals(db, backup_data, {'users': User})
+        await service._update_user_referrals(db, backup_data)
+        await db.commit()
+
+        rows = (await db.execute(select(User.id, User.username, User.balance_kopeks, User.referred_by_id))).all()
+
+    assert sorted(rows) == [(1, 'user1', 0, None), (2, 'user2', 0, 1), (3, 'user3', 0, None)]
+
+
+async def test_unique_conflict_skips_only_offending_row(monkeypatch):
+    service = _service()
+    backup_data = {'users': [_user(1, 1001), _user(2, 5000), _user(3, 1003)]}
+
+    async with memory_session(monkeypatch, [User.__table__]) as db:
+        # telegram_id уникален: строка id=2 конфликтует с уже существующим пользователем
+        db.add(User(id=10, telegram_id=5000, username='existing'))
+        await db.commit()
+
+        await service._restore_users_without_referrals(db, backup_data, {'users': User})
+        await db.commit()
+
+        ids = set((await db.execute(select(User.id))).scalars().all())
+
+    assert ids == {1, 3, 10}
+
+
+async def test_subscriptions_with_unknown_tariff_get_null_tariff(monkeypatch):
+    service = _service()
+    records = [
+        {
+            'id': 1,
+            'user_id': 1,
+            'tariff_id': 7,
+            'remnawave_short_id': 'a1',
+            'status': 'active',
+            'end_date': '2026-02-01T00:00:00+00:00',
+        },
+        {
+            'id': 2,
+            'user_id': 2,
+            'tariff_id': 404,
+            'remnawave_short_id': 'b2',
+            'status': 'active',
+            'end_date': '2026-02-01T00:00:00+00:00',
+        },
+    ]
+
+    async with memory_session(monkeypatch, [User.__table__, Tariff.__table__, Subscription.__table__]) as db:
+        db.add_all([User(id=1, telegram_id=1001), User(id=2, telegram_id=1002)])
+        db.add(Tariff(id=7, name='Base', period_prices={}))
+        await db.commit()
+
+        restored = await service._restore_table_records(db, Subscription, 'subscriptions', records, False)
+        await db.commit()
+
+        tariffs = dict((await db.execute(select(Subscription.id, Subscription.tariff_id))).all())
+
+    assert restored == 2
+    assert tariffs == {1: 7, 2: None}
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database.models import Base, Transaction, tariff_promo_groups
+from app.services import backup_service
+from app.services.backup_service import export_tables_to_ndjson, read_ndjson_dump
+from tests.fixtures.sqlite_memory import ensure_real_aiosqlite
+
+
+async def test_export_streams_tables_in_primary_key_chunks(monkeypatch, tmp_path):
+    ensure_real_aiosqlite(monkeypatch)
+    sqlite_engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "export.sqlite"}')
+    try:
+        await _run_export_scenario(sqlite_engine, tmp_path)
+    finally:
+        await sqlite_engine.dispose()
+
+
+async def _run_export_scenario(sqlite_engine, tmp_path) -> None:
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=[Transaction.__table__, tariff_promo_groups]))
+
+    created_at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=UTC)
+    async with sqlite_engine.begin() as conn:
+        await conn.execute(
+            insert(Transaction.__table__),
+            [
+                {
+                    'id': index,
+                    'user_id': 1,
+                    'type': 'deposit',
+                    'amount_kopeks': index * 100,
+                    'created_at': created_at,
+                }
+                for index in range(1, 11)
+            ],
+        )
+        await conn.execute(
+            insert(tariff_promo_groups),
+            [{'tariff_id': tariff_id, 'promo_group_id': group_id} for tariff_id in (1, 2) for group_id in (1, 2, 3)],
+        )
+
+    dump_path = tmp_path / 'database.ndjson.gz'
+    exported = await export_tables_to_ndjson(
+        sqlite_engine,
+        [
+            ('transactions', Transaction.__table__),
+            ('tariff_promo_groups', tariff_promo_groups),
+            ('users', Base.metadata.tables['users']),  # таблицы нет в БД — пропускается
+        ],
+        dump_path,
+        chunk_size=4,
+    )
+
+    assert exported == {'transactions': 10, 'tariff_promo_groups': 6}
+
+    tables = read_ndjson_dump(dump_path)
+    transactions = tables['transactions']
+    assert [row['id'] for row in transactions] == list(range(1, 11))
+    assert transactions[2]['amount_kopeks'] == 300
+    assert transactions[0]['created_at'].startswith('2026-01-02T03:04:05')
+    assert sorted((row['tariff_id'], row['promo_group_id']) for row in tables['tariff_promo_groups']) == [
+        (1, 1),
+        (1, 2),
+        (1, 3),
+        (2, 1),
+        (2, 2),
+        (2, 3),
+    ]
+    assert 'users' not in tables
+
+
+async def test_table_failing_midway_is_left_out_of_dump(monkeypatch, tmp_path):
+    ensure_real_aiosqlite(monkeypatch)
+    sqlite_engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "export.sqlite"}')
+    try:
+        async with sqlite_engine.begin() as conn:
+            await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=[tariff_promo_groups]))
+            await conn.execute(
+                insert(tariff_promo_groups),
+                [{'tariff_id': 1, 'promo_group_id': group_id} for group_id in range(1, 6)],
+            )
+
+        real_iter = backup_service._iter_table_chunks
+        calls = {'count': 0}
+
+        async def failing_iter(conn, table, chunk_size):
+            calls['count'] += 1
+            async for rows in real_iter(conn, table, chunk_size):
+                yield rows
+                if calls['count'] == 1:
+                    raise RuntimeError('connection lost')
+
+        monkeypatch.setattr(backup_service, '_iter_table_chunks', failing_iter)
+
+        dump_path = tmp_path / 'database.ndjson.gz'
+        exported = await export_tables_to_ndjson(
+            sqlite_engine,
+            [('broken', tariff_promo_groups), ('tariff_promo_groups', tariff_promo_groups)],
+            dump_path,
+            chunk_size=2,
+        )
+    finally:
+        await sqlite_engine.dispose()
+
+    # Из сломавшейся таблицы в дамп не попало ничего — даже первые две строки
+    assert exported == {'tariff_promo_groups': 5}
+    tables = read_ndjson_dump(dump_path)
+    assert set(tables) == {'tariff_promo_groups'}
+    assert len(tables['tariff_promo_groups']) == 5
@@ -0,0 +1,80 @@
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock
+
+from app.config import settings
+from app.services.blacklist_service import BlacklistIndex, BlacklistService, parse_blacklist
+
+
+BLACKLIST_FILE = """
+# комментарий
+7021477105 # @MAMYT_PAXAL2016 перепродажа подписок
+123 спам
+456
+not-a-number # @broken
+123 # @duplicate повтор
+"""
+
+
+def _service(monkeypatch, tmp_path) -> BlacklistService:
+    monkeypatch.setattr(settings, 'BLACKLIST_CHECK_ENABLED', True)
+    monkeypatch.setattr(settings, 'BLACKLIST_IGNORE_ADMINS', False)
+    monkeypatch.setattr(settings, 'BLACKLIST_CACHE_PATH', str(tmp_path / 'blacklist_cache.txt'))
+    return BlacklistService()
+
+
+def test_parse_blacklist_formats():
+    assert parse_blacklist(BLACKLIST_FILE) == [
+        (7021477105, '@MAMYT_PAXAL2016', 'перепродажа подписок'),
+        (123, '', 'спам'),
+        (456, '', 'Занесен в черный список'),
+        (123, '@duplicate', 'повтор'),
+    ]
+
+
+def test_index_lookups_match_linear_scan_semantics():
+    index = BlacklistIndex.build(parse_blacklist(BLACKLIST_FILE))
+
+    # Первая запись с тем же ID выигрывает, как при линейном поиске
+    assert index.by_id[123] == (123, '', 'спам')
+    assert index.by_username['mamyt_paxal2016'][0] == 7021477105
+    assert index.by_username['duplicate'][0] == 123
+    assert len(index.entries) == 4
+
+
+async def test_is_user_blacklisted_by_id_and_username(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    service.blacklist_data = parse_blacklist(BLACKLIST_FILE)
+    service.last_update = datetime.now(UTC)
+    monkeypatch.setattr(service, 'update_blacklist', AsyncMock(side_effect=AssertionError('no fetch expected')))
+
+    assert await service.is_user_blacklisted(456) == (True, 'Занесен в черный список')
+    assert await service.is_user_blacklisted(1, '@mamyt_paxal2016') == (True, 'перепродажа подписок')
+    assert await service.is_user_blacklisted(2, 'MAMYT_PAXAL2016') == (True, 'перепродажа подписок')
+    assert await service.is_user_blacklisted(3, 'someone') == (False, None)
+    assert await service.get_user_by_username('Duplicate') == (123, '@duplicate', 'повтор')
+    assert await service.get_user_by_telegram_id(999) is None
+
+
+async def test_persisted_copy_serves_checks_before_first_fetch(monkeypatch, tmp_path):
+    (tmp_path / 'blacklist_cache.txt').write_text(BLACKLIST_FILE, encoding='utf-8')
+    service = _service(monkeypatch, tmp_path)
+    update = AsyncMock(return_value=True)
+    monkeypatch.setattr(service, 'update_blacklist', update)
+
+    assert await service.is_user_blacklisted(7021477105) == (True, 'перепродажа подписок')
+    update.assert_not_awaited()
+    assert service.last_update is not None
+
+
+async def test_stale_list_refreshes_in_background(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    service.blacklist_data = parse_blacklist(BLACKLIST_FILE)
+    service.last_update = datetime.now(UTC) - timedelta(days=2)
+    update = AsyncMock(return_value=True)
+    monkeypatch.setattr(service, 'update_blacklist', update)
+
+    assert await service.is_user_blacklisted(123) == (True, 'спам')
+    assert await service.is_user_blacklisted(124) == (False, None)
+    await service._refresh_task
+
+    assert update.await_count == 1
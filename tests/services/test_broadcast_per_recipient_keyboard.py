@@ -42,7 +42,6 @@ async def test_keyboard_factory_builds_personal_keyboard_per_recipient(monkeypat
 
     monkeypatch.setattr(service, '_deliver_message', fake_deliver)
     monkeypatch.setattr(service, '_update_progress', noop_progress)
-    monkeypatch.setattr('app.services.broadcast_service._TG_BATCH_DELAY', 0)
 
     offers = {101: 5001, 102: 5002}
     config = _config(
@@ -77,7 +76,6 @@ async def test_blocked_recipients_counted_separately(monkeypatch):
 
     monkeypatch.setattr(service, '_deliver_message', fake_deliver)
     monkeypatch.setattr(service, '_update_progress', noop_progress)
-    monkeypatch.setattr('app.services.broadcast_service._TG_BATCH_DELAY', 0)
 
     config = _config(recipient_ids=[101, 102], keyboard_factory=lambda telegram_id: _promo_keyboard(1))
 
@@ -105,7 +103,6 @@ async def test_without_factory_shared_keyboard_is_used(monkeypatch):
 
     monkeypatch.setattr(service, '_deliver_message', fake_deliver)
     monkeypatch.setattr(service, '_update_progress', noop_progress)
-    monkeypatch.setattr('app.services.broadcast_service._TG_BATCH_DELAY', 0)
 
     shared = _promo_keyboard(1)
     sent, _failed, _blocked, _cancelled = await service._send_batched(
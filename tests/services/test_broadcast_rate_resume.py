@@ -0,0 +1,244 @@
+"""Рассылка: токен-бакет со скользящим окном, адаптация к FloodWait и продолжение по курсору.
+
+Раньше отправка шла пачками по 25 с паузой в секунду: пачка ждала самого
+медленного получателя, список получателей целиком висел в памяти, а рестарт
+бота терял весь прогресс рассылки.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+from app.database.models import (
+    BroadcastHistory,
+    PromoGroup,
+    Subscription,
+    SubscriptionStatus,
+    Tariff,
+    User,
+    UserStatus,
+)
+from app.handlers.admin.messages import fetch_broadcast_recipients_page
+from app.services import broadcast_service as broadcast_module
+from app.services.broadcast_service import BroadcastConfig, BroadcastService, _AdaptiveRateLimiter, _ResumePoint
+from tests.fixtures.sqlite_memory import memory_session
+
+
+def _config(**kwargs) -> BroadcastConfig:
+    defaults = {'target': 'all', 'message_text': 'Новости', 'selected_buttons': [], 'category': 'system'}
+    defaults.update(kwargs)
+    return BroadcastConfig(**defaults)
+
+
+def _service(monkeypatch, deliver) -> tuple[BroadcastService, list[dict]]:
+    service = BroadcastService()
+    progress: list[dict] = []
+
+    async def record_progress(broadcast_id, sent, failed, blocked=0, **kwargs):
+        progress.append({'sent': sent, **kwargs})
+
+    monkeypatch.setattr(service, '_deliver_message', deliver)
+    monkeypatch.setattr(service, '_update_progress', record_progress)
+    monkeypatch.setattr(broadcast_module, '_TG_RATE_PER_SEC', 1000.0)
+    return service, progress
+
+
+async def test_slow_recipient_does_not_block_the_window(monkeypatch):
+    delivered: list[int] = []
+
+    async def deliver(telegram_id, config, keyboard):
+        if telegram_id == 1:
+            await asyncio.sleep(0.2)
+        delivered.append(telegram_id)
+
+    service, _ = _service(monkeypatch, deliver)
+
+    result = await service._send_batched(1, [1, 2, 3, 4], _config(), None, asyncio.Event())
+
+    assert result == (4, 0, 0, False)
+    # Остальные ушли, не дожидаясь медленного первого получателя.
+    assert delivered == [2, 3, 4, 1]
+
+
+async def test_resume_skips_already_processed_positions(monkeypatch):
+    delivered: list[int] = []
+
+    async def deliver(telegram_id, config, keyboard):
+        delivered.append(telegram_id)
+
+    service, _ = _service(monkeypatch, deliver)
+    resume = _ResumePoint(cursor=2, sent_count=2)
+
+    result = await service._send_batched(1, [101, 102, 103], _config(), None, asyncio.Event(), resume_from=resume)
+
+    assert delivered == [103]
+    assert result == (3, 0, 0, False)
+
+
+async def test_progress_cursor_never_passes_unfinished_recipient(monkeypatch):
+    monkeypatch.setattr(broadcast_module, '_PROGRESS_MIN_INTERVAL_SEC', 0.0)
+    release_first = asyncio.Event()
+
+    async def deliver(telegram_id, config, keyboard):
+        if telegram_id == 10:
+            await release_first.wait()
+
+    service, progress = _service(monkeypatch, deliver)
+
+    async def stream():
+        for key, telegram_id in ((5, 10), (6, 11), (9, None)):
+            yield key, telegram_id
+        await asyncio.sleep(0.05)
+        release_first.set()
+
+    await service._send_batched(1, stream(), _config(), None, asyncio.Event())
+
+    # Пока получатель с ключом 5 в полёте, курсор не уходит дальше 4.
+    assert progress
+    assert all(entry['resume_cursor'] <= 4 for entry in progress)
+
+
+async def test_saved_counts_match_resume_cursor(monkeypatch):
+    monkeypatch.setattr(broadcast_module, '_PROGRESS_MIN_INTERVAL_SEC', 0.0)
+    release_first = asyncio.Event()
+
+    async def deliver(telegram_id, config, keyboard):
+        if telegram_id == 10:
+            await release_first.wait()
+
+    service, progress = _service(monkeypatch, deliver)
+    resume = _ResumePoint(cursor=4, sent_count=3, blocked_count=1)
+
+    async def stream():
+        for key, telegram_id in ((5, 10), (6, 11), (7, 12)):
+            yield key, telegram_id
+            await asyncio.sleep(0.01)
+        release_first.set()
+        await asyncio.sleep(0.01)
+        yield 8, 13
+
+    result = await service._send_batched(1, stream(), _config(), None, asyncio.Event(), resume_from=resume)
+
+    assert result == (7, 0, 1, False)
+    # Пока ключ 5 в полёте, уже доставленные 6 и 7 в сохранённый прогресс не входят:
+    # после рестарта их отправят снова, и считать их дважды нельзя.
+    for entry in progress:
+        assert entry['sent'] == 3 + max(0, min(entry['resume_cursor'], 7) - 4)
+    assert progress[-1]['resume_cursor'] == 7
+    assert progress[-1]['sent'] == 6
+
+
+async def test_flood_wait_halves_rate_and_recovers():
+    limiter = _AdaptiveRateLimiter(20.0, min_rate=1.0, recovery_step=5.0)
+
+    limiter.on_flood_wait(0.01)
+    assert limiter.rate == 10.0
+    limiter.on_flood_wait(0.01)
+    assert limiter.rate == 5.0
+
+    await asyncio.sleep(1.05)
+    limiter.on_success()
+    assert limiter.rate == 10.0
+
+
+async def test_cancel_stops_spawning_and_marks_cancelled(monkeypatch):
+    cancel_event = asyncio.Event()
+    delivered: list[int] = []
+
+    async def deliver(telegram_id, config, keyboard):
+        delivered.append(telegram_id)
+        cancel_event.set()
+
+    service, _ = _service(monkeypatch, deliver)
+    marked: list[tuple] = []
+
+    async def mark_cancelled(*args):
+        marked.append(args)
+
+    monkeypatch.setattr(service, '_mark_cancelled', mark_cancelled)
+
+    async def stream():
+        yield 1, 100
+        await asyncio.sleep(0.01)
+        yield 2, 200
+
+    result = await service._send_batched(1, stream(), _config(), None, cancel_event)
+
+    assert delivered == [100]
+    assert result[3] is True
+    assert marked
+
+
+async def test_recipients_page_is_keyset_ordered_and_filtered(monkeypatch):
+    now = datetime.now(UTC)
+    async with memory_session(
+        monkeypatch, (User.__table__, Subscription.__table__, Tariff.__table__, PromoGroup.__table__)
+    ) as db:
+        users = [User(telegram_id=500 + index, status=UserStatus.ACTIVE.value) for index in range(5)]
+        db.add_all(users)
+        await db.commit()
+        # Активная платная подписка только у чётных.
+        db.add_all(
+            [
+                Subscription(
+                    user_id=user.id,
+                    status=SubscriptionStatus.ACTIVE.value,
+                    is_trial=False,
+                    start_date=now - timedelta(days=1),
+                    end_date=now + timedelta(days=10),
+                    remnawave_short_id=f's{user.id}',
+                )
+                for user in users[::2]
+            ]
+        )
+        await db.commit()
+
+        first, cursor = await fetch_broadcast_recipients_page(db, 'active', limit=2)
+        second, cursor_2 = await fetch_broadcast_recipients_page(db, 'active', after_user_id=cursor, limit=2)
+        third, cursor_3 = await fetch_broadcast_recipients_page(db, 'active', after_user_id=cursor_2, limit=2)
+
+    assert [user.id for user in first] == [users[0].id]
+    assert cursor == users[1].id
+    assert [user.id for user in second] == [users[2].id]
+    assert [user.id for user in third] == [users[4].id]
+    assert cursor_3 is None
+
+
+async def test_interrupted_segment_broadcast_is_resumed_from_cursor(monkeypatch):
+    async with memory_session(monkeypatch, (User.__table__, BroadcastHistory.__table__)) as db:
+        db.add_all(
+            [
+                BroadcastHistory(
+                    id=1,
+                    target_type='all',
+                    message_text='Новости',
+                    status='in_progress',
+                    sent_count=40,
+                    failed_count=1,
+                    resume_cursor=41,
+                    resume_state={'selected_buttons': ['home'], 'custom_buttons': None},
+                ),
+                # Персональная рассылка без resume_state заново не запускается.
+                BroadcastHistory(id=2, target_type='promo_offer_direct', message_text='Промо', status='in_progress'),
+            ]
+        )
+        await db.commit()
+
+        @asynccontextmanager
+        async def session_factory():
+            yield db
+
+        monkeypatch.setattr(broadcast_module, 'AsyncSessionLocal', session_factory)
+        service = BroadcastService()
+        service.set_bot(MagicMock())
+        start = AsyncMock()
+        monkeypatch.setattr(service, 'start_broadcast', start)
+
+        assert await service.resume_interrupted() == 1
+
+    broadcast_id, config = start.await_args.args
+    assert broadcast_id == 1
+    assert config.selected_buttons == ['home']
+    resume = start.await_args.kwargs['resume_from']
+    assert (resume.cursor, resume.sent_count, resume.failed_count) == (41, 40, 1)
@@ -0,0 +1,118 @@
+"""Клики по кнопкам пишутся пачками одним фоновым писателем.
+
+Раньше каждый клик порождал задачу со своей сессией БД и одиночным INSERT.
+Теперь клики копятся в ограниченном буфере, пишутся многострочным INSERT,
+а при переполнении отбрасываются со счётчиком, не создавая задач.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import app.services.button_click_log_service as writer_module
+from app.config import settings
+from app.middlewares.button_stats import ButtonStatsMiddleware
+from app.services.button_click_log_service import ButtonClickLogWriter
+
+
+class _FakeSession:
+    def __init__(self, users: list[tuple[int, int]]) -> None:
+        self.commit = AsyncMock()
+        self.inserted: list[dict] = []
+        self._users = users
+        self.execute = AsyncMock(side_effect=self._execute)
+
+    async def _execute(self, statement, params=None):
+        if params is not None:
+            self.inserted.extend(params)
+            return None
+        return SimpleNamespace(all=lambda: self._users)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _running_writer() -> ButtonClickLogWriter:
+    writer = ButtonClickLogWriter()
+    writer._running = True
+    writer._task = MagicMock(done=MagicMock(return_value=False))
+    return writer
+
+
+@pytest.fixture
+def session(monkeypatch) -> _FakeSession:
+    fake = _FakeSession(users=[(7, 922920255)])
+    monkeypatch.setattr(writer_module, 'AsyncSessionLocal', lambda: fake)
+    return fake
+
+
+async def test_flush_writes_one_multirow_insert(session):
+    writer = _running_writer()
+    for index in range(3):
+        assert writer.record(button_id=f'menu_{index}', user_id=922920255, button_type='builtin')
+    writer.record(button_id='/start', user_id=111, button_type='command')
+
+    assert await writer.flush() == 4
+
+    # Один SELECT для сопоставления пользователей и один INSERT на всю пачку.
+    assert session.execute.await_count == 2
+    session.commit.assert_awaited_once()
+    assert [row['user_id'] for row in session.inserted] == [7, 7, 7, None]
+    assert all(row['clicked_at'] is not None for row in session.inserted)
+    assert writer.get_stats()['pending'] == 0
+
+
+async def test_full_buffer_drops_with_counter(monkeypatch):
+    monkeypatch.setattr(settings, 'BUTTON_CLICK_LOG_BATCH_SIZE', 2)
+    monkeypatch.setattr(settings, 'BUTTON_CLICK_LOG_BUFFER_SIZE', 2)
+    writer = _running_writer()
+
+    for index in range(5):
+        assert writer.record(button_id=f'b{index}')
+
+    stats = writer.get_stats()
+    assert stats['pending'] == 2
+    assert stats['dropped'] == 3
+
+
+async def test_failed_flush_does_not_requeue(monkeypatch):
+    fake = _FakeSession(users=[])
+    fake.execute = AsyncMock(side_effect=RuntimeError('db down'))
+    monkeypatch.setattr(writer_module, 'AsyncSessionLocal', lambda: fake)
+    writer = _running_writer()
+    writer.record(button_id='menu_info')
+
+    assert await writer.flush() == 0
+    assert writer.get_stats()['pending'] == 0
+    assert writer.failed == 1
+
+
+async def test_stop_flushes_buffer(session):
+    writer = ButtonClickLogWriter()
+    await writer.start()
+    writer.record(button_id='menu_info', user_id=922920255)
+
+    await writer.stop()
+
+    assert [row['button_id'] for row in session.inserted] == ['menu_info']
+    assert not writer.is_running()
+
+
+def test_middleware_uses_writer_without_spawning_tasks(monkeypatch):
+    writer = _running_writer()
+    monkeypatch.setattr('app.middlewares.button_stats.button_click_log_writer', writer)
+    create_task = MagicMock()
+    monkeypatch.setattr('app.middlewares.button_stats.asyncio.create_task', create_task)
+
+    ButtonStatsMiddleware()._log_command(SimpleNamespace(text='/start', from_user=SimpleNamespace(id=1)))
+
+    create_task.assert_not_called()
+    assert writer.get_stats()['pending'] == 1
+
+
+def test_writer_not_running_is_rejected():
+    assert ButtonClickLogWriter().record(button_id='menu_info') is False
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import json
+
+from app.cabinet.routes import websocket as cabinet_websocket
+from app.config import settings
+from app.services.cluster_event_bus import ClusterEventBus
+
+
+class _LocalBroker:
+    """Локальная замена Redis pub/sub: рассылает сообщения всем подпискам процесса."""
+
+    def __init__(self) -> None:
+        self.subscriptions: list[_LocalPubSub] = []
+        self.redeliver = False
+
+    def client(self) -> _LocalRedis:
+        return _LocalRedis(self)
+
+
+class _LocalRedis:
+    def __init__(self, broker: _LocalBroker) -> None:
+        self.broker = broker
+
+    async def publish(self, channel: str, message: str) -> int:
+        receivers = [sub for sub in self.broker.subscriptions if fnmatch.fnmatchcase(channel, sub.pattern)]
+        for sub in receivers:
+            for _ in range(2 if self.broker.redeliver else 1):
+                sub.queue.put_nowait({'type': 'pmessage', 'channel': channel.encode(), 'data': message.encode()})
+        return len(receivers)
+
+    def pubsub(self) -> _LocalPubSub:
+        return _LocalPubSub(self.broker)
+
+    async def aclose(self) -> None:
+        return None
+
+
+class _LocalPubSub:
+    def __init__(self, broker: _LocalBroker) -> None:
+        self.broker = broker
+        self.pattern = ''
+        self.queue: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def psubscribe(self, pattern: str) -> None:
+        self.pattern = pattern
+        self.broker.subscriptions.append(self)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+    async def aclose(self) -> None:
+        if self in self.broker.subscriptions:
+            self.broker.subscriptions.remove(self)
+
+
+class _FakeWebSocket:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str = '') -> None:
+        return None
+
+
+async def _settle() -> None:
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def _start_pair(monkeypatch, broker: _LocalBroker) -> tuple[ClusterEventBus, ClusterEventBus]:
+    monkeypatch.setattr(settings, 'EVENT_BUS_CLUSTER_ENABLED', True)
+    first = ClusterEventBus(instance_id='a', redis_factory=broker.client)
+    second = ClusterEventBus(instance_id='b', redis_factory=broker.client)
+    return first, second
+
+
+async def test_message_reaches_other_instance_but_not_origin(monkeypatch):
+    broker = _LocalBroker()
+    first, second = await _start_pair(monkeypatch, broker)
+    received: dict[str, list] = {'a': [], 'b': []}
+    first.subscribe('events', received['a'].append)
+    second.subscribe('events', received['b'].append)
+    await first.start()
+    await second.start()
+    try:
+        assert first.publish('events', {'type': 'ticket.created'})
+        await _settle()
+    finally:
+        await first.stop()
+        await second.stop()
+
+    assert received == {'a': [], 'b': [{'type': 'ticket.created'}]}
+    stats = second.get_stats()
+    assert stats['received'] == 1
+    assert stats['latency_ms_p50'] is not None
+    assert first.get_stats()['published'] == 1
+
+
+async def test_redelivered_message_is_applied_once(monkeypatch):
+    broker = _LocalBroker()
+    broker.redeliver = True
+    first, second = await _start_pair(monkeypatch, broker)
+    received = []
+    second.subscribe('events', received.append)
+    await first.start()
+    await second.start()
+    try:
+        first.publish('events', {'n': 1})
+        first.publish('events', {'n': 2})
+        await _settle()
+    finally:
+        await first.stop()
+        await second.stop()
+
+    assert received == [{'n': 1}, {'n': 2}]
+    assert second.get_stats()['duplicates'] == 2
+
+
+async def test_publish_is_noop_when_cluster_mode_disabled(monkeypatch):
+    monkeypatch.setattr(settings, 'EVENT_BUS_CLUSTER_ENABLED', False)
+    bus = ClusterEventBus(redis_factory=_LocalBroker().client)
+    await bus.start()
+
+    assert not bus.is_running()
+    assert bus.publish('events', {'n': 1}) is False
+
+
+async def test_cabinet_notification_reaches_socket_on_another_instance(monkeypatch):
+    broker = _LocalBroker()
+    first, second = await _start_pair(monkeypatch, broker)
+    origin_manager = cabinet_websocket.CabinetConnectionManager()
+    remote_manager = cabinet_websocket.CabinetConnectionManager()
+    second.subscribe('cabinet', remote_manager.deliver_remote)
+    monkeypatch.setattr(cabinet_websocket, 'cluster_event_bus', first)
+
+    local_socket, remote_socket, admin_socket = _FakeWebSocket(), _FakeWebSocket(), _FakeWebSocket()
+    await origin_manager.connect(local_socket, 7, False)
+    await remote_manager.connect(remote_socket, 7, False)
+    await remote_manager.connect(admin_socket, 1, True)
+    await first.start()
+    await second.start()
+    try:
+        await origin_manager.send_to_user(7, {'type': 'balance.topup', 'amount_kopeks': 100})
+        await origin_manager.send_to_admins({'type': 'ticket.new', 'ticket_id': 5})
+        await _settle()
+    finally:
+        await first.stop()
+        await second.stop()
+        await origin_manager.disconnect(local_socket, 7)
+        await remote_manager.disconnect(remote_socket, 7)
+        await remote_manager.disconnect(admin_socket, 1)
+
+    assert local_socket.sent == [{'type': 'balance.topup', 'amount_kopeks': 100}]
+    assert remote_socket.sent == [{'type': 'balance.topup', 'amount_kopeks': 100}]
+    assert admin_socket.sent == [{'type': 'ticket.new', 'ticket_id': 5}]
@@ -0,0 +1,128 @@
+"""Планировщик этапов мониторинга: параллельные группы, таймауты, отдельные транзакции и метрики."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.database.models import MonitoringLog
+from app.services.monitoring_scheduler import MonitoringStage, StageScheduler
+from app.services.monitoring_service import MonitoringService
+from tests.fixtures.sqlite_memory import memory_session
+
+
+def _stage(name: str, run, group: str = 'main', interval: float = 3600, timeout: float = 5) -> MonitoringStage:
+    return MonitoringStage(
+        name=name, title=name, run=run, group=group, interval_seconds=interval, timeout_seconds=timeout
+    )
+
+
+@pytest.mark.asyncio
+async def test_slow_stage_times_out_without_blocking_others(monkeypatch):
+    events: list[str] = []
+    failures: list[tuple[str, str]] = []
+
+    async def slow(_db):
+        await asyncio.sleep(5)
+
+    async def after_slow(_db):
+        events.append('after_slow')
+
+    async def other_group(_db):
+        events.append('other_group')
+
+    async def on_failure(stage, error):
+        failures.append((stage.name, error))
+
+    async with memory_session(monkeypatch, [MonitoringLog.__table__]) as db:
+        scheduler = StageScheduler(
+            [
+                _stage('slow', slow, group='panel', timeout=0.05),
+                _stage('after_slow', after_slow, group='panel'),
+                _stage('other_group', other_group, group='subscriptions'),
+            ],
+            session_factory=async_sessionmaker(db.bind, expire_on_commit=False, autoflush=False),
+            on_failure=on_failure,
+        )
+        await asyncio.wait_for(scheduler.run_due(), timeout=2)
+
+    # Другая группа не ждёт медленный этап, следующий этап группы выполняется после таймаута
+    assert events == ['other_group', 'after_slow']
+    assert failures == [('slow', 'таймаут 0.05 с')]
+    slow_stats = scheduler.stats['slow']
+    assert slow_stats.failures == 1 and slow_stats.last_success_at is None
+    assert slow_stats.last_duration < 1
+    assert scheduler.stats['after_slow'].last_success_at is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_stage_rolls_back_only_its_own_transaction(monkeypatch):
+    async def broken(db):
+        db.add(MonitoringLog(event_type='broken', message='x', data={}))
+        await db.flush()
+        raise RuntimeError('boom')
+
+    async def healthy(db):
+        db.add_all([MonitoringLog(event_type='healthy', message=str(i), data={}) for i in range(2)])
+
+    async with memory_session(monkeypatch, [MonitoringLog.__table__]) as db:
+        scheduler = StageScheduler(
+            [_stage('broken', broken), _stage('healthy', healthy)],
+            session_factory=async_sessionmaker(db.bind, expire_on_commit=False, autoflush=False),
+        )
+        await scheduler.run_due()
+
+        rows = await db.execute(select(MonitoringLog.event_type, func.count()).group_by(MonitoringLog.event_type))
+        assert dict(rows.tuples().all()) == {'healthy': 2}
+
+    snapshot = {stage['name']: stage for stage in scheduler.snapshot()}
+    assert snapshot['broken']['last_error'] == 'boom'
+    assert snapshot['broken']['last_success_at'] is None
+    assert snapshot['healthy']['last_rows'] == 2
+    assert snapshot['healthy']['last_success_at'] is not None
+
+
+@pytest.mark.asyncio
+async def test_stage_runs_only_when_its_interval_elapsed(monkeypatch):
+    calls = {'hourly': 0, 'always': 0}
+
+    async def hourly(_db):
+        calls['hourly'] += 1
+
+    async def always(_db):
+        calls['always'] += 1
+
+    async with memory_session(monkeypatch, [MonitoringLog.__table__]) as db:
+        scheduler = StageScheduler(
+            [_stage('hourly', hourly, interval=3600), _stage('always', always, group='fast', interval=0)],
+            session_factory=async_sessionmaker(db.bind, expire_on_commit=False, autoflush=False),
+        )
+        await scheduler.run_due()
+        await scheduler.run_due()
+        assert calls == {'hourly': 1, 'always': 2}
+        assert scheduler.seconds_until_due(scheduler.stages[0]) > 3500
+
+        await scheduler.run_due(force=True)
+        assert calls == {'hourly': 2, 'always': 3}
+
+
+def test_stage_overrides_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'MONITORING_INTERVAL', 30)
+    monkeypatch.setattr(settings, 'MONITORING_STAGE_TIMEOUT_SECONDS', 120)
+    monkeypatch.setattr(settings, 'MONITORING_STAGE_INTERVALS', 'panel_sync:5, traffic_warnings:abc, expired:0,')
+    monkeypatch.setattr(settings, 'MONITORING_STAGE_TIMEOUTS', 'panel_sync:30')
+
+    assert settings.get_monitoring_stage_intervals() == {'panel_sync': 5}
+    stages = {stage.name: stage for stage in MonitoringService()._build_stages()}
+
+    assert (stages['panel_sync'].interval_seconds, stages['panel_sync'].timeout_seconds) == (300, 30)
+    assert (stages['expired'].interval_seconds, stages['expired'].timeout_seconds) == (1800, 120)
+
+    # Автоплатёж и сверки провайдеров — в одной группе с истечением и раньше него
+    order = [name for name, stage in stages.items() if stage.group == stages['expired'].group]
+    assert order.index('autopay') < order.index('platega_reconcile') < order.index('expired')
+    assert stages['panel_sync'].group != stages['expired'].group
@@ -169,7 +169,7 @@ async def test_request_success(monkeypatch: pytest.MonkeyPatch) -> None:
 
     response_payload = {'ok': True}
     monkeypatch.setattr(
-        'app.services.mulenpay_service.aiohttp.ClientSession',
+        'app.services.mulenpay_service.http_transport.session',
         _session_factory(
             [
                 _DummyResponse(status=200, body=json.dumps(response_payload)),
@@ -198,7 +198,7 @@ async def test_request_retries_on_server_error(monkeypatch: pytest.MonkeyPatch)
     )
 
     monkeypatch.setattr(
-        'app.services.mulenpay_service.aiohttp.ClientSession',
+        'app.services.mulenpay_service.http_transport.session',
         _session_factory(
             [
                 _DummyResponse(status=502, body='{"error": "bad gateway"}'),
@@ -227,7 +227,7 @@ async def test_request_returns_none_after_timeouts(monkeypatch: pytest.MonkeyPat
     )
 
     monkeypatch.setattr(
-        'app.services.mulenpay_service.aiohttp.ClientSession',
+        'app.services.mulenpay_service.http_transport.session',
         _session_factory([TimeoutError()]),
     )
 
@@ -241,7 +241,7 @@ async def test_request_reraises_cancelled(monkeypatch: pytest.MonkeyPatch) -> No
     service = MulenPayService()
 
     monkeypatch.setattr(
-        'app.services.mulenpay_service.aiohttp.ClientSession',
+        'app.services.mulenpay_service.http_transport.session',
         _session_factory([asyncio.CancelledError()]),
     )
 
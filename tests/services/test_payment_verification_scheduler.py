@@ -0,0 +1,118 @@
+"""Автопроверка пополнений: расписание по возрасту счёта, лимиты провайдеров и пакетная сверка."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import app.services.payment_verification_service as verification
+from app.config import settings
+from app.database.models import CryptoBotPayment, Pal24Payment, PaymentMethod, User, UserStatus
+from app.services.payment_verification_service import AutoPaymentVerificationService, recheck_delay
+from tests.fixtures.sqlite_memory import memory_session
+
+
+TABLES = (User.__table__, Pal24Payment.__table__, CryptoBotPayment.__table__)
+
+
+def test_recheck_delay_is_dense_for_fresh_invoices_and_capped_for_old(monkeypatch):
+    monkeypatch.setattr(settings, 'PAYMENT_VERIFICATION_MIN_RECHECK_SECONDS', 30)
+    monkeypatch.setattr(settings, 'PAYMENT_VERIFICATION_AUTO_CHECK_INTERVAL_MINUTES', 10)
+
+    assert recheck_delay(timedelta(seconds=20)) == timedelta(seconds=30)
+    assert recheck_delay(timedelta(minutes=20)) == timedelta(minutes=2)
+    assert recheck_delay(timedelta(hours=20)) == timedelta(minutes=10)
+
+
+class _FakeCryptoBot:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    async def get_invoices(self, invoice_ids=None, count=100):
+        self.calls.append(list(invoice_ids))
+        return [{'invoice_id': 'cb-same', 'status': 'active'}, {'invoice_id': 'cb-paid', 'status': 'paid'}]
+
+
+@pytest.mark.asyncio
+async def test_tick_checks_due_invoices_in_parallel_and_schedules_by_age(monkeypatch):
+    monkeypatch.setattr(settings, 'PAYMENT_VERIFICATION_MIN_RECHECK_SECONDS', 30)
+    monkeypatch.setattr(settings, 'PAYMENT_VERIFICATION_AUTO_CHECK_INTERVAL_MINUTES', 10)
+    monkeypatch.setattr(settings, 'PAYMENT_VERIFICATION_PROVIDER_CONCURRENCY', 1)
+    monkeypatch.setattr(settings, 'PAYMENT_VERIFICATION_PROVIDER_RATE_LIMIT', 0)
+
+    now = datetime.now(UTC)
+    async with memory_session(monkeypatch, TABLES) as db:
+        db.add(User(id=1, telegram_id=1001, status=UserStatus.ACTIVE.value, language='ru'))
+        await db.commit()
+        fresh = Pal24Payment(user_id=1, bill_id='fresh', amount_kopeks=100, status='NEW', created_at=now)
+        old = Pal24Payment(
+            user_id=1, bill_id='old', amount_kopeks=100, status='NEW', created_at=now - timedelta(hours=2)
+        )
+        done = Pal24Payment(user_id=1, bill_id='done', amount_kopeks=100, status='SUCCESS', is_paid=True)
+        same = CryptoBotPayment(user_id=1, invoice_id='cb-same', amount='1', asset='USDT', status='active')
+        paid = CryptoBotPayment(user_id=1, invoice_id='cb-paid', amount='1', asset='USDT', status='active')
+        db.add_all([fresh, old, done, same, paid])
+        await db.commit()
+
+        monkeypatch.setattr(verification, 'AsyncSessionLocal', async_sessionmaker(db.bind, expire_on_commit=False))
+
+        checked: list[tuple[PaymentMethod, int]] = []
+        running = {'now': 0, 'max': 0}
+
+        async def fake_check(session, method, local_id, payment_service):
+            checked.append((method, local_id))
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            await asyncio.sleep(0.01)
+            running['now'] -= 1
+            if local_id == old.id and method == PaymentMethod.PAL24:
+                return None
+            payment = SimpleNamespace(is_paid=method == PaymentMethod.CRYPTOBOT, status='NEW')
+            return SimpleNamespace(
+                method=method,
+                identifier=str(local_id),
+                is_paid=payment.is_paid,
+                status='paid' if payment.is_paid else 'NEW',
+                expires_at=None,
+                payment=payment,
+            )
+
+        monkeypatch.setattr(verification, 'run_manual_check', fake_check)
+        cryptobot = _FakeCryptoBot()
+        service = AutoPaymentVerificationService()
+        service.set_payment_service(SimpleNamespace(cryptobot_service=cryptobot))
+
+        methods = [PaymentMethod.PAL24, PaymentMethod.CRYPTOBOT]
+        await service._run_checks(methods)
+        await asyncio.gather(*list(service._check_tasks))
+
+        # Неизменившийся счёт CryptoBot отсеян пакетной сверкой, оплаченный Pal24 не кандидат
+        assert set(checked) == {
+            (PaymentMethod.PAL24, fresh.id),
+            (PaymentMethod.PAL24, old.id),
+            (PaymentMethod.CRYPTOBOT, paid.id),
+        }
+        assert cryptobot.calls == [['cb-same', 'cb-paid']]
+        assert running['max'] == 2  # по одной проверке на провайдера, провайдеры — параллельно
+
+        schedule = service._next_check_at
+        assert schedule[(PaymentMethod.CRYPTOBOT, paid.id)] is None
+        fresh_delay = schedule[(PaymentMethod.PAL24, fresh.id)] - now
+        assert timedelta(seconds=29) < fresh_delay < timedelta(seconds=40)
+        old_delay = schedule[(PaymentMethod.PAL24, old.id)] - now
+        assert timedelta(minutes=9) < old_delay < timedelta(minutes=11)
+        assert schedule[(PaymentMethod.CRYPTOBOT, same.id)] > now
+
+        stats = service.get_provider_stats()
+        assert stats['cryptobot']['checks'] == 2 and stats['cryptobot']['batched'] == 1
+        assert stats['cryptobot']['paid'] == 1 and stats['cryptobot']['hit_rate'] == 0.5
+        assert stats['pal24']['checks'] == 2 and stats['pal24']['errors'] == 1
+
+        # Следующий такт сразу же: никому ещё не пора
+        await service._run_checks(methods)
+        assert not service._check_tasks
+        assert len(checked) == 3
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database.models import Base, PaymentWebhookInboxItem
+from app.services import payment_webhook_inbox as inbox_module
+from app.services.payment_webhook_inbox import PaymentWebhookInbox
+from tests.fixtures.sqlite_memory import ensure_real_aiosqlite
+
+
+async def _setup(monkeypatch, tmp_path):
+    ensure_real_aiosqlite(monkeypatch)
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "inbox.sqlite"}')
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=[PaymentWebhookInboxItem.__table__]))
+    maker = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+    monkeypatch.setattr(inbox_module, 'AsyncSessionLocal', maker)
+    return engine, maker
+
+
+async def _rows(maker) -> list[PaymentWebhookInboxItem]:
+    async with maker() as db:
+        return list((await db.execute(select(PaymentWebhookInboxItem).order_by(PaymentWebhookInboxItem.id))).scalars())
+
+
+async def _make_due(maker) -> None:
+    async with maker() as db:
+        await db.execute(
+            update(PaymentWebhookInboxItem).values(next_attempt_at=datetime.now(UTC) - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+async def _drain(inbox: PaymentWebhookInbox) -> int:
+    started = await inbox.process_pending()
+    await asyncio.gather(*list(inbox._workers))
+    return started
+
+
+async def test_enqueue_drops_redelivered_callback(monkeypatch, tmp_path):
+    engine, maker = await _setup(monkeypatch, tmp_path)
+    inbox = PaymentWebhookInbox()
+
+    assert await inbox.enqueue('paypear', 'process_paypear_callback', {'id': 'a'}, b'{"id": "a"}')
+    assert not await inbox.enqueue('paypear', 'process_paypear_callback', {'id': 'a'}, b'{"id": "a"}')
+    # Тот же body у другого провайдера — другой коллбек
+    assert await inbox.enqueue('lava', 'process_lava_callback', {'id': 'a'}, b'{"id": "a"}')
+
+    rows = await _rows(maker)
+    assert [(row.provider, row.status, row.payload) for row in rows] == [
+        ('paypear', 'pending', {'id': 'a'}),
+        ('lava', 'pending', {'id': 'a'}),
+    ]
+    await engine.dispose()
+
+
+async def test_failed_callback_is_retried_then_parked_until_replayed(monkeypatch, tmp_path):
+    engine, maker = await _setup(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, 'PAYMENT_WEBHOOK_INBOX_MAX_ATTEMPTS', 2)
+    outcomes: list = [RuntimeError('db hiccup'), False, True]
+    calls: list[dict] = []
+
+    async def process_paypear_callback(db, payload):
+        calls.append(payload)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    inbox = PaymentWebhookInbox()
+    inbox.set_payment_service(SimpleNamespace(process_paypear_callback=process_paypear_callback))
+    await inbox.enqueue('paypear', 'process_paypear_callback', {'id': 'a'}, b'{"id": "a"}')
+
+    assert await _drain(inbox) == 1
+    [row] = await _rows(maker)
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert 'db hiccup' in row.last_error
+    assert row.next_attempt_at > datetime.now(UTC)
+    # Ещё не пора — воркеры не трогают строку
+    assert await _drain(inbox) == 0
+
+    await _make_due(maker)
+    assert await _drain(inbox) == 1
+    [row] = await _rows(maker)
+    assert (row.status, row.attempts) == ('failed', 2)
+
+    await _make_due(maker)
+    assert await _drain(inbox) == 0
+
+    assert await inbox.replay(row.id)
+    assert not await inbox.replay(row.id)
+    assert await _drain(inbox) == 1
+    [row] = await _rows(maker)
+    assert (row.status, row.last_error) == ('done', None)
+    assert row.processed_at is not None
+    assert calls == [{'id': 'a'}] * 3
+
+    metrics = await inbox.get_metrics()
+    assert metrics['providers']['paypear']['processed'] == 1
+    assert metrics['providers']['paypear']['pending'] == 0
+    assert (metrics['succeeded'], metrics['failed'], metrics['exhausted']) == (1, 2, 1)
+    await engine.dispose()
+
+
+async def test_callback_interrupted_by_shutdown_is_picked_up_after_lease(monkeypatch, tmp_path):
+    engine, maker = await _setup(monkeypatch, tmp_path)
+    entered = asyncio.Event()
+
+    async def hanging(db, payload):
+        entered.set()
+        await asyncio.sleep(3600)
+
+    inbox = PaymentWebhookInbox()
+    inbox.set_payment_service(SimpleNamespace(process_lava_callback=hanging))
+    await inbox.enqueue('lava', 'process_lava_callback', {'id': 'x'}, b'x')
+
+    assert await inbox.process_pending() == 1
+    await entered.wait()
+    await inbox.stop()
+
+    [row] = await _rows(maker)
+    assert (row.status, row.attempts) == ('pending', 0)
+
+    metrics = await inbox.get_metrics()
+    assert metrics['providers']['lava']['pending'] == 1
+    assert metrics['in_flight'] == 0
+
+    async def ok(db, payload):
+        return True
+
+    restarted = PaymentWebhookInbox()
+    restarted.set_payment_service(SimpleNamespace(process_lava_callback=ok))
+    # Пока аренда не истекла, коллбек никто не берёт
+    assert await _drain(restarted) == 0
+    await _make_due(maker)
+    assert await _drain(restarted) == 1
+    [row] = await _rows(maker)
+    assert row.status == 'done'
+    await engine.dispose()
@@ -12,7 +12,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from app.database.crud import platega_subscription as sub_crud
-from app.database.models import Base, PlategaSubscription, Subscription, Transaction
+from app.database.models import Base, PlategaSubscription, ReferralClosure, Subscription, Transaction, User
+from tests.fixtures import sqlite_memory  # noqa: F401 — рендер JSONB для users на SQLite
 
 
 def _ensure_real_aiosqlite(monkeypatch) -> None:
@@ -37,6 +38,8 @@ async def _memory_session(monkeypatch):
     """Реальная in-memory SQLite сессия с таблицами platega_subscriptions,
     subscriptions и transactions (последние две нужны коллбек-тестам — продление
     через ``Subscription.extend_subscription`` и аудит через ``create_transaction``).
+    ``users`` и ``referral_closure`` нужны хукам ``Transaction``, которые ведут
+    итоги трат пользователя и его реферальной ветки.
 
     Полный create_all не годится (другие таблицы используют JSONB, SQLite не
     компилирует), а FK в SQLite по умолчанию не форсятся — поэтому user_id/
@@ -48,7 +51,14 @@ async def _memory_session(monkeypatch):
     async with engine.begin() as conn:
         await conn.run_sync(
             lambda c: Base.metadata.create_all(
-                c, tables=[PlategaSubscription.__table__, Subscription.__table__, Transaction.__table__]
+                c,
+                tables=[
+                    User.__table__,
+                    ReferralClosure.__table__,
+                    PlategaSubscription.__table__,
+                    Subscription.__table__,
+                    Transaction.__table__,
+                ],
             )
         )
     maker = async_sessionmaker(engine, expire_on_commit=False)
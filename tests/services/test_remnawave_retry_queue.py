@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.database.crud.subscription as subscription_crud
+import app.services.subscription_service as subscription_service_module
+from app.config import settings
+from app.database.models import Base, RemnaWaveRetryItem
+from app.services import remnawave_retry_queue as queue_module
+from tests.fixtures.sqlite_memory import ensure_real_aiosqlite
+
+
+class _FakeSubscriptionService:
+    results: list = []
+    calls: list = []
+
+    is_configured = True
+
+    async def create_remnawave_user(self, db, sub):
+        self.calls.append(('create', sub.id))
+        return self.results.pop(0)
+
+    async def update_remnawave_user(self, db, sub):
+        self.calls.append(('update', sub.id))
+        return self.results.pop(0)
+
+
+async def _setup(monkeypatch, tmp_path):
+    ensure_real_aiosqlite(monkeypatch)
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "retry.sqlite"}')
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=[RemnaWaveRetryItem.__table__]))
+    maker = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+    monkeypatch.setattr(queue_module, 'AsyncSessionLocal', maker)
+
+    async def _get_subscription(db, subscription_id):
+        return SimpleNamespace(id=subscription_id)
+
+    monkeypatch.setattr(subscription_crud, 'get_subscription_by_id', _get_subscription)
+    monkeypatch.setattr(subscription_service_module, 'SubscriptionService', _FakeSubscriptionService)
+    _FakeSubscriptionService.results = []
+    _FakeSubscriptionService.calls = []
+    return engine, maker
+
+
+async def _rows(maker) -> list[RemnaWaveRetryItem]:
+    async with maker() as db:
+        return list((await db.execute(select(RemnaWaveRetryItem))).scalars().all())
+
+
+async def _make_due(maker) -> None:
+    async with maker() as db:
+        await db.execute(update(RemnaWaveRetryItem).values(next_attempt_at=datetime.now(UTC) - timedelta(seconds=1)))
+        await db.commit()
+
+
+async def test_enqueue_coalesces_and_survives_as_rows(monkeypatch, tmp_path):
+    engine, maker = await _setup(monkeypatch, tmp_path)
+    try:
+        queue = queue_module.RemnaWaveRetryQueue()
+        queue.enqueue(1, 10, 'update')
+        queue.enqueue(1, 10, 'create')
+        queue.enqueue(2, 20, 'update')
+        assert queue.buffered_count == 2
+
+        assert await queue._persist_buffer() == 2
+        queue.enqueue(2, 20, 'update')
+        await queue._persist_buffer()
+
+        rows = {row.subscription_id: row for row in await _rows(maker)}
+    finally:
+        await engine.dispose()
+
+    assert rows[1].action == 'create'
+    assert rows[1].version == 1
+    assert rows[2].action == 'update'
+    assert rows[2].version == 2
+
+
+async def test_failed_attempt_backs_off_and_success_removes_row(monkeypatch, tmp_path):
+    engine, maker = await _setup(monkeypatch, tmp_path)
+    try:
+        queue = queue_module.RemnaWaveRetryQueue()
+        queue.enqueue(1, 10, 'create')
+        queue.enqueue(2, 20, 'update')
+        await queue._persist_buffer()
+
+        # До наступления next_attempt_at ничего не обрабатывается
+        assert await queue.process_pending() == 0
+
+        await _make_due(maker)
+        _FakeSubscriptionService.results = [None, object()]
+        assert await queue.process_pending() == 2
+
+        rows = await _rows(maker)
+        assert len(rows) == 1
+        failed = rows[0]
+        assert failed.attempts == 1
+        assert failed.last_error.endswith('returned None')
+        assert failed.next_attempt_at.replace(tzinfo=UTC) > datetime.now(UTC)
+
+        await _make_due(maker)
+        _FakeSubscriptionService.results = [object()]
+        assert await queue.process_pending() == 1
+        assert await _rows(maker) == []
+        assert queue.succeeded == 2
+    finally:
+        await engine.dispose()
+
+
+async def test_reenqueue_during_attempt_keeps_row(monkeypatch, tmp_path):
+    engine, maker = await _setup(monkeypatch, tmp_path)
+    try:
+        queue = queue_module.RemnaWaveRetryQueue()
+        queue.enqueue(1, 10, 'update')
+        await queue._persist_buffer()
+        await _make_due(maker)
+
+        class _ReenqueueingService(_FakeSubscriptionService):
+            async def update_remnawave_user(self, db, sub):
+                queue.enqueue(sub.id, 10, 'update')
+                await queue._persist_buffer()
+                return object()
+
+        monkeypatch.setattr(subscription_service_module, 'SubscriptionService', _ReenqueueingService)
+        await queue.process_pending()
+
+        rows = await _rows(maker)
+    finally:
+        await engine.dispose()
+
+    assert [(row.subscription_id, row.version) for row in rows] == [(1, 2)]
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, 'REMNAWAVE_RETRY_BASE_DELAY_SECONDS', 30)
+    monkeypatch.setattr(settings, 'REMNAWAVE_RETRY_MAX_DELAY_SECONDS', 600)
+
+    for attempts, ceiling in ((1, 30), (2, 60), (3, 120), (10, 600)):
+        delay = queue_module.retry_delay_seconds(attempts)
+        assert ceiling / 2 <= delay <= ceiling
@@ -0,0 +1,239 @@
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.config import Settings, settings
+from app.database.models import Subscription, User
+from app.services.remnawave_service import RemnaWaveService
+from app.utils import panel_sync_fingerprints as fingerprints_module
+from app.utils.panel_sync_fingerprints import (
+    PanelSyncFingerprints,
+    panel_sync_fingerprints,
+    panel_user_fingerprint,
+)
+
+
+@pytest.fixture(autouse=True)
+def _clean_fingerprints(monkeypatch):
+    monkeypatch.setattr(settings, 'REMNAWAVE_SYNC_SKIP_UNCHANGED', True)
+    panel_sync_fingerprints.clear()
+    yield
+    panel_sync_fingerprints.clear()
+
+
+def _create_service() -> RemnaWaveService:
+    service = RemnaWaveService.__new__(RemnaWaveService)
+    service._panel_timezone = ZoneInfo('UTC')
+    service._utc_timezone = ZoneInfo('UTC')
+    return service
+
+
+def _panel_user(panel_id: int, telegram_id: int | None, expire_at: str = '2026-01-01T00:00:00+00:00') -> dict:
+    return {
+        'id': panel_id,
+        'telegramId': telegram_id,
+        'email': None,
+        'expireAt': expire_at,
+        'status': 'ACTIVE',
+        'trafficLimitBytes': 0,
+        'activeInternalSquads': [{'uuid': 'b'}, {'uuid': 'a'}],
+    }
+
+
+def test_fingerprint_ignores_squad_order_but_tracks_expire():
+    base = _panel_user(1, 10)
+    reordered = {**base, 'activeInternalSquads': [{'uuid': 'a'}, {'uuid': 'b'}]}
+    extended = {**base, 'expireAt': '2026-02-01T00:00:00+00:00'}
+
+    assert panel_user_fingerprint(base) == panel_user_fingerprint(reordered)
+    assert panel_user_fingerprint(base) != panel_user_fingerprint(extended)
+
+
+def test_fingerprints_expire_and_respect_setting(monkeypatch):
+    store = PanelSyncFingerprints()
+    store.remember({1: 'abc'})
+
+    assert store.matches(1, 'abc')
+    assert not store.matches(1, 'other')
+
+    monkeypatch.setattr(settings, 'REMNAWAVE_SYNC_SKIP_UNCHANGED', False)
+    assert not store.matches(1, 'abc')
+
+    monkeypatch.setattr(settings, 'REMNAWAVE_SYNC_SKIP_UNCHANGED', True)
+    monkeypatch.setattr(settings, 'REMNAWAVE_SYNC_FINGERPRINT_TTL_SECONDS', -1)
+    store.remember({2: 'def'})
+    assert not store.matches(2, 'def')
+
+
+def test_committed_user_and_subscription_writes_drop_fingerprints():
+    panel_sync_fingerprints.remember({1: 'a', 2: 'b', 3: 'c'})
+    session = SimpleNamespace(
+        new=[Subscription(user_id=2)],
+        dirty=[User(id=1)],
+        deleted=[],
+        info={},
+    )
+
+    fingerprints_module._collect_changed_users(session, None)
+    fingerprints_module._invalidate_after_commit(session)
+
+    assert not panel_sync_fingerprints.matches(1, 'a')
+    assert not panel_sync_fingerprints.matches(2, 'b')
+    assert panel_sync_fingerprints.matches(3, 'c')
+
+
+async def test_reconcile_page_skips_unchanged_users(monkeypatch):
+    service = _create_service()
+    db = AsyncMock()
+    unchanged = _panel_user(5, 10)
+    changed = _panel_user(6, 20)
+    bot_users = [
+        SimpleNamespace(id=1, telegram_id=10, remnawave_id=5, email=None, email_verified=False),
+        SimpleNamespace(id=2, telegram_id=20, remnawave_id=6, email=None, email_verified=False),
+    ]
+    service._load_bot_users_for_panel_page = AsyncMock(return_value=bot_users)
+    service._update_subscription_from_panel_data = AsyncMock(return_value=True)
+    monkeypatch.setattr(
+        'app.database.crud.subscription.get_subscription_by_user_id',
+        AsyncMock(return_value=MagicMock()),
+    )
+    monkeypatch.setattr('sqlalchemy.inspect', lambda obj: SimpleNamespace(expired_attributes=set()))
+    panel_sync_fingerprints.remember(
+        {
+            1: panel_user_fingerprint(unchanged),
+            2: panel_user_fingerprint({**changed, 'expireAt': '2025-01-01T00:00:00+00:00'}),
+        }
+    )
+    stats = {'created': 0, 'updated': 0, 'errors': 0, 'deleted': 0, 'unchanged': 0}
+    seen: dict[int, dict] = {}
+
+    completed = await service._reconcile_panel_page(db, [unchanged, changed], 'all', stats, seen, set())
+
+    assert completed is True
+    assert stats['unchanged'] == 1
+    assert stats['updated'] == 1
+    assert set(seen) == {10, 20}
+    service._update_subscription_from_panel_data.assert_awaited_once()
+    assert service._update_subscription_from_panel_data.await_args.args[1] is bot_users[1]
+    db.commit.assert_awaited()
+    # Отпечаток обновлённого пользователя запомнен после коммита страницы
+    assert panel_sync_fingerprints.matches(2, panel_user_fingerprint(changed))
+
+
+async def test_partially_applied_panel_state_is_not_fingerprinted(monkeypatch):
+    service = _create_service()
+    panel_user = _panel_user(6, 20)
+    bot_user = SimpleNamespace(id=2, telegram_id=20, remnawave_id=6, email=None, email_verified=False)
+    service._load_bot_users_for_panel_page = AsyncMock(return_value=[bot_user])
+    service._update_subscription_from_panel_data = AsyncMock(return_value=False)
+    monkeypatch.setattr(
+        'app.database.crud.subscription.get_subscription_by_user_id',
+        AsyncMock(return_value=MagicMock()),
+    )
+    monkeypatch.setattr('sqlalchemy.inspect', lambda obj: SimpleNamespace(expired_attributes=set()))
+    stats = {'created': 0, 'updated': 0, 'errors': 0, 'deleted': 0, 'unchanged': 0}
+
+    await service._reconcile_panel_page(AsyncMock(), [panel_user], 'all', stats, {}, set())
+
+    # Пропущенное (grace, свежий вебхук) должно сверяться на следующем проходе
+    assert stats['updated'] == 1
+    assert not panel_sync_fingerprints.matches(2, panel_user_fingerprint(panel_user))
+
+
+@pytest.mark.parametrize(
+    ('grace_open', 'recent_webhook', 'expected'),
+    [(False, False, True), (True, False, False), (False, True, False)],
+)
+async def test_update_reports_whether_panel_state_was_applied_in_full(
+    monkeypatch, grace_open, recent_webhook, expected
+):
+    service = _create_service()
+    subscription = SimpleNamespace(
+        id=7,
+        status='active',
+        end_date=datetime.now(UTC) + timedelta(days=10),
+        traffic_used_gb=0.0,
+        connected_squads=['a', 'b'],
+        remnawave_short_uuid='short',
+        subscription_url='',
+        subscription_crypto_link='',
+    )
+    monkeypatch.setattr(settings, 'MULTI_TARIFF_ENABLED', False, raising=False)
+    monkeypatch.setattr(
+        'app.database.crud.subscription.get_subscription_by_user_id', AsyncMock(return_value=subscription)
+    )
+    monkeypatch.setattr('app.database.crud.subscription.is_recently_updated_by_webhook', lambda sub: recent_webhook)
+    panel_user = {**_panel_user(6, 20), 'expireAt': ''}
+
+    applied = await service._update_subscription_from_panel_data(
+        AsyncMock(),
+        SimpleNamespace(id=2, telegram_id=20),
+        panel_user,
+        open_grace_ids={7} if grace_open else set(),
+    )
+
+    assert applied is expected
+
+
+async def test_reconcile_page_keeps_fresher_duplicate_from_previous_page():
+    service = _create_service()
+    db = AsyncMock()
+    service._load_bot_users_for_panel_page = AsyncMock(return_value=[])
+    stats = {'created': 0, 'updated': 0, 'errors': 0, 'deleted': 0, 'unchanged': 0}
+    seen = {10: {'expireAt': '2027-01-01T00:00:00+00:00', 'status': 'ACTIVE'}}
+
+    await service._reconcile_panel_page(db, [_panel_user(7, 10)], 'update_only', stats, seen, set())
+
+    assert seen[10]['expireAt'] == '2027-01-01T00:00:00+00:00'
+    assert service._load_bot_users_for_panel_page.await_args.kwargs['telegram_ids'] == set()
+
+
+def _mock_pages(service, pages: list[list]) -> MagicMock:
+    api = MagicMock()
+    last = len(pages) - 1
+    api.get_all_users_page_stream = AsyncMock(
+        side_effect=[
+            {'users': page, 'nextCursor': str(i + 1) if i < last else None, 'hasMore': i < last}
+            for i, page in enumerate(pages)
+        ]
+    )
+    acm = MagicMock()
+    acm.__aenter__ = AsyncMock(return_value=api)
+    acm.__aexit__ = AsyncMock(return_value=False)
+    service.get_api_client = MagicMock(return_value=acm)
+    service._panel_user_to_sync_dict = lambda user: user
+    return api
+
+
+@pytest.mark.parametrize(('page_results', 'expect_deactivation'), [((True, True), True), ((False,), False)])
+async def test_sync_streams_pages_and_guards_deactivation(monkeypatch, page_results, expect_deactivation):
+    service = _create_service()
+    api = _mock_pages(service, [[_panel_user(1, 10)], [_panel_user(2, 20)]])
+    monkeypatch.setattr(Settings, 'is_multi_tariff_enabled', lambda self: False)
+    monkeypatch.setattr(
+        'app.services.grace_access_runtime.get_open_grace_subscription_ids',
+        AsyncMock(return_value=set()),
+    )
+
+    results = iter(page_results)
+
+    async def reconcile(db, panel_page, sync_type, stats, seen, open_grace_ids):
+        for user in panel_page:
+            seen[user['telegramId']] = {}
+        return next(results)
+
+    service._reconcile_panel_page = reconcile
+    service._deactivate_users_missing_in_panel = AsyncMock()
+
+    stats = await service.sync_users_from_panel(AsyncMock(), 'all')
+
+    assert api.get_all_users_page_stream.await_count == len(page_results)
+    assert stats['errors'] == 0
+    if expect_deactivation:
+        service._deactivate_users_missing_in_panel.assert_awaited_once()
+        assert service._deactivate_users_missing_in_panel.await_args.args[1] == {10, 20}
+    else:
+        service._deactivate_users_missing_in_panel.assert_not_awaited()
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+from datetime import UTC, date, datetime
+
+from sqlalchemy import delete, select
+
+from app.database.crud.stats_rollup import get_daily_transaction_totals, recompute_rollups, sum_transaction_rollups
+from app.database.models import (
+    DailySubscriptionRollup,
+    DailyTransactionRollup,
+    Subscription,
+    SubscriptionConversion,
+    Transaction,
+    User,
+)
+from app.services import stats_rollup_service as rollup_module
+from tests.fixtures.sqlite_memory import memory_session
+
+
+_TABLES = [
+    User.__table__,
+    Transaction.__table__,
+    Subscription.__table__,
+    SubscriptionConversion.__table__,
+    DailyTransactionRollup.__table__,
+    DailySubscriptionRollup.__table__,
+]
+
+_DAY_1 = datetime(2026, 3, 1, 10, 0, tzinfo=UTC)
+_DAY_2 = datetime(2026, 3, 2, 23, 30, tzinfo=UTC)
+
+
+def _transaction(tx_id: int, created_at: datetime, amount: int, **overrides) -> Transaction:
+    values = {
+        'id': tx_id,
+        'user_id': 1,
+        'type': 'deposit',
+        'amount_kopeks': amount,
+        'payment_method': 'yookassa',
+        'is_completed': True,
+        'created_at': created_at,
+    }
+    values.update(overrides)
+    return Transaction(**values)
+
+
+async def _seed(db) -> None:
+    db.add_all(
+        [
+            User(id=1, telegram_id=1001, created_at=_DAY_1),
+            User(id=2, telegram_id=1002, created_at=_DAY_2),
+        ]
+    )
+    db.add_all(
+        [
+            _transaction(1, _DAY_1, 10_000),
+            _transaction(2, _DAY_1, 5_000),
+            _transaction(3, _DAY_1, -3_000, type='subscription_payment', payment_method=None),
+            _transaction(4, _DAY_2, 7_000, payment_method='cryptobot'),
+            _transaction(5, _DAY_2, 9_999, is_completed=False),
+        ]
+    )
+    db.add_all(
+        [
+            Subscription(id=1, user_id=1, is_trial=True, remnawave_short_id='s1', end_date=_DAY_2, created_at=_DAY_1),
+            Subscription(id=2, user_id=2, is_trial=False, remnawave_short_id='s2', end_date=_DAY_2, created_at=_DAY_2),
+        ]
+    )
+    db.add(SubscriptionConversion(id=1, user_id=1, converted_at=_DAY_2))
+    await db.commit()
+
+
+async def test_recompute_builds_daily_rows_and_is_idempotent(monkeypatch):
+    async with memory_session(monkeypatch, _TABLES) as db:
+        await _seed(db)
+
+        for _ in range(2):
+            await recompute_rollups(db, date(2026, 3, 1), date(2026, 3, 2))
+            await db.commit()
+
+        tx_rows = (
+            await db.execute(
+                select(
+                    DailyTransactionRollup.day,
+                    DailyTransactionRollup.type,
+                    DailyTransactionRollup.payment_method,
+                    DailyTransactionRollup.transactions_count,
+                    DailyTransactionRollup.amount_kopeks,
+                )
+            )
+        ).all()
+        sub_rows = (
+            await db.execute(
+                select(
+                    DailySubscriptionRollup.day,
+                    DailySubscriptionRollup.registrations,
+                    DailySubscriptionRollup.trials_started,
+                    DailySubscriptionRollup.trial_conversions,
+                )
+            )
+        ).all()
+        income = await sum_transaction_rollups(db, types=['deposit'], payment_methods=['yookassa', 'cryptobot'])
+        daily = await get_daily_transaction_totals(db, date(2026, 3, 1), date(2026, 3, 2), types=['deposit'])
+
+    assert sorted(tx_rows) == [
+        (date(2026, 3, 1), 'deposit', 'yookassa', 2, 15_000),
+        (date(2026, 3, 1), 'subscription_payment', '', 1, 3_000),
+        (date(2026, 3, 2), 'deposit', 'cryptobot', 1, 7_000),
+    ]
+    assert sorted(sub_rows) == [(date(2026, 3, 1), 1, 1, 0), (date(2026, 3, 2), 1, 0, 1)]
+    assert income == (3, 22_000)
+    assert daily == [
+        {'date': date(2026, 3, 1), 'count': 2, 'amount_kopeks': 15_000},
+        {'date': date(2026, 3, 2), 'count': 1, 'amount_kopeks': 7_000},
+    ]
+
+
+async def test_recompute_drops_rows_for_days_without_data(monkeypatch):
+    async with memory_session(monkeypatch, _TABLES) as db:
+        await _seed(db)
+        await recompute_rollups(db, date(2026, 3, 1), date(2026, 3, 2))
+        await db.commit()
+
+        # Удаление в обход ORM — как его увидит ночная сверка
+        await db.execute(delete(Transaction).where(Transaction.id == 4))
+        await db.commit()
+        await recompute_rollups(db, date(2026, 3, 2), date(2026, 3, 2))
+        await db.commit()
+
+        days = set((await db.execute(select(DailyTransactionRollup.day))).scalars().all())
+
+    assert days == {date(2026, 3, 1)}
+
+
+async def test_committed_writes_mark_their_days_dirty(monkeypatch):
+    service = rollup_module.StatsRollupService()
+    service._running = True
+    monkeypatch.setattr(rollup_module, 'stats_rollup_service', service)
+
+    async with memory_session(monkeypatch, _TABLES) as db:
+        db.add(User(id=1, telegram_id=1001, created_at=_DAY_1))
+        db.add(_transaction(1, _DAY_2, 500))
+        await db.commit()
+
+        assert service._dirty_days == {date(2026, 3, 1), date(2026, 3, 2)}
+        service._dirty_days.clear()
+
+        db.add(_transaction(2, _DAY_1, 100))
+        await db.flush()
+        await db.rollback()
+
+    assert service._dirty_days == set()
@@ -0,0 +1,131 @@
+import asyncio
+
+from app.cabinet.routes.websocket import CabinetConnectionManager
+from app.config import settings
+from app.services import event_emitter as event_emitter_module
+from app.services.websocket_fanout import SLOW_CONSUMER_CLOSE_CODE, WebSocketFanout
+
+
+class _FakeWebSocket:
+    def __init__(self, *, stall: bool = False) -> None:
+        self.stall = stall
+        self.sent: list[str] = []
+        self.closed_with: int | None = None
+        self._release = asyncio.Event()
+
+    async def send_text(self, text: str) -> None:
+        if self.stall:
+            await self._release.wait()
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000, reason: str = '') -> None:
+        self.closed_with = code
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_slow_consumer_is_dropped_without_blocking_publisher(monkeypatch):
+    monkeypatch.setattr(settings, 'EVENT_HUB_SEND_QUEUE_SIZE', 2)
+    hub = WebSocketFanout('test')
+    fast, slow = _FakeWebSocket(), _FakeWebSocket(stall=True)
+    hub.register(fast)
+    hub.register(slow)
+
+    for index in range(4):
+        hub.publish({'n': index})
+        await _settle()
+
+    assert fast.sent == ['{"n": 0}', '{"n": 1}', '{"n": 2}', '{"n": 3}']
+    assert slow not in hub
+    assert fast in hub
+    assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    stats = hub.get_stats()
+    assert stats['dropped_subscribers'] == 1
+    assert stats['lagging_events'] >= 1
+    hub.unregister(fast)
+
+
+async def test_send_timeout_drops_subscriber(monkeypatch):
+    monkeypatch.setattr(settings, 'EVENT_HUB_SEND_TIMEOUT_SECONDS', 0.01)
+    hub = WebSocketFanout('test')
+    slow = _FakeWebSocket(stall=True)
+    hub.register(slow)
+
+    assert hub.publish({'type': 'ping'}) == 1
+    await asyncio.sleep(0.05)
+
+    assert slow not in hub
+    assert hub.get_stats()['dropped_subscribers'] == 1
+
+
+async def test_publish_serializes_once_and_respects_targets(monkeypatch):
+    hub = WebSocketFanout('test')
+    first, second = _FakeWebSocket(), _FakeWebSocket()
+    hub.register(first)
+    hub.register(second)
+
+    dumps_calls = []
+    real_dumps = __import__('json').dumps
+    monkeypatch.setattr(
+        'app.services.websocket_fanout.json.dumps',
+        lambda *args, **kwargs: dumps_calls.append(1) or real_dumps(*args, **kwargs),
+    )
+
+    assert hub.publish({'type': 'all'}) == 2
+    assert hub.publish({'type': 'one'}, targets=[second, _FakeWebSocket()]) == 1
+    await _settle()
+
+    assert len(dumps_calls) == 2
+    assert first.sent == ['{"type": "all"}']
+    assert second.sent == ['{"type": "all"}', '{"type": "one"}']
+    hub.unregister(first)
+    hub.unregister(second)
+
+
+async def test_emit_queues_webhooks_instead_of_delivering_inline(monkeypatch):
+    queued = []
+    monkeypatch.setattr(
+        event_emitter_module.webhook_service, 'enqueue', lambda event_type, payload: queued.append(event_type)
+    )
+
+    async def _must_not_run(*args, **kwargs):
+        raise AssertionError('send_webhook must not be awaited inline')
+
+    monkeypatch.setattr(event_emitter_module.webhook_service, 'send_webhook', _must_not_run)
+    emitter = event_emitter_module.EventEmitter()
+    websocket = _FakeWebSocket()
+    emitter.register_websocket(websocket)
+
+    await emitter.emit('ticket.created', {'ticket_id': 1}, db=object())
+    await _settle()
+
+    assert queued == ['ticket.created']
+    assert len(websocket.sent) == 1
+    assert '"ticket.created"' in websocket.sent[0]
+    emitter.unregister_websocket(websocket)
+
+
+async def test_failed_send_prunes_cabinet_connection_maps():
+    class _BrokenWebSocket(_FakeWebSocket):
+        async def send_text(self, text: str) -> None:
+            raise RuntimeError('connection reset')
+
+    manager = CabinetConnectionManager()
+    broken, alive = _BrokenWebSocket(), _FakeWebSocket()
+    await manager.connect(broken, user_id=1, is_admin=True)
+    await manager.connect(alive, user_id=2, is_admin=False)
+
+    await manager._deliver_to_admins({'type': 'ping'})
+    await _settle()
+
+    # Мёртвый сокет уходит не только из хаба, но и из словарей менеджера
+    assert 1 not in manager._user_connections
+    assert 1 not in manager._admin_connections
+    assert broken not in manager._connection_users
+    assert manager._user_connections == {2: {alive}}
+    assert manager.get_stats()['send_failures'] == 1
+    await manager.disconnect(broken, 1)
+    await manager.disconnect(alive, 2)
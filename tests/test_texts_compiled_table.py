@@ -0,0 +1,69 @@
+"""get_texts() отдаёт одну скомпилированную таблицу на язык вместо копии локали на вызов.
+
+Раньше каждый вызов get_texts() копировал всю слитую локаль (~2k ключей) и
+строил fallback-словарь — при ~860 местах вызова это тысячи аллокаций на апдейт.
+Таблица должна пересобираться только при сбросе кэша локалей или смене
+настроек, от которых зависят динамические тексты.
+"""
+
+import pytest
+
+from app.config import settings
+from app.localization import texts as texts_module
+from app.localization.loader import clear_locale_cache, load_locale
+from app.localization.texts import get_texts, invalidate_texts_cache
+
+
+@pytest.fixture(autouse=True)
+def _fresh_tables():
+    invalidate_texts_cache()
+    yield
+    invalidate_texts_cache()
+
+
+def test_repeated_calls_return_same_table():
+    assert get_texts('ru') is get_texts('ru')
+    assert get_texts('en') is not get_texts('ru')
+
+
+def test_language_values_override_default_locale():
+    en = get_texts('en')
+
+    assert en['BACK'] == load_locale('en')['BACK']
+    assert en.get('__definitely_missing_key__') is None
+
+
+def test_table_is_read_only():
+    texts = get_texts('ru')
+
+    with pytest.raises(TypeError):
+        texts._table['BACK'] = 'mutated'
+
+
+def test_clear_locale_cache_rebuilds_table():
+    before = get_texts('ru')
+
+    clear_locale_cache()
+
+    assert get_texts('ru') is not before
+
+
+def test_pricing_setting_change_rebuilds_dynamic_values(monkeypatch):
+    before = get_texts('ru').TRAFFIC_5GB
+
+    monkeypatch.setattr(settings, 'PRICE_TRAFFIC_5GB', settings.PRICE_TRAFFIC_5GB + 10_000)
+    invalidate_texts_cache()
+
+    after = get_texts('ru').TRAFFIC_5GB
+    assert after != before
+
+
+def test_unbounded_language_codes_do_not_grow_cache(monkeypatch):
+    monkeypatch.setattr(texts_module, '_COMPILED_TEXTS_MAX', 2)
+
+    get_texts('ru')
+    get_texts('en')
+    get_texts('xx-unknown')
+
+    assert 'xx-unknown' not in texts_module._compiled_texts
+    assert get_texts('xx-unknown').language == 'xx-unknown'
@@ -0,0 +1,159 @@
+"""Каталог в памяти: те же правила, что у CRUD, и сброс по закоммиченным правкам."""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import app.utils.catalog_cache as catalog_module
+from app.config import settings
+from app.database.crud.server_squad import get_available_server_squads
+from app.database.crud.tariff import get_tariffs_for_user
+from app.database.models import (
+    PromoGroup,
+    ServerSquad,
+    Tariff,
+    server_squad_promo_groups,
+    tariff_promo_groups,
+)
+from app.utils.catalog_cache import CatalogCache, get_cached_tariff
+from tests.fixtures.sqlite_memory import memory_session
+
+
+TABLES = (
+    PromoGroup.__table__,
+    Tariff.__table__,
+    ServerSquad.__table__,
+    tariff_promo_groups,
+    server_squad_promo_groups,
+)
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, int] = {}
+
+    async def get(self, key: str):
+        return self.values.get(key)
+
+    async def increment(self, key: str, amount: int = 1) -> int:
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    redis = _FakeRedis()
+    cache = CatalogCache()
+    monkeypatch.setattr(catalog_module, 'cache', redis)
+    monkeypatch.setattr(catalog_module, 'catalog_cache', cache)
+    monkeypatch.setattr(settings, 'CATALOG_CACHE_ENABLED', True)
+    monkeypatch.setattr(settings, 'CATALOG_CACHE_VERSION_CHECK_SECONDS', 60)
+    return cache, redis
+
+
+async def _seed(db) -> None:
+    vip = PromoGroup(id=1, name='VIP', period_discounts={'30': 15})
+    base = PromoGroup(id=2, name='Base', is_default=True)
+    db.add_all([vip, base])
+    await db.flush()
+    db.add_all(
+        [
+            Tariff(id=1, name='Open', display_order=2, period_prices={'30': 10000}),
+            Tariff(id=2, name='VIP only', display_order=1, period_prices={'30': 0}, allowed_promo_groups=[vip]),
+            Tariff(id=3, name='Hidden', is_active=False, period_prices={'30': 5000}),
+            ServerSquad(id=1, squad_uuid='sq-open', display_name='Open', allowed_promo_groups=[vip, base]),
+            ServerSquad(id=2, squad_uuid='sq-vip', display_name='VIP', price_kopeks=500, allowed_promo_groups=[vip]),
+            ServerSquad(id=3, squad_uuid='sq-off', display_name='Off', is_available=False),
+        ]
+    )
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_follows_crud_rules_and_reuses_model_logic(monkeypatch, catalog):
+    cache, _ = catalog
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _seed(db)
+        monkeypatch.setattr(catalog_module, 'AsyncSessionLocal', async_sessionmaker(db.bind, expire_on_commit=False))
+
+        snapshot = await cache.get()
+
+        for promo_group_id in (None, 1, 2):
+            expected_tariffs = [t.id for t in await get_tariffs_for_user(db, promo_group_id)]
+            assert [t.id for t in snapshot.tariffs_for_promo_group(promo_group_id)] == expected_tariffs
+            expected_squads = [s.squad_uuid for s in await get_available_server_squads(db, promo_group_id)]
+            assert [s.squad_uuid for s in snapshot.available_server_squads(promo_group_id)] == expected_squads
+
+        vip_tariff = snapshot.get_tariff(2)
+        assert vip_tariff.is_free and vip_tariff.get_price_for_period(30) == 0
+        assert vip_tariff.is_available_for_promo_group(1) and not vip_tariff.is_available_for_promo_group(2)
+        assert snapshot.get_promo_group(1).get_discount_percent('period', 30) == 15
+        assert snapshot.get_server_squad('sq-vip').price_rubles == 5
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            vip_tariff.name = 'changed'
+
+
+@pytest.mark.asyncio
+async def test_committed_catalog_writes_rebuild_snapshot_and_bump_version(monkeypatch, catalog):
+    cache, redis = catalog
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _seed(db)
+        await asyncio.sleep(0)
+        redis.values.clear()
+        monkeypatch.setattr(catalog_module, 'AsyncSessionLocal', async_sessionmaker(db.bind, expire_on_commit=False))
+
+        await cache.get()
+        await cache.get()
+        assert cache.rebuilds == 1 and cache.hits == 1
+
+        tariff = await db.get(Tariff, 1)
+        tariff.name = 'Renamed'
+        await db.commit()
+        await asyncio.sleep(0)
+        assert redis.values['catalog:version'] == 1
+        snapshot = await cache.get()
+        assert cache.rebuilds == 2
+        assert snapshot.version == 1 and snapshot.get_tariff(1).name == 'Renamed'
+
+        # Счётчик пользователей сервера в снимок не входит и каталог не сбрасывает
+        await db.execute(
+            update(ServerSquad).where(ServerSquad.id == 1).values(current_users=ServerSquad.current_users + 1)
+        )
+        await db.commit()
+        await cache.get()
+        assert cache.rebuilds == 2
+
+        # Core-UPDATE по таблице тарифов (как в set_trial_tariff) — сбрасывает
+        await db.execute(Tariff.__table__.update().values(is_trial_available=True))
+        await db.commit()
+        await asyncio.sleep(0)
+        snapshot = await cache.get()
+        assert cache.rebuilds == 3 and snapshot.get_tariff(3).is_trial_available
+
+
+@pytest.mark.asyncio
+async def test_remote_version_bump_and_disabled_cache_fallback(monkeypatch, catalog):
+    cache, redis = catalog
+    monkeypatch.setattr(settings, 'CATALOG_CACHE_VERSION_CHECK_SECONDS', 0)
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _seed(db)
+        monkeypatch.setattr(catalog_module, 'AsyncSessionLocal', async_sessionmaker(db.bind, expire_on_commit=False))
+        redis.values['catalog:version'] = 4
+
+        assert (await cache.get()).version == 4
+        await cache.get()
+        assert cache.rebuilds == 1
+
+        # Правку закоммитил другой процесс
+        redis.values['catalog:version'] = 5
+        assert (await cache.get()).version == 5
+        assert cache.rebuilds == 2
+
+        monkeypatch.setattr(settings, 'CATALOG_CACHE_ENABLED', False)
+        tariff = await get_cached_tariff(db, 1)
+        assert isinstance(tariff, Tariff)
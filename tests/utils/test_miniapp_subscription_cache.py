@@ -0,0 +1,116 @@
+import asyncio
+from datetime import UTC, datetime
+from types import SimpleNamespace
+
+import app.webapi.routes.miniapp as miniapp_module
+from app.config import settings
+from app.external.remnawave_api import RemnaWaveAPIError
+from app.utils.miniapp_subscription_cache import MiniAppSubscriptionCache, subscription_version_stamp
+from app.webapi.routes.miniapp import _with_panel_timeout
+
+
+def _subscription(**overrides) -> SimpleNamespace:
+    values = {
+        'id': 1,
+        'updated_at': datetime(2026, 3, 1, tzinfo=UTC),
+        'status': 'active',
+        'end_date': datetime(2026, 4, 1, tzinfo=UTC),
+        'traffic_used_gb': 1.5,
+        'device_limit': 3,
+        'autopay_enabled': False,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _user(**overrides) -> SimpleNamespace:
+    values = {
+        'id': 10,
+        'updated_at': datetime(2026, 3, 1, tzinfo=UTC),
+        'balance_kopeks': 1000,
+        'status': 'active',
+        'language': 'ru',
+        'promo_group_id': None,
+        'promo_offer_discount_percent': 0,
+        'promo_offer_discount_expires_at': None,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_stamp_changes_with_user_or_subscription_state():
+    base = subscription_version_stamp(_user(), [_subscription()])
+
+    assert subscription_version_stamp(_user(), [_subscription()]) == base
+    assert subscription_version_stamp(_user(balance_kopeks=900), [_subscription()]) != base
+    assert subscription_version_stamp(_user(), [_subscription(traffic_used_gb=2.0)]) != base
+    assert subscription_version_stamp(_user(), [_subscription(), _subscription(id=2)]) != base
+
+
+def test_cache_serves_only_matching_stamp(monkeypatch):
+    monkeypatch.setattr(settings, 'MINIAPP_SUBSCRIPTION_CACHE_TTL_SECONDS', 30)
+    cache = MiniAppSubscriptionCache()
+    response = object()
+
+    cache.put(555, 'v1', response)
+
+    assert cache.get(555, 'v1') is response
+    assert cache.get(555, 'v2') is None
+    # Устаревшая запись удаляется при промахе
+    assert cache.get(555, 'v1') is None
+
+
+def test_cache_disabled_with_zero_ttl(monkeypatch):
+    monkeypatch.setattr(settings, 'MINIAPP_SUBSCRIPTION_CACHE_TTL_SECONDS', 0)
+    cache = MiniAppSubscriptionCache()
+
+    cache.put(555, 'v1', object())
+
+    assert cache.get(555, 'v1') is None
+
+
+async def test_slow_panel_lookup_degrades_to_fallback(monkeypatch):
+    monkeypatch.setattr(settings, 'MINIAPP_PANEL_LOOKUP_TIMEOUT_SECONDS', 0.01)
+
+    async def _slow():
+        await asyncio.sleep(1)
+        return {'links': ['vless://x']}
+
+    async def _fast():
+        return {'links': ['vless://y']}
+
+    assert await _with_panel_timeout(_slow(), {}, 'links') == ({}, True)
+    assert await _with_panel_timeout(_fast(), {}, 'links') == ({'links': ['vless://y']}, False)
+
+
+async def test_panel_errors_mark_response_degraded(monkeypatch):
+    class _FailingApi:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def get_user_devices_all(self, panel_user_id):
+            raise RemnaWaveAPIError('panel unavailable')
+
+        async def get_subscription_info(self, short_uuid):
+            raise RemnaWaveAPIError('panel unavailable')
+
+    class _FailingService:
+        is_configured = True
+
+        def get_api_client(self):
+            return _FailingApi()
+
+    monkeypatch.setattr(miniapp_module, 'RemnaWaveService', _FailingService)
+    monkeypatch.setattr(miniapp_module, 'SubscriptionService', _FailingService)
+    monkeypatch.setattr(miniapp_module, '_is_remnawave_configured', lambda: True)
+    user = SimpleNamespace(remnawave_id='panel-user')
+    subscription = SimpleNamespace(remnawave_short_uuid='short')
+
+    # Пустой фолбэк вместо ответа панели не должен попасть в кэш как настоящий
+    devices = miniapp_module._load_devices_info(user)
+    assert await _with_panel_timeout(devices, (0, []), 'devices') == ((0, []), True)
+    links = miniapp_module._load_subscription_links(subscription)
+    assert await _with_panel_timeout(links, {}, 'links') == ({}, True)
@@ -10,7 +10,7 @@ from __future__ import annotations
 
 import pytest
 
-from app.database.crud.user import get_users_count, get_users_list
+from app.database.crud.user import get_users_count, get_users_list, rebuild_user_search_text
 from app.database.models import (
     PromoGroup,
     Subscription,
@@ -20,7 +20,7 @@ from app.database.models import (
     UserStatus,
     tariff_promo_groups,
 )
-from app.utils.text_search import case_variants, contains_patterns
+from app.utils.text_search import build_user_search_text, case_variants, contains_patterns, normalize_search_text
 from tests.fixtures.sqlite_memory import memory_session
 
 
@@ -135,3 +135,52 @@ async def test_telegram_id_search_unaffected(monkeypatch: pytest.MonkeyPatch) ->
         await _seed(db, ['Позитив'])
 
         assert len(await get_users_list(db, search='900000')) == 1
+
+
+def test_search_text_is_casefolded_and_transliterated() -> None:
+    user = User(first_name='Пётр', last_name='ИВАНОВ', username='Petr_X', email='Petr@Mail.ru')
+
+    assert normalize_search_text('  Ёлка   ЗЕЛЁНАЯ ') == 'елка зеленая'
+    assert build_user_search_text(user) == 'петр иванов @petr_x petr@mail.ru petr ivanov'
+    assert build_user_search_text(User()) is None
+
+
+async def test_search_text_follows_profile_changes(monkeypatch: pytest.MonkeyPatch) -> None:
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _seed(db, ['Позитив'])
+        user = (await get_users_list(db, search='поз'))[0]
+        assert user.search_text == 'позитив @user0 pozitiv'
+
+        user.first_name = 'Ёжик'
+        await db.commit()
+
+        assert await get_users_list(db, search='поз') == []
+        assert [u.id for u in await get_users_list(db, search='ЕЖИК')] == [user.id]
+        # Транслитерация: латиницей находится кириллическое имя
+        assert [u.id for u in await get_users_list(db, search='ezhik')] == [user.id]
+        assert [u.id for u in await get_users_list(db, search='@USER0')] == [user.id]
+
+
+async def test_rebuild_restores_search_text_after_bulk_load(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Восстановление бекапа пишет users в обход хуков — колонку пересчитывает rebuild."""
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _seed(db, ['Позитив', 'Ёжик'])
+        users = User.__table__
+        await db.execute(users.update().values(search_text=None))
+        await db.execute(users.update().where(users.c.username == 'user1').values(first_name='Негатив'))
+        assert await get_users_list(db, search='поз') == []
+
+        assert await rebuild_user_search_text(db, batch_size=1) == 2
+        await db.commit()
+
+        assert [u.username for u in await get_users_list(db, search='поз')] == ['user0']
+        assert [u.username for u in await get_users_list(db, search='negativ')] == ['user1']
+        assert await get_users_list(db, search='ежик') == []
+
+
+async def test_like_wildcards_in_term_are_literal(monkeypatch: pytest.MonkeyPatch) -> None:
+    async with memory_session(monkeypatch, TABLES) as db:
+        await _seed(db, ['Позитив'])
+
+        assert await get_users_list(db, search='%') == []
+        assert await get_users_list(db, search='user_') == []
@@ -102,14 +102,15 @@ def test_users_search_filter_adds_internal_id_for_int32() -> None:
     query = users._apply_search_filter(select(User), '123')
     where_expr = query._where_criteria[0]
 
-    assert len(list(where_expr.clauses)) == 6
+    # search_text + telegram_id + id
+    assert len(list(where_expr.clauses)) == 3
 
 
 def test_users_search_filter_skips_internal_id_for_out_of_int32() -> None:
     query = users._apply_search_filter(select(User), str(2**40))
     where_expr = query._where_criteria[0]
 
-    assert len(list(where_expr.clauses)) == 5
+    assert len(list(where_expr.clauses)) == 2
 
 
 @pytest.mark.anyio('asyncio')
@@ -0,0 +1,88 @@
+"""Вебхуки с безусловным 200 сохраняют коллбек во входящую очередь до ответа.
+
+После 200 провайдер считает коллбек доставленным и повторять его не будет,
+поэтому обработка, потерянная падением или выкатом, — это потерянное
+зачисление: деньги у провайдера прошли, у нас нет.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.webserver import payments
+
+
+class _Req:
+    async def body(self):
+        return b'{"payment": {"id": "p-1"}}'
+
+
+def _etoplatezhi_route(monkeypatch):
+    monkeypatch.setattr(type(settings), 'is_etoplatezhi_configured', lambda self: True)
+    monkeypatch.setattr(
+        'app.services.etoplatezhi_service.etoplatezhi_service.verify_callback_signature',
+        lambda payload: True,
+    )
+    router = payments.create_payment_router(SimpleNamespace(), SimpleNamespace())
+    return next(r for r in router.routes if r.path == settings.ETOPLATEZHI_WEBHOOK_PATH and 'POST' in r.methods)
+
+
+@pytest.mark.asyncio
+async def test_webhook_acks_after_persisting_without_processing(monkeypatch):
+    """Ответ 200 уходит после записи в очередь, НЕ дожидаясь обработки платежа."""
+    route = _etoplatezhi_route(monkeypatch)
+    enqueued: list[tuple] = []
+
+    async def enqueue(provider, handler, payload, raw_body):
+        enqueued.append((provider, handler, payload, raw_body))
+        return True
+
+    async def processor(*args, **kwargs):
+        raise AssertionError('коллбек обработан внутри запроса')
+
+    monkeypatch.setattr(payments.payment_webhook_inbox, 'enqueue', enqueue)
+    monkeypatch.setattr(payments, '_process_payment_service_callback', processor)
+
+    response = await asyncio.wait_for(route.endpoint(_Req()), timeout=2)
+
+    assert response.status_code == 200
+    assert enqueued == [
+        ('etoplatezhi', 'process_etoplatezhi_callback', {'payment': {'id': 'p-1'}}, b'{"payment": {"id": "p-1"}}')
+    ]
+
+
+@pytest.mark.asyncio
+async def test_webhook_asks_for_redelivery_when_inbox_is_unavailable(monkeypatch):
+    """Не смогли сохранить — не отвечаем 200, иначе провайдер коллбек не повторит."""
+    route = _etoplatezhi_route(monkeypatch)
+
+    async def enqueue(provider, handler, payload, raw_body):
+        raise ConnectionError('db is down')
+
+    monkeypatch.setattr(payments.payment_webhook_inbox, 'enqueue', enqueue)
+
+    response = await route.endpoint(_Req())
+
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_inbox_stops_before_the_other_shutdowns(monkeypatch):
+    """Воркеры очереди останавливаются раньше telegram-процессора и БД.
+
+    Обработка шлёт пользователю уведомление о зачислении — если процессор уже
+    остановлен, платёж применится молча.
+    """
+    import inspect
+
+    from app.webserver import unified_app
+
+    source = inspect.getsource(unified_app.create_unified_app)
+    inbox_at = source.index('shutdown_handlers.append(payment_webhook_inbox.stop)')
+    telegram_at = source.index('shutdown_handlers.append(telegram_processor.stop)')
+
+    assert inbox_at < telegram_at
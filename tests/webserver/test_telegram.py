@@ -1,13 +1,16 @@
+import asyncio
 import json
 from typing import Any
 from unittest.mock import AsyncMock
 
 import pytest
+from aiogram.types import Update
 from fastapi import HTTPException
 from starlette.requests import Request
 
 from app.config import settings
 from app.webserver.telegram import (
+    TelegramWebhookHotUserError,
     TelegramWebhookProcessor,
     create_telegram_router,
 )
@@ -334,3 +337,145 @@ async def test_health_endpoint(monkeypatch: pytest.MonkeyPatch) -> None:
     assert payload['webhook_configured'] is True
     assert payload['queue_maxsize'] == 42
     assert payload['workers'] == 2
+
+
+def _user_update(update_id: int, user_id: int) -> dict[str, Any]:
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'U'},
+            'chat_instance': '1',
+            'data': 'menu',
+        },
+    }
+
+
+@pytest.mark.anyio
+async def test_sharded_processor_keeps_per_user_order() -> None:
+    bot = AsyncMock()
+    dispatcher = AsyncMock()
+    seen: list[tuple[int, int]] = []
+
+    async def feed_update(_bot, update) -> None:
+        # Первый апдейт пользователя обрабатывается дольше — порядок не должен поменяться.
+        if update.update_id == 1:
+            await asyncio.sleep(0.02)
+        seen.append((update.callback_query.from_user.id, update.update_id))
+
+    dispatcher.feed_update = feed_update
+
+    processor = TelegramWebhookProcessor(
+        bot=bot,
+        dispatcher=dispatcher,
+        queue_maxsize=16,
+        worker_count=1,
+        enqueue_timeout=0.0,
+        shutdown_timeout=1.0,
+        shard_count=4,
+    )
+    await processor.start()
+    assert processor.get_stats()['workers'] == 4
+
+    for update_id, user_id in ((1, 10), (2, 11), (3, 10), (4, 10)):
+        await processor.enqueue(Update.model_validate(_user_update(update_id, user_id)))
+    await processor.wait_until_drained(timeout=1.0)
+
+    assert [update_id for user_id, update_id in seen if user_id == 10] == [1, 3, 4]
+    assert processor.get_stats()['users_pending'] == 0
+
+    await processor.stop()
+
+
+@pytest.mark.anyio
+async def test_sharded_processor_drops_hot_user_without_503() -> None:
+    bot = AsyncMock()
+    dispatcher = AsyncMock()
+    dispatcher.feed_update = AsyncMock()
+
+    processor = TelegramWebhookProcessor(
+        bot=bot,
+        dispatcher=dispatcher,
+        queue_maxsize=16,
+        worker_count=0,
+        enqueue_timeout=0.0,
+        shutdown_timeout=1.0,
+        shard_count=2,
+        per_user_max_pending=2,
+    )
+    await processor.start()
+
+    router = create_telegram_router(bot, dispatcher, processor=processor)
+    path = _webhook_path()
+    route = _get_route(router, path)
+
+    for update_id in range(1, 4):
+        request = _build_request(path, json.dumps(_user_update(update_id, 42)).encode('utf-8'))
+        response = await route.endpoint(request)
+        assert response.status_code == 200
+
+    # Другой пользователь не страдает от флуда первого.
+    request = _build_request(path, json.dumps(_user_update(10, 43)).encode('utf-8'))
+    assert (await route.endpoint(request)).status_code == 200
+
+    stats = processor.get_stats()
+    assert stats['dropped_hot_user'] == 1
+    assert stats['max_user_pending'] == 2
+    assert sum(stats['queue_depths']) == 3
+
+    await processor.stop()
+
+
+@pytest.mark.anyio
+async def test_hot_user_limit_never_drops_payment_updates() -> None:
+    processor = TelegramWebhookProcessor(
+        bot=AsyncMock(),
+        dispatcher=AsyncMock(),
+        queue_maxsize=16,
+        worker_count=0,
+        enqueue_timeout=0.0,
+        shutdown_timeout=1.0,
+        shard_count=2,
+        per_user_max_pending=1,
+    )
+    await processor.start()
+    user = {'id': 42, 'is_bot': False, 'first_name': 'U'}
+
+    await processor.enqueue(Update.model_validate(_user_update(1, 42)))
+    with pytest.raises(TelegramWebhookHotUserError):
+        await processor.enqueue(Update.model_validate(_user_update(2, 42)))
+
+    pre_checkout = {
+        'update_id': 3,
+        'pre_checkout_query': {
+            'id': 'q1',
+            'from': user,
+            'currency': 'XTR',
+            'total_amount': 100,
+            'invoice_payload': 'topup',
+        },
+    }
+    successful_payment = {
+        'update_id': 4,
+        'message': {
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': 42, 'type': 'private'},
+            'from': user,
+            'successful_payment': {
+                'currency': 'XTR',
+                'total_amount': 100,
+                'invoice_payload': 'topup',
+                'telegram_payment_charge_id': 'charge-1',
+                'provider_payment_charge_id': 'provider-1',
+            },
+        },
+    }
+    await processor.enqueue(Update.model_validate(pre_checkout))
+    await processor.enqueue(Update.model_validate(successful_payment))
+
+    stats = processor.get_stats()
+    assert stats['dropped_hot_user'] == 1
+    assert stats['max_user_pending'] == 3  # платежи в очереди, порядок пользователя сохранён
+
+    await processor.stop()